@@ -3,11 +3,19 @@ from camera_visualizer.camera_interface.mock_interface import (
     CameraEnum,
     camera,
 )
-from camera_visualizer.gui import VideoPlayer
 
 __all__ = [
-    Camera,
-    CameraEnum,
-    camera,
-    VideoPlayer,
+    "Camera",
+    "CameraEnum",
+    "camera",
+    "VideoPlayer",
 ]
+
+
+def __getattr__(name: str):
+    # The GUI is only imported on request, so that the headless entry points
+    # do not depend on PyQt5.
+    if name == "VideoPlayer":
+        from camera_visualizer.gui import VideoPlayer
+        return VideoPlayer
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
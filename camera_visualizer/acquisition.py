@@ -0,0 +1,386 @@
+import time
+
+import numpy as np
+
+from camera_visualizer.calibration import (
+    CalibrationKey,
+    CalibrationMaps,
+    CalibrationStore,
+    MasterCapture,
+    MasterKindEnum,
+)
+from camera_visualizer.camera_interface.mock_interface import Camera
+from camera_visualizer.catalog import SessionCatalog
+from camera_visualizer.focus import FocusAssist, FocusConfig
+from camera_visualizer.recorder import (
+    RECORDER_FILENAME_PREFIX,
+    AsyncFrameWriter,
+    FrameRingBuffer,
+    PreRollConfig,
+    SegmentConfig,
+)
+from camera_visualizer.serializer import SaveFormatEnum
+from camera_visualizer.stacking import FrameStacker, StackConfig, StackModeEnum
+from camera_visualizer.views import decimate_mosaic, false_color_view
+
+# Weight of the latest grab period in the measured frame rate
+ACQUISITION_FPS_SMOOTHING = 0.05
+
+
+class Acquisition:
+    """
+    Keeps track of the latest raw frame grabbed from a camera.
+
+    Every frame is grabbed (and can be recorded) at the acquisition rate,
+    while the frame for visualization is only computed on request, at most
+    once per grabbed frame, so that the display can run at a lower rate.
+
+    When a pre-roll is configured, the latest frames are kept in a
+    preallocated ring while not recording, and are written at the start of
+    the next recording.
+
+    When calibration is enabled, the maps selected from the camera state are
+    applied in place to every raw frame, before it is recorded or displayed.
+    Master frames are captured from the uncorrected frames.
+
+    When stacking is configured, the (calibrated) frames are also averaged,
+    and the stacked frames can replace the raw frames on the display and in
+    the recording. Recorded stacks are float32, so the pre-roll is then
+    disabled.
+
+    When focus assist is enabled, the sharpness of the region of interest
+    of the (calibrated) frames is scored, skipping frames at high frame
+    rates to bound the time taken from the grab.
+
+    Recorded sessions are added to the session catalog of the data path.
+    """
+    camera: Camera
+    frame: np.ndarray | None
+    frame_index: int
+    timestamp: float | None
+    pre_roll_config: PreRollConfig
+    pre_roll: FrameRingBuffer | None
+    segment_config: SegmentConfig
+    catalog: SessionCatalog
+    writer: AsyncFrameWriter | None
+    calibration: CalibrationStore
+    calibrate: bool
+    master_capture: MasterCapture | None
+    applied_maps: CalibrationMaps | None
+    stacker: FrameStacker | None
+    stacked_index: int
+    focus: FocusAssist | None
+    false_color: bool
+
+    def __init__(
+        self,
+        camera: Camera,
+        pre_roll_config: PreRollConfig | None = None,
+        segment_config: SegmentConfig | None = None,
+        catalog: SessionCatalog | None = None,
+    ):
+        self.camera = camera
+        self.frame = None
+        self.frame_index = -1
+        self.timestamp = None
+        self.fps = None
+        self.measured_fps = None
+        self.grab_errors = 0
+        self.pre_roll_config = pre_roll_config or PreRollConfig()
+        self.pre_roll = None
+        self.segment_config = segment_config or SegmentConfig()
+        self.catalog = catalog or SessionCatalog()
+        self.writer = None
+        self.record_every = 1
+        self.calibration = CalibrationStore()
+        self.calibrate = False
+        self.master_capture = None
+        self.applied_maps = None
+        self.stacker = None
+        self.stacked_index = -1
+        self.focus = None
+        self.false_color = False
+        self._view = None
+        self._view_index = None
+        self._view_decimation = 1
+
+    def reset(self, camera: Camera | None = None) -> None:
+        if camera is not None:
+            self.camera = camera
+        self.frame = None
+        self.frame_index = -1
+        self.timestamp = None
+        self.measured_fps = None
+        self.pre_roll = None
+        self.master_capture = None
+        self.stacked_index = -1
+        if self.stacker is not None:
+            self.stacker.reset()
+        if self.focus is not None:
+            self.focus.reset()
+        self.invalidate_view()
+
+    @property
+    def recording(self) -> bool:
+        return self.writer is not None
+
+    def configure_pre_roll(self, config: PreRollConfig) -> None:
+        """
+        Sets the pre-roll duration and memory budget. The ring is allocated
+        with the next grabbed frame.
+        """
+        self.pre_roll_config = config
+        self.pre_roll = None
+
+    def configure_stacking(self, config: StackConfig) -> None:
+        """
+        Sets the temporal averaging of the frames. The accumulators are
+        allocated with the next grabbed frame.
+        """
+        if self.recording and self.stack_recording() != (config.enabled and config.record):
+            raise ValueError("Stack recording cannot change while recording.")
+        self.stacker = FrameStacker(config=config) if config.enabled else None
+        self.stacked_index = -1
+        self.pre_roll = None
+        self.invalidate_view()
+
+    def configure_focus(self, config: FocusConfig | None) -> None:
+        """
+        Enables the focus assist with the given metric and region of
+        interest, or disables it if config is None.
+        """
+        self.focus = FocusAssist(config=config) if config is not None else None
+
+    def stack_recording(self) -> bool:
+        return self.stacker is not None and self.stacker.config.record
+
+    def grab(self, fps: float) -> np.ndarray:
+        """
+        Grabs a raw frame from the camera without computing its view, and
+        records it or keeps it in the pre-roll ring.
+        """
+        try:
+            frame = self.camera.get_raw_frame(fps=fps)
+        except Exception:
+            self.grab_errors += 1
+            raise
+        if self.master_capture is not None:
+            self._push_master(frame=frame)
+        max_value = 2 ** self.camera.bit_depth() - 1
+        self.applied_maps = None
+        if self.calibrate:
+            maps = self.calibration_maps()
+            if maps is not None and maps.matches(frame):
+                if not frame.flags.writeable:
+                    frame = frame.copy()
+                maps.apply(frame=frame, max_value=max_value)
+                self.applied_maps = maps
+        now = time.perf_counter()
+        if self.timestamp is not None and now > self.timestamp:
+            rate = 1.0 / (now - self.timestamp)
+            if self.measured_fps is None:
+                self.measured_fps = rate
+            else:
+                self.measured_fps += ACQUISITION_FPS_SMOOTHING * (rate - self.measured_fps)
+        self.frame = frame
+        self.frame_index += 1
+        self.timestamp = now
+        self.fps = fps
+        if self.focus is not None and self.focus.due(fps=self.measured_fps or fps):
+            self.focus.update(frame=frame, cfa_shape=self.camera.cfa_shape(), max_value=max_value)
+        stacked = None
+        if self.stacker is not None:
+            stacked = self.stacker.push(frame=frame, max_value=max_value)
+            if stacked is not None:
+                self.stacked_index += 1
+        if self.writer is not None:
+            if self.stack_recording():
+                if stacked is not None:
+                    self.writer.submit(
+                        frame=stacked.copy(),
+                        envi_options=self.envi_options(),
+                    )
+                return frame
+            if self.frame_index % self.record_every != 0:
+                return frame
+            self.writer.submit(
+                frame=frame if frame.flags.writeable else frame.copy(),
+                envi_options=self.envi_options(),
+            )
+        elif not self.stack_recording():
+            self._push_pre_roll(frame=frame)
+        return frame
+
+    def _push_pre_roll(self, frame: np.ndarray) -> None:
+        if self.pre_roll is None or not self.pre_roll.matches(frame):
+            capacity = self.pre_roll_config.capacity(
+                frame_bytes=frame.nbytes,
+                fps=self.fps,
+            )
+            if capacity < 1:
+                self.pre_roll = None
+                return
+            self.pre_roll = FrameRingBuffer(
+                capacity=capacity,
+                shape=frame.shape,
+                dtype=frame.dtype,
+            )
+        self.pre_roll.push(frame=frame, timestamp=self.timestamp)
+
+    def envi_options(self) -> dict:
+        """
+        Returns the metadata of the camera, with the calibration applied to
+        the latest frame.
+        """
+        options = self.camera.get_envi_options()
+        if self.applied_maps is not None:
+            options["calibration"] = self.applied_maps.description
+        if self.stack_recording():
+            config = self.stacker.config
+            options["stacking"] = (
+                f"{config.mode.value} of {config.frames:d} frames"
+                if config.mode == StackModeEnum.MEAN
+                else f"{config.mode.value} with alpha {config.alpha:g}"
+            )
+        return options
+
+    def calibration_maps(self) -> CalibrationMaps | None:
+        """
+        Returns the calibration maps selected for the current camera state.
+        """
+        return self.calibration.maps_for(camera=self.camera)
+
+    def start_master(self, kind: MasterKindEnum, n_frames: int) -> None:
+        """
+        Starts averaging the next n_frames raw frames into a master dark or
+        flat frame for the current camera state.
+        """
+        self.master_capture = MasterCapture(
+            kind=kind,
+            key=CalibrationKey.from_camera(self.camera),
+            n_frames=n_frames,
+        )
+
+    def _push_master(self, frame: np.ndarray) -> None:
+        capture = self.master_capture
+        if not capture.push(frame=frame):
+            return
+        self.calibration.save_master(
+            key=capture.key,
+            kind=capture.kind,
+            frame=capture.result(),
+        )
+        self.master_capture = None
+
+    def start_recording(
+        self,
+        fmt: SaveFormatEnum | str,
+        filename_prefix: str = RECORDER_FILENAME_PREFIX,
+    ) -> None:
+        """
+        Starts writing frames to the camera save folder, beginning with the
+        frames held in the pre-roll ring.
+        """
+        if self.writer is not None:
+            return
+        self.record_every = 1
+        self.writer = AsyncFrameWriter(
+            save_folder=self.camera.save_folder(),
+            fmt=fmt,
+            filename_prefix=filename_prefix,
+            segment_config=self.segment_config,
+            catalog=self.catalog,
+        )
+        self.writer.start(
+            pre_roll=None if self.stack_recording() else self.pre_roll,
+            envi_options=self.envi_options(),
+        )
+
+    def stop_recording(self) -> None:
+        """
+        Stops the recording, waiting for the queued frames to be written.
+        Raises the error of the writer if writing failed, the recording being
+        stopped anyway.
+        """
+        if self.writer is None:
+            return
+        try:
+            self.writer.close()
+        finally:
+            self.writer = None
+            if self.pre_roll is not None:
+                self.pre_roll.clear()
+
+    def set_record_every(self, record_every: int) -> None:
+        """
+        Records only one frame out of record_every, e.g. when the disk cannot
+        keep up with the acquisition rate.
+        """
+        self.record_every = max(int(record_every), 1)
+
+    def recorded_stream(self) -> tuple[int, float]:
+        """
+        Returns the size (in bytes) and rate of the frames sent to the
+        recording.
+        """
+        if self.frame is None:
+            return 0, 0.0
+        if not self.stack_recording():
+            return self.frame.nbytes, self.fps
+        config = self.stacker.config
+        frame_bytes = self.frame.size * np.dtype(np.float32).itemsize
+        if config.mode == StackModeEnum.MEAN:
+            return frame_bytes, self.fps / config.frames
+        return frame_bytes, self.fps
+
+    def frames_recorded(self) -> int:
+        if self.writer is None:
+            return 0
+        return self.writer.frames_written
+
+    def _displayed(self) -> tuple[np.ndarray | None, tuple[str, int]]:
+        """
+        Returns the frame to display, the latest stacked frame if stacking is
+        displayed, and a key identifying it.
+        """
+        if self.stacker is not None and self.stacker.config.display:
+            if self.stacked_index < 0:
+                return None, ("stack", self.stacked_index)
+            return self.stacker.stacked, ("stack", self.stacked_index)
+        return self.frame, ("raw", self.frame_index)
+
+    def has_new_view(self) -> bool:
+        frame, key = self._displayed()
+        return frame is not None and self._view_index != key
+
+    def invalidate_view(self) -> None:
+        self._view = None
+        self._view_index = None
+
+    def view(self, decimation: int = 1) -> np.ndarray | None:
+        """
+        Returns the view of the latest grabbed (or stacked) frame, computing it
+        only if the frame or the decimation changed since the last call.
+
+        With a decimation, the view is computed from one filter array period
+        out of `decimation` in each direction, e.g. when the display cannot
+        show the full resolution, rather than decimated once computed.
+        """
+        frame, key = self._displayed()
+        if frame is None:
+            return None
+        if self._view_index == key and self._view_decimation == decimation:
+            return self._view
+        cfa_shape = self.camera.cfa_shape()
+        frame = decimate_mosaic(frame=frame, cfa_shape=cfa_shape, decimation=decimation)
+        if self.false_color:
+            self._view = false_color_view(
+                frame=frame,
+                cfa_shape=cfa_shape,
+                dynamic_range=2 ** self.camera.bit_depth() - 1,
+            )
+        else:
+            self._view = self.camera.get_view(frame=frame)
+        self._view_index = key
+        self._view_decimation = decimation
+        return self._view
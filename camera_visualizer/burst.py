@@ -0,0 +1,170 @@
+import math
+import threading
+import time
+from dataclasses import dataclass
+from enum import Enum
+
+import numpy as np
+
+from camera_visualizer.camera_interface.mock_interface import Camera
+from camera_visualizer.recorder import AsyncFrameWriter, FrameRingBuffer
+from camera_visualizer.serializer import SaveFormatEnum, format_name
+
+BURST_DEFAULT_FRAMES = 100
+BURST_DEFAULT_MEMORY_MB = 2048
+BURST_TIMESTAMPS_FILENAME = "burst_timestamps.npy"
+
+
+class BurstStateEnum(str, Enum):
+    IDLE = "idle"
+    CAPTURING = "capturing"
+    FLUSHING = "flushing"
+    DONE = "done"
+    FAILED = "failed"
+
+
+@dataclass
+class BurstConfig:
+    """
+    Length of a burst, either in frames or in seconds at the maximum frame
+    rate of the camera, and memory budget (in MB) for holding it in memory.
+    If resume_preview is True, the acquisition can resume while the burst is
+    written to disk.
+    """
+    frames: int | None = BURST_DEFAULT_FRAMES
+    seconds: float | None = None
+    memory_mb: float = BURST_DEFAULT_MEMORY_MB
+    resume_preview: bool = True
+
+    def n_frames(self, fps: float) -> int:
+        if self.frames is not None:
+            return int(self.frames)
+        if self.seconds is not None:
+            return math.ceil(self.seconds * fps)
+        raise ValueError("The burst length is not set.")
+
+    def check_memory(self, n_frames: int, frame_bytes: int) -> None:
+        required_mb = n_frames * frame_bytes / 2 ** 20
+        if required_mb > self.memory_mb:
+            raise ValueError(
+                f"A burst of {n_frames} frames requires {required_mb:.0f} MB, "
+                f"above the memory budget of {self.memory_mb:.0f} MB."
+            )
+
+
+def estimate_frame_bytes(camera: Camera) -> int:
+    bytes_per_pixel = 1 if camera.bit_depth() <= 8 else 2
+    return int(np.prod(camera.shape())) * bytes_per_pixel
+
+
+class BurstCapture:
+    """
+    Captures a fixed number of frames at the maximum frame rate of the camera
+    into a preallocated in-memory array, then writes them to the camera save
+    folder, from a background thread.
+
+    Host and hardware timestamps (in seconds) of each frame are written to
+    the session as an array of shape (frames, 2); missing hardware timestamps
+    are NaN.
+    """
+    camera: Camera
+    config: BurstConfig
+    state: BurstStateEnum
+    error: Exception | None
+    buffer: FrameRingBuffer | None
+    timestamps: np.ndarray | None
+
+    def __init__(
+        self,
+        camera: Camera,
+        config: BurstConfig,
+        fmt: SaveFormatEnum | str = SaveFormatEnum.NUMPY,
+    ):
+        self.camera = camera
+        self.config = config
+        self.fmt = format_name(fmt)
+        self.fps = camera.fps_range()[1]
+        self.n_frames = config.n_frames(fps=self.fps)
+        self.state = BurstStateEnum.IDLE
+        self.error = None
+        self.buffer = None
+        self.timestamps = None
+        self._writer = None
+        self._thread = None
+
+    def start(self) -> None:
+        """
+        Starts the burst, unless it exceeds the memory budget.
+        """
+        self.config.check_memory(
+            n_frames=self.n_frames,
+            frame_bytes=estimate_frame_bytes(camera=self.camera),
+        )
+        self.state = BurstStateEnum.CAPTURING
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def busy(self) -> bool:
+        return self.state in (BurstStateEnum.CAPTURING, BurstStateEnum.FLUSHING)
+
+    def owns_camera(self) -> bool:
+        """
+        Returns True while the burst needs exclusive access to the camera.
+        """
+        if self.state == BurstStateEnum.CAPTURING:
+            return True
+        return self.state == BurstStateEnum.FLUSHING and not self.config.resume_preview
+
+    def progress(self) -> float:
+        """
+        Returns the progress of the current stage between 0 and 1.
+        """
+        if self.state == BurstStateEnum.CAPTURING and self.buffer is not None:
+            return len(self.buffer) / self.n_frames
+        if self.state == BurstStateEnum.FLUSHING and self._writer is not None:
+            return self._writer.frames_written / self.n_frames
+        return 1.0 if self.state == BurstStateEnum.DONE else 0.0
+
+    def wait(self) -> None:
+        if self._thread is not None:
+            self._thread.join()
+
+    def _run(self) -> None:
+        try:
+            self.capture()
+            self.flush()
+            self.state = BurstStateEnum.DONE
+        except Exception as e:
+            self.error = e
+            self.state = BurstStateEnum.FAILED
+        finally:
+            self.buffer = None
+
+    def capture(self) -> None:
+        frame = self.camera.get_raw_frame(fps=self.fps)
+        self.config.check_memory(n_frames=self.n_frames, frame_bytes=frame.nbytes)
+        self.buffer = FrameRingBuffer(
+            capacity=self.n_frames,
+            shape=frame.shape,
+            dtype=frame.dtype,
+        )
+        self.timestamps = np.full((self.n_frames, 2), np.nan)
+        for ii in range(self.n_frames):
+            if ii > 0:
+                frame = self.camera.get_raw_frame(fps=self.fps)
+            self.timestamps[ii, 0] = time.perf_counter()
+            device_timestamp = self.camera.frame_timestamp()
+            if device_timestamp is not None:
+                self.timestamps[ii, 1] = device_timestamp
+            self.buffer.push(frame=frame, timestamp=self.timestamps[ii, 0])
+
+    def flush(self) -> None:
+        self.state = BurstStateEnum.FLUSHING
+        save_folder = self.camera.save_folder()
+        np.save(save_folder / BURST_TIMESTAMPS_FILENAME, self.timestamps)
+        self._writer = AsyncFrameWriter(save_folder=save_folder, fmt=self.fmt)
+        self._writer.start(
+            pre_roll=self.buffer,
+            envi_options=self.camera.get_envi_options(),
+        )
+        self._writer.close()
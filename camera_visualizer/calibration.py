@@ -0,0 +1,459 @@
+import re
+from dataclasses import dataclass
+from enum import Enum
+from pathlib import Path
+
+import numpy as np
+
+from camera_visualizer.camera_interface.mock_interface import Camera
+from camera_visualizer.paths import load_data_path
+
+CALIBRATION_DEFAULT_FRAMES = 32
+CALIBRATION_FOLDER = "calibration"
+HOT_PIXEL_SIGMA = 6.0
+HOT_PIXEL_MIN_LEVEL = 4.0
+DEAD_PIXEL_GAIN_RANGE = (0.5, 2.0)
+
+
+class MasterKindEnum(str, Enum):
+    DARK = "dark"
+    FLAT = "flat"
+
+
+@dataclass(frozen=True)
+class CalibrationKey:
+    """
+    Camera state for which master frames are captured and selected.
+    """
+    camera: str
+    exposure: int
+    bit_depth: int
+
+    @classmethod
+    def from_camera(cls, camera: Camera) -> "CalibrationKey":
+        return cls(
+            camera=camera_name(camera),
+            exposure=int(camera.exposure()),
+            bit_depth=int(camera.bit_depth()),
+        )
+
+    @classmethod
+    def from_envi_options(cls, camera: str, envi_options: dict) -> "CalibrationKey":
+        """
+        Camera state of a recorded session, from its ENVI metadata.
+        """
+        exposure_ms = float(envi_options["exposure time (ms)"])
+        bit_depth = envi_options.get("bit depth")
+        if bit_depth is None:
+            bit_depth = 8 if int(envi_options["data type"]) == 1 else 16
+        return cls(
+            camera=camera,
+            exposure=int(round(exposure_ms * 1000)),
+            bit_depth=int(str(bit_depth).split()[0]),
+        )
+
+    def stem(self, kind: MasterKindEnum) -> str:
+        return f"{MasterKindEnum(kind).value}_{self.exposure:d}us_{self.bit_depth:d}bit"
+
+
+MASTER_PATTERN = re.compile(r"(dark|flat)_(\d+)us_(\d+)bit\.npy$")
+
+
+def camera_name(camera: Camera) -> str:
+    """
+    Name of the camera, as used for its data folder, e.g. "ximea".
+    """
+    return type(camera).__name__.removesuffix("Camera").lower()
+
+
+def defect_neighbours(
+    defects: np.ndarray,
+    shape: tuple[int, int],
+    cfa_shape: tuple[int, int] = (1, 1),
+) -> np.ndarray:
+    """
+    Flat indices of the four nearest pixels behind the same filter of the
+    color filter array, for each defective pixel. Pixels outside the frame
+    are mirrored inside.
+    """
+    height, width = shape
+    rows, cols = np.unravel_index(defects, shape)
+    step_r, step_c = cfa_shape
+    offsets = ((-step_r, 0), (step_r, 0), (0, -step_c), (0, step_c))
+    neighbours = np.empty((len(defects), len(offsets)), dtype=np.intp)
+    for k, (dr, dc) in enumerate(offsets):
+        r = rows + dr
+        c = cols + dc
+        r = np.where((r < 0) | (r >= height), rows - dr, r)
+        c = np.where((c < 0) | (c >= width), cols - dc, c)
+        neighbours[:, k] = np.ravel_multi_index(
+            (np.clip(r, 0, height - 1), np.clip(c, 0, width - 1)), shape
+        )
+    return neighbours
+
+
+def find_hot_pixels(dark: np.ndarray) -> np.ndarray:
+    """
+    Flat indices of the pixels of a master dark frame well above the dark
+    level, with a robust (median absolute deviation) threshold.
+    """
+    median = np.median(dark)
+    sigma = 1.4826 * np.median(np.abs(dark - median))
+    threshold = median + max(HOT_PIXEL_SIGMA * sigma, HOT_PIXEL_MIN_LEVEL)
+    return np.flatnonzero(dark.reshape(-1) > threshold)
+
+
+class CalibrationMaps:
+    """
+    Precomputed offset and gain maps and defective pixel indices, applied in
+    place to the frames of a camera.
+
+    Frames only corrected for the dark offset stay in integer arithmetic;
+    flat-field correction goes through a float32 buffer reused between
+    frames. Defective pixels are replaced by the mean of their neighbours
+    behind the same filter.
+    """
+    dark: np.ndarray | None
+    gain: np.ndarray | None
+    defects: np.ndarray
+    neighbours: np.ndarray
+    description: str
+
+    def __init__(
+        self,
+        shape: tuple[int, ...],
+        dark: np.ndarray | None = None,
+        gain: np.ndarray | None = None,
+        defects: np.ndarray | None = None,
+        neighbours: np.ndarray | None = None,
+        description: str = "",
+    ):
+        self.shape = tuple(shape)
+        self.dark = dark
+        self.gain = gain
+        self.defects = defects if defects is not None else np.empty(0, dtype=np.intp)
+        self.neighbours = (
+            neighbours if neighbours is not None
+            else np.empty((0, 4), dtype=np.intp)
+        )
+        self.description = description
+        self._dark_int = {}
+        self._buffer = None
+
+    @classmethod
+    def from_masters(
+        cls,
+        dark: np.ndarray | None = None,
+        flat: np.ndarray | None = None,
+        flat_dark: np.ndarray | None = None,
+        cfa_shape: tuple[int, int] = (1, 1),
+        description: str = "",
+    ) -> "CalibrationMaps":
+        """
+        Computes the maps from master dark and flat frames. The flat frame is
+        corrected with flat_dark, the master dark at the exposure of the flat
+        frame, or with dark if not given.
+        """
+        if dark is None and flat is None:
+            raise ValueError("No master frame to compute the calibration from.")
+        shape = (dark if dark is not None else flat).shape
+        plane = shape[:2]
+        defects = []
+        if dark is not None:
+            dark = np.asarray(dark, dtype=np.float32)
+            defects.append(find_hot_pixels(dark))
+        gain = None
+        if flat is not None:
+            flat = np.array(flat, dtype=np.float32)
+            if flat_dark is None:
+                flat_dark = dark
+            if flat_dark is not None:
+                flat -= flat_dark
+            valid = flat > 0
+            gain = np.zeros_like(flat)
+            gain[valid] = np.mean(flat[valid]) / flat[valid]
+            defects.append(np.flatnonzero(
+                (gain.reshape(-1) < DEAD_PIXEL_GAIN_RANGE[0])
+                | (gain.reshape(-1) > DEAD_PIXEL_GAIN_RANGE[1])
+            ))
+        defects = np.unique(np.concatenate(defects)).astype(np.intp)
+        return cls(
+            shape=shape,
+            dark=dark,
+            gain=gain,
+            defects=defects,
+            neighbours=defect_neighbours(defects, plane, cfa_shape),
+            description=description,
+        )
+
+    @classmethod
+    def load(cls, path: Path) -> "CalibrationMaps":
+        with np.load(path) as data:
+            return cls(
+                shape=tuple(data["shape"]),
+                dark=data["dark"] if "dark" in data.files else None,
+                gain=data["gain"] if "gain" in data.files else None,
+                defects=data["defects"],
+                neighbours=data["neighbours"],
+                description=str(data["description"]),
+            )
+
+    def save(self, path: Path) -> None:
+        arrays = {
+            "shape": np.array(self.shape),
+            "defects": self.defects,
+            "neighbours": self.neighbours,
+            "description": np.array(self.description),
+        }
+        if self.dark is not None:
+            arrays["dark"] = self.dark
+        if self.gain is not None:
+            arrays["gain"] = self.gain
+        np.savez(path, **arrays)
+
+    def matches(self, frame: np.ndarray) -> bool:
+        return frame.shape == self.shape
+
+    def _dark_as(self, dtype: np.dtype) -> np.ndarray:
+        dark = self._dark_int.get(dtype)
+        if dark is None:
+            info = np.iinfo(dtype)
+            dark = np.clip(np.rint(self.dark), info.min, info.max).astype(dtype)
+            self._dark_int[dtype] = dark
+        return dark
+
+    def _replace_defects(self, frame: np.ndarray) -> None:
+        if len(self.defects) == 0:
+            return
+        flat = frame.reshape(-1)
+        values = flat[self.neighbours].mean(axis=1, dtype=np.float32)
+        if np.issubdtype(frame.dtype, np.integer):
+            values = np.rint(values)
+        flat[self.defects] = values
+
+    def apply(self, frame: np.ndarray, max_value: int | None = None) -> np.ndarray:
+        """
+        Corrects a raw integer frame in place, keeping its data type. Values
+        are clipped to [0, max_value], which defaults to the maximum of the
+        data type.
+        """
+        if not self.matches(frame):
+            raise ValueError(
+                f"Calibration of shape {self.shape} does not match the frame "
+                f"of shape {frame.shape}."
+            )
+        if max_value is None:
+            max_value = np.iinfo(frame.dtype).max
+        if self.gain is None:
+            if self.dark is not None:
+                dark = self._dark_as(frame.dtype)
+                np.maximum(frame, dark, out=frame)
+                np.subtract(frame, dark, out=frame)
+        else:
+            if self._buffer is None:
+                self._buffer = np.empty(self.shape, dtype=np.float32)
+            buffer = self._buffer
+            buffer[...] = frame
+            if self.dark is not None:
+                buffer -= self.dark
+            buffer *= self.gain
+            np.clip(buffer, 0, max_value, out=buffer)
+            np.rint(buffer, out=buffer)
+            frame[...] = buffer
+        self._replace_defects(frame)
+        return frame
+
+    def apply_float(self, frame: np.ndarray) -> np.ndarray:
+        """
+        Corrects a float32 frame in place, e.g. an average of raw frames.
+        """
+        if not self.matches(frame):
+            raise ValueError(
+                f"Calibration of shape {self.shape} does not match the frame "
+                f"of shape {frame.shape}."
+            )
+        if self.dark is not None:
+            frame -= self.dark
+        if self.gain is not None:
+            frame *= self.gain
+        self._replace_defects(frame)
+        return frame
+
+
+class MasterCapture:
+    """
+    Averages a number of raw frames into a master dark or flat frame.
+    """
+    kind: MasterKindEnum
+    key: CalibrationKey
+    n_frames: int
+    count: int
+
+    def __init__(self, kind: MasterKindEnum, key: CalibrationKey, n_frames: int):
+        self.kind = MasterKindEnum(kind)
+        self.key = key
+        self.n_frames = max(int(n_frames), 1)
+        self.count = 0
+        self._sum = None
+
+    def push(self, frame: np.ndarray) -> bool:
+        """
+        Adds a frame to the average, returning True once enough frames were
+        captured.
+        """
+        if self._sum is None:
+            self._sum = np.zeros(frame.shape, dtype=np.float64)
+        self._sum += frame
+        self.count += 1
+        return self.done()
+
+    def done(self) -> bool:
+        return self.count >= self.n_frames
+
+    def progress(self) -> float:
+        return self.count / self.n_frames
+
+    def result(self) -> np.ndarray:
+        return (self._sum / max(self.count, 1)).astype(np.float32)
+
+
+class CalibrationStore:
+    """
+    Master frames and calibration maps of the cameras, stored in
+    data/calibration/<camera>/ and cached in memory.
+
+    The maps are selected from the camera state: the master dark and flat
+    frames of the same bit depth with the closest exposures are combined,
+    and the resulting maps are saved next to the masters, so that they are
+    only computed once.
+    """
+    root: Path
+
+    def __init__(self, root: Path | None = None):
+        if root is None:
+            root = load_data_path() / CALIBRATION_FOLDER
+        self.root = root
+        self._maps = {}
+        self._selection = {}
+
+    def folder(self, camera: str) -> Path:
+        return self.root / camera
+
+    def masters(
+        self,
+        camera: str,
+        kind: MasterKindEnum,
+        bit_depth: int,
+    ) -> dict[int, Path]:
+        """
+        Returns the paths of the master frames of a camera and bit depth, by
+        exposure.
+        """
+        folder = self.folder(camera)
+        if not folder.is_dir():
+            return {}
+        masters = {}
+        for path in folder.glob(f"{MasterKindEnum(kind).value}_*.npy"):
+            match = MASTER_PATTERN.match(path.name)
+            if match is not None and int(match.group(3)) == bit_depth:
+                masters[int(match.group(2))] = path
+        return masters
+
+    def save_master(
+        self,
+        key: CalibrationKey,
+        kind: MasterKindEnum,
+        frame: np.ndarray,
+    ) -> Path:
+        folder = self.folder(key.camera)
+        folder.mkdir(parents=True, exist_ok=True)
+        path = folder / f"{key.stem(kind)}.npy"
+        np.save(path, frame)
+        for maps_path in folder.glob(f"maps_{key.bit_depth:d}bit_*.npz"):
+            maps_path.unlink()
+        self.clear()
+        return path
+
+    def clear(self) -> None:
+        self._maps.clear()
+        self._selection.clear()
+
+    @staticmethod
+    def _closest(masters: dict[int, Path], exposure: int) -> int | None:
+        if not masters:
+            return None
+        return min(masters, key=lambda e: abs(e - exposure))
+
+    def select(
+        self,
+        key: CalibrationKey,
+        cfa_shape: tuple[int, int] = (1, 1),
+    ) -> CalibrationMaps | None:
+        """
+        Returns the calibration maps for a camera state, or None if no master
+        frame was captured for its bit depth.
+        """
+        if key in self._selection:
+            return self._selection[key]
+        darks = self.masters(key.camera, MasterKindEnum.DARK, key.bit_depth)
+        flats = self.masters(key.camera, MasterKindEnum.FLAT, key.bit_depth)
+        dark_exposure = self._closest(darks, key.exposure)
+        flat_exposure = self._closest(flats, key.exposure)
+        if dark_exposure is None and flat_exposure is None:
+            maps = None
+        else:
+            maps = self._load_maps(
+                key=key,
+                darks=darks,
+                flats=flats,
+                dark_exposure=dark_exposure,
+                flat_exposure=flat_exposure,
+                cfa_shape=cfa_shape,
+            )
+        self._selection[key] = maps
+        return maps
+
+    def _load_maps(
+        self,
+        key: CalibrationKey,
+        darks: dict[int, Path],
+        flats: dict[int, Path],
+        dark_exposure: int | None,
+        flat_exposure: int | None,
+        cfa_shape: tuple[int, int],
+    ) -> CalibrationMaps:
+        cache_key = (key.camera, key.bit_depth, dark_exposure, flat_exposure)
+        maps = self._maps.get(cache_key)
+        if maps is not None:
+            return maps
+        parts = []
+        if dark_exposure is not None:
+            parts.append(f"dark {dark_exposure:d} us")
+        if flat_exposure is not None:
+            parts.append(f"flat {flat_exposure:d} us")
+        description = ", ".join(parts) + f", {key.bit_depth:d} bits"
+        path = self.folder(key.camera) / (
+            f"maps_{key.bit_depth:d}bit_"
+            f"{dark_exposure or 0:d}us_{flat_exposure or 0:d}us.npz"
+        )
+        if path.is_file():
+            maps = CalibrationMaps.load(path)
+        else:
+            maps = CalibrationMaps.from_masters(
+                dark=np.load(darks[dark_exposure]) if dark_exposure is not None else None,
+                flat=np.load(flats[flat_exposure]) if flat_exposure is not None else None,
+                flat_dark=(
+                    np.load(darks[flat_exposure]) if flat_exposure in darks else None
+                ),
+                cfa_shape=cfa_shape,
+                description=description,
+            )
+            maps.save(path)
+        self._maps[cache_key] = maps
+        return maps
+
+    def maps_for(self, camera: Camera) -> CalibrationMaps | None:
+        return self.select(
+            key=CalibrationKey.from_camera(camera),
+            cfa_shape=camera.cfa_shape(),
+        )
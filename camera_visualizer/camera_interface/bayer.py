@@ -0,0 +1,53 @@
+import numpy as np
+import scipy
+
+BAYER_DEFAULT_ORDER = "gbrg"
+BAYER_WAVELENGTHS = {
+    450: "b",
+    550: "g",
+    650: "r",
+}
+BAYER_KERNEL_G = np.array([[0, 1, 0], [1, 4, 1], [0, 1, 0]], dtype=np.float32) / 8
+BAYER_KERNEL_RB = np.array([[1, 2, 1], [2, 4, 2], [1, 2, 1]], dtype=np.float32) / 16
+
+
+def demosaic_bilinear(bayer: np.ndarray, order: str = BAYER_DEFAULT_ORDER) -> np.ndarray:
+    """
+    Bilinear demosaicing of a Bayer frame into an RGB frame. The order lists
+    the colors of the 2x2 filter array period in row-major order, e.g. "gbrg"
+    for the Imaging Source DFK 23UX236.
+    """
+    order = order.lower()
+    out = np.zeros((*bayer.shape[:2], 3))
+    for channel, color in enumerate("rgb"):
+        for position, filter_color in enumerate(order):
+            if filter_color == color:
+                ii, jj = divmod(position, 2)
+                out[ii::2, jj::2, channel] = bayer[ii::2, jj::2]
+        kernel = BAYER_KERNEL_G if color == "g" else BAYER_KERNEL_RB
+        out[..., channel] = scipy.ndimage.convolve(out[..., channel], kernel)
+    return out
+
+
+def demosaic_cfa_bayer_gbrb_bilinear(bayer: np.ndarray):
+    return demosaic_bilinear(bayer=bayer, order="gbrg")
+
+
+def bayer_order_from_envi(envi_options: dict | None) -> str:
+    """
+    Returns the Bayer order of a recording, from the wavelengths of its filter
+    array or the order noted in its description, e.g. "(gbrg)".
+    """
+    envi_options = envi_options or {}
+    wavelengths = envi_options.get("wavelength")
+    if wavelengths is not None and len(wavelengths) == 4:
+        try:
+            return "".join(BAYER_WAVELENGTHS[int(float(w))] for w in wavelengths)
+        except (KeyError, ValueError):
+            pass
+    description = str(envi_options.get("description", ""))
+    if "(" in description:
+        order = description.rsplit("(", 1)[1].split(")", 1)[0].lower()
+        if sorted(order) == sorted("bggr"):
+            return order
+    return BAYER_DEFAULT_ORDER
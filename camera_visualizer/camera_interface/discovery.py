@@ -0,0 +1,314 @@
+import argparse
+import json
+import os
+import re
+import subprocess
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import asdict, dataclass, field
+from pathlib import Path
+from typing import Callable
+
+from camera_visualizer.camera_interface.registry import backend_names, get_backend
+from camera_visualizer.paths import load_data_path
+
+DISCOVERY_CACHE_FILENAME = ".device_cache.json"
+DISCOVERY_CACHE_TTL_S = 3600.0
+DISCOVERY_TIMEOUT_S = 5.0
+DISCOVERY_MAX_WORKERS = 8
+USB_SYSFS = Path("/sys/bus/usb/devices")
+V4L2_BY_ID = Path("/dev/v4l/by-id")
+
+
+@dataclass
+class DeviceInfo:
+    """
+    A camera device found by the discovery, with its capabilities. The
+    device_id is the serial number when known, or the bus path otherwise,
+    and is passed to Camera.set_device to open this device.
+    """
+    backend: str
+    device_id: str
+    name: str
+    path: str | None = None
+    formats: list[str] = field(default_factory=list)
+    resolutions: list[tuple[int, int]] = field(default_factory=list)
+    fps_range: tuple[float, float] | None = None
+
+    def label(self) -> str:
+        return f"{self.backend}: {self.name} [{self.device_id}]"
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "DeviceInfo":
+        data = dict(data)
+        data["resolutions"] = [tuple(r) for r in data.get("resolutions", [])]
+        if data.get("fps_range") is not None:
+            data["fps_range"] = tuple(data["fps_range"])
+        return cls(**data)
+
+
+def _run(cmd: list[str]) -> str:
+    result = subprocess.run(
+        cmd,
+        capture_output=True,
+        text=True,
+        check=True,
+        timeout=DISCOVERY_TIMEOUT_S,
+    )
+    return result.stdout
+
+
+def usb_fingerprint() -> list[str] | None:
+    """
+    Cheap signature of the USB devices plugged in, which changes on hotplug.
+    Returns None where it is not available.
+    """
+    if not USB_SYSFS.is_dir():
+        return None
+    return sorted(os.listdir(USB_SYSFS))
+
+
+def v4l2_fingerprint() -> list | None:
+    if not os.path.isdir("/dev"):
+        return None
+    nodes = []
+    for name in sorted(os.listdir("/dev")):
+        if not name.startswith("video"):
+            continue
+        try:
+            stat = os.stat(f"/dev/{name}")
+        except OSError:
+            continue
+        nodes.append([name, stat.st_rdev, stat.st_ctime_ns])
+    return nodes
+
+
+def _v4l2_serials() -> dict[str, str]:
+    """
+    Maps the /dev/video* nodes to their persistent /dev/v4l/by-id names,
+    which include the serial number of USB devices.
+    """
+    if not V4L2_BY_ID.is_dir():
+        return {}
+    return {
+        os.path.realpath(V4L2_BY_ID / name): name
+        for name in os.listdir(V4L2_BY_ID)
+    }
+
+
+def parse_v4l2_ctl(output: str) -> dict:
+    """
+    Parses the output of v4l2-ctl --info --list-formats-ext.
+    """
+    info = {"formats": [], "resolutions": [], "fps": []}
+    for line in output.splitlines():
+        line = line.strip()
+        if line.startswith("Card type"):
+            info["name"] = line.split(":", 1)[1].strip()
+        elif line.startswith("Bus info"):
+            info["bus"] = line.split(":", 1)[1].strip()
+        elif (match := re.match(r"\[\d+\]: '(\w+)'", line)) is not None:
+            if match.group(1) not in info["formats"]:
+                info["formats"].append(match.group(1))
+        elif (match := re.search(r"Size: \w+ (?:.* - )?(\d+)x(\d+)", line)) is not None:
+            resolution = (int(match.group(1)), int(match.group(2)))
+            if resolution not in info["resolutions"]:
+                info["resolutions"].append(resolution)
+        elif (match := re.search(r"\(([\d.]+) fps\)", line)) is not None:
+            info["fps"].append(float(match.group(1)))
+    return info
+
+
+def _probe_v4l2(path: str, serials: dict[str, str]) -> DeviceInfo | None:
+    try:
+        output = _run(["v4l2-ctl", f"--device={path}", "--info", "--list-formats-ext"])
+    except (OSError, subprocess.SubprocessError):
+        return None
+    info = parse_v4l2_ctl(output)
+    if not info["formats"]:
+        # Metadata nodes do not stream frames
+        return None
+    return DeviceInfo(
+        backend="v4l2",
+        device_id=serials.get(path) or info.get("bus") or path,
+        name=info.get("name", path),
+        path=path,
+        formats=info["formats"],
+        resolutions=info["resolutions"],
+        fps_range=(min(info["fps"]), max(info["fps"])) if info["fps"] else None,
+    )
+
+
+def discover_v4l2() -> list[DeviceInfo]:
+    """
+    Probes all the /dev/video* nodes in parallel, with one v4l2-ctl call per
+    node for all its formats.
+    """
+    paths = [f"/dev/{name}" for name, _, _ in v4l2_fingerprint() or []]
+    serials = _v4l2_serials()
+    with ThreadPoolExecutor(max_workers=DISCOVERY_MAX_WORKERS) as executor:
+        devices = executor.map(lambda p: _probe_v4l2(p, serials), paths)
+    return [device for device in devices if device is not None]
+
+
+def discover_tis() -> list[DeviceInfo]:
+    import imagingcontrol4 as ic4
+    from camera_visualizer.camera_interface.tis_interface import init_library
+    init_library()
+    return [
+        DeviceInfo(
+            backend="tis",
+            device_id=info.serial,
+            name=info.model_name,
+        )
+        for info in ic4.DeviceEnum.devices()
+    ]
+
+
+def discover_ximea() -> list[DeviceInfo]:
+    from ximea import xiapi
+    n_devices = xiapi.Camera().get_number_devices()
+    return [
+        DeviceInfo(backend="ximea", device_id=str(index), name="XIMEA")
+        for index in range(n_devices)
+    ]
+
+
+def discover_mock() -> list[DeviceInfo]:
+    return [DeviceInfo(backend="mock", device_id="0", name="Mock camera")]
+
+
+@dataclass(frozen=True)
+class Discoverer:
+    """
+    Enumerates the devices of a backend. The fingerprint is a cheap signature
+    of the plugged devices, used to invalidate the cache on hotplug.
+    """
+    enumerate: Callable[[], list[DeviceInfo]]
+    fingerprint: Callable[[], object] = lambda: None
+
+
+DISCOVERERS: dict[str, Discoverer] = {
+    "mock": Discoverer(enumerate=discover_mock, fingerprint=lambda: []),
+    "ximea": Discoverer(enumerate=discover_ximea, fingerprint=usb_fingerprint),
+    "tis": Discoverer(enumerate=discover_tis, fingerprint=usb_fingerprint),
+    "v4l2": Discoverer(enumerate=discover_v4l2, fingerprint=v4l2_fingerprint),
+}
+
+
+def register_discoverer(backend: str, discoverer: Discoverer) -> None:
+    DISCOVERERS[backend] = discoverer
+
+
+class DeviceDiscovery:
+    """
+    Lists the devices of all the available backends.
+
+    Backends are enumerated in parallel, and their devices are cached on disk
+    with a fingerprint of the plugged devices (the /dev/video* nodes or the
+    USB devices), so that later launches return the cached devices instantly
+    unless a device was plugged or unplugged. Without a fingerprint, the
+    cache expires after DISCOVERY_CACHE_TTL_S.
+    """
+    cache_path: Path
+
+    def __init__(self, cache_path: Path | None = None):
+        if cache_path is None:
+            cache_path = load_data_path() / DISCOVERY_CACHE_FILENAME
+        self.cache_path = cache_path
+        self.errors = {}
+
+    def _read_cache(self) -> dict:
+        if not self.cache_path.is_file():
+            return {}
+        try:
+            with open(self.cache_path, "r") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def _write_cache(self, cache: dict) -> None:
+        self.cache_path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.cache_path.with_suffix(".tmp")
+        with open(tmp_path, "w") as f:
+            json.dump(cache, f, indent=2)
+        os.replace(tmp_path, self.cache_path)
+
+    @staticmethod
+    def _valid(entry: dict | None, fingerprint: object) -> bool:
+        if entry is None:
+            return False
+        if fingerprint is None:
+            return time.time() - entry["updated"] < DISCOVERY_CACHE_TTL_S
+        return entry["fingerprint"] == json.loads(json.dumps(fingerprint))
+
+    def _enumerate(self, backend: str) -> list[DeviceInfo]:
+        try:
+            return DISCOVERERS[backend].enumerate()
+        except Exception as e:
+            self.errors[backend] = e
+            return []
+
+    def devices(self, refresh: bool = False) -> list[DeviceInfo]:
+        """
+        Returns the devices of the available backends, from the cache unless
+        refresh is True or the plugged devices changed.
+        """
+        self.errors = {}
+        cache = self._read_cache()
+        backends = [
+            name for name in backend_names()
+            if name in DISCOVERERS and get_backend(name).available()
+        ]
+        fingerprints = {name: DISCOVERERS[name].fingerprint() for name in backends}
+        stale = [
+            name for name in backends
+            if refresh or not self._valid(cache.get(name), fingerprints[name])
+        ]
+        if stale:
+            with ThreadPoolExecutor(max_workers=len(stale)) as executor:
+                found = dict(zip(stale, executor.map(self._enumerate, stale)))
+            for name, devices in found.items():
+                if name in self.errors:
+                    continue
+                cache[name] = {
+                    "fingerprint": fingerprints[name],
+                    "updated": time.time(),
+                    "devices": [asdict(device) for device in devices],
+                }
+            self._write_cache(cache)
+        return [
+            DeviceInfo.from_dict(device)
+            for name in backends
+            for device in cache.get(name, {}).get("devices", [])
+        ]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="List the connected cameras.")
+    parser.add_argument(
+        "--refresh",
+        action="store_true",
+        help="Enumerate the devices again instead of using the cache.",
+    )
+    args = parser.parse_args()
+
+    discovery = DeviceDiscovery()
+    start = time.perf_counter()
+    devices = discovery.devices(refresh=args.refresh)
+    elapsed = time.perf_counter() - start
+    for device in devices:
+        print(device.label())
+        if device.formats:
+            print(f"    formats: {', '.join(device.formats)}")
+        if device.resolutions:
+            print(f"    resolutions: {', '.join(f'{w}x{h}' for w, h in device.resolutions)}")
+        if device.fps_range is not None:
+            print(f"    fps: {device.fps_range[0]:g}-{device.fps_range[1]:g}")
+    for backend, error in discovery.errors.items():
+        print(f"Discovery of {backend} cameras failed: {error}")
+    print(f"{len(devices)} devices found in {elapsed * 1000:.0f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -19,6 +19,13 @@ class Camera(ABC):
         """
         ...
 
+    def set_device(self, device_id: str | None) -> None:
+        """
+        Selects the device opened by the next call to open, by its identifier
+        from the device discovery. The first device is opened if None.
+        """
+        pass
+
     @abstractmethod
     def close(self) -> None:
         """
@@ -41,12 +48,37 @@ class Camera(ABC):
         ...
 
     @abstractmethod
+    def get_raw_frame(self, fps: float) -> np.ndarray:
+        """
+        Returns the raw frame as a NumPy array, without computing its view.
+        Read-only frames may be views of the camera buffers, only valid until
+        the next call, and are copied when they need to be kept.
+        """
+        ...
+
+    @abstractmethod
+    def get_view(self, frame: np.ndarray) -> np.ndarray:
+        """
+        Returns the frame for visualization of a raw frame, according to the
+        current view of the camera. It is expected to be a float32 between 0
+        and 1.
+        """
+        ...
+
     def get_frame(self, fps: float) -> tuple[np.ndarray, np.ndarray]:
         """
         Returns a tuple of raw frame and frame for visualization as NumPy
         arrays. The second output is expected to be a float32 between 0 and 1.
         """
-        ...
+        frame = self.get_raw_frame(fps=fps)
+        return frame, self.get_view(frame=frame)
+
+    def frame_timestamp(self) -> float | None:
+        """
+        Returns the hardware timestamp (in seconds) of the last raw frame, or
+        None if the camera does not provide it.
+        """
+        return None
 
     @abstractmethod
     def shape(self) -> tuple[int, int]:
@@ -55,6 +87,13 @@ class Camera(ABC):
         """
         ...
 
+    def cfa_shape(self) -> tuple[int, int]:
+        """
+        Gets the (rows, columns) period of the color filter array of the
+        sensor, (1, 1) for monochrome sensors.
+        """
+        return 1, 1
+
     @abstractmethod
     def exposure(self) -> int:
         """
@@ -247,17 +286,25 @@ class MockCamera(Camera):
         else:
             return False
 
-    def get_frame(self, fps: float) -> tuple[np.ndarray, np.ndarray]:
-        """Returns a (H, W) grayscale float32 NumPy array in [0, 1]"""
-        img = np.zeros(self.shape(), dtype=np.float32)
+    def dynamic_range(self) -> int:
+        return 2 ** self._bit_depth - 1
+
+    def get_raw_frame(self, fps: float) -> np.ndarray:
+        """Returns a (H, W) grayscale unsigned integer NumPy array"""
+        dtype = np.uint8 if self._bit_depth == 8 else np.uint16
+        img = np.zeros(self.shape(), dtype=dtype)
         if self._toggle_view == 0:
             x = (self._counter % self.shape()[1])
-            img[:, x:x + 5] = 1.0  # moving white bar
+            img[:, x:x + 5] = self.dynamic_range()  # moving white bar
         else:
             y = (self._counter % self.shape()[0])
-            img[y:y + 5, :] = 1.0
+            img[y:y + 5, :] = self.dynamic_range()
         self._counter += 1
-        return img, img
+        return img
+
+    def get_view(self, frame: np.ndarray) -> np.ndarray:
+        """Returns a (H, W) grayscale float32 NumPy array in [0, 1]"""
+        return frame.astype(np.float32) / self.dynamic_range()
 
     def get_envi_options(self) -> dict:
         return {
@@ -266,7 +313,7 @@ class MockCamera(Camera):
             'bands': 1,
             'interleave': 'bsq',
             'byte order': 0,
-            'data type': 4,
+            'data type': 1 if self._bit_depth == 8 else 12,
             'acquisition time': datetime.now().isoformat(),
         }
 
@@ -287,17 +334,15 @@ class CameraEnum(str, Enum):
     MOCK = "mock"
     XIMEA = "ximea"
     TIS = "tis"
+    V4L2 = "v4l2"
+    GSTREAMER = "gstreamer"
+    REPLAY = "replay"
 
 
 def camera(camera_id: CameraEnum | str) -> Camera:
-    
-    if camera_id == CameraEnum.MOCK:
-        return MockCamera()
-    elif camera_id == CameraEnum.XIMEA:
-        from camera_visualizer.camera_interface.ximea_interface import XimeaCamera
-        return XimeaCamera()
-    elif camera_id == CameraEnum.TIS:
-        from camera_visualizer.camera_interface.tis_interface import TisCamera
-        return TisCamera()
-    else:
-        raise ValueError(f"Camera f{camera_id} not known.")
\ No newline at end of file
+    """
+    Returns a camera of the built-in or third-party backends. The backend is
+    only imported here, so that the SDKs of unused cameras are never loaded.
+    """
+    from camera_visualizer.camera_interface.registry import create_camera
+    return create_camera(name=camera_id)
\ No newline at end of file
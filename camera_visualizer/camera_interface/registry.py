@@ -0,0 +1,119 @@
+import importlib
+import importlib.util
+from dataclasses import dataclass
+from importlib.metadata import entry_points
+
+from camera_visualizer.camera_interface.mock_interface import Camera
+
+CAMERA_ENTRY_POINT_GROUP = "camera_visualizer.cameras"
+
+
+@dataclass(frozen=True)
+class CameraBackend:
+    """
+    A camera backend, as a "module:Class" target only imported when the
+    camera is selected. The modules of `requires` are checked for without
+    being imported, to tell whether the backend can be used.
+    """
+    name: str
+    target: str
+    requires: tuple[str, ...] = ()
+
+    def available(self) -> bool:
+        try:
+            return all(importlib.util.find_spec(m) is not None for m in self.requires)
+        except (ImportError, ValueError):
+            return False
+
+    def load(self) -> type[Camera]:
+        module_name, _, class_name = self.target.partition(":")
+        module = importlib.import_module(module_name)
+        return getattr(module, class_name)
+
+
+BUILTIN_BACKENDS = (
+    CameraBackend(
+        name="mock",
+        target="camera_visualizer.camera_interface.mock_interface:MockCamera",
+    ),
+    CameraBackend(
+        name="ximea",
+        target="camera_visualizer.camera_interface.ximea_interface:XimeaCamera",
+        requires=("ximea",),
+    ),
+    CameraBackend(
+        name="tis",
+        target="camera_visualizer.camera_interface.tis_interface:TisCamera",
+        requires=("imagingcontrol4",),
+    ),
+    CameraBackend(
+        name="v4l2",
+        target="camera_visualizer.camera_interface.v4l2_mmap:V4L2MmapCamera",
+        requires=("fcntl",),
+    ),
+    CameraBackend(
+        name="gstreamer",
+        target="camera_visualizer.camera_interface.v4l2_interface:V4L2Camera",
+        requires=("gi",),
+    ),
+    CameraBackend(
+        name="replay",
+        target="camera_visualizer.camera_interface.replay_interface:ReplayCamera",
+    ),
+)
+
+_backends: dict[str, CameraBackend] | None = None
+
+
+def _discover() -> dict[str, CameraBackend]:
+    backends = {backend.name: backend for backend in BUILTIN_BACKENDS}
+    for entry_point in entry_points(group=CAMERA_ENTRY_POINT_GROUP):
+        if entry_point.name in backends:
+            continue
+        backends[entry_point.name] = CameraBackend(
+            name=entry_point.name,
+            target=entry_point.value,
+        )
+    return backends
+
+
+def backends() -> dict[str, CameraBackend]:
+    """
+    Returns the built-in camera backends and the ones registered by other
+    packages in the "camera_visualizer.cameras" entry point group, e.g.:
+
+        [project.entry-points."camera_visualizer.cameras"]
+        mycam = "mypackage.camera:MyCamera"
+
+    Backends are listed without importing them.
+    """
+    global _backends
+    if _backends is None:
+        _backends = _discover()
+    return _backends
+
+
+def register_backend(backend: CameraBackend) -> None:
+    backends()[backend.name] = backend
+
+
+def backend_names(available_only: bool = False) -> list[str]:
+    return [
+        name for name, backend in backends().items()
+        if not available_only or backend.available()
+    ]
+
+
+def get_backend(name: str) -> CameraBackend:
+    name = getattr(name, "value", name)
+    try:
+        return backends()[name]
+    except KeyError:
+        raise ValueError(f"Camera {name} not known.") from None
+
+
+def create_camera(name: str) -> Camera:
+    """
+    Imports the backend of a camera and returns a new instance.
+    """
+    return get_backend(name).load()()
@@ -0,0 +1,161 @@
+from pathlib import Path
+from typing import Type
+
+import numpy as np
+
+from camera_visualizer.camera_interface.bayer import bayer_order_from_envi
+from camera_visualizer.camera_interface.mock_interface import Camera
+from camera_visualizer.packing import cfa_from_envi
+from camera_visualizer.paths import load_data_path
+from camera_visualizer.session import SessionReader, is_session
+from camera_visualizer.views import ViewModeEnum, frame_view
+
+REPLAY_SAVE_FOLDER = "replay"
+REPLAY_FPS_RANGE = (1, 500, 1)
+
+
+def latest_session(root: Path | None = None) -> Path | None:
+    """
+    Returns the most recently modified session of the data path, i.e. a
+    <camera>/<session> folder, or None if nothing was recorded.
+    """
+    root = Path(root) if root is not None else load_data_path()
+    folders = [
+        folder for folder in root.glob("*/*")
+        if folder.is_dir() and folder.parent.name != REPLAY_SAVE_FOLDER and is_session(folder)
+    ]
+    if not folders:
+        return None
+    return max(folders, key=lambda folder: folder.stat().st_mtime)
+
+
+class ReplayCamera(Camera):
+    """
+    Camera replaying the frames of a recorded session in a loop, e.g. to
+    reproduce or profile the processing of a real sensor without it.
+
+    The session is selected with set_device (a session folder), and defaults
+    to the most recent session of the data path. Frames are returned as fast
+    as they are requested, the caller setting the pace, and are read-only
+    views of the recorded files. The exposure and bit depth are the recorded
+    ones and cannot be changed.
+    """
+    session: Path | None
+    reader: SessionReader | None
+
+    def __init__(self, session: Path | None = None):
+        self.session = Path(session) if session is not None else None
+        self.reader = None
+        self._envi_options = {}
+        self._shape = (0, 0)
+        self._bit_depth = 8
+        self._index = 0
+        self._mode = ViewModeEnum.RAW
+        data_path = load_data_path() / REPLAY_SAVE_FOLDER
+        data_path.mkdir(parents=True, exist_ok=True)
+        self._save_folder = data_path
+        self._subfolder = None
+
+    def set_device(self, device_id: str | None) -> None:
+        if device_id is not None:
+            self.session = Path(device_id)
+
+    def open(self, fps: float) -> None:
+        session = self.session or latest_session()
+        if session is None or not is_session(session):
+            raise OSError(f"No recorded session to replay in {session or load_data_path()}.")
+        self.session = Path(session)
+        self.reader = SessionReader(self.session)
+        if len(self.reader) == 0:
+            raise OSError(f"The session {self.session} has no frames.")
+        self._envi_options = self.reader.envi_options()
+        self._shape = tuple(self.reader.frame_shape()[:2])
+        bit_depth = self._envi_options.get("bit depth")
+        if bit_depth is not None:
+            self._bit_depth = int(str(bit_depth).split()[0])
+        elif self.reader.dtype().kind == "u":
+            self._bit_depth = self.reader.dtype().itemsize * 8
+        self._index = 0
+
+    def close(self) -> None:
+        if self.reader is not None:
+            self.reader.close()
+            self.reader = None
+
+    def toggle_bit_depth(self) -> None:
+        pass
+
+    def bit_depth(self) -> int:
+        return self._bit_depth
+
+    def get_raw_frame(self, fps: float) -> np.ndarray:
+        frame = self.reader.read(self._index)
+        self._index = (self._index + 1) % len(self.reader)
+        return frame
+
+    def get_view(self, frame: np.ndarray) -> np.ndarray:
+        return frame_view(
+            frame=frame,
+            mode=self._mode,
+            cfa_shape=self.cfa_shape(),
+            dynamic_range=2 ** self._bit_depth - 1,
+            bayer_order=bayer_order_from_envi(self._envi_options),
+        )
+
+    def shape(self) -> tuple[int, int]:
+        return self._shape
+
+    def cfa_shape(self) -> tuple[int, int]:
+        return cfa_from_envi(self._envi_options)
+
+    def exposure(self) -> int:
+        exposure_ms = self._envi_options.get("exposure time (ms)")
+        if exposure_ms is None:
+            return 0
+        return int(float(str(exposure_ms).split()[0]) * 1000)
+
+    def exposure_range(self) -> tuple[int, int, int]:
+        exposure = self.exposure()
+        return exposure, exposure, 1
+
+    def fps_range(self) -> tuple[int, int, int]:
+        return REPLAY_FPS_RANGE
+
+    def is_auto_exposure(self) -> bool:
+        return False
+
+    def toggle_auto_exposure(self) -> None:
+        pass
+
+    def set_exposure(self, exposure: int) -> bool:
+        return False
+
+    def init_exposure(self, max_exposure: int) -> None:
+        pass
+
+    def adjust_exposure(self) -> int:
+        return self.exposure()
+
+    def check_exposure(self, frame: np.ndarray) -> bool:
+        return True
+
+    def toggle_view(self) -> None:
+        if self._mode == ViewModeEnum.RAW:
+            self._mode = ViewModeEnum.DEMOSAIC
+        else:
+            self._mode = ViewModeEnum.RAW
+
+    def get_envi_options(self) -> dict:
+        return dict(self._envi_options)
+
+    def set_save_subfolder(self, subfolder: str) -> None:
+        self._subfolder = subfolder
+        self.save_folder().mkdir(parents=False, exist_ok=True)
+
+    def save_folder(self) -> Path:
+        if self._subfolder is None:
+            return self._save_folder
+        return self._save_folder / self._subfolder
+
+    def exception_type(self) -> Type[Exception]:
+        return OSError
@@ -6,12 +6,24 @@ from enum import Enum
 
 import imagingcontrol4 as ic4
 import numpy as np
-import scipy
 
+from camera_visualizer.camera_interface.bayer import demosaic_cfa_bayer_gbrb_bilinear
 from camera_visualizer.camera_interface.mock_interface import Camera
 from camera_visualizer.paths import load_data_path
 
-ic4.Library.init()
+_ic4_initialized = False
+
+
+def init_library() -> None:
+    """
+    Initializes the IC4 library once, when the first camera is created rather
+    than at import time.
+    """
+    global _ic4_initialized
+    if not _ic4_initialized:
+        ic4.Library.init()
+        _ic4_initialized = True
+
 
 class TisShapeEnum(str, Enum):
     LOW = "low"
@@ -61,25 +73,6 @@ TIS_SHAPE_DICT = [
 ]
 
 
-def demosaic_cfa_bayer_gbrb_bilinear(bayer: np.ndarray):
-    f_g = np.array([[0, 1, 0], [1, 4, 1], [0, 1, 0]], dtype=np.float32) / 8
-    f_r = np.array([[1, 2, 1], [2, 4, 2], [1, 2, 1]], dtype=np.float32) / 16
-    out = np.zeros((*bayer.shape[:2], 3))
-
-    # Red
-    out[1::2, 0::2, 0] = bayer[1::2, 0::2]
-    out[..., 0] = scipy.ndimage.convolve(out[..., 0], f_r)
-    # Green
-    out[0::2, 0::2, 1] = bayer[0::2, 0::2]
-    out[1::2, 1::2, 1] = bayer[1::2, 1::2]
-    out[..., 1] = scipy.ndimage.convolve(out[..., 1], f_g)
-    # Blue
-    out[0::2, 1::2, 2] = bayer[0::2, 1::2]
-    out[..., 2] = scipy.ndimage.convolve(out[..., 2], f_r)
-
-    return out
-
-
 @dataclass
 class TisCameraState:
     save_folder: Path
@@ -165,11 +158,16 @@ def get_envi_header(state: TisCameraState) -> dict:
 class TisCamera(Camera):
     grabber: ic4.Grabber
     sink: ic4.SnapSink | None
+    timestamp_ns: int | None
+    device_id: str | None
     state: TisCameraState
 
     def __init__(self):
+        init_library()
         self.grabber = ic4.Grabber(dev=None)
         self.sink = None
+        self.timestamp_ns = None
+        self.device_id = None
         data_path = load_data_path()
         data_path.mkdir(parents=False, exist_ok=True)
         data_path = data_path / "tis"
@@ -181,14 +179,21 @@ class TisCamera(Camera):
         )
         self.state = state
 
+    def set_device(self, device_id: str | None) -> None:
+        self.device_id = device_id
+
     def open(self, fps: float):
-        device_info = ic4.DeviceEnum.devices()
-        if len(device_info) < 1:
-            raise self.exception_type()(
-                code=ic4.ErrorCode.DeviceNotFound,
-                message="No device found",
-            )
-        self.grabber.device_open(dev=device_info[0])
+        if self.device_id is not None:
+            # Open by serial number, without enumerating the devices
+            self.grabber.device_open(dev=self.device_id)
+        else:
+            device_info = ic4.DeviceEnum.devices()
+            if len(device_info) < 1:
+                raise self.exception_type()(
+                    code=ic4.ErrorCode.DeviceNotFound,
+                    message="No device found",
+                )
+            self.grabber.device_open(dev=device_info[0])
         self.grabber.device_property_map.set_value(
             property_name=ic4.PropId.PIXEL_FORMAT,
             value=TIS_DEFAULT_PIXEL_FORMAT,
@@ -227,6 +232,9 @@ class TisCamera(Camera):
     def shape(self) -> tuple[int, ...]:
         return self.state.shape()
 
+    def cfa_shape(self) -> tuple[int, int]:
+        return 2, 2
+
     def bit_depth(self) -> int:
         return self.state.bit_depth()
 
@@ -244,17 +252,29 @@ class TisCamera(Camera):
             frame_view = demosaic_cfa_bayer_gbrb_bilinear(frame_view)
         return frame_view
 
-    def get_frame(self, fps: float) -> tuple[np.ndarray, np.ndarray]:
+    def get_raw_frame(self, fps: float) -> np.ndarray:
         """
-        Returns a numpy frame and its view.
+        Returns a numpy frame. The frame is copied out of the image buffer, so
+        that it can be held (e.g. in the recording queue) after the buffer is
+        returned to the sink.
         """
         image_buffer = self.sink.snap_single(timeout_ms=self.state.timeout_ms)
-        frame = image_buffer.numpy_wrap()
-        frame_view = self._get_frame_view(
+        self.timestamp_ns = image_buffer.meta_data.device_timestamp_ns
+        return image_buffer.numpy_copy()
+
+    def frame_timestamp(self) -> float | None:
+        if self.timestamp_ns is None:
+            return None
+        return self.timestamp_ns * 1e-9
+
+    def get_view(self, frame: np.ndarray) -> np.ndarray:
+        """
+        Returns the view of a numpy frame.
+        """
+        return self._get_frame_view(
             frame=frame,
             demosaic=self.state.demosaic,
         )
-        return frame, frame_view
 
     def get_envi_options(self) -> dict:
         return get_envi_header(state=self.state)
@@ -1,119 +1,610 @@
-# v4l2_camera.py (updated)
-
+import argparse
+import sys
+import threading
+import time
+from collections import deque
+from dataclasses import dataclass
+from datetime import datetime
 from pathlib import Path
-from enum import Enum
+from typing import Type
 
+import gi
 import numpy as np
 
-from camera_visualizer.camera_interface.mock_interface import Camera
+gi.require_version("Gst", "1.0")
+from gi.repository import Gst
 
+from camera_visualizer.camera_interface.mock_interface import Camera
+from camera_visualizer.paths import load_data_path
 
-class SaveFormatEnum(Enum):
-    PNG = 'png'
-    TIFF = 'tiff'
+_gst_initialized = False
 
 
-class V4L2Camera(Camera):
-    def __init__(self, device='/dev/video3', width=1920, height=1200):
+def init_library() -> None:
+    """
+    Initializes GStreamer once, when the first camera is created rather than
+    at import time.
+    """
+    global _gst_initialized
+    if not _gst_initialized:
         Gst.init(None)
-        self.device = device
-        self._width = width
-        self._height = height
-        self._bit_depth = 8  # Default to 8-bit
-        self._pipeline = None
-        self._appsink = None
-        self._frame_count = 0
-
-    def open(self):
-        if self._bit_depth == 8:
-            raw_format = "GRAY8"
-        elif self._bit_depth == 16:
-            raw_format = "GRAY16_LE"
-        else:
-            raise ValueError(f"Unsupported bit depth: {self._bit_depth}")
-
-        pipeline_desc = f"""
-            v4l2src device={self.device} !
-            video/x-raw,format={raw_format},width={self._width},height={self._height} !
-            videoconvert !
-            video/x-raw,format=RGB !
-            appsink name=sink emit-signals=false sync=false max-buffers=1 drop=true
-        """
-        self._pipeline = Gst.parse_launch(pipeline_desc)
-        self._appsink = self._pipeline.get_by_name('sink')
-        self._pipeline.set_state(Gst.State.PLAYING)
-
-    def close(self):
-        if self._pipeline:
-            self._pipeline.set_state(Gst.State.NULL)
-            self._pipeline = None
-            self._appsink = None
-
-    def get_frame(self):
-        sample = self._appsink.emit('pull-sample')
-        if not sample:
-            raise RuntimeError("Failed to pull frame from appsink")
-
-        buf = sample.get_buffer()
-        caps = sample.get_caps()
-        width = caps.get_structure(0).get_value('width')
-        height = caps.get_structure(0).get_value('height')
-
-        success, map_info = buf.map(Gst.MapFlags.READ)
+        _gst_initialized = True
+
+
+# Camera Constants
+GST_DEFAULT_WIDTH = 1920
+GST_DEFAULT_HEIGHT = 1200
+GST_RING_SIZE = 4
+GST_TIMEOUT_S = 5.0
+GST_FPS_RANGE = (1, 60, 1)
+GST_TEST_SOURCE = "videotestsrc is-live=true pattern=ball"
+# Uniform white frames, in which any padding left in the rows shows up
+GST_SOLID_SOURCE = "videotestsrc is-live=true pattern=solid-color foreground-color=0xffffffff"
+# Checked (bit depth, Bayer order, width) caps: rows are padded to 4 bytes,
+# so the widths are chosen to leave padding (Bayer widths must be even)
+GST_CHECK_CAPS = ((8, None, 317), (16, None, 317), (8, "bggr", 318))
+GST_CHECK_HEIGHT = 240
+
+# Exposure Constants (V4L2 absolute exposure is in units of 100 us)
+GST_EXPOSURE_CONTROL = "exposure_time_absolute"
+GST_AUTO_EXPOSURE_CONTROL = "auto_exposure"
+GST_EXPOSURE_UNIT_US = 100
+GST_MIN_EXPOSURE = 100
+GST_MAX_EXPOSURE = 1_000_000
+GST_EXPOSURE_INCREMENT = 100
+
+
+GST_FORMAT_DICT = [
+    {
+        "caps": "video/x-raw",
+        "format": "GRAY8",
+        "bit_depth": 8,
+        "bayer": False,
+    },
+    {
+        "caps": "video/x-raw",
+        "format": "GRAY16_LE",
+        "bit_depth": 16,
+        "bayer": False,
+    },
+    {
+        "caps": "video/x-bayer",
+        "format": "{order}",
+        "bit_depth": 8,
+        "bayer": True,
+    },
+    {
+        "caps": "video/x-bayer",
+        "format": "{order}16le",
+        "bit_depth": 16,
+        "bayer": True,
+    },
+]
+
+
+class GstCameraError(RuntimeError):
+    pass
+
+
+class MappedSample:
+    """
+    A sample from the appsink, with its buffer mapped for reading. The
+    mapping is released only once no NumPy view of it remains.
+    """
+
+    def __init__(self, sample: Gst.Sample):
+        self.sample = sample
+        self.buffer = sample.get_buffer()
+        # The gst-python overrides return the MapInfo, with the data as a
+        # memoryview of the buffer, and plain PyGObject a (success, MapInfo)
+        # tuple with a copy of the data
+        mapped = self.buffer.map(Gst.MapFlags.READ)
+        success, self.map_info = mapped if isinstance(mapped, tuple) else (True, mapped)
         if not success:
-            raise RuntimeError("Failed to map buffer")
+            raise GstCameraError("Failed to map buffer")
+        pts = self.buffer.pts
+        self.timestamp = None if pts == Gst.CLOCK_TIME_NONE else pts * 1e-9
+
+    def array(self, dtype: np.dtype, height: int, width: int) -> np.ndarray:
+        """
+        Returns a read-only view of the mapped frame, without the padding of
+        its rows.
+        """
+        data = np.frombuffer(self.map_info.data, dtype=np.uint8)
+        stride = data.size // height
+        rows = data[:stride * height].reshape(height, stride)
+        return rows.view(dtype)[:, :width]
+
+    def release(self) -> bool:
+        """
+        Unmaps the buffer, unless a view of it is still in use. Returns True
+        if released.
+        """
+        if isinstance(self.map_info.data, memoryview):
+            try:
+                self.map_info.data.release()
+            except BufferError:
+                return False
+        self.buffer.unmap(self.map_info)
+        return True
+
+
+class SampleRing:
+    """
+    Bounded queue of mapped samples, filled from the streaming thread of
+    the appsink. When full, the oldest sample is dropped.
+    """
+
+    def __init__(self, capacity: int = GST_RING_SIZE):
+        self._samples = deque()
+        self._capacity = capacity
+        self._condition = threading.Condition()
+        self.dropped = 0
+
+    def push(self, sample: MappedSample) -> None:
+        with self._condition:
+            if len(self._samples) >= self._capacity:
+                self._samples.popleft().release()
+                self.dropped += 1
+            self._samples.append(sample)
+            self._condition.notify()
+
+    def pop(self, timeout: float) -> MappedSample | None:
+        with self._condition:
+            if not self._condition.wait_for(lambda: self._samples, timeout=timeout):
+                return None
+            return self._samples.popleft()
+
+    def clear(self) -> None:
+        with self._condition:
+            while self._samples:
+                self._samples.popleft().release()
+
+
+@dataclass
+class GstCameraState:
+    save_folder: Path
+    width: int = GST_DEFAULT_WIDTH
+    height: int = GST_DEFAULT_HEIGHT
+    bit_depth: int = 16
+    bayer_order: str | None = None
+    current_exposure: int = 10_000
+    exposure_range: tuple[int, int, int] = (
+        GST_MIN_EXPOSURE,
+        GST_MAX_EXPOSURE,
+        GST_EXPOSURE_INCREMENT,
+    )
+    min_exposure: int = GST_MIN_EXPOSURE
+    max_exposure: int = GST_MAX_EXPOSURE
+    auto_exposure: bool = False
+    binned_view: bool = False
+    save_subfolder: str | None = None
+
+    @property
+    def save_path(self) -> Path:
+        if self.save_subfolder is None:
+            return self.save_folder
+        return self.save_folder / self.save_subfolder
+
+    @property
+    def dtype(self) -> type:
+        return np.uint8 if self.bit_depth == 8 else np.uint16
+
+    def dynamic_range(self) -> int:
+        return 2 ** self.bit_depth - 1
+
+    def caps(self, fps: float | None = None) -> str:
+        entry = next(
+            entry for entry in GST_FORMAT_DICT
+            if entry["bit_depth"] == self.bit_depth
+            and entry["bayer"] == (self.bayer_order is not None)
+        )
+        caps = (
+            f"{entry['caps']},format={entry['format'].format(order=self.bayer_order)},"
+            f"width={self.width},height={self.height}"
+        )
+        if fps is not None:
+            caps += f",framerate={int(round(fps * 1000))}/1000"
+        return caps
+
+
+def get_envi_header(state: GstCameraState) -> dict:
+    header = {
+        'samples': state.width,
+        'lines': state.height,
+        'bands': 1,
+        'interleave': 'bsq',
+        'byte order': 0,
+        'data type': 1 if state.bit_depth == 8 else 12,
+        'bit depth': f"{state.bit_depth} bits",
+        'acquisition time': datetime.now().isoformat(),
+        'exposure time (ms)': f"{state.current_exposure / 1000:g}",
+    }
+    if state.bayer_order is not None:
+        header['filter array size'] = '2x2'
+        header['description'] = f'Bayer mosaic image snapshot ({state.bayer_order}).'
+    return header
+
+
+class V4L2Camera(Camera):
+    """
+    V4L2 camera (or any GStreamer source) streamed through a GStreamer
+    pipeline negotiating raw GRAY8/GRAY16_LE or Bayer caps, without any
+    conversion.
+
+    The appsink callback maps each sample and queues it in a SampleRing.
+    Raw frames are read-only NumPy views of the mapped buffers, which stay
+    mapped while a view is in use; frames must be copied to be kept after
+    the next call to get_raw_frame.
+    """
+    state: GstCameraState
+    source: str | None
+    pipeline: Gst.Pipeline | None
+
+    def __init__(
+        self,
+        source: str | None = None,
+        width: int = GST_DEFAULT_WIDTH,
+        height: int = GST_DEFAULT_HEIGHT,
+        bayer_order: str | None = None,
+    ):
+        """
+        The source is a GStreamer element description, by default a v4l2src
+        on the selected device, e.g. GST_TEST_SOURCE for a test pattern.
+        Bayer frames are negotiated if bayer_order (e.g. "gbrg") is given.
+        """
+        init_library()
+        self.source = source
+        self.device_id = None
+        self.pipeline = None
+        self._source_element = None
+        self._ring = SampleRing()
+        self._current = None
+        self._retired = []
+        self._timestamp = None
+        self._fps = None
+        data_path = load_data_path() / "gstreamer"
+        data_path.mkdir(parents=True, exist_ok=True)
+        self.state = GstCameraState(
+            save_folder=data_path,
+            width=width,
+            height=height,
+            bayer_order=bayer_order,
+        )
+
+    def set_device(self, device_id: str | None) -> None:
+        self.device_id = device_id
 
+    def _source_description(self) -> str:
+        if self.source is not None:
+            return f"{self.source} name=source"
+        from camera_visualizer.camera_interface.v4l2_mmap import resolve_device
+        return f"v4l2src device={resolve_device(self.device_id)} name=source"
+
+    def open(self, fps: float) -> None:
+        self._fps = fps
+        description = (
+            f"{self._source_description()} ! {self.state.caps(fps=fps)} ! "
+            f"appsink name=sink emit-signals=true sync=false "
+            f"max-buffers={GST_RING_SIZE} drop=true"
+        )
+        self.pipeline = Gst.parse_launch(description)
+        self._source_element = self.pipeline.get_by_name("source")
+        sink = self.pipeline.get_by_name("sink")
+        sink.connect("new-sample", self._on_new_sample)
+        if self.pipeline.set_state(Gst.State.PLAYING) == Gst.StateChangeReturn.FAILURE:
+            error = self._bus_error()
+            self.close()
+            raise GstCameraError(error or f"Unable to start the pipeline: {description}")
+        self._query_exposure()
+
+    def _query_exposure(self) -> None:
+        """
+        Reads the exposure range and value of the device of a v4l2src. Other
+        sources keep the default range.
+        """
+        element = self._source_element
+        if element is None or element.find_property("device") is None:
+            return
+        from camera_visualizer.camera_interface.v4l2_mmap import query_exposure
         try:
-            frame = np.frombuffer(map_info.data, dtype=np.uint8)
-            frame = frame.reshape((height, width, 3))
-            frame = frame.astype(np.float32)
-            if self._bit_depth == 8:
-                frame /= 255.0
-            else:
-                frame /= 65535.0  # if you later support real RGB16
-        finally:
-            buf.unmap(map_info)
-
-        self._frame_count += 1
-        return frame, None
-
-    def shape(self):
-        return (self._height, self._width)
+            exposure_control = query_exposure(device=element.get_property("device"))
+        except OSError:
+            return
+        if exposure_control is not None:
+            self.state.exposure_range, self.state.current_exposure = exposure_control
+
+    def _on_new_sample(self, sink) -> Gst.FlowReturn:
+        sample = sink.emit("pull-sample")
+        if sample is None:
+            return Gst.FlowReturn.EOS
+        self._ring.push(MappedSample(sample))
+        return Gst.FlowReturn.OK
+
+    def _bus_error(self) -> str | None:
+        message = self.pipeline.get_bus().pop_filtered(Gst.MessageType.ERROR)
+        if message is None:
+            return None
+        error, debug = message.parse_error()
+        return f"{error.message} ({debug})"
+
+    def close(self) -> None:
+        if self.pipeline is not None:
+            self.pipeline.set_state(Gst.State.NULL)
+            self.pipeline = None
+            self._source_element = None
+        self._ring.clear()
+        self._retire(None)
+
+    def _retire(self, sample: MappedSample | None) -> None:
+        """
+        Replaces the current sample, releasing the previous ones whose views
+        are no longer in use.
+        """
+        if self._current is not None:
+            self._retired.append(self._current)
+        self._current = sample
+        self._retired = [s for s in self._retired if not s.release()]
+
+    def get_raw_frame(self, fps: float) -> np.ndarray:
+        """
+        Returns the oldest queued frame as a read-only view of its mapped
+        buffer.
+        """
+        sample = self._ring.pop(timeout=GST_TIMEOUT_S)
+        if sample is None:
+            error = self._bus_error() if self.pipeline is not None else None
+            raise GstCameraError(error or "Timeout waiting for a frame")
+        self._retire(sample)
+        self._timestamp = sample.timestamp
+        return sample.array(
+            dtype=self.state.dtype,
+            height=self.state.height,
+            width=self.state.width,
+        )
+
+    def frame_timestamp(self) -> float | None:
+        return self._timestamp
+
+    def get_view(self, frame: np.ndarray) -> np.ndarray:
+        view = frame.astype(np.float32)
+        view /= self.state.dynamic_range()
+        if self.state.binned_view and self.state.bayer_order is not None:
+            height = view.shape[0] // 2 * 2
+            width = view.shape[1] // 2 * 2
+            view = view[:height, :width].reshape(
+                height // 2, 2, width // 2, 2
+            ).mean(axis=(1, 3))
+        return view
+
+    @property
+    def dropped(self) -> int:
+        return self._ring.dropped
+
+    def shape(self) -> tuple[int, int]:
+        return self.state.height, self.state.width
+
+    def cfa_shape(self) -> tuple[int, int]:
+        return (1, 1) if self.state.bayer_order is None else (2, 2)
 
     def bit_depth(self) -> int:
-        return self._bit_depth
+        return self.state.bit_depth
+
+    def toggle_bit_depth(self) -> None:
+        self.state.bit_depth = 16 if self.state.bit_depth == 8 else 8
+        if self.pipeline is not None:
+            self.close()
+            self.open(fps=self._fps)
 
-    def toggle_bit_depth(self):
-        self._bit_depth = 16 if self._bit_depth == 8 else 8
-        self.close()
-        self.open()
+    def _set_controls(self, **controls: int) -> bool:
+        """
+        Sets V4L2 controls through the extra-controls of a v4l2src.
+        """
+        element = self._source_element
+        if element is None or element.find_property("extra-controls") is None:
+            return False
+        fields = ",".join(f"{name}={value}" for name, value in controls.items())
+        element.set_property(
+            "extra-controls",
+            Gst.Structure.new_from_string(f"controls,{fields}"),
+        )
+        return True
 
     def exposure(self) -> int:
-        raise NotImplementedError()
+        return self.state.current_exposure
+
+    def exposure_range(self) -> tuple[int, int, int]:
+        return self.state.exposure_range
+
+    def fps_range(self) -> tuple[int, int, int]:
+        return GST_FPS_RANGE
 
     def set_exposure(self, exposure: int) -> bool:
-        raise NotImplementedError()
+        low, high, _ = self.state.exposure_range
+        if not low <= exposure <= high:
+            return False
+        if not self._set_controls(
+            **{GST_EXPOSURE_CONTROL: int(exposure // GST_EXPOSURE_UNIT_US)}
+        ):
+            return False
+        self.state.current_exposure = exposure
+        return True
 
-    def init_exposure(self):
-        pass
+    def is_auto_exposure(self) -> bool:
+        return self.state.auto_exposure
 
-    def adjust_exposure(self):
-        pass
+    def toggle_auto_exposure(self) -> None:
+        # V4L2 auto_exposure menu: 1 is manual, 3 is aperture priority
+        value = 1 if self.state.auto_exposure else 3
+        if self._set_controls(**{GST_AUTO_EXPOSURE_CONTROL: value}):
+            self.state.auto_exposure = not self.state.auto_exposure
+
+    def init_exposure(self, max_exposure: int) -> None:
+        low, high, _ = self.state.exposure_range
+        self.state.max_exposure = min(high, max_exposure)
+        self.state.min_exposure = low
+
+    def adjust_exposure(self) -> int:
+        return int((self.state.max_exposure + self.state.min_exposure) // 2)
 
     def check_exposure(self, frame: np.ndarray) -> bool:
-        return True
+        """
+        Binary search of the exposure keeping the saturated pixels under
+        0.1% of the frame.
+        """
+        saturated = np.count_nonzero(frame >= self.state.dynamic_range())
+        if saturated > frame.size // 1000:
+            self.state.max_exposure = self.state.current_exposure - 1
+        else:
+            self.state.min_exposure = self.state.current_exposure + 1
+        step = self.state.exposure_range[2]
+        return self.state.max_exposure - self.state.min_exposure <= 2 * step
 
-    def toggle_view(self):
-        pass
+    def toggle_view(self) -> None:
+        self.state.binned_view = not self.state.binned_view
 
-    def get_envi_options(self):
-        return None
+    def get_envi_options(self) -> dict:
+        return get_envi_header(state=self.state)
 
-    def set_save_subfolder(self, subfolder: str):
-        pass
+    def set_save_subfolder(self, subfolder: str) -> None:
+        self.state.save_subfolder = subfolder
+        self.state.save_path.mkdir(parents=False, exist_ok=True)
 
     def save_folder(self) -> Path:
-        return Path("..")
+        return self.state.save_path
+
+    def exception_type(self) -> Type[Exception]:
+        return GstCameraError
+
+
+def check_stream(
+    source: str,
+    bit_depth: int,
+    bayer_order: str | None,
+    width: int,
+    n_frames: int,
+    fps: float,
+) -> list[str]:
+    """
+    Streams frames of a source in the given caps, and returns the failed
+    checks of their type, shape and row stride, and of the release of their
+    buffers.
+    """
+    failures = []
+    caps = f"{bayer_order or 'gray'} {bit_depth} bits"
+
+    def check(condition: bool, message: str) -> None:
+        if not condition:
+            failures.append(f"{caps}: {message}")
+
+    cam = V4L2Camera(
+        source=source,
+        width=width,
+        height=GST_CHECK_HEIGHT,
+        bayer_order=bayer_order,
+    )
+    cam.state.bit_depth = bit_depth
+    cam.open(fps=fps)
+    try:
+        dtype = np.dtype(cam.state.dtype)
+        held = cam.get_raw_frame(fps=fps)
+        cam.get_raw_frame(fps=fps)
+        check(len(cam._retired) == 1, "buffer of a frame in use released")
+        del held
+        for _ in range(n_frames):
+            frame = cam.get_raw_frame(fps=fps)
+            check(frame.dtype == dtype, f"dtype {frame.dtype} instead of {dtype}")
+            check(frame.shape == (GST_CHECK_HEIGHT, width), f"shape {frame.shape}")
+            check(not frame.flags.writeable, "frame is writeable")
+            check(
+                frame.strides[1] == dtype.itemsize
+                and frame.strides[0] % 4 == 0
+                and frame.strides[0] > width * dtype.itemsize,
+                f"strides {frame.strides} of padded rows",
+            )
+            if source == GST_SOLID_SOURCE:
+                check(0 < frame.min() == frame.max(), "padding left in the rows")
+            # Only the buffer of the previous frame may still be in use
+            check(len(cam._retired) <= 1, f"{len(cam._retired)} buffers not released")
+        frame = None
+    finally:
+        cam.close()
+    check(cam._current is None and not cam._retired, "buffers not released on close")
+    return failures
+
+
+def check_caps(n_frames: int, fps: float) -> bool:
+    """
+    Checks the GRAY8, GRAY16_LE and Bayer caps on test sources. Returns True
+    if all the checks passed.
+    """
+    passed = True
+    for bit_depth, bayer_order, width in GST_CHECK_CAPS:
+        for source in (GST_TEST_SOURCE, GST_SOLID_SOURCE):
+            try:
+                failures = check_stream(
+                    source=source,
+                    bit_depth=bit_depth,
+                    bayer_order=bayer_order,
+                    width=width,
+                    n_frames=n_frames,
+                    fps=fps,
+                )
+            except GstCameraError as e:
+                failures = [str(e)]
+            result = "OK" if not failures else "FAIL"
+            print(f"{source}, {bayer_order or 'gray'} {bit_depth} bits: {result}")
+            for failure in failures[:10]:
+                print(f"  FAIL: {failure}")
+            passed = passed and not failures
+    return passed
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Streams frames from a GStreamer source."
+    )
+    parser.add_argument(
+        "--source",
+        type=str,
+        default=None,
+        help=f"GStreamer source, e.g. '{GST_TEST_SOURCE}' (default: v4l2src).",
+    )
+    parser.add_argument("--bayer", type=str, default=None, help="Bayer order, e.g. gbrg.")
+    parser.add_argument("--width", type=int, default=640)
+    parser.add_argument("--height", type=int, default=480)
+    parser.add_argument("--bit-depth", type=int, choices=[8, 16], default=16)
+    parser.add_argument("-n", "--frames", type=int, default=100)
+    parser.add_argument("--fps", type=float, default=30.0)
+    parser.add_argument(
+        "--check",
+        action="store_true",
+        help="Check the raw caps on test sources, exiting non-zero on failure.",
+    )
+    args = parser.parse_args()
+
+    if args.check:
+        sys.exit(0 if check_caps(n_frames=args.frames, fps=args.fps) else 1)
+
+    cam = V4L2Camera(
+        source=args.source,
+        width=args.width,
+        height=args.height,
+        bayer_order=args.bayer,
+    )
+    cam.state.bit_depth = args.bit_depth
+    cam.open(fps=args.fps)
+    try:
+        start = time.perf_counter()
+        for _ in range(args.frames):
+            frame, frame_view = cam.get_frame(fps=args.fps)
+        elapsed = time.perf_counter() - start
+    finally:
+        cam.close()
+    print(f"frame: {frame.shape} {frame.dtype}, max: {frame.max()}")
+    print(f"frame_view: {frame_view.shape} {frame_view.dtype}, max: {frame_view.max():.4f}")
+    print(f"{args.frames / elapsed:.1f} fps, {cam.dropped} dropped")
+
 
-    def exception_type(self):
-        return RuntimeError
+if __name__ == "__main__":
+    main()
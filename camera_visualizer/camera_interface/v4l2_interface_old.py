@@ -4,6 +4,7 @@ import subprocess
 import scipy
 import numpy as np
 
+from camera_visualizer.camera_interface.discovery import discover_v4l2
 from camera_visualizer.camera_interface.mock_interface import Camera
 
 V4L2_MIN_EXPOSURE_MS = 15
@@ -27,12 +28,10 @@ def supports_format(device, fmt: str = "BG16"):
         return False
 
 def find_device(fmt: list[str]):
-    """Finds the first /dev/videoX device that supports BG16 format."""
-    for dev in list_video_devices():
-        for f in fmt:
-            if not supports_format(dev, f):
-                break
-        return dev
+    """Finds the first /dev/videoX device that supports all the formats."""
+    for device in discover_v4l2():
+        if all(f in device.formats for f in fmt):
+            return device.path
     return None
 
 def capture_bayer_image_in_memory(
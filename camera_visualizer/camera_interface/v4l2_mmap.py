@@ -0,0 +1,773 @@
+import ctypes
+import errno
+import fcntl
+import mmap
+import os
+import select
+from dataclasses import dataclass, field
+from datetime import datetime
+from pathlib import Path
+from typing import Type
+
+import numpy as np
+
+from camera_visualizer.camera_interface.mock_interface import Camera
+from camera_visualizer.paths import load_data_path
+
+# Streaming constants
+V4L2_BUFFER_COUNT = 4
+V4L2_TIMEOUT_S = 5.0
+V4L2_DEFAULT_FPS_RANGE = (1, 60, 1)
+
+# Exposure constants (V4L2 absolute exposure is in units of 100 us)
+V4L2_EXPOSURE_UNIT_US = 100
+V4L2_MIN_EXPOSURE = 100
+V4L2_MAX_EXPOSURE = 1_000_000
+V4L2_EXPOSURE_INCREMENT = 100
+
+# ioctl encoding, from linux/ioctl.h
+_IOC_WRITE = 1
+_IOC_READ = 2
+
+
+def _ioc(direction: int, nr: int, struct: type) -> int:
+    return (
+        (direction << 30)
+        | (ctypes.sizeof(struct) << 16)
+        | (ord("V") << 8)
+        | nr
+    )
+
+
+def fourcc(code: str) -> int:
+    return int.from_bytes(code.encode("ascii"), "little")
+
+
+def fourcc_name(value: int) -> str:
+    return value.to_bytes(4, "little").decode("ascii", errors="replace")
+
+
+V4L2_BUF_TYPE_VIDEO_CAPTURE = 1
+V4L2_MEMORY_MMAP = 1
+V4L2_FIELD_NONE = 1
+V4L2_CAP_VIDEO_CAPTURE = 0x00000001
+V4L2_CAP_STREAMING = 0x04000000
+V4L2_CAP_DEVICE_CAPS = 0x80000000
+V4L2_CID_EXPOSURE_AUTO = 0x009A0901
+V4L2_CID_EXPOSURE_ABSOLUTE = 0x009A0902
+V4L2_EXPOSURE_AUTO = 0
+V4L2_EXPOSURE_MANUAL = 1
+
+
+class v4l2_capability(ctypes.Structure):
+    _fields_ = [
+        ("driver", ctypes.c_char * 16),
+        ("card", ctypes.c_char * 32),
+        ("bus_info", ctypes.c_char * 32),
+        ("version", ctypes.c_uint32),
+        ("capabilities", ctypes.c_uint32),
+        ("device_caps", ctypes.c_uint32),
+        ("reserved", ctypes.c_uint32 * 3),
+    ]
+
+
+class v4l2_fmtdesc(ctypes.Structure):
+    _fields_ = [
+        ("index", ctypes.c_uint32),
+        ("type", ctypes.c_uint32),
+        ("flags", ctypes.c_uint32),
+        ("description", ctypes.c_char * 32),
+        ("pixelformat", ctypes.c_uint32),
+        ("mbus_code", ctypes.c_uint32),
+        ("reserved", ctypes.c_uint32 * 3),
+    ]
+
+
+class v4l2_pix_format(ctypes.Structure):
+    _fields_ = [
+        ("width", ctypes.c_uint32),
+        ("height", ctypes.c_uint32),
+        ("pixelformat", ctypes.c_uint32),
+        ("field", ctypes.c_uint32),
+        ("bytesperline", ctypes.c_uint32),
+        ("sizeimage", ctypes.c_uint32),
+        ("colorspace", ctypes.c_uint32),
+        ("priv", ctypes.c_uint32),
+        ("flags", ctypes.c_uint32),
+        ("ycbcr_enc", ctypes.c_uint32),
+        ("quantization", ctypes.c_uint32),
+        ("xfer_func", ctypes.c_uint32),
+    ]
+
+
+class _v4l2_format_union(ctypes.Union):
+    _fields_ = [
+        ("pix", v4l2_pix_format),
+        ("raw_data", ctypes.c_uint8 * 200),
+        # The kernel union holds pointers, which sets its alignment
+        ("_align", ctypes.c_void_p),
+    ]
+
+
+class v4l2_format(ctypes.Structure):
+    _fields_ = [
+        ("type", ctypes.c_uint32),
+        ("fmt", _v4l2_format_union),
+    ]
+
+
+class v4l2_fract(ctypes.Structure):
+    _fields_ = [
+        ("numerator", ctypes.c_uint32),
+        ("denominator", ctypes.c_uint32),
+    ]
+
+
+class v4l2_captureparm(ctypes.Structure):
+    _fields_ = [
+        ("capability", ctypes.c_uint32),
+        ("capturemode", ctypes.c_uint32),
+        ("timeperframe", v4l2_fract),
+        ("extendedmode", ctypes.c_uint32),
+        ("readbuffers", ctypes.c_uint32),
+        ("reserved", ctypes.c_uint32 * 4),
+    ]
+
+
+class _v4l2_streamparm_union(ctypes.Union):
+    _fields_ = [
+        ("capture", v4l2_captureparm),
+        ("raw_data", ctypes.c_uint8 * 200),
+    ]
+
+
+class v4l2_streamparm(ctypes.Structure):
+    _fields_ = [
+        ("type", ctypes.c_uint32),
+        ("parm", _v4l2_streamparm_union),
+    ]
+
+
+class v4l2_requestbuffers(ctypes.Structure):
+    _fields_ = [
+        ("count", ctypes.c_uint32),
+        ("type", ctypes.c_uint32),
+        ("memory", ctypes.c_uint32),
+        ("capabilities", ctypes.c_uint32),
+        ("flags", ctypes.c_uint8),
+        ("reserved", ctypes.c_uint8 * 3),
+    ]
+
+
+class timeval(ctypes.Structure):
+    _fields_ = [
+        ("tv_sec", ctypes.c_long),
+        ("tv_usec", ctypes.c_long),
+    ]
+
+
+class v4l2_timecode(ctypes.Structure):
+    _fields_ = [
+        ("type", ctypes.c_uint32),
+        ("flags", ctypes.c_uint32),
+        ("frames", ctypes.c_uint8),
+        ("seconds", ctypes.c_uint8),
+        ("minutes", ctypes.c_uint8),
+        ("hours", ctypes.c_uint8),
+        ("userbits", ctypes.c_uint8 * 4),
+    ]
+
+
+class _v4l2_buffer_m(ctypes.Union):
+    _fields_ = [
+        ("offset", ctypes.c_uint32),
+        ("userptr", ctypes.c_ulong),
+        ("planes", ctypes.c_void_p),
+        ("fd", ctypes.c_int32),
+    ]
+
+
+class v4l2_buffer(ctypes.Structure):
+    _fields_ = [
+        ("index", ctypes.c_uint32),
+        ("type", ctypes.c_uint32),
+        ("bytesused", ctypes.c_uint32),
+        ("flags", ctypes.c_uint32),
+        ("field", ctypes.c_uint32),
+        ("timestamp", timeval),
+        ("timecode", v4l2_timecode),
+        ("sequence", ctypes.c_uint32),
+        ("memory", ctypes.c_uint32),
+        ("m", _v4l2_buffer_m),
+        ("length", ctypes.c_uint32),
+        ("reserved2", ctypes.c_uint32),
+        ("request_fd", ctypes.c_int32),
+    ]
+
+
+class v4l2_control(ctypes.Structure):
+    _fields_ = [
+        ("id", ctypes.c_uint32),
+        ("value", ctypes.c_int32),
+    ]
+
+
+class v4l2_queryctrl(ctypes.Structure):
+    _fields_ = [
+        ("id", ctypes.c_uint32),
+        ("type", ctypes.c_uint32),
+        ("name", ctypes.c_char * 32),
+        ("minimum", ctypes.c_int32),
+        ("maximum", ctypes.c_int32),
+        ("step", ctypes.c_int32),
+        ("default_value", ctypes.c_int32),
+        ("flags", ctypes.c_uint32),
+        ("reserved", ctypes.c_uint32 * 2),
+    ]
+
+
+VIDIOC_QUERYCAP = _ioc(_IOC_READ, 0, v4l2_capability)
+VIDIOC_ENUM_FMT = _ioc(_IOC_READ | _IOC_WRITE, 2, v4l2_fmtdesc)
+VIDIOC_G_FMT = _ioc(_IOC_READ | _IOC_WRITE, 4, v4l2_format)
+VIDIOC_S_FMT = _ioc(_IOC_READ | _IOC_WRITE, 5, v4l2_format)
+VIDIOC_REQBUFS = _ioc(_IOC_READ | _IOC_WRITE, 8, v4l2_requestbuffers)
+VIDIOC_QUERYBUF = _ioc(_IOC_READ | _IOC_WRITE, 9, v4l2_buffer)
+VIDIOC_QBUF = _ioc(_IOC_READ | _IOC_WRITE, 15, v4l2_buffer)
+VIDIOC_DQBUF = _ioc(_IOC_READ | _IOC_WRITE, 17, v4l2_buffer)
+VIDIOC_STREAMON = _ioc(_IOC_WRITE, 18, ctypes.c_int)
+VIDIOC_STREAMOFF = _ioc(_IOC_WRITE, 19, ctypes.c_int)
+VIDIOC_G_PARM = _ioc(_IOC_READ | _IOC_WRITE, 21, v4l2_streamparm)
+VIDIOC_S_PARM = _ioc(_IOC_READ | _IOC_WRITE, 22, v4l2_streamparm)
+VIDIOC_G_CTRL = _ioc(_IOC_READ | _IOC_WRITE, 27, v4l2_control)
+VIDIOC_S_CTRL = _ioc(_IOC_READ | _IOC_WRITE, 28, v4l2_control)
+VIDIOC_QUERYCTRL = _ioc(_IOC_READ | _IOC_WRITE, 36, v4l2_queryctrl)
+
+
+@dataclass(frozen=True)
+class PixelFormat:
+    """
+    A raw pixel format, with the NumPy type of its samples and the period of
+    its color filter array.
+    """
+    fourcc: str
+    dtype: type
+    bit_depth: int
+    cfa_shape: tuple[int, int] = (1, 1)
+
+
+V4L2_PIXEL_FORMATS = {
+    f.fourcc: f for f in (
+        PixelFormat("GREY", np.uint8, 8),
+        PixelFormat("Y10 ", np.uint16, 10),
+        PixelFormat("Y12 ", np.uint16, 12),
+        PixelFormat("Y16 ", np.uint16, 16),
+        PixelFormat("BA81", np.uint8, 8, (2, 2)),
+        PixelFormat("GBRG", np.uint8, 8, (2, 2)),
+        PixelFormat("GRBG", np.uint8, 8, (2, 2)),
+        PixelFormat("RGGB", np.uint8, 8, (2, 2)),
+        PixelFormat("BG10", np.uint16, 10, (2, 2)),
+        PixelFormat("GB10", np.uint16, 10, (2, 2)),
+        PixelFormat("BA10", np.uint16, 10, (2, 2)),
+        PixelFormat("RG10", np.uint16, 10, (2, 2)),
+        PixelFormat("BG12", np.uint16, 12, (2, 2)),
+        PixelFormat("GB12", np.uint16, 12, (2, 2)),
+        PixelFormat("BA12", np.uint16, 12, (2, 2)),
+        PixelFormat("RG12", np.uint16, 12, (2, 2)),
+        PixelFormat("BYR2", np.uint16, 16, (2, 2)),
+        PixelFormat("GB16", np.uint16, 16, (2, 2)),
+        PixelFormat("GR16", np.uint16, 16, (2, 2)),
+        PixelFormat("RG16", np.uint16, 16, (2, 2)),
+    )
+}
+
+
+class V4L2Error(OSError):
+    pass
+
+
+class V4L2IO:
+    """
+    System calls used by the V4L2 camera. scripts/check_v4l2_mmap.py
+    replaces it with a fake layer emulating a device, and the kernel vivid
+    driver can be used as a real device without hardware.
+    """
+
+    def open(self, path: str) -> int:
+        return os.open(path, os.O_RDWR | os.O_NONBLOCK)
+
+    def close(self, fd: int) -> None:
+        os.close(fd)
+
+    def ioctl(self, fd: int, request: int, arg) -> None:
+        fcntl.ioctl(fd, request, arg)
+
+    def mmap(self, fd: int, length: int, offset: int) -> mmap.mmap:
+        return mmap.mmap(
+            fd,
+            length,
+            flags=mmap.MAP_SHARED,
+            prot=mmap.PROT_READ,
+            offset=offset,
+        )
+
+    def wait(self, fd: int, timeout: float) -> bool:
+        """
+        Waits until a buffer can be dequeued, returning False on timeout.
+        """
+        readable, _, _ = select.select([fd], [], [], timeout)
+        return bool(readable)
+
+
+@dataclass
+class V4L2CameraState:
+    save_folder: Path
+    device: str | None = None
+    card: str = "V4L2 camera"
+    width: int = 0
+    height: int = 0
+    bytes_per_line: int = 0
+    pixel_format: PixelFormat | None = None
+    formats: list[PixelFormat] = field(default_factory=list)
+    current_exposure: int = 0
+    exposure_range: tuple[int, int, int] = (
+        V4L2_MIN_EXPOSURE,
+        V4L2_MAX_EXPOSURE,
+        V4L2_EXPOSURE_INCREMENT,
+    )
+    has_exposure: bool = False
+    auto_exposure: bool = False
+    min_exposure: int = V4L2_MIN_EXPOSURE
+    max_exposure: int = V4L2_MAX_EXPOSURE
+    binned_view: bool = False
+    save_subfolder: str | None = None
+
+    @property
+    def save_path(self) -> Path:
+        if self.save_subfolder is None:
+            return self.save_folder
+        return self.save_folder / self.save_subfolder
+
+    def bit_depth(self) -> int:
+        return self.pixel_format.bit_depth if self.pixel_format is not None else 8
+
+    def dynamic_range(self) -> int:
+        return 2 ** self.bit_depth() - 1
+
+
+def get_envi_header(state: V4L2CameraState) -> dict:
+    header = {
+        'samples': state.width,
+        'lines': state.height,
+        'bands': 1,
+        'interleave': 'bsq',
+        'byte order': 0,
+        'data type': 1 if state.pixel_format.dtype == np.uint8 else 12,
+        'sensor type': state.card,
+        'bit depth': f"{state.bit_depth()} bits",
+        'pixel format': state.pixel_format.fourcc.strip(),
+        'acquisition time': datetime.now().isoformat(),
+        'exposure time (ms)': f"{state.current_exposure / 1000:g}",
+    }
+    if state.pixel_format.cfa_shape != (1, 1):
+        header['filter array size'] = "x".join(map(str, state.pixel_format.cfa_shape))
+        header['description'] = 'Bayer mosaic image snapshot.'
+    return header
+
+
+def read_exposure_control(io: V4L2IO, fd: int) -> tuple[tuple[int, int, int], int] | None:
+    """
+    Returns the (min, max, step) range and the value of the absolute
+    exposure control of an open device, in microseconds, or None if the
+    device has no such control.
+    """
+    query = v4l2_queryctrl(id=V4L2_CID_EXPOSURE_ABSOLUTE)
+    try:
+        io.ioctl(fd, VIDIOC_QUERYCTRL, query)
+    except OSError:
+        return None
+    control = v4l2_control(id=V4L2_CID_EXPOSURE_ABSOLUTE)
+    io.ioctl(fd, VIDIOC_G_CTRL, control)
+    exposure_range = (
+        query.minimum * V4L2_EXPOSURE_UNIT_US,
+        query.maximum * V4L2_EXPOSURE_UNIT_US,
+        max(query.step, 1) * V4L2_EXPOSURE_UNIT_US,
+    )
+    return exposure_range, control.value * V4L2_EXPOSURE_UNIT_US
+
+
+def query_exposure(device: str, io: V4L2IO | None = None) -> tuple[tuple[int, int, int], int] | None:
+    """
+    Opens a device only to read its exposure control, e.g. while another
+    process or library streams from it.
+    """
+    io = io or V4L2IO()
+    fd = io.open(device)
+    try:
+        return read_exposure_control(io=io, fd=fd)
+    finally:
+        io.close(fd)
+
+
+def resolve_device(device_id: str | None) -> str:
+    """
+    Returns the /dev/video* node of a device identifier from the discovery,
+    or of the first device streaming a supported raw format if None.
+    """
+    from camera_visualizer.camera_interface.discovery import (
+        V4L2_BY_ID,
+        DeviceDiscovery,
+    )
+    if device_id is not None:
+        if device_id.startswith("/dev/"):
+            return device_id
+        if (V4L2_BY_ID / device_id).exists():
+            return os.path.realpath(V4L2_BY_ID / device_id)
+    for device in DeviceDiscovery().devices():
+        if device.backend != "v4l2" or device.path is None:
+            continue
+        if device_id is not None and device.device_id == device_id:
+            return device.path
+        if device_id is None and any(f in V4L2_PIXEL_FORMATS for f in device.formats):
+            return device.path
+    raise V4L2Error(errno.ENODEV, f"V4L2 device {device_id or ''} not found".strip())
+
+
+class V4L2MmapCamera(Camera):
+    """
+    V4L2 camera streaming raw frames through memory-mapped kernel buffers.
+
+    The device is opened once, and V4L2_BUFFER_COUNT buffers are kept queued
+    while streaming. Raw frames are read-only NumPy views of the mapped
+    buffers: the buffer of a frame is given back to the driver by the next
+    call to get_raw_frame, so frames must be copied to be kept longer.
+    """
+    io: V4L2IO
+    fd: int | None
+    state: V4L2CameraState
+
+    def __init__(
+        self,
+        width: int | None = None,
+        height: int | None = None,
+        io: V4L2IO | None = None,
+    ):
+        self.io = io or V4L2IO()
+        self.fd = None
+        self.device_id = None
+        self._requested_shape = (height, width)
+        self._buffers = []
+        self._held = None
+        self._timestamp = None
+        self._streaming = False
+        data_path = load_data_path() / "v4l2"
+        data_path.mkdir(parents=True, exist_ok=True)
+        self.state = V4L2CameraState(save_folder=data_path)
+
+    def set_device(self, device_id: str | None) -> None:
+        self.device_id = device_id
+
+    def _ioctl(self, request: int, arg) -> None:
+        self.io.ioctl(self.fd, request, arg)
+
+    def open(self, fps: float) -> None:
+        self.state.device = resolve_device(self.device_id)
+        self.fd = self.io.open(self.state.device)
+        try:
+            cap = v4l2_capability()
+            self._ioctl(VIDIOC_QUERYCAP, cap)
+            caps = cap.device_caps if cap.capabilities & V4L2_CAP_DEVICE_CAPS else cap.capabilities
+            if not caps & V4L2_CAP_VIDEO_CAPTURE or not caps & V4L2_CAP_STREAMING:
+                raise V4L2Error(
+                    errno.ENOTSUP,
+                    f"{self.state.device} does not support streaming capture",
+                )
+            self.state.card = cap.card.decode(errors="replace")
+            self.state.formats = self._enum_formats()
+            if not self.state.formats:
+                raise V4L2Error(
+                    errno.ENOTSUP,
+                    f"{self.state.device} has no supported raw pixel format",
+                )
+            if self.state.pixel_format not in self.state.formats:
+                self.state.pixel_format = max(self.state.formats, key=lambda f: f.bit_depth)
+            self._init_exposure_control()
+            self._start(fps=fps)
+        except Exception:
+            self.close()
+            raise
+
+    def _enum_formats(self) -> list[PixelFormat]:
+        formats = []
+        desc = v4l2_fmtdesc(type=V4L2_BUF_TYPE_VIDEO_CAPTURE)
+        while True:
+            try:
+                self._ioctl(VIDIOC_ENUM_FMT, desc)
+            except OSError as e:
+                if e.errno == errno.EINVAL:
+                    break
+                raise
+            name = fourcc_name(desc.pixelformat)
+            if name in V4L2_PIXEL_FORMATS:
+                formats.append(V4L2_PIXEL_FORMATS[name])
+            desc.index += 1
+        return formats
+
+    def _init_exposure_control(self) -> None:
+        exposure_control = read_exposure_control(io=self.io, fd=self.fd)
+        self.state.has_exposure = exposure_control is not None
+        if exposure_control is None:
+            return
+        self.state.exposure_range, self.state.current_exposure = exposure_control
+        control = v4l2_control(id=V4L2_CID_EXPOSURE_AUTO)
+        try:
+            self._ioctl(VIDIOC_G_CTRL, control)
+            self.state.auto_exposure = control.value != V4L2_EXPOSURE_MANUAL
+        except OSError:
+            self.state.auto_exposure = False
+
+    def _start(self, fps: float) -> None:
+        """
+        Negotiates the format, maps the buffers, queues them and starts the
+        stream.
+        """
+        fmt = v4l2_format(type=V4L2_BUF_TYPE_VIDEO_CAPTURE)
+        self._ioctl(VIDIOC_G_FMT, fmt)
+        height, width = self._requested_shape
+        if width is not None:
+            fmt.fmt.pix.width = width
+        if height is not None:
+            fmt.fmt.pix.height = height
+        fmt.fmt.pix.pixelformat = fourcc(self.state.pixel_format.fourcc)
+        fmt.fmt.pix.field = V4L2_FIELD_NONE
+        self._ioctl(VIDIOC_S_FMT, fmt)
+        # The driver may adjust the format to the closest one supported
+        self.state.pixel_format = V4L2_PIXEL_FORMATS.get(
+            fourcc_name(fmt.fmt.pix.pixelformat),
+            self.state.pixel_format,
+        )
+        self.state.width = fmt.fmt.pix.width
+        self.state.height = fmt.fmt.pix.height
+        self.state.bytes_per_line = fmt.fmt.pix.bytesperline
+
+        parm = v4l2_streamparm(type=V4L2_BUF_TYPE_VIDEO_CAPTURE)
+        parm.parm.capture.timeperframe.numerator = 1000
+        parm.parm.capture.timeperframe.denominator = int(round(fps * 1000))
+        try:
+            self._ioctl(VIDIOC_S_PARM, parm)
+        except OSError:
+            # Not all drivers let the frame rate be set
+            pass
+
+        req = v4l2_requestbuffers(
+            count=V4L2_BUFFER_COUNT,
+            type=V4L2_BUF_TYPE_VIDEO_CAPTURE,
+            memory=V4L2_MEMORY_MMAP,
+        )
+        self._ioctl(VIDIOC_REQBUFS, req)
+        if req.count < 2:
+            raise V4L2Error(errno.ENOMEM, "Not enough V4L2 buffers")
+        for index in range(req.count):
+            buf = v4l2_buffer(
+                index=index,
+                type=V4L2_BUF_TYPE_VIDEO_CAPTURE,
+                memory=V4L2_MEMORY_MMAP,
+            )
+            self._ioctl(VIDIOC_QUERYBUF, buf)
+            self._buffers.append(self.io.mmap(self.fd, buf.length, buf.m.offset))
+            self._ioctl(VIDIOC_QBUF, buf)
+        self._ioctl(VIDIOC_STREAMON, ctypes.c_int(V4L2_BUF_TYPE_VIDEO_CAPTURE))
+        self._streaming = True
+
+    def _stop(self) -> None:
+        if self._streaming:
+            self._ioctl(VIDIOC_STREAMOFF, ctypes.c_int(V4L2_BUF_TYPE_VIDEO_CAPTURE))
+            self._streaming = False
+        self._held = None
+        for buffer in self._buffers:
+            try:
+                buffer.close()
+            except BufferError:
+                # A frame still refers to the buffer, which is unmapped
+                # when the frame is garbage collected
+                pass
+        self._buffers = []
+        if self.fd is not None:
+            req = v4l2_requestbuffers(
+                count=0,
+                type=V4L2_BUF_TYPE_VIDEO_CAPTURE,
+                memory=V4L2_MEMORY_MMAP,
+            )
+            try:
+                self._ioctl(VIDIOC_REQBUFS, req)
+            except OSError:
+                pass
+
+    def close(self) -> None:
+        if self.fd is None:
+            return
+        try:
+            self._stop()
+        finally:
+            self.io.close(self.fd)
+            self.fd = None
+
+    def _requeue(self) -> None:
+        if self._held is None:
+            return
+        self._ioctl(VIDIOC_QBUF, self._held)
+        self._held = None
+
+    def get_raw_frame(self, fps: float) -> np.ndarray:
+        """
+        Returns the next frame as a read-only view of its mapped buffer,
+        valid until the next call.
+        """
+        self._requeue()
+        if not self.io.wait(self.fd, V4L2_TIMEOUT_S):
+            raise V4L2Error(errno.ETIMEDOUT, "Timeout waiting for a V4L2 frame")
+        buf = v4l2_buffer(type=V4L2_BUF_TYPE_VIDEO_CAPTURE, memory=V4L2_MEMORY_MMAP)
+        self._ioctl(VIDIOC_DQBUF, buf)
+        self._held = buf
+        self._timestamp = buf.timestamp.tv_sec + buf.timestamp.tv_usec * 1e-6
+        dtype = np.dtype(self.state.pixel_format.dtype)
+        row = self.state.bytes_per_line // dtype.itemsize
+        frame = np.frombuffer(
+            self._buffers[buf.index],
+            dtype=dtype,
+            count=row * self.state.height,
+        )
+        return frame.reshape(self.state.height, row)[:, :self.state.width]
+
+    def frame_timestamp(self) -> float | None:
+        return self._timestamp
+
+    def get_view(self, frame: np.ndarray) -> np.ndarray:
+        """
+        Returns the normalized frame, or the mean of each filter array period
+        for a monochrome view of a Bayer frame.
+        """
+        view = frame.astype(np.float32)
+        view /= self.state.dynamic_range()
+        rows, cols = self.cfa_shape()
+        if self.state.binned_view and (rows, cols) != (1, 1):
+            height = view.shape[0] // rows * rows
+            width = view.shape[1] // cols * cols
+            view = view[:height, :width].reshape(
+                height // rows, rows, width // cols, cols
+            ).mean(axis=(1, 3))
+        return view
+
+    def shape(self) -> tuple[int, int]:
+        return self.state.height, self.state.width
+
+    def cfa_shape(self) -> tuple[int, int]:
+        if self.state.pixel_format is None:
+            return 1, 1
+        return self.state.pixel_format.cfa_shape
+
+    def bit_depth(self) -> int:
+        return self.state.bit_depth()
+
+    def toggle_bit_depth(self) -> None:
+        """
+        Switches to the next supported format with a different bit depth,
+        restarting the stream.
+        """
+        depths = sorted({f.bit_depth for f in self.state.formats})
+        if len(depths) < 2:
+            return
+        current = self.state.bit_depth()
+        target = depths[(depths.index(current) + 1) % len(depths)]
+        self.state.pixel_format = next(
+            f for f in self.state.formats if f.bit_depth == target
+        )
+        if self.fd is not None:
+            self._stop()
+            self._start(fps=self._fps())
+
+    def _fps(self) -> float:
+        parm = v4l2_streamparm(type=V4L2_BUF_TYPE_VIDEO_CAPTURE)
+        try:
+            self._ioctl(VIDIOC_G_PARM, parm)
+        except OSError:
+            return V4L2_DEFAULT_FPS_RANGE[1]
+        period = parm.parm.capture.timeperframe
+        if period.numerator == 0:
+            return V4L2_DEFAULT_FPS_RANGE[1]
+        return period.denominator / period.numerator
+
+    def exposure(self) -> int:
+        return self.state.current_exposure
+
+    def exposure_range(self) -> tuple[int, int, int]:
+        return self.state.exposure_range
+
+    def fps_range(self) -> tuple[int, int, int]:
+        return V4L2_DEFAULT_FPS_RANGE
+
+    def set_exposure(self, exposure: int) -> bool:
+        if not self.state.has_exposure:
+            return False
+        low, high, _ = self.state.exposure_range
+        if not low <= exposure <= high:
+            return False
+        control = v4l2_control(
+            id=V4L2_CID_EXPOSURE_ABSOLUTE,
+            value=int(exposure // V4L2_EXPOSURE_UNIT_US),
+        )
+        self._ioctl(VIDIOC_S_CTRL, control)
+        self.state.current_exposure = control.value * V4L2_EXPOSURE_UNIT_US
+        return True
+
+    def is_auto_exposure(self) -> bool:
+        return self.state.auto_exposure
+
+    def toggle_auto_exposure(self) -> None:
+        value = V4L2_EXPOSURE_AUTO if not self.state.auto_exposure else V4L2_EXPOSURE_MANUAL
+        try:
+            self._ioctl(VIDIOC_S_CTRL, v4l2_control(id=V4L2_CID_EXPOSURE_AUTO, value=value))
+        except OSError:
+            # Many sensors only have a manual exposure
+            return
+        self.state.auto_exposure = not self.state.auto_exposure
+
+    def init_exposure(self, max_exposure: int) -> None:
+        low, high, _ = self.state.exposure_range
+        self.state.max_exposure = min(high, max_exposure)
+        self.state.min_exposure = low
+
+    def adjust_exposure(self) -> int:
+        return int((self.state.max_exposure + self.state.min_exposure) // 2)
+
+    def check_exposure(self, frame: np.ndarray) -> bool:
+        """
+        Binary search of the exposure keeping the saturated pixels under
+        0.1% of the frame.
+        """
+        max_saturation = frame.size // 1000
+        saturated = np.count_nonzero(frame >= self.state.dynamic_range())
+        if saturated > max_saturation:
+            self.state.max_exposure = self.state.current_exposure - 1
+        else:
+            self.state.min_exposure = self.state.current_exposure + 1
+        step = self.state.exposure_range[2]
+        return (
+            not self.state.has_exposure
+            or self.state.max_exposure - self.state.min_exposure <= 2 * step
+        )
+
+    def toggle_view(self) -> None:
+        self.state.binned_view = not self.state.binned_view
+
+    def get_envi_options(self) -> dict:
+        return get_envi_header(state=self.state)
+
+    def set_save_subfolder(self, subfolder: str) -> None:
+        self.state.save_subfolder = subfolder
+        self.state.save_path.mkdir(parents=False, exist_ok=True)
+
+    def save_folder(self) -> Path:
+        return self.state.save_path
+
+    def exception_type(self) -> Type[Exception]:
+        return OSError
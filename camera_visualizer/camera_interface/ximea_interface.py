@@ -8,10 +8,16 @@ from pathlib import Path
 from ximea import xiapi
 
 from camera_visualizer.camera_interface.mock_interface import Camera
+from camera_visualizer.camera_interface.ximea_mosaic import (
+    XIMEA_HEIGHT,
+    XIMEA_MOSAIC_C,
+    XIMEA_MOSAIC_R,
+    XIMEA_WAVELENGTHS,
+    XIMEA_WIDTH,
+    get_images,
+)
 from camera_visualizer.paths import load_data_path
 
-XIMEA_MOSAIC_R = 4
-XIMEA_MOSAIC_C = 4
 XIMEA_MIN_EXPOSURE = 7_000
 XIMEA_MAX_EXPOSURE = 499_950
 XIMEA_EXPOSURE_INCREMENT = 10
@@ -20,8 +26,6 @@ XIMEA_FPS_MAX = 170
 XIMEA_FPS_INCREMENT = 1
 XIMEA_DYN_RANGE_10BIT = 1023
 XIMEA_DYN_RANGE_8BIT = 255
-XIMEA_HEIGHT = 1088
-XIMEA_WIDTH = 2048
 
 
 @dataclass
@@ -59,41 +63,8 @@ class CameraState:
         return 10 if self.bit_depth_10bits else 8
 
 
-def demosaic(arr: np.ndarray) -> np.ndarray:
-    out = np.empty(
-        (
-            arr.shape[0] // XIMEA_MOSAIC_R,
-            arr.shape[1] // XIMEA_MOSAIC_C,
-            XIMEA_MOSAIC_R * XIMEA_MOSAIC_C,
-        ),
-        dtype=arr.dtype,
-    )
-    for ii in range(XIMEA_MOSAIC_R):
-        for jj in range(XIMEA_MOSAIC_C):
-            idx = jj + XIMEA_MOSAIC_C * (XIMEA_MOSAIC_R - 1 - ii)
-            out[:, :, idx] = arr[ii::XIMEA_MOSAIC_R, jj::XIMEA_MOSAIC_R]
-    return out
-
-
-def demosaic_tiled(arr: np.ndarray):
-    out = []
-    for ii in range(XIMEA_MOSAIC_R):
-        out_list = []
-        for jj in range(XIMEA_MOSAIC_C):
-            idx = jj + XIMEA_MOSAIC_C * (XIMEA_MOSAIC_R - 1 - ii)
-            out_list.append(arr[:, :, idx])
-        out.append(out_list)
-    return np.block(out)
-
-
 def get_envi_header(state: CameraState) -> dict:
-    wl = [
-        [800, 820, 840, 860],
-        [720, 740, 760, 780],
-        [655, 660, 680, 700],
-        [595, 610, 625, 640],
-    ]
-    wl_flat = [w for wa in wl for w in wa]
+    wl_flat = [w for wa in XIMEA_WAVELENGTHS for w in wa]
     data_type = 12 if state.bit_depth_10bits else 1
     bit_depth = "10 bits" if state.bit_depth_10bits else "8 bits"
     return {
@@ -129,17 +100,12 @@ def get_envi_header(state: CameraState) -> dict:
     }
 
 
-def get_images(
-    frame: np.ndarray,
-    demosaic_flag: bool,
-    dynamic_range: int,
+def get_raw_frame(
+    cam: xiapi.Camera,
+    img: xiapi.Image,
 ) -> np.ndarray:
-    frame_normalized = np.array(frame, dtype=np.float32) / dynamic_range
-    if not demosaic_flag:
-        return frame_normalized
-    dem = demosaic(arr=frame_normalized)
-    tiles = demosaic_tiled(arr=dem)
-    return tiles
+    cam.get_image(img)
+    return img.get_image_data_numpy()
 
 
 def get_frame(
@@ -147,8 +113,7 @@ def get_frame(
     img: xiapi.Image,
     state: CameraState,
 ) -> tuple[np.ndarray, np.ndarray]:
-    cam.get_image(img)
-    frame = img.get_image_data_numpy()
+    frame = get_raw_frame(cam=cam, img=img)
     frame_view = get_images(
         frame=frame,
         demosaic_flag=state.demosaic,
@@ -221,6 +186,9 @@ class XimeaCamera(Camera):
         )
         self.state = state
 
+    def set_device(self, device_id: str | None) -> None:
+        self.cam = xiapi.Camera(dev_id=int(device_id or 0))
+
     def open(self, fps: float):
         self.cam.open_device()
         self.toggle_bit_depth()     # Set initial bit depth to 10 bits
@@ -238,18 +206,29 @@ class XimeaCamera(Camera):
     def bit_depth(self) -> int:
         return self.state.bit_depth
 
-    def get_frame(self, fps: float) -> tuple[np.ndarray, np.ndarray]:
+    def get_raw_frame(self, fps: float) -> np.ndarray:
         if self.img is None:
             raise ValueError("Camera was not opened. Run self.open() before this operation.")
-        return get_frame(
-            cam=self.cam,
-            img=self.img,
-            state=self.state,
+        return get_raw_frame(cam=self.cam, img=self.img)
+
+    def frame_timestamp(self) -> float | None:
+        if self.img is None:
+            return None
+        return self.img.tsSec + self.img.tsUSec * 1e-6
+
+    def get_view(self, frame: np.ndarray) -> np.ndarray:
+        return get_images(
+            frame=frame,
+            demosaic_flag=self.state.demosaic,
+            dynamic_range=self.state.dynamic_range,
         )
 
     def shape(self) -> tuple[int, int]:
         return XIMEA_HEIGHT, XIMEA_WIDTH
 
+    def cfa_shape(self) -> tuple[int, int]:
+        return XIMEA_MOSAIC_R, XIMEA_MOSAIC_C
+
     def exposure(self) -> int:
         return int(self.state.current_exposure)
 
@@ -0,0 +1,73 @@
+import numpy as np
+
+XIMEA_MOSAIC_R = 4
+XIMEA_MOSAIC_C = 4
+XIMEA_HEIGHT = 1088
+XIMEA_WIDTH = 2048
+
+# Wavelengths (in nm) of the 4x4 filter array, in row-major order
+XIMEA_WAVELENGTHS = [
+    [800, 820, 840, 860],
+    [720, 740, 760, 780],
+    [655, 660, 680, 700],
+    [595, 610, 625, 640],
+]
+
+
+def band_index(ii: int, jj: int) -> int:
+    """
+    Band of the demosaiced cube for the pixel (ii, jj) of a mosaic tile.
+    """
+    return jj + XIMEA_MOSAIC_C * (XIMEA_MOSAIC_R - 1 - ii)
+
+
+def band_wavelengths() -> list[int]:
+    """
+    Wavelengths (in nm) of the bands of the demosaiced cube.
+    """
+    wavelengths = [0] * (XIMEA_MOSAIC_R * XIMEA_MOSAIC_C)
+    for ii in range(XIMEA_MOSAIC_R):
+        for jj in range(XIMEA_MOSAIC_C):
+            wavelengths[band_index(ii, jj)] = XIMEA_WAVELENGTHS[ii][jj]
+    return wavelengths
+
+
+def demosaic(arr: np.ndarray, out: np.ndarray | None = None) -> np.ndarray:
+    if out is None:
+        out = np.empty(
+            (
+                arr.shape[0] // XIMEA_MOSAIC_R,
+                arr.shape[1] // XIMEA_MOSAIC_C,
+                XIMEA_MOSAIC_R * XIMEA_MOSAIC_C,
+            ),
+            dtype=arr.dtype,
+        )
+    for ii in range(XIMEA_MOSAIC_R):
+        for jj in range(XIMEA_MOSAIC_C):
+            idx = band_index(ii, jj)
+            out[:, :, idx] = arr[ii::XIMEA_MOSAIC_R, jj::XIMEA_MOSAIC_R]
+    return out
+
+
+def demosaic_tiled(arr: np.ndarray):
+    out = []
+    for ii in range(XIMEA_MOSAIC_R):
+        out_list = []
+        for jj in range(XIMEA_MOSAIC_C):
+            idx = band_index(ii, jj)
+            out_list.append(arr[:, :, idx])
+        out.append(out_list)
+    return np.block(out)
+
+
+def get_images(
+    frame: np.ndarray,
+    demosaic_flag: bool,
+    dynamic_range: int,
+) -> np.ndarray:
+    frame_normalized = np.array(frame, dtype=np.float32) / dynamic_range
+    if not demosaic_flag:
+        return frame_normalized
+    dem = demosaic(arr=frame_normalized)
+    tiles = demosaic_tiled(arr=dem)
+    return tiles
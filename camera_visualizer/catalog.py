@@ -0,0 +1,437 @@
+import argparse
+import os
+import sqlite3
+import time
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import closing
+from dataclasses import astuple, dataclass, fields
+from datetime import date, datetime, timedelta
+from pathlib import Path
+
+from camera_visualizer.paths import load_data_path
+from camera_visualizer.session import (
+    SessionReader,
+    SessionSummary,
+    is_session,
+)
+
+CATALOG_FILENAME = "catalog.sqlite"
+CATALOG_TIMEOUT_S = 10.0
+CATALOG_CHUNK_SIZE = 16
+CATALOG_SCHEMA = """
+CREATE TABLE IF NOT EXISTS sessions (
+    path TEXT PRIMARY KEY,
+    camera TEXT NOT NULL,
+    format TEXT NOT NULL,
+    frames INTEGER NOT NULL,
+    width INTEGER,
+    height INTEGER,
+    dtype TEXT,
+    start TEXT,
+    end TEXT,
+    exposure_min REAL,
+    exposure_max REAL,
+    bit_depth_min INTEGER,
+    bit_depth_max INTEGER,
+    bytes INTEGER NOT NULL,
+    files INTEGER NOT NULL,
+    segments INTEGER NOT NULL,
+    updated REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS sessions_camera_start ON sessions (camera, start);
+CREATE INDEX IF NOT EXISTS sessions_start ON sessions (start);
+CREATE INDEX IF NOT EXISTS sessions_end ON sessions (end);
+"""
+
+
+@dataclass
+class CatalogEntry:
+    """
+    A recorded session in the catalog. The path is relative to the data path
+    when the session is under it, and the camera is the name of its parent
+    folder (e.g. ximea). Exposures are in milliseconds.
+    """
+    path: str
+    camera: str
+    format: str
+    frames: int
+    width: int | None
+    height: int | None
+    dtype: str | None
+    start: str | None
+    end: str | None
+    exposure_min: float | None
+    exposure_max: float | None
+    bit_depth_min: int | None
+    bit_depth_max: int | None
+    bytes: int
+    files: int
+    segments: int
+    updated: float
+
+    def summary(self) -> str:
+        settings = []
+        if self.bit_depth_min is not None:
+            settings.append(_range_label(self.bit_depth_min, self.bit_depth_max, " bit"))
+        if self.exposure_min is not None:
+            settings.append(_range_label(self.exposure_min, self.exposure_max, " ms"))
+        return (
+            f"{self.path}: {self.frames} frames, {self.width}x{self.height} "
+            f"{self.format}, {', '.join(settings + [''])}"
+            f"{self.start or '?'} - {self.end or '?'}, "
+            f"{self.bytes / 2 ** 20:.1f} MB in {self.files} files"
+        )
+
+
+def _range_label(low: float, high: float, unit: str) -> str:
+    if low == high:
+        return f"{low:g}{unit}"
+    return f"{low:g}-{high:g}{unit}"
+
+
+def folder_size(folder: Path, exclude: set[str] | None = None) -> tuple[int, int]:
+    """
+    Returns the total size and number of the files of a session, including
+    the files of its segments, except those of the excluded subfolders.
+    """
+    size, n_files = 0, 0
+    for root, subfolders, names in os.walk(folder):
+        if exclude and root == str(folder):
+            subfolders[:] = [name for name in subfolders if name not in exclude]
+        for name in names:
+            try:
+                size += os.stat(os.path.join(root, name)).st_size
+            except OSError:
+                continue
+            n_files += 1
+    return size, n_files
+
+
+def catalog_entry(folder: Path, root: Path) -> CatalogEntry:
+    """
+    Describes a session from its manifest. Sessions recorded without a
+    summary (or without a manifest) are described from the metadata of
+    their first frame.
+    """
+    folder = Path(folder)
+    reader = SessionReader(folder)
+    try:
+        manifest = reader.manifest or {}
+        n_frames = len(reader)
+        shape = manifest.get("shape")
+        dtype = manifest.get("dtype")
+        if shape is None and n_frames > 0:
+            shape, dtype = reader.frame_shape(), reader.dtype().str
+        if manifest.get("summary") is not None:
+            summary = SessionSummary(**manifest["summary"])
+        else:
+            summary = SessionSummary.from_envi(
+                reader.envi_options() if n_frames > 0 else None
+            )
+            mtime = datetime.fromtimestamp(os.path.getmtime(folder))
+            summary.end = manifest.get("updated") or mtime.isoformat()
+    finally:
+        reader.close()
+    size, n_files = folder_size(folder)
+    return session_entry(
+        folder=folder,
+        root=root,
+        fmt=reader.fmt.value,
+        n_frames=n_frames,
+        shape=shape,
+        dtype=dtype,
+        summary=summary,
+        size=size,
+        n_files=n_files,
+        n_segments=len(manifest.get("segments") or []),
+    )
+
+
+def session_entry(
+    folder: Path,
+    root: Path,
+    fmt: str,
+    n_frames: int,
+    shape: tuple[int, ...] | list[int] | None,
+    dtype: str | None,
+    summary: SessionSummary,
+    size: int,
+    n_files: int,
+    n_segments: int,
+) -> CatalogEntry:
+    """
+    Describes a session from what is known of it, e.g. by the recorder while
+    writing it.
+    """
+    folder = Path(folder).resolve()
+    try:
+        path = folder.relative_to(root.resolve()).as_posix()
+    except ValueError:
+        path = folder.as_posix()
+    return CatalogEntry(
+        path=path,
+        camera=folder.parent.name,
+        format=fmt,
+        frames=n_frames,
+        width=shape[1] if shape is not None and len(shape) > 1 else None,
+        height=shape[0] if shape is not None else None,
+        dtype=dtype,
+        start=summary.start,
+        end=summary.end,
+        exposure_min=summary.exposure_ms[0] if summary.exposure_ms else None,
+        exposure_max=summary.exposure_ms[1] if summary.exposure_ms else None,
+        bit_depth_min=summary.bit_depth[0] if summary.bit_depth else None,
+        bit_depth_max=summary.bit_depth[1] if summary.bit_depth else None,
+        bytes=size,
+        files=n_files,
+        segments=n_segments,
+        updated=time.time(),
+    )
+
+
+def _scan_entry(folder: Path, root: Path) -> CatalogEntry | None:
+    """
+    Describes a session for the rebuild, which skips the sessions that can
+    not be read, whatever the reason, instead of failing.
+    """
+    try:
+        return catalog_entry(folder=folder, root=root)
+    except Exception as e:
+        print(f"Skipping {folder}: {type(e).__name__}: {e}")
+        return None
+
+
+class SessionCatalog:
+    """
+    SQLite catalog of the recorded sessions of the data path, indexed by
+    camera and time, so that sessions can be queried without walking and
+    parsing the session folders.
+
+    The recorder puts its sessions as they are written, and rebuild scans
+    the existing session folders (data/<camera>/<session>) in parallel.
+    Each operation uses its own connection, so that a catalog can be shared
+    between the recording threads.
+    """
+    path: Path
+    root: Path
+
+    def __init__(self, path: Path | None = None):
+        if path is None:
+            path = load_data_path() / CATALOG_FILENAME
+        self.path = Path(path)
+        self.root = self.path.parent
+
+    def _connect(self) -> sqlite3.Connection:
+        self.root.mkdir(parents=True, exist_ok=True)
+        connection = sqlite3.connect(self.path, timeout=CATALOG_TIMEOUT_S)
+        connection.executescript(CATALOG_SCHEMA)
+        return connection
+
+    def _upsert(self, connection: sqlite3.Connection, entries: list[CatalogEntry]) -> None:
+        columns = [f.name for f in fields(CatalogEntry)]
+        connection.executemany(
+            f"INSERT OR REPLACE INTO sessions ({', '.join(columns)}) "
+            f"VALUES ({', '.join('?' * len(columns))})",
+            [astuple(entry) for entry in entries],
+        )
+
+    def add(self, folder: Path) -> CatalogEntry:
+        """
+        Adds or updates a session.
+        """
+        entry = catalog_entry(folder=folder, root=self.root)
+        self.put(entry)
+        return entry
+
+    def put(self, entry: CatalogEntry) -> None:
+        """
+        Adds or updates a session from an entry, without reading the session.
+        """
+        with closing(self._connect()) as connection, connection:
+            self._upsert(connection, [entry])
+
+    def remove(self, path: str) -> None:
+        with closing(self._connect()) as connection, connection:
+            connection.execute("DELETE FROM sessions WHERE path = ?", (path,))
+
+    def session_folders(self) -> list[Path]:
+        return [
+            folder
+            for camera in sorted(self.root.iterdir()) if camera.is_dir()
+            for folder in sorted(camera.iterdir())
+            if folder.is_dir() and is_session(folder)
+        ]
+
+    def rebuild(self, workers: int | None = None) -> int:
+        """
+        Replaces the catalog with the sessions found in the data path, read
+        in parallel. Returns the number of cataloged sessions.
+        """
+        folders = self.session_folders()
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            entries = [
+                entry
+                for entry in executor.map(
+                    _scan_entry,
+                    folders,
+                    [self.root] * len(folders),
+                    chunksize=CATALOG_CHUNK_SIZE,
+                )
+                if entry is not None
+            ]
+        with closing(self._connect()) as connection, connection:
+            connection.execute("DELETE FROM sessions")
+            self._upsert(connection, entries)
+        return len(entries)
+
+    def query(
+        self,
+        camera: str | None = None,
+        fmt: str | None = None,
+        bit_depth: int | None = None,
+        min_exposure: float | None = None,
+        max_exposure: float | None = None,
+        since: datetime | str | None = None,
+        until: datetime | str | None = None,
+        min_frames: int | None = None,
+    ) -> list[CatalogEntry]:
+        """
+        Returns the sessions matching all the given conditions, by start
+        time: recorded with the camera, in the format, at the bit depth,
+        with all their exposures (in ms) within the exposure bounds, and
+        overlapping the time range. A date without a time as until includes
+        that whole day.
+        """
+        conditions, parameters = [], []
+        if camera is not None:
+            conditions.append("camera = ?")
+            parameters.append(camera)
+        if fmt is not None:
+            conditions.append("format = ?")
+            parameters.append(fmt)
+        if bit_depth is not None:
+            conditions.append("bit_depth_min <= ? AND bit_depth_max >= ?")
+            parameters += [bit_depth, bit_depth]
+        if min_exposure is not None:
+            conditions.append("exposure_min >= ?")
+            parameters.append(min_exposure)
+        if max_exposure is not None:
+            conditions.append("exposure_max <= ?")
+            parameters.append(max_exposure)
+        if since is not None:
+            conditions.append("end >= ?")
+            parameters.append(_isoformat(since))
+        if until is not None:
+            if _is_date(until):
+                conditions.append("start < ?")
+                parameters.append(_isoformat(datetime.fromisoformat(until) + timedelta(days=1)))
+            else:
+                conditions.append("start <= ?")
+                parameters.append(_isoformat(until))
+        if min_frames is not None:
+            conditions.append("frames >= ?")
+            parameters.append(min_frames)
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+        with closing(self._connect()) as connection:
+            rows = connection.execute(
+                f"SELECT * FROM sessions {where} ORDER BY start", parameters
+            ).fetchall()
+        return [CatalogEntry(*row) for row in rows]
+
+
+def _is_date(value: datetime | str) -> bool:
+    if isinstance(value, datetime):
+        return False
+    try:
+        date.fromisoformat(value)
+    except ValueError:
+        return False
+    return True
+
+
+def _isoformat(value: datetime | str) -> str:
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return datetime.fromisoformat(value).isoformat()
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Query the catalog of the recorded sessions."
+    )
+    parser.add_argument(
+        "--rebuild",
+        action="store_true",
+        help="Scan the session folders of the data path into a new catalog.",
+    )
+    parser.add_argument(
+        "-j",
+        "--workers",
+        type=int,
+        default=None,
+        help="Number of worker processes of the rebuild.",
+    )
+    parser.add_argument("--camera", type=str, default=None)
+    parser.add_argument("-f", "--format", type=str, default=None)
+    parser.add_argument("--bit-depth", type=int, default=None)
+    parser.add_argument(
+        "--min-exposure",
+        type=float,
+        default=None,
+        help="Minimum exposure time in ms.",
+    )
+    parser.add_argument(
+        "--max-exposure",
+        type=float,
+        default=None,
+        help="Maximum exposure time in ms.",
+    )
+    parser.add_argument(
+        "--since",
+        type=str,
+        default=None,
+        help="ISO date or time, e.g. 2025-08-01.",
+    )
+    parser.add_argument(
+        "--until",
+        type=str,
+        default=None,
+        help="ISO date or time, e.g. 2025-08-31, a date including the whole day.",
+    )
+    parser.add_argument(
+        "--days",
+        type=float,
+        default=None,
+        help="Only the sessions of the last given days.",
+    )
+    parser.add_argument("--min-frames", type=int, default=None)
+    args = parser.parse_args()
+
+    catalog = SessionCatalog()
+    if args.rebuild:
+        start = time.perf_counter()
+        n_sessions = catalog.rebuild(workers=args.workers)
+        elapsed = time.perf_counter() - start
+        print(f"{n_sessions} sessions cataloged in {elapsed:.2f} s")
+    since = args.since
+    if args.days is not None:
+        since = datetime.now() - timedelta(days=args.days)
+    start = time.perf_counter()
+    entries = catalog.query(
+        camera=args.camera,
+        fmt=args.format,
+        bit_depth=args.bit_depth,
+        min_exposure=args.min_exposure,
+        max_exposure=args.max_exposure,
+        since=since,
+        until=args.until,
+        min_frames=args.min_frames,
+    )
+    elapsed = time.perf_counter() - start
+    for entry in entries:
+        print(entry.summary())
+    print(f"{len(entries)} sessions found in {elapsed * 1000:.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
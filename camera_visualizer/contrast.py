@@ -0,0 +1,89 @@
+import numpy as np
+
+from camera_visualizer.views import display_channels
+
+# Pixels of the subsampled view the histogram is computed from
+CONTRAST_SAMPLES = 2 ** 16
+CONTRAST_BINS = 4096
+# Percentiles of the histogram mapped to black and white
+CONTRAST_LOW_PERCENTILE = 0.5
+CONTRAST_HIGH_PERCENTILE = 99.5
+# Weight of the latest frame in the smoothed limits
+CONTRAST_SMOOTHING = 0.1
+# Change of the limits, as a fraction of their span, before the display
+# stretch is updated
+CONTRAST_TOLERANCE = 0.02
+CONTRAST_MIN_SPAN = 8 / CONTRAST_BINS
+
+
+class AutoContrast:
+    """
+    Computes the display limits of a live view from percentiles of its
+    histogram, so that dim bands fill the display range.
+
+    The histogram is an integer count over CONTRAST_BINS bins of a strided
+    subsample of about CONTRAST_SAMPLES pixels, which costs a fraction of a
+    millisecond regardless of the frame size. The percentiles are smoothed
+    over the frames, and the limits used by the display are only updated
+    when the smoothed ones drift by more than CONTRAST_TOLERANCE of their
+    span, so that noise does not make the view flicker.
+    """
+    limits: tuple[float, float]
+
+    def __init__(
+        self,
+        low_percentile: float = CONTRAST_LOW_PERCENTILE,
+        high_percentile: float = CONTRAST_HIGH_PERCENTILE,
+    ):
+        self.low_percentile = low_percentile
+        self.high_percentile = high_percentile
+        self.limits = (0.0, 1.0)
+        self._low = None
+        self._high = None
+
+    def reset(self) -> None:
+        """
+        Forgets the smoothed limits, e.g. when the view changes, so that the
+        next frame sets them directly.
+        """
+        self.limits = (0.0, 1.0)
+        self._low = None
+        self._high = None
+
+    def percentiles(self, view: np.ndarray) -> tuple[float, float]:
+        """
+        Returns the (low, high) percentiles of a view in [0, 1], from the
+        histogram of a subsample of its pixels.
+        """
+        view = display_channels(view)
+        stride = max(int(np.sqrt(view.shape[0] * view.shape[1] / CONTRAST_SAMPLES)), 1)
+        sample = np.multiply(view[::stride, ::stride], CONTRAST_BINS - 1, dtype=np.float32)
+        np.clip(sample, 0, CONTRAST_BINS - 1, out=sample)
+        histogram = np.bincount(sample.astype(np.intp).ravel(), minlength=CONTRAST_BINS)
+        cumulative = np.cumsum(histogram)
+        low, high = np.searchsorted(
+            cumulative,
+            [
+                cumulative[-1] * self.low_percentile / 100,
+                cumulative[-1] * self.high_percentile / 100,
+            ],
+        )
+        return low / (CONTRAST_BINS - 1), min((high + 1) / (CONTRAST_BINS - 1), 1.0)
+
+    def update(self, view: np.ndarray) -> tuple[float, float]:
+        """
+        Adds the histogram of a view, and returns the limits to display it
+        with.
+        """
+        low, high = self.percentiles(view)
+        if self._low is None:
+            self._low, self._high = low, high
+        else:
+            self._low += CONTRAST_SMOOTHING * (low - self._low)
+            self._high += CONTRAST_SMOOTHING * (high - self._high)
+        applied_low, applied_high = self.limits
+        tolerance = CONTRAST_TOLERANCE * (applied_high - applied_low)
+        if abs(self._low - applied_low) > tolerance or abs(self._high - applied_high) > tolerance:
+            high = max(self._high, self._low + CONTRAST_MIN_SPAN)
+            self.limits = (self._low, high)
+        return self.limits
@@ -0,0 +1,339 @@
+import argparse
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from dataclasses import dataclass
+from pathlib import Path
+
+import numpy as np
+import spectral
+
+from camera_visualizer.packing import (
+    PACKED_SUFFIX,
+    PackedFrames,
+    PackedHeader,
+    bit_depth_from_envi,
+    cfa_from_envi,
+)
+from camera_visualizer.serializer import (
+    PER_FRAME_FORMATS,
+    CompressedSink,
+    SaveFormatEnum,
+    envi_cube_header,
+    save_frame,
+)
+from camera_visualizer.session import (
+    SESSION_FILENAME_PREFIX,
+    SessionReader,
+    session_manifest,
+    write_manifest,
+)
+
+CONVERT_CHUNK_SIZE = 64
+CONVERT_PROGRESS_FILE = ".convert_progress.json"
+# Single-file formats preallocated and filled in place by the workers
+PREALLOCATED_FORMATS = (
+    SaveFormatEnum.NUMPY_CUBE,
+    SaveFormatEnum.ENVI_CUBE,
+    SaveFormatEnum.PACKED,
+)
+
+
+@dataclass
+class ConversionReport:
+    session: Path
+    output: Path
+    frames: int = 0
+    bytes_read: int = 0
+    elapsed: float = 0.0
+    skipped_chunks: int = 0
+
+    def summary(self) -> str:
+        mb = self.bytes_read / 2 ** 20
+        elapsed = max(self.elapsed, 1e-9)
+        text = (
+            f"{self.session} -> {self.output}: {self.frames} frames, "
+            f"{mb:.1f} MB in {self.elapsed:.2f} s "
+            f"({self.frames / elapsed:.1f} frames/s, {mb / elapsed:.1f} MB/s)"
+        )
+        if self.skipped_chunks:
+            text += f", {self.skipped_chunks} chunks resumed"
+        return text
+
+
+def chunk_ranges(n_frames: int, chunk_size: int) -> list[tuple[int, int]]:
+    return [
+        (start, min(start + chunk_size, n_frames))
+        for start in range(0, n_frames, chunk_size)
+    ]
+
+
+def _read_progress(output: Path) -> dict:
+    path = output / CONVERT_PROGRESS_FILE
+    if not path.is_file():
+        return {}
+    with open(path, "r") as f:
+        return json.load(f)
+
+
+def _write_progress(output: Path, progress: dict) -> None:
+    path = output / CONVERT_PROGRESS_FILE
+    tmp_path = path.with_suffix(".tmp")
+    with open(tmp_path, "w") as f:
+        json.dump(progress, f)
+    os.replace(tmp_path, path)
+
+
+def _cube_paths(output: Path, fmt: SaveFormatEnum) -> tuple[Path, Path | None]:
+    if fmt == SaveFormatEnum.NUMPY_CUBE:
+        return output / f"{SESSION_FILENAME_PREFIX}.npy", None
+    if fmt == SaveFormatEnum.PACKED:
+        return output / f"{SESSION_FILENAME_PREFIX}{PACKED_SUFFIX}", None
+    return (
+        output / f"{SESSION_FILENAME_PREFIX}.img",
+        output / f"{SESSION_FILENAME_PREFIX}.hdr",
+    )
+
+
+def create_output(
+    output: Path,
+    fmt: SaveFormatEnum,
+    n_frames: int,
+    shape: tuple[int, ...],
+    dtype: np.dtype,
+    envi_options: dict,
+) -> None:
+    """
+    Preallocates the single-file outputs, so that workers can fill their
+    chunks concurrently.
+    """
+    output.mkdir(parents=True, exist_ok=True)
+    if fmt == SaveFormatEnum.NUMPY_CUBE:
+        path, _ = _cube_paths(output, fmt)
+        cube = np.lib.format.open_memmap(
+            path, mode="w+", dtype=dtype, shape=(n_frames, *shape)
+        )
+        del cube
+    elif fmt == SaveFormatEnum.ENVI_CUBE:
+        path, header_path = _cube_paths(output, fmt)
+        with open(path, "wb") as f:
+            f.truncate(n_frames * int(np.prod(shape)) * np.dtype(dtype).itemsize)
+        spectral.envi.write_envi_header(
+            str(header_path),
+            envi_cube_header(
+                envi_options=envi_options,
+                n_frames=n_frames,
+                shape=shape,
+                dtype=dtype,
+            ),
+        )
+    elif fmt == SaveFormatEnum.PACKED:
+        path, _ = _cube_paths(output, fmt)
+        PackedFrames.create(
+            path=path,
+            header=PackedHeader(
+                shape=shape,
+                bit_depth=bit_depth_from_envi(envi_options, dtype),
+                frames=n_frames,
+                cfa=cfa_from_envi(envi_options),
+            ),
+        )
+
+
+def _open_cube(
+    output: Path,
+    fmt: SaveFormatEnum,
+    n_frames: int,
+    shape: tuple[int, ...],
+    dtype: np.dtype,
+) -> np.memmap | PackedFrames:
+    path, _ = _cube_paths(output, fmt)
+    if fmt == SaveFormatEnum.NUMPY_CUBE:
+        return np.load(path, mmap_mode="r+")
+    if fmt == SaveFormatEnum.PACKED:
+        return PackedFrames(path, mode="r+")
+    return np.memmap(path, mode="r+", dtype=dtype, shape=(n_frames, *shape))
+
+
+def convert_chunk(
+    session: Path,
+    output: Path,
+    fmt: SaveFormatEnum,
+    start: int,
+    stop: int,
+    envi_options: dict,
+) -> tuple[int, int, int]:
+    """
+    Converts the frames [start, stop) of a session. Only one frame is held in
+    memory at a time. Returns the chunk range and the number of bytes read.
+    """
+    reader = SessionReader(session)
+    n_read = 0
+    cube = None
+    sink = None
+    if fmt in PREALLOCATED_FORMATS:
+        cube = _open_cube(
+            output=output,
+            fmt=fmt,
+            n_frames=len(reader),
+            shape=reader.frame_shape(),
+            dtype=reader.dtype(),
+        )
+    elif fmt == SaveFormatEnum.COMPRESSED:
+        path = output / f"{SESSION_FILENAME_PREFIX}_{start:06d}.npz"
+        sink = CompressedSink(
+            save_folder=output,
+            filename_prefix=SESSION_FILENAME_PREFIX,
+            path=path.with_suffix(".tmp"),
+        )
+    for index in range(start, stop):
+        frame = reader.read(index)
+        n_read += frame.nbytes
+        if fmt in PER_FRAME_FORMATS:
+            save_frame(
+                frame=np.asarray(frame),
+                save_folder=output,
+                filename_stem=f"{SESSION_FILENAME_PREFIX}_{index:04d}",
+                envi_options=envi_options,
+                fmt=fmt,
+            )
+        elif cube is not None:
+            cube[index] = frame
+        else:
+            sink.write(frame=np.asarray(frame), index=index)
+    if cube is not None:
+        cube.flush()
+    if sink is not None:
+        sink.close()
+        os.replace(sink.path, path)
+    reader.close()
+    return start, stop, n_read
+
+
+def convert_session(
+    session: Path,
+    output: Path,
+    fmt: SaveFormatEnum | str,
+    workers: int | None = None,
+    chunk_size: int = CONVERT_CHUNK_SIZE,
+) -> ConversionReport:
+    """
+    Converts a recorded session to another format with a pool of processes,
+    each streaming one chunk of frames at a time. The chunks already
+    converted by an interrupted run are skipped.
+
+    The compressed format is written as one .npz file per chunk, since a
+    single zip archive cannot be filled concurrently, and each chunk file is
+    only moved in place once complete.
+    """
+    fmt = SaveFormatEnum(fmt)
+    reader = SessionReader(session)
+    n_frames = len(reader)
+    if n_frames == 0:
+        raise ValueError(f"Session {session} has no frames.")
+    shape, dtype = reader.frame_shape(), reader.dtype()
+    envi_options = reader.envi_options()
+    reader.close()
+
+    report = ConversionReport(session=session, output=output)
+    progress = _read_progress(output)
+    expected = {"format": fmt.value, "frames": n_frames, "chunk size": chunk_size}
+    if {k: progress.get(k) for k in expected} != expected:
+        create_output(output, fmt, n_frames, shape, dtype, envi_options)
+        progress = expected | {"done": []}
+        _write_progress(output, progress)
+    done = {tuple(c) for c in progress["done"]}
+    chunks = [c for c in chunk_ranges(n_frames, chunk_size) if c not in done]
+    report.skipped_chunks = len(done)
+
+    start = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = [
+            executor.submit(
+                convert_chunk, session, output, fmt, c[0], c[1], envi_options
+            )
+            for c in chunks
+        ]
+        for future in as_completed(futures):
+            chunk_start, chunk_stop, n_read = future.result()
+            report.frames += chunk_stop - chunk_start
+            report.bytes_read += n_read
+            progress["done"].append([chunk_start, chunk_stop])
+            _write_progress(output, progress)
+    report.elapsed = time.perf_counter() - start
+
+    write_manifest(
+        folder=output,
+        manifest=session_manifest(
+            fmt=fmt,
+            n_frames=n_frames,
+            shape=shape,
+            dtype=dtype,
+            envi_options=envi_options,
+        ),
+    )
+    (output / CONVERT_PROGRESS_FILE).unlink()
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Convert recorded sessions between the supported formats."
+    )
+    parser.add_argument(
+        "sessions",
+        type=Path,
+        nargs="+",
+        help="Session folders, e.g. data/ximea/20250801_101500.",
+    )
+    parser.add_argument(
+        "-f",
+        "--format",
+        type=str,
+        required=True,
+        choices=[e.value for e in SaveFormatEnum],
+        help="Output format.",
+    )
+    parser.add_argument(
+        "-o",
+        "--output",
+        type=Path,
+        default=None,
+        help="Output folder (defaults to a sibling of each session, "
+             "suffixed with the format).",
+    )
+    parser.add_argument(
+        "-j",
+        "--workers",
+        type=int,
+        default=None,
+        help="Number of worker processes (defaults to the number of CPUs).",
+    )
+    parser.add_argument(
+        "--chunk-size",
+        type=int,
+        default=CONVERT_CHUNK_SIZE,
+        help="Number of frames converted by each task.",
+    )
+    args = parser.parse_args()
+
+    for session in args.sessions:
+        if args.output is None:
+            output = session.with_name(f"{session.name}_{args.format}")
+        elif len(args.sessions) > 1:
+            output = args.output / session.name
+        else:
+            output = args.output
+        report = convert_session(
+            session=session,
+            output=output,
+            fmt=args.format,
+            workers=args.workers,
+            chunk_size=args.chunk_size,
+        )
+        print(report.summary())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,293 @@
+import argparse
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from dataclasses import dataclass
+from enum import Enum
+from pathlib import Path
+
+import numpy as np
+import spectral
+
+from camera_visualizer.calibration import (
+    CalibrationKey,
+    CalibrationMaps,
+    CalibrationStore,
+)
+from camera_visualizer.camera_interface.ximea_mosaic import (
+    XIMEA_MOSAIC_C,
+    XIMEA_MOSAIC_R,
+    band_wavelengths,
+    demosaic,
+)
+from camera_visualizer.session import SessionReader
+
+CUBES_PER_TASK = 16
+CUBE_FILENAME_PREFIX = "cube"
+
+
+class InterleaveEnum(str, Enum):
+    BSQ = "bsq"
+    BIL = "bil"
+    BIP = "bip"
+
+
+@dataclass
+class CubeOptions:
+    """
+    Options of the offline cube generation: number of consecutive frames
+    averaged per cube, output interleave, and optional master dark and flat
+    frames (as .npy files with the shape of the raw frames). If calibrate is
+    set, the master frames are selected from the calibration store instead,
+    from the exposure and bit depth of the session.
+    """
+    average: int = 1
+    interleave: InterleaveEnum = InterleaveEnum.BSQ
+    dark: Path | None = None
+    flat: Path | None = None
+    calibrate: bool = False
+
+    @property
+    def float_output(self) -> bool:
+        return (
+            self.average > 1
+            or self.dark is not None
+            or self.flat is not None
+            or self.calibrate
+        )
+
+
+def load_calibration(
+    options: CubeOptions,
+    envi_options: dict,
+) -> CalibrationMaps | None:
+    """
+    Returns the calibration maps of the master dark and flat frames.
+    """
+    if options.dark is not None or options.flat is not None:
+        return CalibrationMaps.from_masters(
+            dark=np.load(options.dark) if options.dark is not None else None,
+            flat=np.load(options.flat) if options.flat is not None else None,
+            cfa_shape=(XIMEA_MOSAIC_R, XIMEA_MOSAIC_C),
+        )
+    if options.calibrate:
+        return CalibrationStore().select(
+            key=CalibrationKey.from_envi_options(
+                camera="ximea",
+                envi_options=envi_options,
+            ),
+            cfa_shape=(XIMEA_MOSAIC_R, XIMEA_MOSAIC_C),
+        )
+    return None
+
+
+def cube_header(
+    envi_options: dict,
+    shape: tuple[int, int, int],
+    average: int,
+) -> dict:
+    wavelengths = band_wavelengths()
+    header = {
+        key: value for key, value in envi_options.items()
+        if key not in (
+            "data type", "header offset", "byte order", "file type", "interleave"
+        )
+    }
+    header.update({
+        "samples": shape[1],
+        "lines": shape[0],
+        "bands": shape[2],
+        "wavelength units": "Nanometers",
+        "wavelength": wavelengths,
+        "band names": [f"{wl} nm" for wl in wavelengths],
+        "frames averaged": average,
+        "description": "Demosaiced hyperspectral cube.",
+        "note": "Bands are sorted by filter array position, from the bottom-left "
+                "to the top-right of the 4x4 tile.",
+    })
+    return header
+
+
+def generate_cubes(
+    session: Path,
+    output: Path,
+    start: int,
+    stop: int,
+    options: CubeOptions,
+    envi_options: dict,
+) -> tuple[int, int, int]:
+    """
+    Writes the cubes [start, stop) of a session. Each worker only holds one
+    accumulator and one cube in memory. Returns the cube range and the number
+    of bytes read.
+    """
+    reader = SessionReader(session)
+    calibration = load_calibration(options=options, envi_options=envi_options)
+    n_read = 0
+    accumulator = None
+    cube = None
+    for cube_index in range(start, stop):
+        first = cube_index * options.average
+        for index in range(first, first + options.average):
+            frame = reader.read(index)
+            n_read += frame.nbytes
+            if not options.float_output:
+                accumulator = np.asarray(frame)
+                break
+            if accumulator is None:
+                accumulator = np.empty(frame.shape, dtype=np.float32)
+            if index == first:
+                accumulator[...] = frame
+            else:
+                accumulator += frame
+        if options.float_output:
+            accumulator /= options.average
+            if calibration is not None:
+                calibration.apply_float(frame=accumulator)
+        cube = demosaic(arr=accumulator, out=cube)
+        spectral.envi.save_image(
+            hdr_file=output / f"{CUBE_FILENAME_PREFIX}_{cube_index:04d}.hdr",
+            image=cube,
+            dtype=cube.dtype,
+            ext=".img",
+            force=True,
+            interleave=options.interleave.value,
+            metadata=cube_header(
+                envi_options=envi_options,
+                shape=cube.shape,
+                average=options.average,
+            ),
+        )
+        if not options.float_output:
+            accumulator = None
+    reader.close()
+    return start, stop, n_read
+
+
+def check_mosaic_session(reader: SessionReader, envi_options: dict) -> None:
+    shape = reader.frame_shape()
+    if (
+        len(shape) != 2
+        or shape[0] % XIMEA_MOSAIC_R != 0
+        or shape[1] % XIMEA_MOSAIC_C != 0
+    ):
+        raise ValueError(f"Frames of shape {shape} are not 4x4 mosaics.")
+    filter_array = envi_options.get("filter array size")
+    if filter_array is not None and filter_array != f"{XIMEA_MOSAIC_R}x{XIMEA_MOSAIC_C}":
+        raise ValueError(f"Session has a {filter_array} filter array, not 4x4.")
+
+
+def process_session(
+    session: Path,
+    output: Path,
+    options: CubeOptions,
+    workers: int | None = None,
+    cubes_per_task: int = CUBES_PER_TASK,
+) -> tuple[int, float]:
+    """
+    Demosaics all the frames of a XIMEA session into ENVI cubes with a pool
+    of processes. Returns the number of cubes and the elapsed time.
+    """
+    reader = SessionReader(session)
+    envi_options = reader.envi_options()
+    check_mosaic_session(reader=reader, envi_options=envi_options)
+    n_cubes = len(reader) // options.average
+    reader.close()
+    if options.calibrate and load_calibration(options, envi_options) is None:
+        raise ValueError(f"No calibration found for session {session}.")
+    output.mkdir(parents=True, exist_ok=True)
+
+    start = time.perf_counter()
+    n_read = 0
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = [
+            executor.submit(
+                generate_cubes,
+                session,
+                output,
+                first,
+                min(first + cubes_per_task, n_cubes),
+                options,
+                envi_options,
+            )
+            for first in range(0, n_cubes, cubes_per_task)
+        ]
+        for future in as_completed(futures):
+            n_read += future.result()[2]
+    elapsed = time.perf_counter() - start
+    mb = n_read / 2 ** 20
+    print(
+        f"{session} -> {output}: {n_cubes} cubes from {mb:.1f} MB in "
+        f"{elapsed:.2f} s ({n_cubes / max(elapsed, 1e-9):.1f} cubes/s, "
+        f"{mb / max(elapsed, 1e-9):.1f} MB/s)"
+    )
+    return n_cubes, elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Generate hyperspectral cubes from XIMEA mosaic sessions."
+    )
+    parser.add_argument("sessions", type=Path, nargs="+", help="Session folders.")
+    parser.add_argument(
+        "-o",
+        "--output",
+        type=Path,
+        default=None,
+        help="Output folder (defaults to a sibling of each session, suffixed "
+             "with '_cubes').",
+    )
+    parser.add_argument(
+        "-i",
+        "--interleave",
+        type=str,
+        choices=[e.value for e in InterleaveEnum],
+        default=InterleaveEnum.BSQ.value,
+    )
+    parser.add_argument(
+        "-a",
+        "--average",
+        type=int,
+        default=1,
+        help="Number of consecutive frames averaged in each cube.",
+    )
+    parser.add_argument("--dark", type=Path, default=None, help="Master dark frame (.npy).")
+    parser.add_argument("--flat", type=Path, default=None, help="Master flat frame (.npy).")
+    parser.add_argument(
+        "--calibrate",
+        action="store_true",
+        help="Correct the frames with the calibration captured for the "
+             "exposure and bit depth of the session.",
+    )
+    parser.add_argument(
+        "-j",
+        "--workers",
+        type=int,
+        default=None,
+        help="Number of worker processes (defaults to the number of CPUs).",
+    )
+    args = parser.parse_args()
+
+    options = CubeOptions(
+        average=max(args.average, 1),
+        interleave=InterleaveEnum(args.interleave),
+        dark=args.dark,
+        flat=args.flat,
+        calibrate=args.calibrate,
+    )
+    for session in args.sessions:
+        if args.output is None:
+            output = session.with_name(f"{session.name}_cubes")
+        elif len(args.sessions) > 1:
+            output = args.output / session.name
+        else:
+            output = args.output
+        process_session(
+            session=session,
+            output=output,
+            options=options,
+            workers=args.workers,
+        )
+
+
+if __name__ == "__main__":
+    main()
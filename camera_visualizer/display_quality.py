@@ -0,0 +1,142 @@
+from dataclasses import dataclass
+
+# Fraction of the display period an update may take before degrading
+DISPLAY_BUDGET_FRACTION = 0.75
+# Fraction of the display period under which an update may upgrade again
+DISPLAY_HEADROOM_FRACTION = 0.3
+# Weight of the latest update in the measured update cost
+DISPLAY_COST_SMOOTHING = 0.2
+# Time over budget before degrading, in seconds
+DISPLAY_DOWNGRADE_HOLD_S = 0.5
+# Time with headroom before upgrading, in seconds, doubled whenever an
+# upgrade has to be undone, up to DISPLAY_UPGRADE_HOLD_MAX_S
+DISPLAY_UPGRADE_HOLD_S = 2.0
+DISPLAY_UPGRADE_HOLD_MAX_S = 30.0
+
+
+@dataclass(frozen=True)
+class DisplayQuality:
+    """
+    A step of the display quality: smooth or fast scaling, decimation of the
+    displayed view, and fraction of the display rate.
+    """
+    name: str
+    smooth: bool = True
+    decimation: int = 1
+    rate: float = 1.0
+
+
+DISPLAY_QUALITY_LEVELS = (
+    DisplayQuality(name="full"),
+    DisplayQuality(name="fast scaling", smooth=False),
+    DisplayQuality(name="half resolution", smooth=False, decimation=2),
+    DisplayQuality(name="quarter resolution", smooth=False, decimation=4),
+    DisplayQuality(name="half rate", smooth=False, decimation=4, rate=0.5),
+    DisplayQuality(name="quarter rate", smooth=False, decimation=4, rate=0.25),
+)
+
+
+class DisplayQualityController:
+    """
+    Adapts the display quality to the cost of the display updates.
+
+    The cost of each update (computing, converting and painting the view) is
+    smoothed and compared with the display period at the current rate. The
+    quality is degraded one step at a time while the updates stay over
+    budget, and upgraded one step when they have enough headroom for long
+    enough. An upgrade that has to be undone doubles the time required for
+    the next one, so that the quality does not oscillate.
+
+    Only the display is affected: frames are still grabbed and recorded at
+    the acquisition rate.
+    """
+    display_fps: float
+    adaptive: bool
+    index: int
+    cost: float | None
+
+    def __init__(
+        self,
+        display_fps: float,
+        adaptive: bool = True,
+        levels: tuple[DisplayQuality, ...] = DISPLAY_QUALITY_LEVELS,
+    ):
+        self.display_fps = display_fps
+        self.adaptive = adaptive
+        self.levels = levels
+        self.index = 0
+        self.cost = None
+        self._upgrade_hold = DISPLAY_UPGRADE_HOLD_S
+        self._over_since = None
+        self._under_since = None
+        self._changed_at = None
+        self._upgraded = False
+
+    @property
+    def quality(self) -> DisplayQuality:
+        return self.levels[self.index]
+
+    def current_fps(self) -> float:
+        return self.display_fps * self.quality.rate
+
+    def period(self) -> float:
+        return 1.0 / self.current_fps()
+
+    def reset(self) -> None:
+        """
+        Forgets the measured cost, e.g. when the camera changes.
+        """
+        self.cost = None
+        self._over_since = None
+        self._under_since = None
+
+    def set_adaptive(self, adaptive: bool) -> None:
+        self.adaptive = adaptive
+        self.index = 0
+        self._upgrade_hold = DISPLAY_UPGRADE_HOLD_S
+        self.reset()
+
+    def update(self, cost: float, now: float) -> bool:
+        """
+        Adds the cost (in seconds) of a display update at time now, and
+        returns True if the quality changed.
+        """
+        if not self.adaptive:
+            return False
+        if self.cost is None:
+            self.cost = cost
+        else:
+            self.cost += DISPLAY_COST_SMOOTHING * (cost - self.cost)
+        if self._upgraded and now - self._changed_at >= DISPLAY_UPGRADE_HOLD_MAX_S:
+            # The last upgrade held, the next ones can be tried sooner again
+            self._upgrade_hold = DISPLAY_UPGRADE_HOLD_S
+        load = self.cost / self.period()
+        if load > DISPLAY_BUDGET_FRACTION and self.index < len(self.levels) - 1:
+            self._under_since = None
+            if self._over_since is None:
+                self._over_since = now
+            if now - self._over_since >= DISPLAY_DOWNGRADE_HOLD_S:
+                if self._upgraded and now - self._changed_at < self._upgrade_hold:
+                    self._upgrade_hold = min(2 * self._upgrade_hold, DISPLAY_UPGRADE_HOLD_MAX_S)
+                self._change(index=self.index + 1, now=now)
+                return True
+        elif load < DISPLAY_HEADROOM_FRACTION and self.index > 0:
+            self._over_since = None
+            if self._under_since is None:
+                self._under_since = now
+            if now - self._under_since >= self._upgrade_hold:
+                self._change(index=self.index - 1, now=now)
+                return True
+        else:
+            self._over_since = None
+            self._under_since = None
+        return False
+
+    def _change(self, index: int, now: float) -> None:
+        self._upgraded = index < self.index
+        self.index = index
+        self._changed_at = now
+        self.reset()
+
+    def summary(self) -> str:
+        return f"Display: {self.quality.name}"
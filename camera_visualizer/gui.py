@@ -1,6 +1,9 @@
+import argparse
 import sys
+import time
 from dataclasses import dataclass
 from datetime import datetime
+from pathlib import Path
 
 import numpy as np
 
@@ -16,29 +19,85 @@ from PyQt5.QtWidgets import (
     QSlider,
     QHBoxLayout,
     QCheckBox,
+    QFileDialog,
+    QProgressBar,
 )
 from PyQt5.QtCore import QTimer, Qt
-from PyQt5.QtGui import QImage, QPixmap
 
+from camera_visualizer.acquisition import Acquisition
+from camera_visualizer.burst import (
+    BURST_DEFAULT_FRAMES,
+    BURST_DEFAULT_MEMORY_MB,
+    BurstCapture,
+    BurstConfig,
+    BurstStateEnum,
+)
+from camera_visualizer.calibration import (
+    CALIBRATION_DEFAULT_FRAMES,
+    MasterKindEnum,
+)
 from camera_visualizer.camera_interface.mock_interface import (
     Camera,
     CameraEnum,
     camera,
 )
-from camera_visualizer.serializer import SaveFormatEnum
+from camera_visualizer.camera_interface.discovery import DISCOVERERS, DeviceDiscovery
+from camera_visualizer.camera_interface.registry import backend_names, get_backend
+from camera_visualizer.camera_interface.ximea_mosaic import XIMEA_MOSAIC_C, XIMEA_MOSAIC_R
+from camera_visualizer.contrast import AutoContrast
+from camera_visualizer.display_quality import DisplayQualityController
+from camera_visualizer.focus import (
+    FOCUS_DEFAULT_ROI,
+    FocusConfig,
+    FocusMetricEnum,
+    overlay_peaking,
+    peaking_color_table,
+    peaking_mask,
+)
+from camera_visualizer.metrics import (
+    add_metrics_arguments,
+    register_acquisition,
+    start_metrics,
+)
+from camera_visualizer.paths import load_data_path
+from camera_visualizer.playback import SessionPlayer
+from camera_visualizer.profiling import (
+    PROFILE_POLL_MS,
+    Profiler,
+    add_profile_arguments,
+    profile_config,
+)
+from camera_visualizer.recorder import PreRollConfig, SegmentConfig
+from camera_visualizer.serializer import SaveFormatEnum, sink_names
+from camera_visualizer.session import is_session
+from camera_visualizer.stacking import (
+    STACK_DEFAULT_FRAMES,
+    StackConfig,
+    StackModeEnum,
+)
+from camera_visualizer.storage import (
+    STORAGE_SAMPLE_PERIOD_S,
+    StorageMonitor,
+    StoragePolicyEnum,
+)
+from camera_visualizer.views import ViewModeEnum, view_to_display
+from camera_visualizer.video_widget import TransformEnum, TrendWidget, VideoWidget
 
 
 EXPOSURE_DEFAULT_RANGE = (1_000, 1_000_000, 100)
 EXPOSURE_DEFAULT_VALUE = 10_000
 FPS_DEFAULT_RANGE = (1, 500, 1)
 FPS_DEFAULT_VALUE = 30
+DISPLAY_FPS_FALLBACK = 60.0
 
 
 @dataclass
 class GuiState:
-    selected_camera: CameraEnum = CameraEnum.MOCK
+    selected_camera: str = CameraEnum.MOCK.value
+    selected_device: str | None = None
     exposure: int = EXPOSURE_DEFAULT_VALUE
     fps: float = FPS_DEFAULT_VALUE
+    display_fps: float = DISPLAY_FPS_FALLBACK
     frame_counter: int = 0
     dropped_frames: int = 0
     recording: bool = False
@@ -46,37 +105,113 @@ class GuiState:
     paused: bool = False
     estimating_exposure: bool = False
     exposure_tries: int = 0
-    recording_format: SaveFormatEnum = SaveFormatEnum.ENVI
+    recording_format: SaveFormatEnum | str = SaveFormatEnum.ENVI
+    display_transform: TransformEnum = TransformEnum.SMOOTH
+    adaptive_display: bool = True
+    auto_contrast: bool = False
     filename_stem: str = "frame"
+    pre_roll_seconds: float = 0.0
+    pre_roll_mb: float | None = None
+    segment_mb: float | None = None
+    segment_seconds: float | None = None
+    burst_frames: int = BURST_DEFAULT_FRAMES
+    burst_memory_mb: float = BURST_DEFAULT_MEMORY_MB
+    storage_policy: StoragePolicyEnum = StoragePolicyEnum.WARN
+    calibrate: bool = False
+    calibration_frames: int = CALIBRATION_DEFAULT_FRAMES
+    stack_mode: StackModeEnum = StackModeEnum.OFF
+    stack_frames: int = STACK_DEFAULT_FRAMES
+    stack_reject_saturated: bool = False
+    stack_record: bool = False
+    view_mode: ViewModeEnum = ViewModeEnum.RAW
+    focus_assist: bool = False
+    focus_metric: FocusMetricEnum = FocusMetricEnum.LAPLACIAN
+    focus_roi: tuple[float, float, float, float] = FOCUS_DEFAULT_ROI
+    focus_peaking: bool = False
 
 
 class VideoPlayer(QWidget):
     camera: Camera
+    acquisition: Acquisition
+    display_quality: DisplayQualityController
+    contrast: AutoContrast
+    burst: BurstCapture | None
+    storage: StorageMonitor
     state: GuiState
-    current_image: QPixmap | None
+    display_buffer: np.ndarray | None
 
     def __init__(
         self,
         fps: float,
         camera_id: CameraEnum | str = CameraEnum.MOCK,
+        display_fps: float | None = None,
+        pre_roll_seconds: float = 0.0,
+        pre_roll_mb: float | None = None,
+        segment_mb: float | None = None,
+        segment_seconds: float | None = None,
+        burst_memory_mb: float = BURST_DEFAULT_MEMORY_MB,
+        storage_policy: StoragePolicyEnum | str = StoragePolicyEnum.WARN,
+        player_name: str = "main",
+        adaptive_display: bool = True,
     ):
         super().__init__()
         self.camera = camera(camera_id=camera_id)
-        self.state = GuiState(selected_camera=camera_id, fps=fps)
-        self.current_image = None
+        if display_fps is None:
+            display_fps = self.screen_refresh_rate()
+        self.state = GuiState(
+            selected_camera=get_backend(camera_id).name,
+            fps=fps,
+            display_fps=display_fps,
+            pre_roll_seconds=pre_roll_seconds,
+            pre_roll_mb=pre_roll_mb,
+            segment_mb=segment_mb,
+            segment_seconds=segment_seconds,
+            burst_memory_mb=burst_memory_mb,
+            storage_policy=StoragePolicyEnum(storage_policy),
+            adaptive_display=adaptive_display,
+        )
+        self.acquisition = Acquisition(
+            camera=self.camera,
+            pre_roll_config=self.pre_roll_config(),
+            segment_config=SegmentConfig(
+                max_mb=self.state.segment_mb,
+                max_seconds=self.state.segment_seconds,
+            ),
+        )
+        register_acquisition(
+            acquisition=self.acquisition,
+            labels=lambda: {"camera": self.state.selected_camera, "player": player_name},
+        )
+        self.burst = None
+        self.storage = StorageMonitor(
+            path=load_data_path(),
+            policy=self.state.storage_policy,
+        )
+        self.display_quality = DisplayQualityController(
+            display_fps=self.state.display_fps,
+            adaptive=self.state.adaptive_display,
+        )
+        self.contrast = AutoContrast()
+        self.display_buffer = None
+        self.players = []
 
         self.setWindowTitle("Camera Video Player")
-        self.label = QLabel("")
+        self.video = VideoWidget()
+        self.video.set_color_table(peaking_color_table())
+        self.video.roi_selected.connect(self.select_focus_roi)
 
         self.play_button = QPushButton("")
         self.play_button.clicked.connect(self.toggle_running)
         self.pause_button = QPushButton("")
         self.pause_button.clicked.connect(self.toggle_pausing)
 
+        self.discovery = DeviceDiscovery()
+        self.camera_choices = []
         self.camera_select = QComboBox()
-        self.camera_select.addItems([e.value for e in CameraEnum])
         self.camera_select.currentIndexChanged.connect(self.choose_camera)
-        self.camera_select.setCurrentText(self.state.selected_camera)
+        self.refresh_button = QPushButton("Refresh")
+        self.refresh_button.clicked.connect(lambda: self.list_cameras(refresh=True))
+        self.list_cameras()
         camera_select = QFormLayout()
         camera_select.addRow("Camera:", self.camera_select)
 
@@ -84,16 +219,36 @@ class VideoPlayer(QWidget):
         play_layout.addWidget(self.play_button)
         play_layout.addWidget(self.pause_button)
         play_layout.addLayout(camera_select)
+        play_layout.addWidget(self.refresh_button)
         
-        self.view_button = QPushButton("Toggle view")
+        self.view_button = QPushButton(f"View: {self.state.view_mode.value}")
         self.view_button.clicked.connect(self.toggle_view)
 
         self.bit_depth_button = QPushButton(f"Toggle bit depth: {self.camera.bit_depth()}")
         self.bit_depth_button.clicked.connect(self.toggle_bit_depth)
 
+        self.smooth_checkbox = QCheckBox("Smooth")
+        self.smooth_checkbox.setChecked(
+            self.state.display_transform == TransformEnum.SMOOTH
+        )
+        self.smooth_checkbox.toggled.connect(self.toggle_smooth_display)
+        self.adaptive_checkbox = QCheckBox("Adaptive")
+        self.adaptive_checkbox.setChecked(self.state.adaptive_display)
+        self.adaptive_checkbox.toggled.connect(self.toggle_adaptive_display)
+        self.contrast_checkbox = QCheckBox("Auto contrast")
+        self.contrast_checkbox.setChecked(self.state.auto_contrast)
+        self.contrast_checkbox.toggled.connect(self.toggle_auto_contrast)
+
+        self.open_session_button = QPushButton("Open session")
+        self.open_session_button.clicked.connect(self.open_session)
+
         view_layout = QHBoxLayout()
         view_layout.addWidget(self.view_button)
         view_layout.addWidget(self.bit_depth_button)
+        view_layout.addWidget(self.smooth_checkbox)
+        view_layout.addWidget(self.adaptive_checkbox)
+        view_layout.addWidget(self.contrast_checkbox)
+        view_layout.addWidget(self.open_session_button)
 
         # FPS and Exposure Inputs
         self.fps_input = QLineEdit("")
@@ -147,16 +302,20 @@ class VideoPlayer(QWidget):
         self.open_label.setStyleSheet("color: red; font-weight: bold")
         self.frame_label = QLabel("")
         self.frame_label.setStyleSheet("color: red; font-weight: bold")
+        self.storage_label = QLabel("")
+        self.display_label = QLabel("")
         warning_layout = QHBoxLayout()
         warning_layout.addWidget(self.recording_label)
         warning_layout.addWidget(self.open_label)
         warning_layout.addWidget(self.frame_label)
+        warning_layout.addWidget(self.storage_label)
+        warning_layout.addWidget(self.display_label)
 
         self.record_button = QPushButton("Record")
         self.record_button.clicked.connect(self.toggle_recording)
 
         self.record_format = QComboBox()
-        self.record_format.addItems([e.value for e in SaveFormatEnum])
+        self.record_format.addItems(sink_names())
         self.record_format.currentIndexChanged.connect(self.set_record_format)
         self.record_format.setCurrentText(self.state.recording_format)
         record_format = QFormLayout()
@@ -164,10 +323,103 @@ class VideoPlayer(QWidget):
         record_filename = QFormLayout()
         record_filename.addRow("Filename:", self.filename_input)
 
+        self.pre_roll_input = QLineEdit(f"{self.state.pre_roll_seconds:g}")
+        self.pre_roll_input.editingFinished.connect(self.update_pre_roll)
+        record_pre_roll = QFormLayout()
+        record_pre_roll.addRow("Pre-roll (s):", self.pre_roll_input)
+
+        self.storage_policy = QComboBox()
+        self.storage_policy.addItems([e.value for e in StoragePolicyEnum])
+        self.storage_policy.setCurrentText(self.state.storage_policy)
+        self.storage_policy.currentIndexChanged.connect(self.set_storage_policy)
+        record_storage_policy = QFormLayout()
+        record_storage_policy.addRow("If disk too slow:", self.storage_policy)
+
         record_layout = QHBoxLayout()
         record_layout.addWidget(self.record_button)
         record_layout.addLayout(record_format)
         record_layout.addLayout(record_filename)
+        record_layout.addLayout(record_pre_roll)
+        record_layout.addLayout(record_storage_policy)
+
+        self.burst_button = QPushButton("Burst")
+        self.burst_button.clicked.connect(self.start_burst)
+        self.burst_input = QLineEdit(f"{self.state.burst_frames:d}")
+        self.burst_input.editingFinished.connect(self.update_burst_frames)
+        burst_frames = QFormLayout()
+        burst_frames.addRow("Burst frames:", self.burst_input)
+        self.burst_progress = QProgressBar()
+        self.burst_progress.setRange(0, 100)
+        self.burst_progress.setValue(0)
+
+        burst_layout = QHBoxLayout()
+        burst_layout.addWidget(self.burst_button)
+        burst_layout.addLayout(burst_frames)
+        burst_layout.addWidget(self.burst_progress)
+
+        self.calibrate_checkbox = QCheckBox("Calibrate")
+        self.calibrate_checkbox.setChecked(self.state.calibrate)
+        self.calibrate_checkbox.toggled.connect(self.toggle_calibration)
+        self.dark_button = QPushButton("Capture dark")
+        self.dark_button.clicked.connect(lambda: self.capture_master(MasterKindEnum.DARK))
+        self.flat_button = QPushButton("Capture flat")
+        self.flat_button.clicked.connect(lambda: self.capture_master(MasterKindEnum.FLAT))
+        self.calibration_label = QLabel("")
+
+        calibration_layout = QHBoxLayout()
+        calibration_layout.addWidget(self.calibrate_checkbox)
+        calibration_layout.addWidget(self.dark_button)
+        calibration_layout.addWidget(self.flat_button)
+        calibration_layout.addWidget(self.calibration_label)
+
+        self.stack_mode = QComboBox()
+        self.stack_mode.addItems([e.value for e in StackModeEnum])
+        self.stack_mode.setCurrentText(self.state.stack_mode)
+        self.stack_mode.currentIndexChanged.connect(self.update_stacking)
+        stack_mode = QFormLayout()
+        stack_mode.addRow("Stack:", self.stack_mode)
+        self.stack_input = QLineEdit(f"{self.state.stack_frames:d}")
+        self.stack_input.editingFinished.connect(self.update_stacking)
+        stack_frames = QFormLayout()
+        stack_frames.addRow("Stack frames:", self.stack_input)
+        self.stack_reject_checkbox = QCheckBox("Reject saturated")
+        self.stack_reject_checkbox.setChecked(self.state.stack_reject_saturated)
+        self.stack_reject_checkbox.toggled.connect(self.update_stacking)
+        self.stack_record_checkbox = QCheckBox("Record stacks")
+        self.stack_record_checkbox.setChecked(self.state.stack_record)
+        self.stack_record_checkbox.toggled.connect(self.update_stacking)
+
+        stack_layout = QHBoxLayout()
+        stack_layout.addLayout(stack_mode)
+        stack_layout.addLayout(stack_frames)
+        stack_layout.addWidget(self.stack_reject_checkbox)
+        stack_layout.addWidget(self.stack_record_checkbox)
+
+        self.focus_checkbox = QCheckBox("Focus assist")
+        self.focus_checkbox.setChecked(self.state.focus_assist)
+        self.focus_checkbox.toggled.connect(self.update_focus)
+        self.focus_metric = QComboBox()
+        self.focus_metric.addItems([e.value for e in FocusMetricEnum])
+        self.focus_metric.setCurrentText(self.state.focus_metric)
+        self.focus_metric.currentIndexChanged.connect(self.update_focus)
+        focus_metric = QFormLayout()
+        focus_metric.addRow("Metric:", self.focus_metric)
+        self.focus_roi_button = QPushButton("Select ROI")
+        self.focus_roi_button.setCheckable(True)
+        self.focus_roi_button.toggled.connect(self.toggle_roi_selection)
+        self.peaking_checkbox = QCheckBox("Peaking")
+        self.peaking_checkbox.setChecked(self.state.focus_peaking)
+        self.peaking_checkbox.toggled.connect(self.toggle_peaking)
+        self.focus_label = QLabel("")
+        self.focus_trend = TrendWidget()
+        self.focus_trend.setVisible(self.state.focus_assist)
+
+        focus_layout = QHBoxLayout()
+        focus_layout.addWidget(self.focus_checkbox)
+        focus_layout.addLayout(focus_metric)
+        focus_layout.addWidget(self.focus_roi_button)
+        focus_layout.addWidget(self.peaking_checkbox)
+        focus_layout.addWidget(self.focus_label)
 
         # Layouts
         control_layout = QFormLayout()
@@ -175,19 +427,32 @@ class VideoPlayer(QWidget):
         control_layout.addRow("Exposure (μs):", layout_exposure)
 
         layout = QVBoxLayout()
-        layout.addWidget(self.label, stretch=40)
+        layout.addWidget(self.video, stretch=40)
         layout.addLayout(play_layout, stretch=0)
         layout.addLayout(view_layout, stretch=0)
         layout.addLayout(warning_layout, stretch=0)
         layout.addLayout(record_layout, stretch=0)
+        layout.addLayout(burst_layout, stretch=0)
+        layout.addLayout(calibration_layout, stretch=0)
+        layout.addLayout(stack_layout, stretch=0)
+        layout.addLayout(focus_layout, stretch=0)
+        layout.addWidget(self.focus_trend, stretch=0)
         layout.addLayout(control_layout, stretch=0)
         layout.addStretch()
         self.setLayout(layout)
 
         self.timer = QTimer()
-        self.timer.timeout.connect(self.update_frame)
+        self.timer.timeout.connect(self.acquire_frame)
         self.timer.start(int(1000 // self.state.fps))
 
+        self.display_timer = QTimer()
+        self.display_timer.timeout.connect(self.update_frame)
+        self.display_timer.start(int(1000 // self.display_quality.current_fps()))
+
+        self.storage_timer = QTimer()
+        self.storage_timer.timeout.connect(self.update_storage)
+        self.storage_timer.start(int(1000 * STORAGE_SAMPLE_PERIOD_S))
+
         self.disable_running()
 
         self.setStyleSheet(
@@ -220,6 +485,13 @@ class VideoPlayer(QWidget):
         )
         self.initial_scale()
 
+    @staticmethod
+    def screen_refresh_rate() -> float:
+        screen = QApplication.primaryScreen()
+        if screen is None or screen.refreshRate() <= 0:
+            return DISPLAY_FPS_FALLBACK
+        return float(screen.refreshRate())
+
     def initial_scale(self) -> None:
         screen = QApplication.primaryScreen()
         size = screen.availableGeometry()
@@ -231,16 +503,24 @@ class VideoPlayer(QWidget):
             initial_w = int(0.9 * size.width())
             initial_h = int(0.9 * size.width())
 
-        self.label.setFixedHeight(int(0.6 * initial_h))
+        self.video.setFixedHeight(int(0.6 * initial_h))
         self.resize(initial_w, initial_h)
 
     def toggle_running(self) -> None:
+        if self.burst_busy():
+            return
         self.disable_running() if self.state.running else self.enable_running()
 
     def enable_running(self):
         try:
             self.camera = camera(camera_id=self.state.selected_camera)
+            self.camera.set_device(device_id=self.state.selected_device)
             self.camera.open(fps=self.state.fps)
+            self.acquisition.reset(camera=self.camera)
+            self.display_quality.reset()
+            self.contrast.reset()
+            if self.state.view_mode == ViewModeEnum.DEMOSAIC:
+                self.camera.toggle_view()
             self.open_label.setText("")
         except (self.camera.exception_type(), ModuleNotFoundError) as e:
             print(e)
@@ -248,11 +528,12 @@ class VideoPlayer(QWidget):
             return
         self.state.running = True
         scale_ratio = self.camera.shape()[1] / self.camera.shape()[0]
-        self.label.setFixedWidth(int(scale_ratio * self.label.height()))
+        self.video.setFixedWidth(int(scale_ratio * self.video.height()))
 
         self.fps_input.setEnabled(False)
         self.fps_slider.setEnabled(False)
         self.camera_select.setEnabled(False)
+        self.refresh_button.setEnabled(False)
         self.init_auto_exposure()
         self.setup_fps_slider(fps_val=self.state.fps)
         exposure = self.camera.exposure()
@@ -262,12 +543,15 @@ class VideoPlayer(QWidget):
         self.play_button.setText("Stop")
 
     def disable_running(self):
+        if self.state.recording:
+            self.toggle_recording()
         if self.state.running:
             self.camera.close()
         self.state.running = False
         self.fps_input.setEnabled(True)
         self.fps_slider.setEnabled(True)
         self.camera_select.setEnabled(True)
+        self.refresh_button.setEnabled(True)
         self.exposure_input.setEnabled(False)
         self.exposure_slider.setEnabled(False)
         self.exposure_button.setEnabled(False)
@@ -284,7 +568,7 @@ class VideoPlayer(QWidget):
         )
         self.disable_pausing()
         self.play_button.setText("Play")
-        self.label.setText("Waiting for image...")
+        self.video.set_text("Waiting for image...")
 
     def toggle_pausing(self) -> None:
         self.disable_pausing() if self.state.paused else self.enable_pausing()
@@ -300,33 +584,324 @@ class VideoPlayer(QWidget):
         self.pause_button.setText("Pause")
 
     def toggle_view(self) -> None:
+        """
+        Cycles through the raw, demosaiced and false color views.
+        """
         if (not self.state.running) or self.state.paused:
             return
-        self.camera.toggle_view()
-        
+        modes = list(ViewModeEnum)
+        mode = modes[(modes.index(self.state.view_mode) + 1) % len(modes)]
+        if ViewModeEnum.DEMOSAIC in (mode, self.state.view_mode):
+            self.camera.toggle_view()
+        self.state.view_mode = mode
+        self.acquisition.false_color = mode == ViewModeEnum.FALSE_COLOR
+        self.acquisition.invalidate_view()
+        self.contrast.reset()
+        self.view_button.setText(f"View: {mode.value}")
+
+    def open_session(self) -> None:
+        """
+        Opens a recorded session in a playback window.
+        """
+        # The XIMEA and TIS cameras have no save folder before recording
+        save_folder = self.camera.save_folder()
+        folder = QFileDialog.getExistingDirectory(
+            self,
+            "Open session",
+            str(save_folder.parent if save_folder is not None else load_data_path()),
+        )
+        if not folder:
+            return
+        folder = Path(folder)
+        if not is_session(folder):
+            self.open_label.setText("No recorded session found.")
+            return
+        player = SessionPlayer(session=folder, display_fps=self.state.display_fps)
+        player.destroyed.connect(lambda: self.players.remove(player))
+        player.setAttribute(Qt.WA_DeleteOnClose)
+        self.players.append(player)
+        player.show()
+
+    def toggle_smooth_display(self) -> None:
+        if self.smooth_checkbox.isChecked():
+            self.state.display_transform = TransformEnum.SMOOTH
+        else:
+            self.state.display_transform = TransformEnum.FAST
+        self.apply_display_quality()
+
+    def toggle_auto_contrast(self) -> None:
+        self.state.auto_contrast = self.contrast_checkbox.isChecked()
+        self.contrast.reset()
+
+    def toggle_adaptive_display(self) -> None:
+        self.state.adaptive_display = self.adaptive_checkbox.isChecked()
+        self.display_quality.set_adaptive(self.state.adaptive_display)
+        self.apply_display_quality()
+
+    def apply_display_quality(self) -> None:
+        """
+        Applies the scaling and rate of the display quality, the smooth
+        scaling being kept only at full quality.
+        """
+        quality = self.display_quality.quality
+        if quality.smooth:
+            self.video.set_transform(self.state.display_transform)
+        else:
+            self.video.set_transform(TransformEnum.FAST)
+        self.display_timer.setInterval(int(1000 // self.display_quality.current_fps()))
+        self.display_label.setText(
+            self.display_quality.summary() if self.state.adaptive_display else ""
+        )
+
     def toggle_bit_depth(self):
         if (not self.state.running) or self.state.paused or self.state.recording:
             return
+        if self.burst_busy():
+            return
         self.camera.toggle_bit_depth()
+        self.contrast.reset()
         self.bit_depth_button.setText(f"Toggle bit depth: {self.camera.bit_depth()}")
 
     def toggle_recording(self):
-        if (not self.state.running) or self.state.paused:
+        if (not self.state.running) or (self.state.paused and not self.state.recording):
+            return
+        if self.burst_busy():
             return
         self.state.recording = not self.state.recording
         if self.state.recording:
             self.record_format.setEnabled(False)
             self.filename_input.setEnabled(False)
+            self.pre_roll_input.setEnabled(False)
+            self.stack_record_checkbox.setEnabled(False)
+            self.stack_mode.setEnabled(not self.acquisition.stack_recording())
             self.state.frame_counter = 0
             self.record_button.setText("Stop Recording")
             self.recording_label.setText("RECORDING")
             timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
             self.camera.set_save_subfolder(subfolder=timestamp)
+            self.storage.reset()
+            self.acquisition.start_recording(fmt=self.state.recording_format)
         else:
+            message = ""
+            try:
+                self.acquisition.stop_recording()
+            except Exception as e:
+                print(f"Recording failed: {e}")
+                message = f"Recording failed: {e}"
             self.record_format.setEnabled(True)
             self.filename_input.setEnabled(True)
+            self.pre_roll_input.setEnabled(True)
+            self.stack_record_checkbox.setEnabled(True)
+            self.stack_mode.setEnabled(True)
             self.record_button.setText("Record")
+            self.recording_label.setText(message)
+
+    def toggle_calibration(self) -> None:
+        self.state.calibrate = self.calibrate_checkbox.isChecked()
+        self.acquisition.calibrate = self.state.calibrate
+        self.acquisition.invalidate_view()
+
+    def capture_master(self, kind: MasterKindEnum) -> None:
+        if (not self.state.running) or self.state.paused or self.state.recording:
+            return
+        if self.burst_busy() or self.acquisition.master_capture is not None:
+            return
+        self.acquisition.start_master(kind=kind, n_frames=self.state.calibration_frames)
+        self.dark_button.setEnabled(False)
+        self.flat_button.setEnabled(False)
+        self.record_button.setEnabled(False)
+
+    def update_calibration(self) -> None:
+        capture = self.acquisition.master_capture
+        if capture is not None:
+            self.calibration_label.setText(
+                f"Capturing {capture.kind.value}: {capture.count}/{capture.n_frames}"
+            )
+            return
+        if not self.dark_button.isEnabled():
+            self.dark_button.setEnabled(True)
+            self.flat_button.setEnabled(True)
+            self.record_button.setEnabled(True)
+        maps = self.acquisition.applied_maps
+        if maps is not None:
+            self.calibration_label.setText(f"Calibrated: {maps.description}")
+        elif self.state.calibrate:
+            self.calibration_label.setText("No calibration for this bit depth")
+        else:
+            self.calibration_label.setText("")
+
+    def update_stacking(self) -> None:
+        try:
+            frames = max(int(self.stack_input.text()), 1)
+        except ValueError:
+            frames = self.state.stack_frames
+        self.stack_input.setText(f"{frames:d}")
+        self.state.stack_mode = StackModeEnum(self.stack_mode.currentText())
+        self.state.stack_frames = frames
+        self.state.stack_reject_saturated = self.stack_reject_checkbox.isChecked()
+        if not self.state.recording:
+            self.state.stack_record = self.stack_record_checkbox.isChecked()
+        self.acquisition.configure_stacking(
+            config=StackConfig(
+                mode=self.state.stack_mode,
+                frames=self.state.stack_frames,
+                reject_saturated=self.state.stack_reject_saturated,
+                record=self.state.stack_record,
+            )
+        )
+
+    def update_focus(self) -> None:
+        self.state.focus_assist = self.focus_checkbox.isChecked()
+        self.state.focus_metric = FocusMetricEnum(self.focus_metric.currentText())
+        config = None
+        if self.state.focus_assist:
+            config = FocusConfig(metric=self.state.focus_metric, roi=self.state.focus_roi)
+        self.acquisition.configure_focus(config=config)
+        self.video.set_roi(self.state.focus_roi if self.state.focus_assist else None)
+        self.focus_trend.set_values(np.zeros(0))
+        self.focus_trend.setVisible(self.state.focus_assist)
+        self.focus_label.setText("")
+
+    def toggle_roi_selection(self) -> None:
+        self.video.set_selecting(self.focus_roi_button.isChecked())
+
+    def select_focus_roi(self, roi: tuple[float, float, float, float]) -> None:
+        """
+        Sets the region of interest of the focus assist, dragged on the
+        video as fractions of the frame.
+        """
+        self.state.focus_roi = roi
+        self.focus_roi_button.setChecked(False)
+        if self.acquisition.focus is not None:
+            self.acquisition.focus.set_roi(roi)
+            self.video.set_roi(roi)
+
+    def toggle_peaking(self) -> None:
+        self.state.focus_peaking = self.peaking_checkbox.isChecked()
+
+    def show_peaking(self) -> bool:
+        """
+        The peaking follows the sensor geometry, so it is not shown over the
+        tiled bands of the demosaiced 4x4 mosaic view.
+        """
+        if not self.state.focus_peaking or self.acquisition.frame is None:
+            return False
+        return not (
+            self.state.view_mode == ViewModeEnum.DEMOSAIC
+            and tuple(self.camera.cfa_shape()) == (XIMEA_MOSAIC_R, XIMEA_MOSAIC_C)
+        )
+
+    def burst_busy(self) -> bool:
+        return self.burst is not None and self.burst.busy()
+
+    def update_burst_frames(self):
+        try:
+            frames = max(int(self.burst_input.text()), 1)
+        except ValueError:
+            frames = self.state.burst_frames
+        self.state.burst_frames = frames
+        self.burst_input.setText(f"{frames:d}")
+
+    def start_burst(self):
+        if (not self.state.running) or self.state.paused or self.state.recording:
+            return
+        if self.burst_busy():
+            return
+        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+        self.camera.set_save_subfolder(subfolder=f"{timestamp}_burst")
+        self.burst = BurstCapture(
+            camera=self.camera,
+            config=BurstConfig(
+                frames=self.state.burst_frames,
+                memory_mb=self.state.burst_memory_mb,
+            ),
+            fmt=self.state.recording_format,
+        )
+        try:
+            self.burst.start()
+        except ValueError as e:
+            self.burst = None
+            self.recording_label.setText(str(e))
+            return
+        self.burst_button.setEnabled(False)
+        self.burst_input.setEnabled(False)
+        self.record_button.setEnabled(False)
+        self.play_button.setEnabled(False)
+        self.recording_label.setText("BURST")
+
+    def update_burst(self) -> bool:
+        """
+        Updates the burst progress, returning True while the burst needs
+        exclusive access to the camera.
+        """
+        if self.burst is None:
+            return False
+        self.burst_progress.setValue(int(100 * self.burst.progress()))
+        if self.burst.state == BurstStateEnum.CAPTURING:
+            self.burst_progress.setFormat("Capturing %p%")
+        elif self.burst.state == BurstStateEnum.FLUSHING:
+            self.burst_progress.setFormat("Saving %p%")
+        if self.burst.busy():
+            return self.burst.owns_camera()
+        if self.burst.state == BurstStateEnum.FAILED:
+            self.recording_label.setText(f"Burst failed: {self.burst.error}")
+        else:
             self.recording_label.setText("")
+        self.burst_progress.setFormat("%p%")
+        self.burst = None
+        self.burst_button.setEnabled(True)
+        self.burst_input.setEnabled(True)
+        self.record_button.setEnabled(True)
+        self.play_button.setEnabled(True)
+        return False
+
+    def set_storage_policy(self):
+        selected_value = self.storage_policy.currentText()
+        self.state.storage_policy = StoragePolicyEnum(selected_value)
+        self.storage.policy = self.state.storage_policy
+
+    def update_storage(self):
+        if not self.state.running or self.acquisition.frame is None:
+            self.storage_label.setText("")
+            return
+        frame_bytes, fps = self.acquisition.recorded_stream()
+        status = self.storage.update(
+            frame_bytes=frame_bytes,
+            fps=fps,
+            writer=self.acquisition.writer,
+        )
+        text = status.summary()
+        if status.warning is not None:
+            text = f"{status.warning}. {text}"
+        self.storage_label.setText(text)
+        if not self.state.recording:
+            return
+        if self.acquisition.writer is not None and self.acquisition.writer.error is not None:
+            # Stopping reports the error of the writer
+            self.toggle_recording()
+            return
+        self.acquisition.set_record_every(status.record_every)
+        if status.stop:
+            self.toggle_recording()
+            self.recording_label.setText(f"Recording stopped: {status.warning}")
+
+    def pre_roll_config(self) -> PreRollConfig:
+        return PreRollConfig(
+            seconds=self.state.pre_roll_seconds,
+            memory_mb=self.state.pre_roll_mb,
+        )
+
+    def update_pre_roll(self):
+        if self.state.recording:
+            return
+        try:
+            seconds = max(float(self.pre_roll_input.text()), 0.0)
+        except ValueError:
+            seconds = self.state.pre_roll_seconds
+        self.pre_roll_input.setText(f"{seconds:g}")
+        if seconds != self.state.pre_roll_seconds:
+            self.state.pre_roll_seconds = seconds
+            self.acquisition.configure_pre_roll(config=self.pre_roll_config())
 
     def init_auto_exposure(self):
         self.exposure_checkbox.setEnabled(True)
@@ -362,70 +937,73 @@ class VideoPlayer(QWidget):
 
     def set_record_format(self):
         selected_value = self.record_format.currentText()
-        self.state.recording_format = SaveFormatEnum(selected_value)
+        self.state.recording_format = selected_value
 
-    def choose_camera(self):
+    def list_cameras(self, refresh: bool = False) -> None:
+        """
+        Lists the devices found by the discovery (cached between launches),
+        and the backends without device discovery.
+        """
         if self.state.running:
             return
-        selected_value = self.camera_select.currentText()
-        self.state.selected_camera = CameraEnum(selected_value)
-
-    @staticmethod
-    def numpy_to_pixmap_format(arr: np.ndarray) -> QImage:
-        arr = np.clip(arr * 255.0, 0, 255).astype(np.uint8)
-        if arr.ndim == 2 or (arr.ndim == 3 and arr.shape[2] == 1):  # Grayscale
-            qimg = QImage(
-                arr.data, 
-                arr.shape[1], 
-                arr.shape[0], 
-                arr.shape[1], 
-                QImage.Format_Grayscale8,
-            )
-        elif arr.ndim == 3:  # RGB
-            arr = arr[..., :3]
-            qimg = QImage(
-                arr.data, 
-                arr.shape[1], 
-                arr.shape[0], 
-                arr.shape[2] * arr.shape[1], 
-                QImage.Format_RGB888,
-            )
-        else:
-            ValueError("Image not displayable")
-        return qimg.copy()
+        devices = self.discovery.devices(refresh=refresh)
+        for backend, error in self.discovery.errors.items():
+            print(f"Discovery of {backend} cameras failed: {error}")
+        self.camera_choices = [(d.backend, d.device_id) for d in devices]
+        labels = [d.label() for d in devices]
+        for name in backend_names():
+            if name not in DISCOVERERS:
+                self.camera_choices.append((name, None))
+                labels.append(name)
+        selected = (self.state.selected_camera, self.state.selected_device)
+        index = next(
+            (
+                ii for ii, choice in enumerate(self.camera_choices)
+                if choice == selected or (
+                    selected[1] is None and choice[0] == selected[0]
+                )
+            ),
+            0,
+        )
+        self.camera_select.blockSignals(True)
+        self.camera_select.clear()
+        self.camera_select.addItems(labels)
+        self.camera_select.blockSignals(False)
+        self.camera_select.setCurrentIndex(index)
+        self.choose_camera()
 
+    def choose_camera(self):
+        if self.state.running:
+            return
+        index = self.camera_select.currentIndex()
+        if not 0 <= index < len(self.camera_choices):
+            return
+        self.state.selected_camera, self.state.selected_device = (
+            self.camera_choices[index]
+        )
 
-    def update_frame(self):
+    def acquire_frame(self):
         if (not self.state.running) or self.state.paused:
             return
+        if self.update_burst():
+            return
         if self.state.estimating_exposure:
             exposure = self.camera.adjust_exposure()
             self.update_exposure(exposure_val=exposure)
         try:
-            frame_save, frame_view = self.camera.get_frame(fps=self.state.fps)
+            frame_save = self.acquisition.grab(fps=self.state.fps)
             self.state.dropped_frames = 0
             self.frame_label.setText("")
         except self.camera.exception_type():
-            frame_save, frame_view = None, None
+            frame_save = None
             self.state.dropped_frames += 1
             date = datetime.now().isoformat()
             self.frame_label.setText(f"[{date}]: Dropped frame")
         if self.state.dropped_frames >= 3:
             self.disable_running()
-        if frame_view is not None:
-            self.current_image = self.numpy_to_pixmap_format(arr=frame_view)
-            pixmap = QPixmap.fromImage(self.current_image)
-            self.label.setPixmap(pixmap.scaled(
-                self.label.size(), Qt.KeepAspectRatio, Qt.SmoothTransformation
-            ))
-        if self.state.recording and frame_save is not None:
-            filename = f"frame_{self.state.frame_counter:04d}"
-            self.camera.save_frame(
-                filename_stem=filename,
-                frame=frame_save,
-                fmt=self.state.recording_format,
-            )
-            self.state.frame_counter += 1
+        self.update_calibration()
+        if self.state.recording:
+            self.state.frame_counter = self.acquisition.frames_recorded()
         if self.state.estimating_exposure and frame_save is not None:
             converged = self.camera.check_exposure(frame=frame_save)
             self.state.estimating_exposure = not converged
@@ -442,6 +1020,38 @@ class VideoPlayer(QWidget):
                 self.exposure_checkbox.blockSignals(False)
                 self.exposure_button.setText("Estimate Exposure Time")
 
+    def update_frame(self):
+        if (not self.state.running) or self.state.paused:
+            return
+        if not self.acquisition.has_new_view():
+            return
+        start = time.perf_counter()
+        frame_view = self.acquisition.view(decimation=self.display_quality.quality.decimation)
+        limits = None
+        if self.state.auto_contrast:
+            limits = self.contrast.update(frame_view)
+        self.display_buffer = view_to_display(
+            view=frame_view,
+            out=self.display_buffer,
+            limits=limits,
+        )
+        peaking = self.show_peaking()
+        if peaking:
+            overlay_peaking(
+                buffer=self.display_buffer,
+                mask=peaking_mask(frame=self.acquisition.frame, cfa_shape=self.camera.cfa_shape()),
+            )
+        self.video.set_frame(self.display_buffer, indexed=peaking and self.display_buffer.ndim == 2)
+        focus = self.acquisition.focus
+        if focus is not None:
+            self.focus_label.setText(focus.summary())
+            self.focus_trend.set_values(focus.trend())
+        # The paint of the previous frame is counted with this update
+        now = time.perf_counter()
+        cost = now - start + self.video.paint_seconds
+        if self.display_quality.update(cost=cost, now=now):
+            self.apply_display_quality()
+
     def update_fps_from_input(self):
         fps_val = self.fps_input.text()
         self.update_fps(fps_val=fps_val)
@@ -541,19 +1151,111 @@ class VideoPlayer(QWidget):
 
 
 def main():
-
-    app = QApplication(sys.argv)
-    try:
-        from camera_visualizer.camera_interface.ximea_interface import XimeaCamera
+    parser = argparse.ArgumentParser(description="Camera video player")
+    parser.add_argument(
+        "--camera",
+        type=str,
+        choices=backend_names(),
+        default=None,
+        help="Camera selected at start (default: ximea if available, else mock).",
+    )
+    parser.add_argument(
+        "--display-fps",
+        type=float,
+        default=None,
+        help="Maximum display rate. Defaults to the screen refresh rate.",
+    )
+    parser.add_argument(
+        "--pre-roll",
+        type=float,
+        default=0.0,
+        help="Seconds of frames kept in memory and saved when recording starts.",
+    )
+    parser.add_argument(
+        "--pre-roll-mb",
+        type=float,
+        default=None,
+        help="Memory budget of the pre-roll buffer in MB.",
+    )
+    parser.add_argument(
+        "--segment-mb",
+        type=float,
+        default=None,
+        help="Roll recordings over to a new segment every given MB.",
+    )
+    parser.add_argument(
+        "--segment-seconds",
+        type=float,
+        default=None,
+        help="Roll recordings over to a new segment every given seconds.",
+    )
+    parser.add_argument(
+        "--burst-memory-mb",
+        type=float,
+        default=BURST_DEFAULT_MEMORY_MB,
+        help="Memory budget of the burst capture in MB.",
+    )
+    parser.add_argument(
+        "--storage-policy",
+        type=str,
+        choices=[e.value for e in StoragePolicyEnum],
+        default=StoragePolicyEnum.WARN.value,
+        help="Action taken when the disk cannot keep up with the recording.",
+    )
+    parser.add_argument(
+        "--no-adaptive-display",
+        action="store_true",
+        help="Keep the display quality when the display cannot keep up.",
+    )
+    add_metrics_arguments(parser)
+    add_profile_arguments(parser)
+    args, qt_args = parser.parse_known_args()
+
+    start_metrics(
+        port=args.metrics_port,
+        host=args.metrics_host,
+        path=args.metrics_file,
+    )
+    app = QApplication(sys.argv[:1] + qt_args)
+    if args.camera is not None:
+        camera_id = args.camera
+    elif get_backend(CameraEnum.XIMEA).available():
         camera_id = CameraEnum.XIMEA
-    except ImportError:
+    else:
         camera_id = CameraEnum.MOCK
-    except Exception as e:
-        raise e
 
-    player = VideoPlayer(camera_id=camera_id, fps=30)
+    player = VideoPlayer(
+        camera_id=camera_id,
+        fps=30,
+        display_fps=args.display_fps,
+        pre_roll_seconds=args.pre_roll,
+        pre_roll_mb=args.pre_roll_mb,
+        segment_mb=args.segment_mb,
+        segment_seconds=args.segment_seconds,
+        burst_memory_mb=args.burst_memory_mb,
+        storage_policy=args.storage_policy,
+        adaptive_display=not args.no_adaptive_display,
+    )
     player.show()
-    sys.exit(app.exec_())
+    if not args.profile:
+        sys.exit(app.exec_())
+
+    # Profiles the GUI running the camera, until enough frames are grabbed
+    profiler = Profiler(config=profile_config(args), name="gui")
+    player.toggle_running()
+    profiler.start()
+
+    def check_profile():
+        if profiler.tick(frames=player.acquisition.frame_index + 1):
+            app.quit()
+
+    profile_timer = QTimer()
+    profile_timer.timeout.connect(check_profile)
+    profile_timer.start(PROFILE_POLL_MS)
+    code = app.exec_()
+    player.disable_running()
+    profiler.stop()
+    sys.exit(code)
 
 
 if __name__ == "__main__":
@@ -1,9 +1,12 @@
+import argparse
 import sys
 
 from PyQt5.QtWidgets import QWidget, QHBoxLayout, QApplication
 
 from camera_visualizer.gui import VideoPlayer
 from camera_visualizer.camera_interface.mock_interface import CameraEnum
+from camera_visualizer.camera_interface.registry import get_backend
+from camera_visualizer.metrics import add_metrics_arguments, start_metrics
 
 
 class DoubleVideoPlayer(QWidget):
@@ -16,8 +19,8 @@ class DoubleVideoPlayer(QWidget):
         camera_b: CameraEnum = CameraEnum.MOCK,
     ):
         super().__init__()
-        self.player_a = VideoPlayer(fps=fps_a, camera_id=camera_a)
-        self.player_b = VideoPlayer(fps=fps_b, camera_id=camera_b)
+        self.player_a = VideoPlayer(fps=fps_a, camera_id=camera_a, player_name="a")
+        self.player_b = VideoPlayer(fps=fps_b, camera_id=camera_b, player_name="b")
         layout = QHBoxLayout()
 
         layout.addWidget(self.player_a)
@@ -27,17 +30,21 @@ class DoubleVideoPlayer(QWidget):
 
 
 def main():
-    app = QApplication(sys.argv)
-    try:
-        from camera_visualizer.camera_interface.ximea_interface import XimeaCamera
+    parser = argparse.ArgumentParser(description="Two camera video players")
+    add_metrics_arguments(parser)
+    args, qt_args = parser.parse_known_args()
+    start_metrics(
+        port=args.metrics_port,
+        host=args.metrics_host,
+        path=args.metrics_file,
+    )
+    app = QApplication(sys.argv[:1] + qt_args)
+    camera_a = CameraEnum.MOCK
+    if get_backend(CameraEnum.XIMEA).available():
         camera_a = CameraEnum.XIMEA
-    except ImportError:
-        camera_a = CameraEnum.MOCK
-    try:
-        from camera_visualizer.camera_interface.tis_interface import TisCamera
+    camera_b = CameraEnum.MOCK
+    if get_backend(CameraEnum.TIS).available():
         camera_b = CameraEnum.TIS
-    except ImportError:
-        camera_b = CameraEnum.MOCK
     player = DoubleVideoPlayer(camera_a=camera_a, camera_b=camera_b)
     player.resize(640, 480)
     player.show()
@@ -0,0 +1,402 @@
+import json
+import os
+import threading
+import time
+from dataclasses import dataclass, field
+from enum import Enum
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Callable, Iterable
+
+from camera_visualizer.acquisition import Acquisition
+
+METRICS_PREFIX = "camera_visualizer"
+METRICS_DEFAULT_HOST = "127.0.0.1"
+METRICS_DEFAULT_PORT = 9464
+METRICS_FILE_PERIOD_S = 5.0
+METRICS_FILE_MAX_MB = 10.0
+METRICS_FILE_BACKUPS = 3
+PROMETHEUS_CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+class MetricTypeEnum(str, Enum):
+    COUNTER = "counter"
+    GAUGE = "gauge"
+
+
+@dataclass(frozen=True)
+class MetricFamily:
+    name: str
+    type: MetricTypeEnum
+    help: str
+
+
+@dataclass
+class Sample:
+    name: str
+    value: float
+    labels: dict[str, str] = field(default_factory=dict)
+
+
+Collector = Callable[[], Iterable[Sample]]
+
+
+def _label_text(labels: dict[str, str]) -> str:
+    if not labels:
+        return ""
+    escaped = (
+        (key, str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n"))
+        for key, value in sorted(labels.items())
+    )
+    return "{" + ",".join(f'{key}="{value}"' for key, value in escaped) + "}"
+
+
+class MetricsRegistry:
+    """
+    Registry of the metrics of the running acquisitions.
+
+    Metrics are pulled from collectors when exported, which read the counters
+    that the acquisition and writer threads already maintain, so that the
+    grab and write paths are neither slowed down nor locked by the export.
+    """
+
+    def __init__(self):
+        self.families = {}
+        self._collectors = []
+        self._lock = threading.Lock()
+
+    def family(self, name: str, type: MetricTypeEnum, help: str) -> str:
+        """
+        Declares a metric, returning its full name.
+        """
+        name = f"{METRICS_PREFIX}_{name}"
+        self.families[name] = MetricFamily(name=name, type=MetricTypeEnum(type), help=help)
+        return name
+
+    def register(self, collector: Collector) -> None:
+        with self._lock:
+            self._collectors.append(collector)
+
+    def unregister(self, collector: Collector) -> None:
+        with self._lock:
+            if collector in self._collectors:
+                self._collectors.remove(collector)
+
+    def collect(self) -> list[Sample]:
+        with self._lock:
+            collectors = list(self._collectors)
+        samples = []
+        for collector in collectors:
+            samples.extend(collector())
+        return samples
+
+    def prometheus_text(self) -> str:
+        """
+        Exports the metrics in the Prometheus text exposition format.
+        """
+        by_name = {}
+        for sample in self.collect():
+            by_name.setdefault(sample.name, []).append(sample)
+        lines = []
+        for name, samples in by_name.items():
+            family = self.families.get(name)
+            if family is not None:
+                lines.append(f"# HELP {name} {family.help}")
+                lines.append(f"# TYPE {name} {family.type.value}")
+            for sample in samples:
+                lines.append(f"{name}{_label_text(sample.labels)} {float(sample.value):.17g}")
+        return "\n".join(lines) + "\n"
+
+    def snapshot(self) -> dict:
+        return {
+            "time": time.time(),
+            "samples": [
+                {"name": s.name, "labels": s.labels, "value": s.value}
+                for s in self.collect()
+            ],
+        }
+
+
+REGISTRY = MetricsRegistry()
+FRAMES_GRABBED = REGISTRY.family(
+    "frames_grabbed_total",
+    MetricTypeEnum.COUNTER,
+    "Frames grabbed from the camera.",
+)
+GRAB_ERRORS = REGISTRY.family(
+    "grab_errors_total",
+    MetricTypeEnum.COUNTER,
+    "Failed frame grabs.",
+)
+FPS = REGISTRY.family(
+    "fps",
+    MetricTypeEnum.GAUGE,
+    "Measured acquisition frame rate.",
+)
+FPS_TARGET = REGISTRY.family(
+    "fps_target",
+    MetricTypeEnum.GAUGE,
+    "Requested acquisition frame rate.",
+)
+EXPOSURE = REGISTRY.family(
+    "exposure_microseconds",
+    MetricTypeEnum.GAUGE,
+    "Exposure time.",
+)
+FOCUS_SCORE = REGISTRY.family(
+    "focus_score",
+    MetricTypeEnum.GAUGE,
+    "Sharpness of the focus assist region of interest.",
+)
+BIT_DEPTH = REGISTRY.family(
+    "bit_depth",
+    MetricTypeEnum.GAUGE,
+    "Bit depth of the frames.",
+)
+RECORDING = REGISTRY.family(
+    "recording",
+    MetricTypeEnum.GAUGE,
+    "1 while recording.",
+)
+FRAMES_RECORDED = REGISTRY.family(
+    "frames_recorded_total",
+    MetricTypeEnum.COUNTER,
+    "Frames written by the current recording.",
+)
+FRAMES_DROPPED = REGISTRY.family(
+    "frames_dropped_total",
+    MetricTypeEnum.COUNTER,
+    "Frames dropped by the current recording, with a full write queue.",
+)
+BYTES_WRITTEN = REGISTRY.family(
+    "bytes_written_total",
+    MetricTypeEnum.COUNTER,
+    "Bytes written by the current recording.",
+)
+WRITE_SECONDS = REGISTRY.family(
+    "write_seconds_total",
+    MetricTypeEnum.COUNTER,
+    "Time spent writing frames by the current recording.",
+)
+WRITE_LATENCY = REGISTRY.family(
+    "write_latency_seconds",
+    MetricTypeEnum.GAUGE,
+    "Write time of the latest frame.",
+)
+QUEUE_DEPTH = REGISTRY.family(
+    "write_queue_depth",
+    MetricTypeEnum.GAUGE,
+    "Frames waiting to be written.",
+)
+QUEUE_SIZE = REGISTRY.family(
+    "write_queue_size",
+    MetricTypeEnum.GAUGE,
+    "Capacity of the write queue.",
+)
+
+
+class AcquisitionCollector:
+    """
+    Collects the metrics of an acquisition, labeled with its camera. The
+    labels are a callable when the camera can change (e.g. in the GUI).
+    """
+
+    def __init__(
+        self,
+        acquisition: Acquisition,
+        labels: dict[str, str] | Callable[[], dict[str, str]],
+    ):
+        self.acquisition = acquisition
+        self.labels = labels
+
+    def __call__(self) -> list[Sample]:
+        acquisition = self.acquisition
+        labels = self.labels() if callable(self.labels) else dict(self.labels)
+        samples = [
+            Sample(FRAMES_GRABBED, acquisition.frame_index + 1, labels),
+            Sample(GRAB_ERRORS, acquisition.grab_errors, labels),
+            Sample(FPS, acquisition.measured_fps or 0.0, labels),
+            Sample(FPS_TARGET, acquisition.fps or 0.0, labels),
+        ]
+        try:
+            samples += [
+                Sample(EXPOSURE, acquisition.camera.exposure(), labels),
+                Sample(BIT_DEPTH, acquisition.camera.bit_depth(), labels),
+            ]
+        except Exception:
+            # Closed camera
+            pass
+        focus = acquisition.focus
+        if focus is not None and focus.score is not None:
+            samples.append(Sample(FOCUS_SCORE, focus.score, labels))
+        writer = acquisition.writer
+        samples.append(Sample(RECORDING, int(writer is not None), labels))
+        if writer is not None:
+            samples += [
+                Sample(FRAMES_RECORDED, writer.frames_written, labels),
+                Sample(FRAMES_DROPPED, writer.dropped, labels),
+                Sample(BYTES_WRITTEN, writer.bytes_written, labels),
+                Sample(WRITE_SECONDS, writer.write_time, labels),
+                Sample(WRITE_LATENCY, writer.last_latency, labels),
+                Sample(QUEUE_DEPTH, writer.queue_depth(), labels),
+                Sample(QUEUE_SIZE, writer.queue_size(), labels),
+            ]
+        return samples
+
+
+def register_acquisition(
+    acquisition: Acquisition,
+    labels: dict[str, str] | Callable[[], dict[str, str]],
+    registry: MetricsRegistry = REGISTRY,
+) -> AcquisitionCollector:
+    collector = AcquisitionCollector(acquisition=acquisition, labels=labels)
+    registry.register(collector)
+    return collector
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    registry: MetricsRegistry
+
+    def do_GET(self) -> None:
+        path = self.path.split("?", 1)[0]
+        if path in ("/", "/metrics"):
+            body = self.registry.prometheus_text().encode("utf-8")
+            content_type = PROMETHEUS_CONTENT_TYPE
+        elif path == "/metrics.json":
+            body = json.dumps(self.registry.snapshot()).encode("utf-8")
+            content_type = "application/json"
+        else:
+            self.send_error(404)
+            return
+        self.send_response(200)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format: str, *args) -> None:
+        pass
+
+
+class MetricsServer:
+    """
+    Serves the metrics of a registry over HTTP, on /metrics in the Prometheus
+    text format and on /metrics.json, from a background thread. Port 0 binds
+    a free port.
+    """
+    host: str
+    port: int
+
+    def __init__(
+        self,
+        registry: MetricsRegistry = REGISTRY,
+        host: str = METRICS_DEFAULT_HOST,
+        port: int = METRICS_DEFAULT_PORT,
+    ):
+        handler = type("MetricsHandler", (_MetricsHandler,), {"registry": registry})
+        self._server = ThreadingHTTPServer((host, port), handler)
+        self._server.daemon_threads = True
+        self.host, self.port = self._server.server_address[:2]
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+
+    @property
+    def url(self) -> str:
+        return f"http://{self.host}:{self.port}/metrics"
+
+    def close(self) -> None:
+        self._server.shutdown()
+        self._server.server_close()
+        self._thread.join()
+
+
+class MetricsFileWriter:
+    """
+    Appends a JSON snapshot of the metrics to a file every period, rotating
+    the file to .1, .2, ... when it exceeds max_mb.
+    """
+    path: Path
+
+    def __init__(
+        self,
+        path: Path,
+        registry: MetricsRegistry = REGISTRY,
+        period_s: float = METRICS_FILE_PERIOD_S,
+        max_mb: float = METRICS_FILE_MAX_MB,
+        backups: int = METRICS_FILE_BACKUPS,
+    ):
+        self.path = Path(path)
+        self.registry = registry
+        self.period_s = period_s
+        self.max_bytes = int(max_mb * 2 ** 20)
+        self.backups = backups
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def _rotate(self) -> None:
+        for index in range(self.backups - 1, 0, -1):
+            source = self.path.with_name(f"{self.path.name}.{index}")
+            if source.exists():
+                os.replace(source, self.path.with_name(f"{self.path.name}.{index + 1}"))
+        if self.backups > 0:
+            os.replace(self.path, self.path.with_name(f"{self.path.name}.1"))
+        else:
+            self.path.unlink()
+
+    def write(self) -> None:
+        line = json.dumps(self.registry.snapshot()) + "\n"
+        if self.path.exists() and self.path.stat().st_size + len(line) > self.max_bytes:
+            self._rotate()
+        with open(self.path, "a") as f:
+            f.write(line)
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.period_s):
+            self.write()
+
+    def close(self) -> None:
+        self._stop.set()
+        self._thread.join()
+        self.write()
+
+
+def start_metrics(
+    port: int | None,
+    host: str = METRICS_DEFAULT_HOST,
+    path: Path | None = None,
+    registry: MetricsRegistry = REGISTRY,
+) -> list:
+    """
+    Starts the HTTP endpoint (if port is not None) and the JSON lines file
+    (if path is not None). Returns the started exporters, to be closed.
+    """
+    exporters = []
+    if port is not None:
+        server = MetricsServer(registry=registry, host=host, port=port)
+        print(f"Serving metrics on {server.url}")
+        exporters.append(server)
+    if path is not None:
+        exporters.append(MetricsFileWriter(path=path, registry=registry))
+    return exporters
+
+
+def add_metrics_arguments(parser) -> None:
+    parser.add_argument(
+        "--metrics-port",
+        type=int,
+        default=None,
+        help=f"Serve Prometheus metrics on this port (e.g. {METRICS_DEFAULT_PORT}).",
+    )
+    parser.add_argument(
+        "--metrics-host",
+        type=str,
+        default=METRICS_DEFAULT_HOST,
+        help="Address of the metrics endpoint (0.0.0.0 for remote dashboards).",
+    )
+    parser.add_argument(
+        "--metrics-file",
+        type=Path,
+        default=None,
+        help="Append metrics snapshots to this JSON lines file.",
+    )
@@ -0,0 +1,314 @@
+import json
+import os
+from dataclasses import dataclass
+from pathlib import Path
+
+import numpy as np
+
+PACKED_MAGIC = b"CVPACKED"
+PACKED_HEADER_SIZE = 512
+PACKED_SUFFIX = ".pkd"
+PACKED_BIT_DEPTHS = (8, 10, 12, 16)
+# Pixels sharing a byte of least significant bits
+PACKED_GROUPS = {
+    10: 4,
+    12: 2,
+}
+
+
+def packed_dtype(bit_depth: int) -> np.dtype:
+    return np.dtype(np.uint8 if bit_depth <= 8 else np.uint16)
+
+
+def packed_frame_bytes(n_pixels: int, bit_depth: int) -> int:
+    """
+    Bytes of a packed frame, e.g. 5 bytes for every 4 pixels of 10 bits.
+    """
+    if bit_depth not in PACKED_BIT_DEPTHS:
+        raise ValueError(f"Bit depth {bit_depth} cannot be packed.")
+    if bit_depth in PACKED_GROUPS:
+        group = PACKED_GROUPS[bit_depth]
+        return n_pixels + -(-n_pixels // group)
+    return n_pixels * packed_dtype(bit_depth).itemsize
+
+
+class FramePacker:
+    """
+    Packs 10 and 12-bit frames densely, with preallocated scratch buffers so
+    that it can run in the recording path at the sensor rate.
+
+    Packed frames are planar: the 8 most significant bits of every pixel,
+    which are an 8-bit version of the frame, followed by the remaining bits
+    of 4 (10-bit) or 2 (12-bit) consecutive pixels per byte, first pixel in
+    the least significant bits. The bits of several pixels are moved at once
+    within 64 or 32-bit words (little-endian), so that every step is a
+    single vectorized NumPy operation. 8 and 16-bit frames are stored as
+    they are.
+    """
+    n_pixels: int
+    bit_depth: int
+
+    def __init__(self, n_pixels: int, bit_depth: int):
+        self.n_pixels = n_pixels
+        self.bit_depth = bit_depth
+        self.frame_bytes = packed_frame_bytes(n_pixels, bit_depth)
+        self.dtype = packed_dtype(bit_depth)
+        self._words = None
+        self._shifted = None
+        self._padded = None
+        group = PACKED_GROUPS.get(bit_depth)
+        if group is None:
+            return
+        word = np.uint64 if group == 4 else np.uint32
+        n_groups = -(-n_pixels // group)
+        self._words = np.empty(n_groups, dtype=word)
+        self._shifted = np.empty(n_groups, dtype=word)
+        if n_pixels % group:
+            self._padded = np.zeros(n_groups * group, dtype=np.uint16)
+
+    def _flat(self, frame: np.ndarray) -> np.ndarray:
+        flat = np.ascontiguousarray(frame, dtype=self.dtype).reshape(-1)
+        if flat.size != self.n_pixels:
+            raise ValueError(f"Frame of {flat.size} pixels instead of {self.n_pixels}.")
+        if self._padded is not None:
+            self._padded[:self.n_pixels] = flat
+            return self._padded
+        return flat
+
+    def pack(self, frame: np.ndarray, out: np.ndarray | None = None) -> np.ndarray:
+        """
+        Packs an integer frame, whose samples must fit in bit_depth bits,
+        into a uint8 array of frame_bytes bytes.
+        """
+        if out is None:
+            out = np.empty(self.frame_bytes, dtype=np.uint8)
+        flat = self._flat(frame)
+        if self.bit_depth not in PACKED_GROUPS:
+            out[:] = flat.view(np.uint8)
+            return out
+        n = self.n_pixels
+        a, b = self._words, self._shifted
+        np.right_shift(flat[:n], self.bit_depth - 8, out=out[:n], casting="unsafe")
+        if self.bit_depth == 10:
+            # Pixels at bits 0, 16, 32, 48 -> 2 bits each at bits 0 to 7
+            np.bitwise_and(flat.view(np.uint64), np.uint64(0x0003000300030003), out=a)
+            np.right_shift(a, np.uint64(14), out=b)
+            np.bitwise_or(a, b, out=a)
+            np.bitwise_and(a, np.uint64(0x0000000F0000000F), out=a)
+            np.right_shift(a, np.uint64(28), out=b)
+            np.bitwise_or(a, b, out=a)
+        else:
+            # Pixels at bits 0, 16 -> 4 bits each at bits 0 to 7
+            np.bitwise_and(flat.view(np.uint32), np.uint32(0x000F000F), out=a)
+            np.right_shift(a, np.uint32(12), out=b)
+            np.bitwise_or(a, b, out=a)
+        np.copyto(out[n:], a, casting="unsafe")
+        return out
+
+    def unpack(self, packed: np.ndarray, out: np.ndarray | None = None) -> np.ndarray:
+        """
+        Unpacks a packed frame into a flat array of n_pixels samples, of
+        uint8 for 8-bit frames and uint16 otherwise.
+        """
+        if out is None:
+            out = np.empty(self.n_pixels, dtype=self.dtype)
+        if self.bit_depth not in PACKED_GROUPS:
+            out[:] = packed.view(self.dtype)[:self.n_pixels]
+            return out
+        n = self.n_pixels
+        a, b = self._words, self._shifted
+        flat = out if self._padded is None else self._padded
+        np.left_shift(packed[:n], self.bit_depth - 8, out=flat[:n], dtype=np.uint16)
+        np.copyto(a, packed[n:], casting="unsafe")
+        if self.bit_depth == 10:
+            np.left_shift(a, np.uint64(28), out=b)
+            np.bitwise_or(a, b, out=a)
+            np.bitwise_and(a, np.uint64(0x0000000F0000000F), out=a)
+            np.left_shift(a, np.uint64(14), out=b)
+            np.bitwise_or(a, b, out=a)
+            np.bitwise_and(a, np.uint64(0x0003000300030003), out=a)
+            low = flat.view(np.uint64)
+        else:
+            np.left_shift(a, np.uint32(12), out=b)
+            np.bitwise_or(a, b, out=a)
+            np.bitwise_and(a, np.uint32(0x000F000F), out=a)
+            low = flat.view(np.uint32)
+        np.bitwise_or(low, a, out=low)
+        if flat is not out:
+            out[:] = flat[:n]
+        return out
+
+
+def pack(frame: np.ndarray, bit_depth: int) -> np.ndarray:
+    return FramePacker(frame.size, bit_depth).pack(frame)
+
+
+def unpack(packed: np.ndarray, bit_depth: int, n_pixels: int) -> np.ndarray:
+    return FramePacker(n_pixels, bit_depth).unpack(packed)
+
+
+def bit_depth_from_envi(envi_options: dict | None, dtype: np.dtype) -> int:
+    """
+    Bit depth at which frames of the given type are packed, from the "bit
+    depth" metadata of the camera if consistent with the type.
+    """
+    dtype = np.dtype(dtype)
+    if dtype.kind != "u":
+        raise ValueError(f"Frames of type {dtype} cannot be packed.")
+    bit_depth = (envi_options or {}).get("bit depth")
+    if bit_depth is not None:
+        bit_depth = int(str(bit_depth).split()[0])
+        if bit_depth in PACKED_BIT_DEPTHS and packed_dtype(bit_depth) == dtype:
+            return bit_depth
+    return dtype.itemsize * 8
+
+
+def cfa_from_envi(envi_options: dict | None) -> tuple[int, int]:
+    size = (envi_options or {}).get("filter array size")
+    if size is None:
+        return 1, 1
+    rows, cols = str(size).lower().split("x")
+    return int(rows), int(cols)
+
+
+@dataclass
+class PackedHeader:
+    """
+    Fixed-size header of a packed file, followed by the packed frames. The
+    header is JSON, padded to PACKED_HEADER_SIZE so that it can be rewritten
+    in place with the number of frames.
+    """
+    shape: tuple[int, ...]
+    bit_depth: int
+    frames: int = 0
+    cfa: tuple[int, int] = (1, 1)
+
+    @property
+    def n_pixels(self) -> int:
+        return int(np.prod(self.shape))
+
+    @property
+    def frame_bytes(self) -> int:
+        return packed_frame_bytes(self.n_pixels, self.bit_depth)
+
+    @property
+    def dtype(self) -> np.dtype:
+        return packed_dtype(self.bit_depth)
+
+    def to_bytes(self) -> bytes:
+        text = json.dumps({
+            "shape": list(self.shape),
+            "bit depth": self.bit_depth,
+            "frames": self.frames,
+            "filter array size": list(self.cfa),
+            "layout": "planar" if self.bit_depth in PACKED_GROUPS else "raw",
+        }).encode("ascii")
+        padding = PACKED_HEADER_SIZE - len(PACKED_MAGIC) - len(text) - 1
+        if padding < 0:
+            raise ValueError(f"Shape {self.shape} too long for the packed header.")
+        return PACKED_MAGIC + text + b" " * padding + b"\n"
+
+    @classmethod
+    def from_bytes(cls, data: bytes) -> "PackedHeader":
+        if not data.startswith(PACKED_MAGIC):
+            raise ValueError("Not a packed frame file.")
+        header = json.loads(data[len(PACKED_MAGIC):].decode("ascii"))
+        return cls(
+            shape=tuple(header["shape"]),
+            bit_depth=int(header["bit depth"]),
+            frames=int(header["frames"]),
+            cfa=tuple(header["filter array size"]),
+        )
+
+
+class PackedFrames:
+    """
+    Random access to the frames of a packed file, memory mapped and only
+    unpacked when requested. The number of frames is taken from the file
+    size, so that the frames of an interrupted recording can be read.
+    """
+    path: Path
+    header: PackedHeader
+
+    def __init__(self, path: Path, mode: str = "r"):
+        self.path = Path(path)
+        with open(self.path, "rb") as f:
+            self.header = PackedHeader.from_bytes(f.read(PACKED_HEADER_SIZE))
+        n_frames = (os.path.getsize(self.path) - PACKED_HEADER_SIZE) // self.header.frame_bytes
+        self._packer = FramePacker(self.header.n_pixels, self.header.bit_depth)
+        self._data = None
+        if n_frames > 0:
+            self._data = np.memmap(
+                self.path,
+                mode=mode,
+                dtype=np.uint8,
+                offset=PACKED_HEADER_SIZE,
+                shape=(n_frames, self.header.frame_bytes),
+            )
+
+    @classmethod
+    def create(cls, path: Path, header: PackedHeader) -> "PackedFrames":
+        """
+        Preallocates a file for header.frames frames, to be filled in place.
+        """
+        with open(path, "wb") as f:
+            f.write(header.to_bytes())
+            f.truncate(PACKED_HEADER_SIZE + header.frames * header.frame_bytes)
+        return cls(path, mode="r+")
+
+    @property
+    def shape(self) -> tuple[int, ...]:
+        return (len(self), *self.header.shape)
+
+    @property
+    def dtype(self) -> np.dtype:
+        return self.header.dtype
+
+    def __len__(self) -> int:
+        return 0 if self._data is None else self._data.shape[0]
+
+    def __getitem__(self, index: int) -> np.ndarray:
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError(f"Frame {index} out of range.")
+        frame = self._packer.unpack(packed=self._data[index])
+        return frame.reshape(self.header.shape)
+
+    def __setitem__(self, index: int, frame: np.ndarray) -> None:
+        self._packer.pack(frame=frame, out=self._data[index])
+
+    def flush(self) -> None:
+        if self._data is not None:
+            self._data.flush()
+
+
+class PackedWriter:
+    """
+    Appends packed frames to a file, through a preallocated packing buffer.
+    The header is rewritten with the number of frames when closing.
+    """
+
+    def __init__(self, path: Path, header: PackedHeader):
+        self.path = path
+        self.header = header
+        self._packer = FramePacker(header.n_pixels, header.bit_depth)
+        self._buffer = np.empty(header.frame_bytes, dtype=np.uint8)
+        self._file = open(path, "wb")
+        self._file.write(header.to_bytes())
+
+    def write(self, frame: np.ndarray) -> int:
+        """
+        Packs and appends a frame. Returns the number of bytes written.
+        """
+        self._file.write(self._packer.pack(frame=frame, out=self._buffer).data)
+        self.header.frames += 1
+        return self._buffer.nbytes
+
+    def close(self) -> None:
+        if self._file is None:
+            return
+        self._file.seek(0)
+        self._file.write(self.header.to_bytes())
+        self._file.close()
+        self._file = None
@@ -0,0 +1,380 @@
+import argparse
+import sys
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime
+from pathlib import Path
+
+import numpy as np
+
+from PyQt5.QtWidgets import (
+    QApplication,
+    QComboBox,
+    QFormLayout,
+    QHBoxLayout,
+    QLabel,
+    QPushButton,
+    QSlider,
+    QVBoxLayout,
+    QWidget,
+)
+from PyQt5.QtCore import QTimer, Qt
+
+from camera_visualizer.camera_interface.bayer import bayer_order_from_envi
+from camera_visualizer.packing import cfa_from_envi
+from camera_visualizer.previews import SessionPreviews
+from camera_visualizer.session import SessionReader
+from camera_visualizer.video_widget import VideoWidget
+from camera_visualizer.views import ViewModeEnum, frame_view, view_to_display
+
+PLAYBACK_DEFAULT_FPS = 30.0
+PLAYBACK_DISPLAY_FPS = 60.0
+PLAYBACK_PREFETCH_FRAMES = 32
+PLAYBACK_CACHE_MB = 512
+PLAYBACK_SPEEDS = (0.25, 0.5, 1.0, 2.0, 4.0, 8.0, 16.0)
+
+
+def session_fps(reader: SessionReader) -> float:
+    """
+    Returns the recorded frame rate of a session, from the time range of its
+    frames in the manifest.
+    """
+    summary = (reader.manifest or {}).get("summary") or {}
+    if summary.get("start") and summary.get("end") and len(reader) > 1:
+        start = datetime.fromisoformat(summary["start"])
+        end = datetime.fromisoformat(summary["end"])
+        elapsed = (end - start).total_seconds()
+        if elapsed > 0:
+            return (len(reader) - 1) / elapsed
+    return PLAYBACK_DEFAULT_FPS
+
+
+class FramePrefetcher:
+    """
+    Reads the frames of a session ahead of the playhead from a background
+    thread, into a cache bounded to cache_mb.
+
+    Frames are copied out of the memory mapped files by the background
+    thread, so that page faults and unpacking do not stall the display.
+    Frames missing from the cache (e.g. after a jump) are read by the caller
+    with its own reader, as the readers are not shared between the threads.
+    """
+    reader: SessionReader
+    n_frames: int
+    capacity: int
+
+    def __init__(
+        self,
+        session: Path,
+        cache_mb: float = PLAYBACK_CACHE_MB,
+        ahead: int = PLAYBACK_PREFETCH_FRAMES,
+    ):
+        self._reader = SessionReader(session)
+        self.reader = SessionReader(session)
+        self.n_frames = len(self.reader)
+        frame_bytes = self.reader.frame_bytes() if self.n_frames > 0 else 1
+        self.ahead = ahead
+        self.capacity = max(int(cache_mb * 2 ** 20 // frame_bytes), 2)
+        self.hits = 0
+        self.misses = 0
+        self._cache = OrderedDict()
+        self._condition = threading.Condition()
+        self._playhead = 0
+        self._step = 1
+        self._stop = False
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def seek(self, index: int, step: int = 1) -> None:
+        """
+        Moves the playhead. Frames are prefetched every step frames from the
+        playhead, backwards for a negative step.
+        """
+        with self._condition:
+            self._playhead = index
+            self._step = step if step != 0 else 1
+            self._condition.notify()
+
+    def cached(self, index: int) -> bool:
+        with self._condition:
+            return index in self._cache
+
+    def get(self, index: int) -> np.ndarray:
+        with self._condition:
+            frame = self._cache.get(index)
+            if frame is not None:
+                self._cache.move_to_end(index)
+                self.hits += 1
+                return frame
+            self.misses += 1
+        frame = np.array(self.reader.read(index))
+        with self._condition:
+            self._insert(index, frame)
+        return frame
+
+    def _insert(self, index: int, frame: np.ndarray) -> None:
+        self._cache[index] = frame
+        self._cache.move_to_end(index)
+        while len(self._cache) > self.capacity:
+            self._cache.popitem(last=False)
+
+    def _next_index(self) -> int | None:
+        for i in range(min(self.ahead, self.capacity - 1) + 1):
+            index = self._playhead + i * self._step
+            if not 0 <= index < self.n_frames:
+                return None
+            if index not in self._cache:
+                return index
+        return None
+
+    def _run(self) -> None:
+        while True:
+            with self._condition:
+                while not self._stop and (index := self._next_index()) is None:
+                    self._condition.wait()
+                if self._stop:
+                    return
+            frame = np.array(self._reader.read(index))
+            with self._condition:
+                self._insert(index, frame)
+
+    def close(self) -> None:
+        with self._condition:
+            self._stop = True
+            self._condition.notify()
+        self._thread.join()
+        self._reader.close()
+        self.reader.close()
+
+
+class SessionPlayer(QWidget):
+    """
+    Plays back a recorded session, with the view modes of the live view.
+
+    The playhead advances at the selected speed times the recorded frame
+    rate, skipping frames when it is faster than the display. While the
+    slider is dragged, the previews of the session are displayed until the
+    frame under the playhead is read.
+    """
+    session: Path
+    prefetcher: FramePrefetcher
+    previews: SessionPreviews | None
+
+    def __init__(
+        self,
+        session: Path,
+        fps: float | None = None,
+        display_fps: float = PLAYBACK_DISPLAY_FPS,
+        speed: float = 1.0,
+    ):
+        super().__init__()
+        self.session = Path(session)
+        self.prefetcher = FramePrefetcher(self.session)
+        reader = self.prefetcher.reader
+        envi_options = reader.envi_options() if self.prefetcher.n_frames > 0 else {}
+        self.fps = fps or session_fps(reader)
+        self.cfa_shape = cfa_from_envi(envi_options)
+        self.bayer_order = bayer_order_from_envi(envi_options)
+        bit_depth = (envi_options or {}).get("bit depth")
+        if bit_depth is not None:
+            self.dynamic_range = 2 ** int(str(bit_depth).split()[0]) - 1
+        elif reader.dtype().kind == "u":
+            self.dynamic_range = np.iinfo(reader.dtype()).max
+        else:
+            self.dynamic_range = 1
+        self.previews = SessionPreviews(self.session) if SessionPreviews.exists(self.session) else None
+        self.display_fps = display_fps
+        self.speed = speed
+        self.mode = ViewModeEnum.RAW
+        self.playing = False
+        self.position = 0.0
+        self.index = -1
+        self.display_buffer = None
+        self._last_tick = None
+
+        self.setWindowTitle(f"Playback: {self.session.name}")
+        self.video = VideoWidget()
+
+        self.play_button = QPushButton("Play")
+        self.play_button.clicked.connect(self.toggle_playing)
+        self.back_button = QPushButton("<")
+        self.back_button.clicked.connect(lambda: self.step(-1))
+        self.forward_button = QPushButton(">")
+        self.forward_button.clicked.connect(lambda: self.step(1))
+
+        self.speed_select = QComboBox()
+        self.speed_select.addItems([f"{s:g}x" for s in PLAYBACK_SPEEDS])
+        if speed in PLAYBACK_SPEEDS:
+            self.speed_select.setCurrentIndex(PLAYBACK_SPEEDS.index(speed))
+        self.speed_select.currentIndexChanged.connect(self.set_speed)
+        speed_select = QFormLayout()
+        speed_select.addRow("Speed:", self.speed_select)
+
+        self.view_select = QComboBox()
+        self.view_select.addItems([e.value for e in ViewModeEnum])
+        self.view_select.currentIndexChanged.connect(self.set_view_mode)
+        view_select = QFormLayout()
+        view_select.addRow("View:", self.view_select)
+
+        self.slider = QSlider(Qt.Horizontal)
+        self.slider.setRange(0, max(self.prefetcher.n_frames - 1, 0))
+        self.slider.sliderMoved.connect(self.scrub)
+        self.slider.sliderReleased.connect(lambda: self.seek(self.slider.value()))
+        self.position_label = QLabel("")
+
+        control_layout = QHBoxLayout()
+        control_layout.addWidget(self.back_button)
+        control_layout.addWidget(self.play_button)
+        control_layout.addWidget(self.forward_button)
+        control_layout.addLayout(speed_select)
+        control_layout.addLayout(view_select)
+        control_layout.addWidget(self.position_label)
+
+        layout = QVBoxLayout()
+        layout.addWidget(self.video, stretch=40)
+        layout.addWidget(self.slider, stretch=0)
+        layout.addLayout(control_layout, stretch=0)
+        self.setLayout(layout)
+
+        self.timer = QTimer()
+        self.timer.timeout.connect(self.tick)
+        self.timer.start(int(1000 // self.display_fps))
+
+        if self.prefetcher.n_frames > 0:
+            self.seek(0)
+        else:
+            self.video.set_text("Empty session.")
+
+    def step_size(self) -> int:
+        """
+        Frames between two displayed frames at the current speed.
+        """
+        return max(int(round(self.speed * self.fps / self.display_fps)), 1)
+
+    def playing_index(self) -> int:
+        """
+        Frame to display at the current position, snapped to the frames
+        prefetched every step_size() frames from the displayed one.
+        """
+        index = int(self.position)
+        if self.index < 0:
+            return index
+        step = self.step_size()
+        return self.index + int(round((index - self.index) / step)) * step
+
+    def toggle_playing(self) -> None:
+        self.playing = not self.playing
+        if self.playing and self.index >= self.prefetcher.n_frames - 1:
+            self.position = 0.0
+        self._last_tick = time.perf_counter()
+        self.play_button.setText("Pause" if self.playing else "Play")
+
+    def set_speed(self) -> None:
+        self.speed = PLAYBACK_SPEEDS[self.speed_select.currentIndex()]
+        self.prefetcher.seek(self.index, step=self.step_size())
+
+    def set_view_mode(self) -> None:
+        self.mode = ViewModeEnum(self.view_select.currentText())
+        index, self.index = self.index, -1
+        self.show_frame(index)
+
+    def step(self, frames: int) -> None:
+        if self.playing:
+            self.toggle_playing()
+        self.seek(self.index + frames, step=1 if frames > 0 else -1)
+
+    def seek(self, index: int, step: int = 1) -> None:
+        index = min(max(index, 0), self.prefetcher.n_frames - 1)
+        self.position = float(index)
+        self.prefetcher.seek(index, step=step)
+        self.show_frame(index)
+
+    def scrub(self, index: int) -> None:
+        """
+        Follows the slider with the previews while it is dragged.
+        """
+        self.position = float(index)
+        self.prefetcher.seek(index)
+        if self.previews is None or self.prefetcher.cached(index):
+            self.show_frame(index)
+            return
+        self.video.set_frame(np.array(self.previews.preview(index)))
+        self.index = -1
+        self.update_label(index)
+
+    def tick(self) -> None:
+        if not self.playing:
+            return
+        now = time.perf_counter()
+        self.position += (now - self._last_tick) * self.speed * self.fps
+        self._last_tick = now
+        index = self.playing_index()
+        if index >= self.prefetcher.n_frames - 1:
+            index = self.prefetcher.n_frames - 1
+            self.toggle_playing()
+        if index != self.index:
+            self.prefetcher.seek(index, step=self.step_size())
+            self.show_frame(index)
+
+    def show_frame(self, index: int) -> None:
+        if index == self.index or not 0 <= index < self.prefetcher.n_frames:
+            return
+        frame = self.prefetcher.get(index)
+        view = frame_view(
+            frame=frame,
+            mode=self.mode,
+            cfa_shape=self.cfa_shape,
+            dynamic_range=self.dynamic_range,
+            bayer_order=self.bayer_order,
+        )
+        self.display_buffer = view_to_display(view=view, out=self.display_buffer)
+        self.video.set_frame(self.display_buffer)
+        self.index = index
+        if not self.slider.isSliderDown():
+            self.slider.blockSignals(True)
+            self.slider.setValue(index)
+            self.slider.blockSignals(False)
+        self.update_label(index)
+
+    def update_label(self, index: int) -> None:
+        self.position_label.setText(
+            f"{index + 1}/{self.prefetcher.n_frames} ({index / self.fps:.2f} s)"
+        )
+
+    def closeEvent(self, event) -> None:
+        self.timer.stop()
+        self.prefetcher.close()
+        super().closeEvent(event)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Play back a recorded session.")
+    parser.add_argument(
+        "session",
+        type=Path,
+        help="Session folder, e.g. data/ximea/20250801_101500.",
+    )
+    parser.add_argument(
+        "--fps",
+        type=float,
+        default=None,
+        help="Frame rate at 1x speed. Defaults to the recorded frame rate.",
+    )
+    parser.add_argument("--speed", type=float, default=1.0)
+    parser.add_argument("--display-fps", type=float, default=PLAYBACK_DISPLAY_FPS)
+    args, qt_args = parser.parse_known_args()
+
+    app = QApplication(sys.argv[:1] + qt_args)
+    player = SessionPlayer(
+        session=args.session,
+        fps=args.fps,
+        display_fps=args.display_fps,
+        speed=args.speed,
+    )
+    player.show()
+    sys.exit(app.exec_())
+
+
+if __name__ == "__main__":
+    main()
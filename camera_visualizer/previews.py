@@ -0,0 +1,318 @@
+import argparse
+import json
+import os
+import struct
+import time
+import zlib
+from pathlib import Path
+
+import numpy as np
+
+from camera_visualizer.packing import cfa_from_envi
+from camera_visualizer.session import SessionReader
+
+PREVIEW_FOLDER = "previews"
+PREVIEW_INDEX = "previews.json"
+PREVIEW_CONTACT_SHEET = "contact_sheet.png"
+# Frames kept in the previews, spread over the whole session
+PREVIEW_MAX_FRAMES = 256
+# Initial stride between preview frames, doubled whenever the previews are full
+PREVIEW_MIN_EVERY = 16
+# Smallest dimension of the coarsest pyramid level
+PREVIEW_MIN_SIZE = 32
+CONTACT_SHEET_TILES = 64
+CONTACT_SHEET_TILE_WIDTH = 160
+PNG_SIGNATURE = b"\x89PNG\r\n\x1a\n"
+# zlib level of the contact sheet: fast, the sheet is written on every close
+PNG_COMPRESSION = 1
+
+
+def preview_levels(shape: tuple[int, int], cfa: tuple[int, int]) -> list[tuple[int, int]]:
+    """
+    Shapes of the pyramid levels of frames of the given shape: one pixel per
+    color filter array period, then halved down to PREVIEW_MIN_SIZE.
+    """
+    height, width = shape[0] // cfa[0], shape[1] // cfa[1]
+    levels = [(height, width)]
+    while min(height, width) // 2 >= PREVIEW_MIN_SIZE:
+        height, width = height // 2, width // 2
+        levels.append((height, width))
+    return levels
+
+
+def _bit_depth(envi_options: dict | None, dtype: np.dtype) -> int | None:
+    bit_depth = (envi_options or {}).get("bit depth")
+    if bit_depth is not None:
+        return int(str(bit_depth).split()[0])
+    if np.dtype(dtype).kind == "u":
+        return np.dtype(dtype).itemsize * 8
+    return None
+
+
+class PreviewBuilder:
+    """
+    Builds the 8-bit previews of a session while its frames are written.
+
+    Each preview frame is binned over the color filter array period, which
+    averages the mosaic of XIMEA (4x4) and Bayer (2x2) sensors into a
+    luminance image without demosaicing, then halved into a pyramid. At most
+    PREVIEW_MAX_FRAMES frames are kept: when full, every other preview is
+    dropped and the stride between previews is doubled, so that the
+    previews always span the whole session with bounded memory.
+    """
+    every: int
+
+    def __init__(self, every: int = PREVIEW_MIN_EVERY, max_frames: int = PREVIEW_MAX_FRAMES):
+        self.every = every
+        self.max_frames = max_frames
+        self.indices = []
+        self.pyramids = []
+        self.shape = None
+        self.cfa = (1, 1)
+        self.bit_depth = None
+        self.levels = []
+        self._sum = None
+
+    def _configure(self, frame: np.ndarray, envi_options: dict | None) -> None:
+        self.shape = frame.shape[:2]
+        self.cfa = cfa_from_envi(envi_options)
+        if self.shape[0] % self.cfa[0] or self.shape[1] % self.cfa[1]:
+            self.cfa = (1, 1)
+        self.bit_depth = _bit_depth(envi_options, frame.dtype)
+        self.levels = preview_levels(self.shape, self.cfa)
+        dtype = np.uint32 if frame.dtype.kind in "ub" else np.float32
+        self._sum = np.empty(self.levels[0], dtype=dtype)
+
+    def wants(self, index: int) -> bool:
+        return index % self.every == 0
+
+    def add(self, frame: np.ndarray, index: int, envi_options: dict | None = None) -> None:
+        """
+        Adds the previews of the frame of the given index, if on the stride.
+        """
+        if not self.wants(index) or frame.ndim != 2:
+            return
+        if self.shape is None:
+            self._configure(frame, envi_options)
+        if frame.shape[:2] != self.shape:
+            return
+        self.indices.append(index)
+        self.pyramids.append(self._pyramid(frame))
+        if len(self.indices) >= self.max_frames:
+            self.indices = self.indices[::2]
+            self.pyramids = self.pyramids[::2]
+            self.every *= 2
+
+    def _pyramid(self, frame: np.ndarray) -> list[np.ndarray]:
+        rows, cols = self.cfa
+        binned = self._sum
+        binned[:] = 0
+        # Strided sums are faster than a reshaped mean over the mosaic
+        for r in range(rows):
+            for c in range(cols):
+                np.add(binned, frame[r::rows, c::cols], out=binned, casting="unsafe")
+        if self.bit_depth is not None:
+            scale = 255.0 / ((2 ** self.bit_depth - 1) * rows * cols)
+        else:
+            scale = 255.0 / max(float(binned.max()), 1e-9)
+        level = np.clip(binned * np.float32(scale), 0, 255).astype(np.uint8)
+        pyramid = [level]
+        for height, width in self.levels[1:]:
+            level = level[:height * 2, :width * 2].reshape(height, 2, width, 2)
+            level = level.mean(axis=(1, 3), dtype=np.float32).astype(np.uint8)
+            pyramid.append(level)
+        return pyramid
+
+    def save(self, session: Path) -> None:
+        """
+        Writes one uint8 stack per pyramid level, the index of the previews
+        and the contact sheet to the previews folder of the session.
+        """
+        if not self.indices:
+            return
+        folder = Path(session) / PREVIEW_FOLDER
+        folder.mkdir(exist_ok=True)
+        for level in range(len(self.levels)):
+            np.save(
+                folder / f"level_{level}.npy",
+                np.stack([pyramid[level] for pyramid in self.pyramids]),
+            )
+        save_contact_sheet(
+            path=folder / PREVIEW_CONTACT_SHEET,
+            tiles=[pyramid[self._sheet_level()] for pyramid in self.pyramids],
+        )
+        index = {
+            "frames": self.indices,
+            "every": self.every,
+            "shape": list(self.shape),
+            "filter array size": list(self.cfa),
+            "bit depth": self.bit_depth,
+            "levels": [list(level) for level in self.levels],
+        }
+        tmp_path = folder / f"{PREVIEW_INDEX}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(index, f, indent=2)
+        os.replace(tmp_path, folder / PREVIEW_INDEX)
+
+    def _sheet_level(self) -> int:
+        for level, (_, width) in enumerate(self.levels):
+            if width <= CONTACT_SHEET_TILE_WIDTH:
+                return level
+        return len(self.levels) - 1
+
+
+def save_contact_sheet(path: Path, tiles: list[np.ndarray]) -> None:
+    """
+    Saves up to CONTACT_SHEET_TILES tiles, evenly spread over the session,
+    as a square grid PNG.
+    """
+    picks = np.linspace(0, len(tiles) - 1, min(len(tiles), CONTACT_SHEET_TILES))
+    tiles = [tiles[int(round(i))] for i in picks]
+    n_cols = int(np.ceil(np.sqrt(len(tiles))))
+    n_rows = -(-len(tiles) // n_cols)
+    height, width = tiles[0].shape
+    sheet = np.zeros((n_rows * height, n_cols * width), dtype=np.uint8)
+    for i, tile in enumerate(tiles):
+        row, col = divmod(i, n_cols)
+        sheet[row * height:(row + 1) * height, col * width:(col + 1) * width] = tile
+    write_gray_png(path=path, image=sheet)
+
+
+def _png_chunk(kind: bytes, data: bytes) -> bytes:
+    return (
+        struct.pack(">I", len(data))
+        + kind
+        + data
+        + struct.pack(">I", zlib.crc32(kind + data) & 0xFFFFFFFF)
+    )
+
+
+def write_gray_png(path: Path, image: np.ndarray) -> None:
+    """
+    Writes a uint8 image as an 8-bit grayscale PNG with zlib only, so that
+    closing a recording does not load an imaging library.
+    """
+    image = np.ascontiguousarray(image, dtype=np.uint8)
+    height, width = image.shape
+    # Each scanline is prefixed with filter type 0 (none)
+    rows = np.zeros((height, width + 1), dtype=np.uint8)
+    rows[:, 1:] = image
+    header = struct.pack(">IIBBBBB", width, height, 8, 0, 0, 0, 0)
+    with open(path, "wb") as f:
+        f.write(PNG_SIGNATURE)
+        f.write(_png_chunk(b"IHDR", header))
+        f.write(_png_chunk(b"IDAT", zlib.compress(rows.tobytes(), PNG_COMPRESSION)))
+        f.write(_png_chunk(b"IEND", b""))
+
+
+class SessionPreviews:
+    """
+    Reads the previews of a session, memory mapped, so that browsing a
+    session does not touch its raw frames.
+    """
+    folder: Path
+
+    def __init__(self, session: Path):
+        self.folder = Path(session) / PREVIEW_FOLDER
+        with open(self.folder / PREVIEW_INDEX, "r") as f:
+            self.index = json.load(f)
+        self.frames = np.asarray(self.index["frames"])
+        self.levels = [tuple(level) for level in self.index["levels"]]
+        self._stacks = {}
+
+    @staticmethod
+    def exists(session: Path) -> bool:
+        return (Path(session) / PREVIEW_FOLDER / PREVIEW_INDEX).is_file()
+
+    @property
+    def contact_sheet(self) -> Path:
+        return self.folder / PREVIEW_CONTACT_SHEET
+
+    def __len__(self) -> int:
+        return len(self.frames)
+
+    def level(self, level: int) -> np.ndarray:
+        """
+        Returns the (n_previews, height, width) stack of a pyramid level.
+        """
+        if level not in self._stacks:
+            self._stacks[level] = np.load(self.folder / f"level_{level}.npy", mmap_mode="r")
+        return self._stacks[level]
+
+    def level_for(self, max_size: tuple[int, int]) -> int:
+        """
+        Returns the finest level fitting in (height, width).
+        """
+        for level, (height, width) in enumerate(self.levels):
+            if height <= max_size[0] and width <= max_size[1]:
+                return level
+        return len(self.levels) - 1
+
+    def nearest(self, frame_index: int) -> int:
+        """
+        Returns the position of the preview closest to a frame of the session.
+        """
+        position = int(np.searchsorted(self.frames, frame_index))
+        if position == len(self.frames):
+            return position - 1
+        if position > 0 and frame_index - self.frames[position - 1] < self.frames[position] - frame_index:
+            return position - 1
+        return position
+
+    def preview(self, frame_index: int, level: int = 0) -> np.ndarray:
+        return self.level(level)[self.nearest(frame_index)]
+
+
+def generate_previews(session: Path) -> PreviewBuilder:
+    """
+    Generates the previews of a recorded session from its frames, reading
+    only the frames on the preview stride.
+    """
+    reader = SessionReader(session)
+    try:
+        n_frames = len(reader)
+        every = PREVIEW_MIN_EVERY
+        while n_frames > every * PREVIEW_MAX_FRAMES:
+            every *= 2
+        builder = PreviewBuilder(every=every)
+        envi_options = reader.envi_options() if n_frames > 0 else None
+        for index in range(0, n_frames, every):
+            builder.add(frame=reader.read(index), index=index, envi_options=envi_options)
+    finally:
+        reader.close()
+    builder.save(session)
+    return builder
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Generate the previews and contact sheet of recorded sessions."
+    )
+    parser.add_argument(
+        "sessions",
+        type=Path,
+        nargs="+",
+        help="Session folders, e.g. data/ximea/20250801_101500.",
+    )
+    parser.add_argument(
+        "--force",
+        action="store_true",
+        help="Generate the previews again if they exist.",
+    )
+    args = parser.parse_args()
+
+    for session in args.sessions:
+        if SessionPreviews.exists(session) and not args.force:
+            print(f"{session}: previews exist")
+            continue
+        start = time.perf_counter()
+        builder = generate_previews(session)
+        elapsed = time.perf_counter() - start
+        print(
+            f"{session}: {len(builder.indices)} previews (every {builder.every} "
+            f"frames) in {elapsed:.2f} s"
+        )
+
+
+if __name__ == "__main__":
+    main()
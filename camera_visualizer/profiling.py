@@ -0,0 +1,418 @@
+import argparse
+import cProfile
+import pstats
+import sys
+import threading
+import time
+import tracemalloc
+from dataclasses import dataclass
+from datetime import datetime
+from enum import Enum
+from pathlib import Path
+
+from camera_visualizer.acquisition import Acquisition
+from camera_visualizer.camera_interface.mock_interface import CameraEnum, camera
+from camera_visualizer.camera_interface.registry import backend_names
+from camera_visualizer.paths import load_data_path
+from camera_visualizer.serializer import SaveFormatEnum
+from camera_visualizer.views import ViewModeEnum, view_to_display
+
+PROFILE_FOLDER = "profiles"
+PROFILE_REPORT = "report.txt"
+PROFILE_STATS = "profile.pstats"
+PROFILE_DEFAULT_SECONDS = 10.0
+PROFILE_DEFAULT_FPS = 30.0
+PROFILE_TOP_FUNCTIONS = 25
+PROFILE_TOP_ALLOCATIONS = 15
+# Frames of the tracebacks kept by tracemalloc
+PROFILE_TRACEMALLOC_DEPTH = 8
+# Frames between two checks of the traced memory, for the peak snapshot
+PROFILE_MEMORY_EVERY = 10
+# Period of the checks of the end of the profile in the GUI, in ms
+PROFILE_POLL_MS = 100
+# cProfile follows all the threads from Python 3.12, with sys.monitoring
+PROFILE_ALL_THREADS = sys.version_info >= (3, 12)
+
+
+class StageEnum(str, Enum):
+    GRAB = "grab"
+    VIEW = "view"
+    DISPLAY = "display"
+    RECORD = "record"
+
+
+@dataclass
+class ProfileConfig:
+    """
+    Length and output of a profile. The profile stops after `frames` frames
+    or `seconds` seconds, whichever comes first. Allocations are traced with
+    tracemalloc if memory is set, which slows everything down.
+    """
+    seconds: float | None = PROFILE_DEFAULT_SECONDS
+    frames: int | None = None
+    memory: bool = False
+    output: Path | None = None
+    top: int = PROFILE_TOP_FUNCTIONS
+
+    def folder(self, name: str) -> Path:
+        if self.output is not None:
+            return Path(self.output)
+        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+        return load_data_path() / PROFILE_FOLDER / f"{name}_{timestamp}"
+
+
+def _function_name(key: tuple[str, int, str]) -> str:
+    filename, line, name = key
+    if filename == "~":
+        return name
+    return f"{Path(filename).name}:{line}({name})"
+
+
+def _site(statistic: tracemalloc.Statistic | tracemalloc.StatisticDiff) -> str:
+    frame = statistic.traceback[0]
+    return f"{Path(frame.filename).name}:{frame.lineno}"
+
+
+class Profiler:
+    """
+    Profiles the running application with cProfile, and optionally its
+    allocations with tracemalloc, until the configured number of frames or
+    duration is reached, then writes a report of the hottest functions per
+    frame and allocation sites, and a pstats dump for offline viewing, e.g.
+    with `python -m pstats` or snakeviz.
+
+    Before Python 3.12, cProfile only follows the thread enabling it, so the
+    threads started while profiling (e.g. the frame writer) get their own
+    profiles, merged into the report. Frames are counted by the caller with
+    tick.
+    """
+    config: ProfileConfig
+    name: str
+    frames: int
+    elapsed: float
+
+    def __init__(self, config: ProfileConfig, name: str):
+        self.config = config
+        self.name = name
+        self.frames = 0
+        self.elapsed = 0.0
+        self._profile = cProfile.Profile()
+        self._thread_profiles = []
+        self._start = None
+        self._baseline = None
+        self._peak = None
+        self._peak_memory = 0
+        self._memory_frame = 0
+        self._enabled = False
+
+    def _profile_thread(self, frame, event, arg) -> None:
+        sys.setprofile(None)
+        profile = cProfile.Profile()
+        self._thread_profiles.append(profile)
+        profile.enable()
+
+    def start(self, enable: bool = True) -> None:
+        """
+        Starts the profile. Only the sections of the calling thread are
+        profiled if enable is False.
+        """
+        if self.config.memory:
+            tracemalloc.start(PROFILE_TRACEMALLOC_DEPTH)
+            self._baseline = self._snapshot()
+        if not PROFILE_ALL_THREADS:
+            threading.setprofile(self._profile_thread)
+        self._start = time.perf_counter()
+        self._enabled = enable
+        if enable:
+            self._profile.enable()
+
+    def section(self) -> "Profiler":
+        """
+        Profiles a section of the calling thread, e.g. one stage of a frame,
+        as a context manager.
+        """
+        return self
+
+    def __enter__(self) -> "Profiler":
+        self._profile.enable()
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self._profile.disable()
+
+    def tick(self, frames: int | None = None) -> bool:
+        """
+        Counts one frame, or sets the number of frames, and returns True when
+        the profile is done.
+        """
+        self.frames = self.frames + 1 if frames is None else frames
+        if self.config.memory and self.frames - self._memory_frame >= PROFILE_MEMORY_EVERY:
+            self._memory_frame = self.frames
+            current, _ = tracemalloc.get_traced_memory()
+            if current > self._peak_memory:
+                self._peak_memory = current
+                self._peak = self._snapshot()
+        return self.done()
+
+    def done(self) -> bool:
+        if self.config.frames is not None and self.frames >= self.config.frames:
+            return True
+        if (
+            self.config.seconds is not None
+            and time.perf_counter() - self._start >= self.config.seconds
+        ):
+            return True
+        return False
+
+    def _snapshot(self) -> tracemalloc.Snapshot:
+        # The snapshots are left out of the profile
+        if self._enabled:
+            self._profile.disable()
+        snapshot = tracemalloc.take_snapshot().filter_traces((
+            tracemalloc.Filter(False, tracemalloc.__file__),
+            tracemalloc.Filter(False, __file__),
+            tracemalloc.Filter(False, "<frozen importlib._bootstrap*>"),
+        ))
+        if self._enabled:
+            self._profile.enable()
+        return snapshot
+
+    def stop(self) -> Path:
+        """
+        Stops the profile and writes the report and the pstats dump, returning
+        their folder.
+        """
+        self._profile.disable()
+        self._enabled = False
+        self.elapsed = time.perf_counter() - self._start
+        if not PROFILE_ALL_THREADS:
+            threading.setprofile(None)
+        snapshot = None
+        if self.config.memory:
+            snapshot = self._snapshot()
+            _, peak = tracemalloc.get_traced_memory()
+            self._peak_memory = max(self._peak_memory, peak)
+            tracemalloc.stop()
+        stats = pstats.Stats(self._profile)
+        for profile in self._thread_profiles:
+            stats.add(profile)
+        folder = self.config.folder(self.name)
+        folder.mkdir(parents=True, exist_ok=True)
+        stats.dump_stats(folder / PROFILE_STATS)
+        report = self.report(stats=stats, snapshot=snapshot)
+        with open(folder / PROFILE_REPORT, "w") as f:
+            f.write(report)
+        print(report)
+        print(f"Profile written to {folder}")
+        return folder
+
+    def report(self, stats: pstats.Stats, snapshot: tracemalloc.Snapshot | None) -> str:
+        frames = max(self.frames, 1)
+        fps = self.frames / self.elapsed if self.elapsed > 0 else 0.0
+        lines = [
+            f"Profile of {self.name}: {self.frames} frames in {self.elapsed:.2f} s "
+            f"({fps:.1f} fps)",
+            "",
+        ]
+        columns = f"{'own ms/frame':>13} {'total ms/frame':>15} {'calls/frame':>12}  function"
+        for title, column in (("own", 2), ("total", 3)):
+            lines.append(f"Hottest functions by {title} time:")
+            lines.append(columns)
+            # The calls of the profiler itself are left out
+            entries = sorted(
+                (
+                    item for item in stats.stats.items()
+                    if item[0][0] != __file__ and "_lsprof" not in item[0][2]
+                ),
+                key=lambda item: item[1][column],
+                reverse=True,
+            )
+            for key, (_, n_calls, own, total, _) in entries[:self.config.top]:
+                lines.append(
+                    f"{1000 * own / frames:13.3f} {1000 * total / frames:15.3f} "
+                    f"{n_calls / frames:12.2f}  {_function_name(key)}"
+                )
+            lines.append("")
+        if snapshot is not None:
+            lines += self._memory_report(snapshot=snapshot)
+        return "\n".join(lines)
+
+    def _memory_report(self, snapshot: tracemalloc.Snapshot) -> list[str]:
+        top = PROFILE_TOP_ALLOCATIONS
+        lines = [f"Peak traced memory: {self._peak_memory / 2 ** 20:.1f} MB", ""]
+        peak = self._peak or snapshot
+        lines.append("Largest allocation sites at the peak:")
+        lines.append(f"{'MB':>10} {'blocks':>10}  site")
+        for statistic in peak.statistics("lineno")[:top]:
+            lines.append(
+                f"{statistic.size / 2 ** 20:10.2f} {statistic.count:10d}  {_site(statistic)}"
+            )
+        lines.append("")
+        lines.append("Allocation growth since the start:")
+        lines.append(f"{'MB':>10} {'blocks':>10}  site")
+        for statistic in snapshot.compare_to(self._baseline, "lineno")[:top]:
+            if statistic.size_diff <= 0:
+                break
+            lines.append(
+                f"{statistic.size_diff / 2 ** 20:+10.2f} "
+                f"{statistic.count_diff:+10d}  {_site(statistic)}"
+            )
+        lines.append("")
+        return lines
+
+
+def profile_stage(
+    camera_id: CameraEnum | str,
+    stage: StageEnum | str,
+    config: ProfileConfig,
+    session: Path | None = None,
+    fps: float = PROFILE_DEFAULT_FPS,
+    view_mode: ViewModeEnum | str = ViewModeEnum.RAW,
+    fmt: SaveFormatEnum | str = SaveFormatEnum.NUMPY,
+) -> Path:
+    """
+    Profiles one stage of the frame pipeline in isolation, without the GUI:
+    frames are grabbed as fast as the camera delivers them (e.g. the mock or
+    the replay of a session), and only the given stage is profiled.
+    """
+    stage = StageEnum(stage)
+    view_mode = ViewModeEnum(view_mode)
+    source = camera(camera_id=camera_id)
+    if session is not None:
+        source.set_device(device_id=str(session))
+    source.open(fps=fps)
+    acquisition = Acquisition(camera=source)
+    if view_mode == ViewModeEnum.DEMOSAIC:
+        source.toggle_view()
+    acquisition.false_color = view_mode == ViewModeEnum.FALSE_COLOR
+    display_buffer = None
+    profiler = Profiler(config=config, name=f"{source.__class__.__name__}_{stage.value}")
+    try:
+        if stage == StageEnum.RECORD:
+            source.set_save_subfolder(subfolder=datetime.now().strftime("profile_%Y%m%d_%H%M%S"))
+            # The frames are written by the writer thread, profiled throughout
+            profiler.start()
+            acquisition.start_recording(fmt=fmt)
+        else:
+            profiler.start(enable=False)
+        while not profiler.done():
+            if stage == StageEnum.GRAB:
+                with profiler.section():
+                    acquisition.grab(fps=fps)
+            else:
+                acquisition.grab(fps=fps)
+            if stage == StageEnum.VIEW:
+                with profiler.section():
+                    acquisition.view()
+            elif stage == StageEnum.DISPLAY:
+                view = acquisition.view()
+                with profiler.section():
+                    display_buffer = view_to_display(view=view, out=display_buffer)
+            profiler.tick()
+    finally:
+        # Waits for the queued frames, which belong to the record stage
+        acquisition.stop_recording()
+        source.close()
+    return profiler.stop()
+
+
+def add_profile_arguments(parser: argparse.ArgumentParser) -> None:
+    parser.add_argument(
+        "--profile",
+        action="store_true",
+        help="Run under cProfile, then write a report and a pstats dump.",
+    )
+    add_profile_options(parser)
+
+
+def add_profile_options(parser: argparse.ArgumentParser) -> None:
+    parser.add_argument(
+        "--profile-seconds",
+        type=float,
+        default=None,
+        help=f"Profile duration in seconds (default: {PROFILE_DEFAULT_SECONDS:g}).",
+    )
+    parser.add_argument(
+        "--profile-frames",
+        type=int,
+        default=None,
+        help="Number of frames to profile.",
+    )
+    parser.add_argument(
+        "--profile-memory",
+        action="store_true",
+        help="Also trace the allocations with tracemalloc.",
+    )
+    parser.add_argument(
+        "--profile-output",
+        type=Path,
+        default=None,
+        help=f"Output folder (default: a new folder in data/{PROFILE_FOLDER}).",
+    )
+
+
+def profile_config(args: argparse.Namespace) -> ProfileConfig:
+    seconds = args.profile_seconds
+    if seconds is None and args.profile_frames is None:
+        seconds = PROFILE_DEFAULT_SECONDS
+    return ProfileConfig(
+        seconds=seconds,
+        frames=args.profile_frames,
+        memory=args.profile_memory,
+        output=args.profile_output,
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Profile one stage of the frame pipeline without the GUI."
+    )
+    parser.add_argument(
+        "stage",
+        type=str,
+        choices=[e.value for e in StageEnum],
+        help="Stage to profile: grab, view, display (8-bit conversion) or record.",
+    )
+    parser.add_argument(
+        "--camera",
+        type=str,
+        choices=backend_names(),
+        default=CameraEnum.MOCK.value,
+    )
+    parser.add_argument(
+        "--session",
+        type=Path,
+        default=None,
+        help="Session replayed by the replay camera (default: the latest one).",
+    )
+    parser.add_argument("--fps", type=float, default=PROFILE_DEFAULT_FPS)
+    parser.add_argument(
+        "--view",
+        type=str,
+        choices=[e.value for e in ViewModeEnum],
+        default=ViewModeEnum.RAW.value,
+    )
+    parser.add_argument(
+        "-f",
+        "--format",
+        type=str,
+        choices=[e.value for e in SaveFormatEnum],
+        default=SaveFormatEnum.NUMPY.value,
+        help="Format of the record stage.",
+    )
+    add_profile_options(parser)
+    args = parser.parse_args()
+
+    profile_stage(
+        camera_id=args.camera,
+        stage=args.stage,
+        config=profile_config(args),
+        session=args.session,
+        fps=args.fps,
+        view_mode=args.view,
+        fmt=args.format,
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,414 @@
+import argparse
+import sys
+import threading
+import time
+from dataclasses import dataclass
+from datetime import datetime
+
+from camera_visualizer.acquisition import Acquisition
+from camera_visualizer.camera_interface.mock_interface import (
+    Camera,
+    CameraEnum,
+    camera,
+)
+from camera_visualizer.camera_interface.registry import backend_names, get_backend
+from camera_visualizer.metrics import (
+    add_metrics_arguments,
+    register_acquisition,
+    start_metrics,
+)
+from camera_visualizer.paths import load_data_path
+from camera_visualizer.recorder import AsyncFrameWriter, PreRollConfig, SegmentConfig
+from camera_visualizer.serializer import SaveFormatEnum, sink_names
+from camera_visualizer.storage import (
+    STORAGE_SAMPLE_PERIOD_S,
+    StorageMonitor,
+    StoragePolicyEnum,
+)
+
+RECORD_DEFAULT_FPS = 30.0
+RECORD_STATS_PERIOD_S = 5.0
+RECORD_MAX_FAILURES = 3
+
+
+@dataclass
+class RecordConfig:
+    """
+    Camera settings and length of a headless recording. The recording stops
+    after `frames` grabbed frames or `duration` seconds, whichever comes
+    first, or when interrupted if neither is set. The recording rolls over
+    to a new segment every segment_mb MB or segment_seconds seconds if set.
+    """
+    fps: float = RECORD_DEFAULT_FPS
+    exposure: int | None = None
+    bit_depth: int | None = None
+    duration: float | None = None
+    frames: int | None = None
+    fmt: SaveFormatEnum | str = SaveFormatEnum.NUMPY
+    calibrate: bool = False
+    storage_policy: StoragePolicyEnum = StoragePolicyEnum.WARN
+    segment_mb: float | None = None
+    segment_seconds: float | None = None
+
+
+@dataclass
+class RecordStats:
+    grabbed: int = 0
+    recorded: int = 0
+    dropped: int = 0
+    errors: int = 0
+    bytes_written: int = 0
+    queue_depth: int = 0
+    elapsed: float = 0.0
+
+    def summary(self, previous: "RecordStats | None" = None) -> str:
+        """
+        Statistics since the start of the recording, with the rates since the
+        previous statistics if given.
+        """
+        if previous is None:
+            previous = RecordStats()
+        elapsed = max(self.elapsed - previous.elapsed, 1e-9)
+        fps = (self.grabbed - previous.grabbed) / elapsed
+        mbps = (self.bytes_written - previous.bytes_written) / elapsed / 2 ** 20
+        return (
+            f"{self.grabbed} grabbed ({fps:.1f} fps), {self.recorded} recorded "
+            f"({mbps:.1f} MB/s), {self.dropped} dropped, {self.errors} errors, "
+            f"queue {self.queue_depth}"
+        )
+
+
+class CameraRecorder:
+    """
+    Records one camera with the acquisition and writer machinery of the GUI,
+    from its own thread, without any display.
+    """
+    camera_id: str
+    config: RecordConfig
+    camera: Camera | None
+    acquisition: Acquisition | None
+    writer: AsyncFrameWriter | None
+    storage: StorageMonitor
+    error: Exception | None
+
+    def __init__(self, camera_id: CameraEnum | str, config: RecordConfig):
+        self.camera_id = get_backend(camera_id).name
+        self.config = config
+        self.camera = None
+        self.acquisition = None
+        self.writer = None
+        self.storage = StorageMonitor(
+            path=load_data_path(),
+            policy=config.storage_policy,
+        )
+        self.error = None
+        self.errors = 0
+        self._stop = threading.Event()
+        self._thread = None
+        self._start = None
+        self._end = None
+
+    def open(self, subfolder: str) -> None:
+        """
+        Opens the camera and applies the settings of the configuration.
+        """
+        self.camera = camera(camera_id=self.camera_id)
+        self.camera.open(fps=self.config.fps)
+        if (
+            self.config.bit_depth is not None
+            and self.camera.bit_depth() != self.config.bit_depth
+        ):
+            self.camera.toggle_bit_depth()
+            if self.camera.bit_depth() != self.config.bit_depth:
+                print(
+                    f"[{self.camera_id}] Bit depth {self.config.bit_depth} "
+                    f"not available, using {self.camera.bit_depth()}."
+                )
+        if self.config.exposure is not None:
+            if self.camera.is_auto_exposure():
+                self.camera.toggle_auto_exposure()
+            self.camera.set_exposure(self.config.exposure)
+        self.camera.set_save_subfolder(subfolder=subfolder)
+        self.acquisition = Acquisition(
+            camera=self.camera,
+            pre_roll_config=PreRollConfig(),
+            segment_config=SegmentConfig(
+                max_mb=self.config.segment_mb,
+                max_seconds=self.config.segment_seconds,
+            ),
+        )
+        self.acquisition.calibrate = self.config.calibrate
+
+    def start(self) -> None:
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+
+    def join(self, timeout: float | None = None) -> None:
+        if self._thread is not None:
+            self._thread.join(timeout=timeout)
+
+    def is_alive(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def _done(self) -> bool:
+        if self._stop.is_set():
+            return True
+        if (
+            self.config.frames is not None
+            and self.acquisition.frame_index + 1 >= self.config.frames
+        ):
+            return True
+        if (
+            self.config.duration is not None
+            and time.perf_counter() - self._start >= self.config.duration
+        ):
+            return True
+        return False
+
+    def _run(self) -> None:
+        period = 1.0 / self.config.fps
+        failures = 0
+        self.acquisition.start_recording(fmt=self.config.fmt)
+        self.writer = self.acquisition.writer
+        self._start = time.perf_counter()
+        next_grab = self._start
+        try:
+            while not self._done():
+                try:
+                    self.acquisition.grab(fps=self.config.fps)
+                    failures = 0
+                except self.camera.exception_type() as e:
+                    self.errors += 1
+                    failures += 1
+                    if failures >= RECORD_MAX_FAILURES:
+                        self.error = e
+                        break
+                next_grab += period
+                delay = next_grab - time.perf_counter()
+                if delay > 0:
+                    time.sleep(delay)
+                elif delay < -period:
+                    # Do not try to catch up after a slow grab
+                    next_grab = time.perf_counter()
+        except Exception as e:
+            self.error = e
+        finally:
+            self._end = time.perf_counter()
+            try:
+                self.acquisition.stop_recording()
+            except Exception as e:
+                self.error = self.error or e
+            self.camera.close()
+
+    def update_storage(self) -> str | None:
+        """
+        Checks that the disk keeps up with the recording, returning a warning
+        if not. The recording is stopped if required by the storage policy.
+        """
+        writer = self.acquisition.writer
+        if writer is None:
+            return None
+        if writer.error is not None:
+            self.stop()
+            return f"Writing failed: {writer.error}"
+        frame_bytes, fps = self.acquisition.recorded_stream()
+        status = self.storage.update(frame_bytes=frame_bytes, fps=fps, writer=writer)
+        self.acquisition.set_record_every(status.record_every)
+        if status.stop:
+            self.stop()
+        return status.warning
+
+    def stats(self) -> RecordStats:
+        stats = RecordStats(errors=self.errors)
+        if self.acquisition is None or self._start is None:
+            return stats
+        end = self._end if self._end is not None else time.perf_counter()
+        stats.elapsed = end - self._start
+        stats.grabbed = self.acquisition.frame_index + 1
+        writer = self.writer
+        if writer is not None:
+            stats.recorded = writer.frames_written
+            stats.dropped = writer.dropped
+            stats.bytes_written = writer.bytes_written
+            stats.queue_depth = writer.queue_depth()
+        return stats
+
+
+def record(
+    camera_ids: list[str],
+    config: RecordConfig,
+    stats_period: float = RECORD_STATS_PERIOD_S,
+) -> list[CameraRecorder]:
+    """
+    Records the cameras in parallel until done or interrupted, printing the
+    throughput and drop statistics of each camera periodically. The metrics
+    of each camera are published in the metrics registry.
+    """
+    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+    recorders = []
+    try:
+        for ii, camera_id in enumerate(camera_ids):
+            recorder = CameraRecorder(camera_id=camera_id, config=config)
+            if camera_ids.count(camera_id) == 1:
+                subfolder = timestamp
+            else:
+                subfolder = f"{timestamp}_{ii}"
+            recorder.open(subfolder=subfolder)
+            recorders.append(recorder)
+            register_acquisition(
+                acquisition=recorder.acquisition,
+                labels={"camera": recorder.camera_id, "session": subfolder},
+            )
+            print(f"[{recorder.camera_id}] Recording to {recorder.camera.save_folder()}")
+    except Exception:
+        for recorder in recorders:
+            recorder.camera.close()
+        raise
+
+    previous = [RecordStats() for _ in recorders]
+    next_stats = time.perf_counter() + stats_period
+    for recorder in recorders:
+        recorder.start()
+    try:
+        while any(recorder.is_alive() for recorder in recorders):
+            time.sleep(min(STORAGE_SAMPLE_PERIOD_S, stats_period))
+            for recorder in recorders:
+                warning = recorder.update_storage()
+                if warning is not None:
+                    print(f"[{recorder.camera_id}] {warning}")
+            if time.perf_counter() >= next_stats:
+                next_stats += stats_period
+                for ii, recorder in enumerate(recorders):
+                    stats = recorder.stats()
+                    print(f"[{recorder.camera_id}] {stats.summary(previous[ii])}")
+                    previous[ii] = stats
+    except KeyboardInterrupt:
+        print("Interrupted, finishing the recordings...")
+    finally:
+        for recorder in recorders:
+            recorder.stop()
+        for recorder in recorders:
+            recorder.join()
+    return recorders
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Record one or more cameras without a display."
+    )
+    parser.add_argument(
+        "cameras",
+        type=str,
+        nargs="*",
+        default=None,
+        help=f"Cameras to record, among {', '.join(backend_names())} (default: mock).",
+    )
+    parser.add_argument("--fps", type=float, default=RECORD_DEFAULT_FPS)
+    parser.add_argument(
+        "--exposure",
+        type=int,
+        default=None,
+        help="Exposure time in microseconds.",
+    )
+    parser.add_argument("--bit-depth", type=int, default=None)
+    parser.add_argument(
+        "-d",
+        "--duration",
+        type=float,
+        default=None,
+        help="Recording duration in seconds.",
+    )
+    parser.add_argument(
+        "-n",
+        "--frames",
+        type=int,
+        default=None,
+        help="Number of frames to grab.",
+    )
+    parser.add_argument(
+        "-f",
+        "--format",
+        type=str,
+        choices=sink_names(),
+        default=SaveFormatEnum.NUMPY.value,
+    )
+    parser.add_argument(
+        "--calibrate",
+        action="store_true",
+        help="Apply the calibration captured for the camera settings.",
+    )
+    parser.add_argument(
+        "--storage-policy",
+        type=str,
+        choices=[e.value for e in StoragePolicyEnum],
+        default=StoragePolicyEnum.WARN.value,
+        help="Action taken when the disk cannot keep up with the recording.",
+    )
+    parser.add_argument(
+        "--segment-mb",
+        type=float,
+        default=None,
+        help="Roll the recording over to a new segment every given MB.",
+    )
+    parser.add_argument(
+        "--segment-seconds",
+        type=float,
+        default=None,
+        help="Roll the recording over to a new segment every given seconds.",
+    )
+    parser.add_argument(
+        "--stats-period",
+        type=float,
+        default=RECORD_STATS_PERIOD_S,
+        help="Period of the statistics printouts in seconds.",
+    )
+    add_metrics_arguments(parser)
+    args = parser.parse_args()
+    if not args.cameras:
+        args.cameras = [CameraEnum.MOCK.value]
+    for camera_id in args.cameras:
+        if camera_id not in backend_names():
+            parser.error(
+                f"invalid camera: {camera_id!r} (choose from {', '.join(backend_names())})"
+            )
+
+    config = RecordConfig(
+        fps=args.fps,
+        exposure=args.exposure,
+        bit_depth=args.bit_depth,
+        duration=args.duration,
+        frames=args.frames,
+        fmt=args.format,
+        calibrate=args.calibrate,
+        storage_policy=StoragePolicyEnum(args.storage_policy),
+        segment_mb=args.segment_mb,
+        segment_seconds=args.segment_seconds,
+    )
+    exporters = start_metrics(
+        port=args.metrics_port,
+        host=args.metrics_host,
+        path=args.metrics_file,
+    )
+    try:
+        recorders = record(
+            camera_ids=args.cameras,
+            config=config,
+            stats_period=args.stats_period,
+        )
+    finally:
+        for exporter in exporters:
+            exporter.close()
+    failed = False
+    for recorder in recorders:
+        print(f"[{recorder.camera_id}] Done: {recorder.stats().summary()}")
+        if recorder.error is not None:
+            print(f"[{recorder.camera_id}] Stopped on error: {recorder.error}")
+            failed = True
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
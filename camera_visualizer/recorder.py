@@ -0,0 +1,442 @@
+import math
+import queue
+import threading
+import time
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from pathlib import Path
+
+import numpy as np
+
+from camera_visualizer.catalog import SessionCatalog, folder_size, session_entry
+from camera_visualizer.previews import PreviewBuilder
+from camera_visualizer.serializer import format_name, open_sink, SaveFormatEnum
+from camera_visualizer.session import (
+    SESSION_FILENAME_PREFIX,
+    SESSION_SEGMENT_PREFIX,
+    SessionSummary,
+    session_manifest,
+    write_manifest,
+)
+
+RECORDER_QUEUE_SIZE = 256
+RECORDER_FILENAME_PREFIX = SESSION_FILENAME_PREFIX
+RECORDER_SEGMENT_PREFIX = SESSION_SEGMENT_PREFIX
+# Wait for the writer thread to accept the end of the recording, in seconds
+RECORDER_CLOSE_POLL_S = 0.1
+
+
+@dataclass
+class PreRollConfig:
+    """
+    Duration (in seconds) and/or memory budget (in MB) of the frames kept in
+    memory before the recording starts. When both are given, the smallest
+    resulting capacity is used.
+    """
+    seconds: float = 0.0
+    memory_mb: float | None = None
+
+    def capacity(self, frame_bytes: int, fps: float) -> int:
+        capacities = []
+        if self.seconds > 0:
+            capacities.append(math.ceil(self.seconds * fps))
+        if self.memory_mb is not None and self.memory_mb > 0:
+            capacities.append(int(self.memory_mb * 2 ** 20 // frame_bytes))
+        return min(capacities) if capacities else 0
+
+
+@dataclass
+class SegmentConfig:
+    """
+    Size (in MB) and/or duration (in seconds) after which a recording rolls
+    over to a new segment. Recordings are not segmented if neither is set.
+    """
+    max_mb: float | None = None
+    max_seconds: float | None = None
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.max_mb) or bool(self.max_seconds)
+
+    def full(self, nbytes: int, seconds: float) -> bool:
+        if self.max_mb and nbytes >= self.max_mb * 2 ** 20:
+            return True
+        return bool(self.max_seconds) and seconds >= self.max_seconds
+
+
+class FrameRingBuffer:
+    """
+    Preallocated ring of the latest raw frames with their timestamps (as
+    returned by time.perf_counter). Pushing copies the frame in the oldest
+    slot, so memory use never grows after construction.
+    """
+    frames: np.ndarray
+    timestamps: np.ndarray
+
+    def __init__(
+        self,
+        capacity: int,
+        shape: tuple[int, ...],
+        dtype: np.dtype,
+    ):
+        if capacity < 1:
+            raise ValueError("The ring buffer needs a capacity of at least 1 frame.")
+        self.frames = np.empty((capacity, *shape), dtype=dtype)
+        self.timestamps = np.zeros(capacity, dtype=np.float64)
+        self._head = 0
+        self._count = 0
+
+    @property
+    def capacity(self) -> int:
+        return self.frames.shape[0]
+
+    @property
+    def nbytes(self) -> int:
+        return self.frames.nbytes
+
+    def __len__(self) -> int:
+        return self._count
+
+    def matches(self, frame: np.ndarray) -> bool:
+        return (
+            frame.shape == self.frames.shape[1:]
+            and frame.dtype == self.frames.dtype
+        )
+
+    def push(self, frame: np.ndarray, timestamp: float) -> None:
+        self.frames[self._head] = frame
+        self.timestamps[self._head] = timestamp
+        self._head = (self._head + 1) % self.capacity
+        self._count = min(self._count + 1, self.capacity)
+
+    def clear(self) -> None:
+        self._head = 0
+        self._count = 0
+
+    def ordered_indices(self) -> np.ndarray:
+        """
+        Returns the slot indices of the stored frames, oldest first.
+        """
+        start = (self._head - self._count) % self.capacity
+        return (start + np.arange(self._count)) % self.capacity
+
+
+class AsyncFrameWriter:
+    """
+    Writes frames to a session folder from a background thread.
+
+    Frames are submitted without blocking: when the queue is full, the frame
+    is dropped and counted. Frames are named with a continuous index, starting
+    with the frames of the optional pre-roll ring, which must not be modified
+    until the writer is closed. The session manifest is written with the
+    first frame and updated when closing.
+
+    With a segment configuration, the frames are written to a sequence of
+    segment folders, each a complete session with its own manifest, rolling
+    over at the configured size or duration. The session manifest lists the
+    segments and is updated atomically after each segment closes, so that a
+    crash loses at most the current segment.
+
+    The session is updated in the catalog, if given, after each closed
+    segment and when closing, from the counters of the writer: only the
+    files of the closed segment are sized, so that long recordings are not
+    walked again and again. Catalog failures are reported and never stop
+    the recording. Unless disabled, 8-bit previews of a subset of the
+    frames are built while writing and saved with the session when closing.
+
+    If writing fails (e.g. when the disk is full), the thread stops, the
+    queued frames are dropped, the error is kept in `error`, and the
+    following frames are refused. close() then finalizes what it can and
+    raises the error.
+    """
+    save_folder: Path
+    fmt: str
+    segment_config: SegmentConfig
+    error: Exception | None
+
+    def __init__(
+        self,
+        save_folder: Path,
+        fmt: SaveFormatEnum | str = SaveFormatEnum.NUMPY,
+        filename_prefix: str = RECORDER_FILENAME_PREFIX,
+        queue_size: int = RECORDER_QUEUE_SIZE,
+        segment_config: SegmentConfig | None = None,
+        catalog: SessionCatalog | None = None,
+        previews: bool = True,
+    ):
+        self.save_folder = save_folder
+        self.fmt = format_name(fmt)
+        self.filename_prefix = filename_prefix
+        self.segment_config = segment_config or SegmentConfig()
+        self.frames_written = 0
+        self.bytes_written = 0
+        self.write_time = 0.0
+        self.last_latency = 0.0
+        self.dropped = 0
+        self.error = None
+        self.summary = SessionSummary()
+        self.catalog = catalog
+        self.previews = PreviewBuilder() if previews else None
+        self.segments = None
+        self._segment = None
+        # Size and number of the files of the closed segments
+        self._segments_size = 0
+        self._segments_files = 0
+        if self.segment_config.enabled:
+            self.segments = []
+            self._open_segment()
+        else:
+            self._sink = open_sink(
+                save_folder=save_folder,
+                filename_prefix=filename_prefix,
+                fmt=self.fmt,
+            )
+        self._shape = None
+        self._dtype = None
+        self._envi_options = None
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._thread = None
+        self._pre_roll = None
+        self._pre_roll_options = None
+
+    def start(
+        self,
+        pre_roll: FrameRingBuffer | None = None,
+        envi_options: dict | None = None,
+    ) -> None:
+        self._pre_roll = pre_roll
+        self._pre_roll_options = envi_options
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def submit(self, frame: np.ndarray, envi_options: dict | None = None) -> bool:
+        if self.error is not None or (self._thread is not None and not self._thread.is_alive()):
+            self.dropped += 1
+            return False
+        try:
+            self._queue.put_nowait((frame, envi_options))
+        except queue.Full:
+            self.dropped += 1
+            return False
+        return True
+
+    def queue_depth(self) -> int:
+        return self._queue.qsize()
+
+    def queue_size(self) -> int:
+        return self._queue.maxsize
+
+    def is_alive(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def close(self) -> None:
+        """
+        Waits for all the submitted frames to be written, and raises the error
+        that stopped the writer thread, if any.
+        """
+        if self._thread is None:
+            return
+        while self._thread.is_alive():
+            try:
+                self._queue.put(None, timeout=RECORDER_CLOSE_POLL_S)
+                break
+            except queue.Full:
+                continue
+        self._thread.join()
+        self._thread = None
+        try:
+            if self.segments is not None:
+                self._close_segment()
+            else:
+                self._sink.close()
+            self._write_manifest()
+            if self.previews is not None:
+                self.previews.save(session=self.save_folder)
+        except Exception as e:
+            if self.error is None:
+                self.error = e
+        self._update_catalog(closing=True)
+        if self.error is not None:
+            raise self.error
+
+    def _session_frames(self) -> int:
+        if self.segments is not None:
+            return sum(segment["frames"] for segment in self.segments)
+        return self.frames_written
+
+    def _write_manifest(self) -> None:
+        write_manifest(
+            folder=self.save_folder,
+            manifest=session_manifest(
+                fmt=self.fmt,
+                n_frames=self._session_frames(),
+                shape=self._shape,
+                dtype=self._dtype,
+                envi_options=self._envi_options,
+                filename_prefix=self.filename_prefix,
+                segments=self.segments,
+                summary=self.summary,
+            ),
+        )
+
+    def _update_catalog(self, closing: bool = False) -> None:
+        """
+        Puts the session in the catalog. The files of the closed segments are
+        already counted, so only the files outside of them are sized, which
+        are those of the manifest and previews when closing (or all of them
+        when the recording is not segmented).
+        """
+        if self.catalog is None:
+            return
+        try:
+            if self.segments is None or closing:
+                size, n_files = folder_size(
+                    folder=self.save_folder,
+                    exclude={segment["folder"] for segment in self.segments or []},
+                )
+            else:
+                size, n_files = 0, 0
+            self.catalog.put(session_entry(
+                folder=self.save_folder,
+                root=self.catalog.root,
+                fmt=self.fmt,
+                n_frames=self._session_frames(),
+                shape=self._shape,
+                dtype=None if self._dtype is None else self._dtype.str,
+                summary=self.summary,
+                size=self._segments_size + size,
+                n_files=self._segments_files + n_files,
+                n_segments=len(self.segments or []),
+            ))
+        except Exception as e:
+            print(f"Catalog update failed: {e}")
+
+    def _open_segment(self) -> None:
+        index = len(self.segments)
+        folder = self.save_folder / f"{RECORDER_SEGMENT_PREFIX}_{index:05d}"
+        folder.mkdir(parents=False, exist_ok=True)
+        self._sink = open_sink(
+            save_folder=folder,
+            filename_prefix=self.filename_prefix,
+            fmt=self.fmt,
+        )
+        self._segment = {
+            "folder": folder.name,
+            "first frame": self.frames_written,
+            "frames": 0,
+            "bytes": 0,
+            "start": None,
+            "end": None,
+        }
+        self._segment_start = None
+
+    def _close_segment(self) -> None:
+        """
+        Finalizes the files and manifest of the current segment, then lists
+        it in the session manifest.
+        """
+        self._sink.close()
+        segment = self._segment
+        if segment["frames"] == 0:
+            return
+        segment["end"] = datetime.now().isoformat()
+        write_manifest(
+            folder=self.save_folder / segment["folder"],
+            manifest=session_manifest(
+                fmt=self.fmt,
+                n_frames=segment["frames"],
+                shape=self._shape,
+                dtype=self._dtype,
+                envi_options=self._envi_options,
+                filename_prefix=self.filename_prefix,
+            ),
+        )
+        self.segments.append(segment)
+        self._write_manifest()
+        size, n_files = folder_size(self.save_folder / segment["folder"])
+        self._segments_size += size
+        self._segments_files += n_files
+        self._update_catalog()
+
+    def _roll_segment(self) -> None:
+        segment = self._segment
+        if segment["frames"] == 0:
+            return
+        if self.segment_config.full(
+            nbytes=segment["bytes"],
+            seconds=time.perf_counter() - self._segment_start,
+        ):
+            self._close_segment()
+            self._open_segment()
+
+    def _write(self, frame: np.ndarray, envi_options: dict | None) -> None:
+        start = time.perf_counter()
+        index = self.frames_written
+        if self.segments is not None:
+            self._roll_segment()
+            index -= self._segment["first frame"]
+        self._sink.write(
+            frame=frame,
+            index=index,
+            envi_options=envi_options,
+        )
+        if self._shape is None:
+            self._shape, self._dtype = frame.shape, frame.dtype
+            self._envi_options = envi_options
+            self._write_manifest()
+        self.summary.update(envi_options=envi_options)
+        if self.previews is not None:
+            self.previews.add(
+                frame=frame,
+                index=self.frames_written,
+                envi_options=envi_options or self._envi_options,
+            )
+        frame_bytes = self._sink.frame_bytes(frame)
+        if self.segments is not None:
+            if self._segment["frames"] == 0:
+                self._segment["start"] = datetime.now().isoformat()
+                self._segment_start = start
+            self._segment["frames"] += 1
+            self._segment["bytes"] += frame_bytes
+        self.last_latency = time.perf_counter() - start
+        self.write_time += self.last_latency
+        self.bytes_written += frame_bytes
+        self.frames_written += 1
+
+    def _flush_pre_roll(self) -> None:
+        ring = self._pre_roll
+        if ring is None:
+            return
+        now_wall, now = datetime.now(), time.perf_counter()
+        for idx in ring.ordered_indices():
+            envi_options = self._pre_roll_options
+            if envi_options is not None:
+                delay = timedelta(seconds=now - ring.timestamps[idx])
+                envi_options = envi_options | {
+                    "acquisition time": (now_wall - delay).isoformat(),
+                }
+            self._write(frame=ring.frames[idx], envi_options=envi_options)
+
+    def _run(self) -> None:
+        try:
+            self._flush_pre_roll()
+            while True:
+                item = self._queue.get()
+                if item is None:
+                    break
+                self._write(*item)
+        except Exception as e:
+            self.error = e
+            self._drain()
+
+    def _drain(self) -> None:
+        """
+        Drops the frames left in the queue after a failed write.
+        """
+        while True:
+            try:
+                item = self._queue.get_nowait()
+            except queue.Empty:
+                return
+            if item is not None:
+                self.dropped += 1
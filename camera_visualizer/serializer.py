@@ -1,13 +1,55 @@
+from abc import ABC, abstractmethod
+from functools import partial
 from pathlib import Path
 from enum import Enum
+from typing import Callable
+import struct
+import zipfile
 
-import spectral
 import numpy as np
 
+from camera_visualizer.packing import (
+    PACKED_SUFFIX,
+    PackedHeader,
+    PackedWriter,
+    bit_depth_from_envi,
+    cfa_from_envi,
+)
+
+NUMPY_CUBE_HEADER_SIZE = 128
+
+ENVI_DATA_TYPES = {
+    np.dtype(np.uint8): 1,
+    np.dtype(np.int16): 2,
+    np.dtype(np.int32): 3,
+    np.dtype(np.float32): 4,
+    np.dtype(np.float64): 5,
+    np.dtype(np.uint16): 12,
+    np.dtype(np.uint32): 13,
+    np.dtype(np.int64): 14,
+    np.dtype(np.uint64): 15,
+}
+
 
 class SaveFormatEnum(str, Enum):
     NUMPY = "numpy"
     ENVI = "envi"
+    NUMPY_CUBE = "numpy_cube"
+    ENVI_CUBE = "envi_cube"
+    COMPRESSED = "npz"
+    PACKED = "packed"
+
+
+PER_FRAME_FORMATS = (SaveFormatEnum.NUMPY, SaveFormatEnum.ENVI)
+
+
+def envi():
+    """
+    Returns the spectral.envi module, imported on first use, since spectral
+    is only needed by the ENVI formats and is slow to import.
+    """
+    from spectral.io import envi
+    return envi
 
 
 def save_frame(
@@ -25,14 +67,330 @@ def save_frame(
         if envi_options is None:
             raise ValueError("Impossible to save to ENVI")
         metadata = envi_options
-        spectral.envi.save_image(
+        envi().save_image(
             hdr_file=save_folder / f'{filename_stem}.hdr',
             image=frame,
-            dtype=np.uint8,
+            dtype=frame.dtype,
             ext=".img",
             force=True,
             interleave='bsq',
             metadata=metadata,
         )
     else:
-        raise ValueError(f"File format {fmt} unknown.")
\ No newline at end of file
+        raise ValueError(f"File format {fmt} is not a per-frame format.")
+
+
+def numpy_header(shape: tuple[int, ...], dtype: np.dtype) -> bytes:
+    """
+    Returns a .npy header of fixed size, so that it can be rewritten in place
+    when frames are appended to the file.
+    """
+    header = {
+        "descr": np.lib.format.dtype_to_descr(np.dtype(dtype)),
+        "fortran_order": False,
+        "shape": tuple(shape),
+    }
+    text = repr(header).encode("latin1")
+    magic = np.lib.format.magic(1, 0)
+    padding = NUMPY_CUBE_HEADER_SIZE - len(magic) - 2 - len(text) - 1
+    if padding < 0:
+        raise ValueError(f"Shape {shape} too long for the .npy header.")
+    return (
+        magic
+        + struct.pack("<H", len(text) + padding + 1)
+        + text
+        + b" " * padding
+        + b"\n"
+    )
+
+
+def envi_cube_header(
+    envi_options: dict | None,
+    n_frames: int,
+    shape: tuple[int, ...],
+    dtype: np.dtype,
+) -> dict:
+    """
+    Returns the ENVI header of a sequence of frames stored as the bands of
+    a single BSQ cube.
+    """
+    header = dict(envi_options) if envi_options is not None else {}
+    if "wavelength" in header:
+        header["filter array wavelength"] = header.pop("wavelength")
+    header.update({
+        "samples": shape[1],
+        "lines": shape[0],
+        "bands": n_frames,
+        "interleave": "bsq",
+        "byte order": 0,
+        "data type": ENVI_DATA_TYPES[np.dtype(dtype)],
+        "header offset": 0,
+    })
+    return header
+
+
+class FrameSink(ABC):
+    """
+    Destination of the frames of a recording session.
+    """
+
+    def __init__(self, save_folder: Path, filename_prefix: str):
+        self.save_folder = save_folder
+        self.filename_prefix = filename_prefix
+
+    @abstractmethod
+    def write(
+        self,
+        frame: np.ndarray,
+        index: int,
+        envi_options: dict | None = None,
+    ) -> None:
+        """
+        Writes a frame with the given index in the session.
+        """
+        ...
+
+    def frame_bytes(self, frame: np.ndarray) -> int:
+        """
+        Returns the bytes written for a frame.
+        """
+        return frame.nbytes
+
+    def close(self) -> None:
+        """
+        Finalizes the files of the session.
+        """
+        pass
+
+
+class FrameFileSink(FrameSink):
+    """
+    Writes one file per frame.
+    """
+
+    def __init__(
+        self,
+        save_folder: Path,
+        filename_prefix: str,
+        fmt: SaveFormatEnum = SaveFormatEnum.NUMPY,
+    ):
+        super().__init__(save_folder=save_folder, filename_prefix=filename_prefix)
+        self.fmt = fmt
+
+    def write(
+        self,
+        frame: np.ndarray,
+        index: int,
+        envi_options: dict | None = None,
+    ) -> None:
+        save_frame(
+            frame=frame,
+            save_folder=self.save_folder,
+            filename_stem=f"{self.filename_prefix}_{index:04d}",
+            envi_options=envi_options,
+            fmt=self.fmt,
+        )
+
+
+class NumpyCubeSink(FrameSink):
+    """
+    Appends the frames to a single .npy file, whose header is rewritten with
+    the number of frames when closing.
+    """
+
+    def __init__(self, save_folder: Path, filename_prefix: str):
+        super().__init__(save_folder=save_folder, filename_prefix=filename_prefix)
+        self.path = save_folder / f"{filename_prefix}.npy"
+        self._file = None
+        self._shape = None
+        self._dtype = None
+        self._count = 0
+
+    def write(
+        self,
+        frame: np.ndarray,
+        index: int,
+        envi_options: dict | None = None,
+    ) -> None:
+        if self._file is None:
+            self._shape, self._dtype = frame.shape, frame.dtype
+            self._file = open(self.path, "wb")
+            self._file.write(numpy_header((0, *self._shape), self._dtype))
+        self._file.write(np.ascontiguousarray(frame, dtype=self._dtype).data)
+        self._count += 1
+
+    def close(self) -> None:
+        if self._file is None:
+            return
+        self._file.seek(0)
+        self._file.write(numpy_header((self._count, *self._shape), self._dtype))
+        self._file.close()
+        self._file = None
+
+
+class EnviCubeSink(FrameSink):
+    """
+    Appends the frames as the bands of a single BSQ ENVI file, whose header
+    is written when closing.
+    """
+
+    def __init__(self, save_folder: Path, filename_prefix: str):
+        super().__init__(save_folder=save_folder, filename_prefix=filename_prefix)
+        self.path = save_folder / f"{filename_prefix}.img"
+        self.header_path = save_folder / f"{filename_prefix}.hdr"
+        self._file = None
+        self._shape = None
+        self._dtype = None
+        self._envi_options = None
+        self._count = 0
+
+    def write(
+        self,
+        frame: np.ndarray,
+        index: int,
+        envi_options: dict | None = None,
+    ) -> None:
+        if self._file is None:
+            self._shape, self._dtype = frame.shape, frame.dtype
+            self._envi_options = envi_options
+            self._file = open(self.path, "wb")
+        self._file.write(np.ascontiguousarray(frame, dtype=self._dtype).data)
+        self._count += 1
+
+    def close(self) -> None:
+        if self._file is None:
+            return
+        self._file.close()
+        self._file = None
+        envi().write_envi_header(
+            str(self.header_path),
+            envi_cube_header(
+                envi_options=self._envi_options,
+                n_frames=self._count,
+                shape=self._shape,
+                dtype=self._dtype,
+            ),
+        )
+
+
+class CompressedSink(FrameSink):
+    """
+    Writes the frames as deflated .npy entries of a single .npz file.
+    """
+
+    def __init__(
+        self,
+        save_folder: Path,
+        filename_prefix: str,
+        path: Path | None = None,
+    ):
+        super().__init__(save_folder=save_folder, filename_prefix=filename_prefix)
+        if path is None:
+            path = save_folder / f"{filename_prefix}.npz"
+        self.path = path
+        self._zip = None
+
+    def write(
+        self,
+        frame: np.ndarray,
+        index: int,
+        envi_options: dict | None = None,
+    ) -> None:
+        if self._zip is None:
+            self._zip = zipfile.ZipFile(
+                self.path, mode="w", compression=zipfile.ZIP_DEFLATED
+            )
+        name = f"{self.filename_prefix}_{index:06d}.npy"
+        with self._zip.open(name, mode="w", force_zip64=True) as f:
+            np.lib.format.write_array(f, np.asanyarray(frame))
+
+    def close(self) -> None:
+        if self._zip is not None:
+            self._zip.close()
+            self._zip = None
+
+
+class PackedSink(FrameSink):
+    """
+    Appends the frames to a single file with their samples bit-packed, e.g.
+    4 pixels in 5 bytes for 10-bit frames. The bit depth and the color
+    filter array are taken from the metadata of the first frame.
+    """
+
+    def __init__(self, save_folder: Path, filename_prefix: str):
+        super().__init__(save_folder=save_folder, filename_prefix=filename_prefix)
+        self.path = save_folder / f"{filename_prefix}{PACKED_SUFFIX}"
+        self._writer = None
+
+    def write(
+        self,
+        frame: np.ndarray,
+        index: int,
+        envi_options: dict | None = None,
+    ) -> None:
+        if self._writer is None:
+            self._writer = PackedWriter(
+                path=self.path,
+                header=PackedHeader(
+                    shape=frame.shape,
+                    bit_depth=bit_depth_from_envi(envi_options, frame.dtype),
+                    cfa=cfa_from_envi(envi_options),
+                ),
+            )
+        self._writer.write(frame)
+
+    def frame_bytes(self, frame: np.ndarray) -> int:
+        if self._writer is None:
+            return frame.nbytes
+        return self._writer.header.frame_bytes
+
+    def close(self) -> None:
+        if self._writer is not None:
+            self._writer.close()
+            self._writer = None
+
+
+SINK_REGISTRY: dict[str, Callable[..., FrameSink]] = {
+    SaveFormatEnum.NUMPY.value: partial(FrameFileSink, fmt=SaveFormatEnum.NUMPY),
+    SaveFormatEnum.ENVI.value: partial(FrameFileSink, fmt=SaveFormatEnum.ENVI),
+    SaveFormatEnum.NUMPY_CUBE.value: NumpyCubeSink,
+    SaveFormatEnum.ENVI_CUBE.value: EnviCubeSink,
+    SaveFormatEnum.COMPRESSED.value: CompressedSink,
+    SaveFormatEnum.PACKED.value: PackedSink,
+}
+
+
+def format_name(fmt: SaveFormatEnum | str) -> str:
+    return getattr(fmt, "value", fmt)
+
+
+def register_sink(
+    name: str,
+    factory: Callable[..., FrameSink],
+) -> None:
+    """
+    Registers the sink of a save format by name, either a new format or a
+    replacement of a built-in one. The factory is called with the
+    save_folder and filename_prefix arguments. Sessions of new formats are
+    recorded with their manifest, but are only read by SessionReader (and
+    thus converted and cataloged) in the built-in formats.
+    """
+    SINK_REGISTRY[format_name(name)] = factory
+
+
+def sink_names() -> list[str]:
+    """
+    Returns the names of the formats which can be recorded.
+    """
+    return list(SINK_REGISTRY)
+
+
+def open_sink(
+    save_folder: Path,
+    filename_prefix: str,
+    fmt: SaveFormatEnum | str = SaveFormatEnum.NUMPY,
+) -> FrameSink:
+    factory = SINK_REGISTRY.get(format_name(fmt))
+    if factory is None:
+        raise ValueError(f"File format {format_name(fmt)} unknown.")
+    return factory(save_folder=save_folder, filename_prefix=filename_prefix)
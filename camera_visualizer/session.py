@@ -0,0 +1,335 @@
+import bisect
+import json
+import os
+import re
+from dataclasses import asdict, dataclass
+from datetime import datetime
+from pathlib import Path
+
+import numpy as np
+
+from camera_visualizer.packing import PACKED_SUFFIX, PackedFrames
+from camera_visualizer.serializer import ENVI_DATA_TYPES, SaveFormatEnum, envi, format_name
+
+SESSION_MANIFEST = "session.json"
+SESSION_FILENAME_PREFIX = "frame"
+SESSION_SEGMENT_PREFIX = "segment"
+
+
+def read_manifest(folder: Path) -> dict | None:
+    path = folder / SESSION_MANIFEST
+    if not path.is_file():
+        return None
+    with open(path, "r") as f:
+        return json.load(f)
+
+
+def write_manifest(folder: Path, manifest: dict) -> None:
+    """
+    Writes the session manifest atomically, so that readers never see a
+    partially written file.
+    """
+    path = folder / SESSION_MANIFEST
+    tmp_path = path.with_suffix(".json.tmp")
+    with open(tmp_path, "w") as f:
+        json.dump(manifest, f, indent=2, default=str)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+
+def _envi_number(envi_options: dict, key: str) -> float | None:
+    value = envi_options.get(key)
+    if value is None:
+        return None
+    try:
+        return float(str(value).split()[0])
+    except ValueError:
+        return None
+
+
+def _widen(bounds: list | None, value: float | None) -> list | None:
+    if value is None:
+        return bounds
+    if bounds is None:
+        return [value, value]
+    return [min(bounds[0], value), max(bounds[1], value)]
+
+
+@dataclass
+class SessionSummary:
+    """
+    Time range of the frames of a session and range of their exposure and
+    bit depth, updated with each written frame so that the session can be
+    cataloged without reading its frames.
+    """
+    start: str | None = None
+    end: str | None = None
+    exposure_ms: list[float] | None = None
+    bit_depth: list[int] | None = None
+
+    def update(self, envi_options: dict | None) -> None:
+        envi_options = envi_options or {}
+        timestamp = envi_options.get("acquisition time") or datetime.now().isoformat()
+        if self.start is None or timestamp < self.start:
+            self.start = timestamp
+        if self.end is None or timestamp > self.end:
+            self.end = timestamp
+        self.exposure_ms = _widen(
+            self.exposure_ms,
+            _envi_number(envi_options, "exposure time (ms)"),
+        )
+        bit_depth = _envi_number(envi_options, "bit depth")
+        self.bit_depth = _widen(
+            self.bit_depth,
+            None if bit_depth is None else int(bit_depth),
+        )
+
+    def to_dict(self) -> dict:
+        return asdict(self)
+
+    @classmethod
+    def from_envi(cls, envi_options: dict | None) -> "SessionSummary":
+        summary = cls()
+        summary.update(envi_options=envi_options)
+        return summary
+
+
+def session_manifest(
+    fmt: SaveFormatEnum | str,
+    n_frames: int,
+    shape: tuple[int, ...] | None,
+    dtype: np.dtype | None,
+    envi_options: dict | None,
+    filename_prefix: str = SESSION_FILENAME_PREFIX,
+    segments: list[dict] | None = None,
+    summary: SessionSummary | None = None,
+) -> dict:
+    """
+    Returns the manifest of a session. The segments of a segmented session
+    are listed with their folder and number of frames.
+    """
+    manifest = {
+        "format": format_name(fmt),
+        "frames": n_frames,
+        "shape": list(shape) if shape is not None else None,
+        "dtype": np.dtype(dtype).str if dtype is not None else None,
+        "filename prefix": filename_prefix,
+        "updated": datetime.now().isoformat(),
+        "envi options": envi_options,
+    }
+    if summary is not None:
+        manifest["summary"] = summary.to_dict()
+    if segments is not None:
+        manifest["segments"] = list(segments)
+    return manifest
+
+
+def envi_options_from_header(path: Path) -> dict:
+    """
+    Reads an ENVI header back into the metadata of get_envi_options.
+    """
+    header = envi().read_envi_header(str(path))
+    for key in ("samples", "lines", "bands", "byte order", "data type"):
+        if key in header:
+            header[key] = int(header[key])
+    return header
+
+
+def _indexed_files(folder: Path, prefix: str, suffix: str) -> list[Path]:
+    pattern = re.compile(rf"{re.escape(prefix)}_(\d+){re.escape(suffix)}$")
+    matches = []
+    for path in folder.glob(f"{prefix}_*{suffix}"):
+        match = pattern.match(path.name)
+        if match is not None:
+            matches.append((int(match.group(1)), path))
+    return [path for _, path in sorted(matches)]
+
+
+def detect_format(folder: Path, prefix: str = SESSION_FILENAME_PREFIX) -> SaveFormatEnum:
+    manifest = read_manifest(folder)
+    if manifest is not None:
+        return SaveFormatEnum(manifest["format"])
+    if (folder / f"{prefix}.npy").is_file():
+        return SaveFormatEnum.NUMPY_CUBE
+    if (folder / f"{prefix}.hdr").is_file():
+        return SaveFormatEnum.ENVI_CUBE
+    if (folder / f"{prefix}.npz").is_file():
+        return SaveFormatEnum.COMPRESSED
+    if (folder / f"{prefix}{PACKED_SUFFIX}").is_file():
+        return SaveFormatEnum.PACKED
+    if _indexed_files(folder, prefix, ".npz"):
+        return SaveFormatEnum.COMPRESSED
+    if _indexed_files(folder, prefix, ".npy"):
+        return SaveFormatEnum.NUMPY
+    if _indexed_files(folder, prefix, ".hdr"):
+        return SaveFormatEnum.ENVI
+    raise ValueError(f"No recorded session found in {folder}.")
+
+
+class SessionReader:
+    """
+    Lazy, random access reader of the frames of a recorded session, for all
+    the formats of SaveFormatEnum. Frames are only read (or memory mapped)
+    when requested.
+
+    The segments of a segmented session are read as one continuous
+    sequence of frames, opening one segment at a time.
+    """
+    folder: Path
+    fmt: SaveFormatEnum
+
+    def __init__(self, folder: Path, prefix: str | None = None):
+        self.folder = Path(folder)
+        self.manifest = read_manifest(self.folder)
+        if prefix is None and self.manifest is not None:
+            prefix = self.manifest.get("filename prefix")
+        self.prefix = prefix or SESSION_FILENAME_PREFIX
+        self.fmt = detect_format(self.folder, prefix=self.prefix)
+        self._files = []
+        self._cube = None
+        self._npz = None
+        self._npz_index = None
+        self._keys = []
+        self._segments = []
+        self._offsets = []
+        self._segment = None
+        self._segment_index = None
+        self._open()
+
+    def _open(self) -> None:
+        if self.segmented:
+            # Only the segments closed before a crash are listed, possibly none
+            total = 0
+            for segment in self.manifest["segments"]:
+                self._segments.append(self.folder / segment["folder"])
+                total += segment["frames"]
+                self._offsets.append(total)
+        elif self.fmt == SaveFormatEnum.NUMPY:
+            self._files = _indexed_files(self.folder, self.prefix, ".npy")
+        elif self.fmt == SaveFormatEnum.ENVI:
+            self._files = _indexed_files(self.folder, self.prefix, ".hdr")
+        elif self.fmt == SaveFormatEnum.NUMPY_CUBE:
+            self._cube = np.load(self.folder / f"{self.prefix}.npy", mmap_mode="r")
+        elif self.fmt == SaveFormatEnum.ENVI_CUBE:
+            image = envi().open(
+                str(self.folder / f"{self.prefix}.hdr"),
+                str(self.folder / f"{self.prefix}.img"),
+            )
+            self._cube = image.open_memmap(interleave="source")
+        elif self.fmt == SaveFormatEnum.PACKED:
+            # Frames are unpacked when read
+            self._cube = PackedFrames(self.folder / f"{self.prefix}{PACKED_SUFFIX}")
+        elif self.fmt == SaveFormatEnum.COMPRESSED:
+            self._files = _indexed_files(self.folder, self.prefix, ".npz")
+            single = self.folder / f"{self.prefix}.npz"
+            if single.is_file():
+                self._files.insert(0, single)
+            for file_index, path in enumerate(self._files):
+                with np.load(path) as npz:
+                    self._keys.extend((file_index, key) for key in sorted(npz.files))
+
+    @property
+    def segmented(self) -> bool:
+        return self.manifest is not None and self.manifest.get("segments") is not None
+
+    def __len__(self) -> int:
+        if self.segmented:
+            return self._offsets[-1] if self._offsets else 0
+        if self.fmt in (SaveFormatEnum.NUMPY, SaveFormatEnum.ENVI):
+            return len(self._files)
+        if self.fmt == SaveFormatEnum.COMPRESSED:
+            return len(self._keys)
+        return self._cube.shape[0]
+
+    def __getitem__(self, index: int) -> np.ndarray:
+        return self.read(index)
+
+    def __iter__(self):
+        for index in range(len(self)):
+            yield self.read(index)
+
+    def read(self, index: int) -> np.ndarray:
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError(f"Frame {index} out of range.")
+        if self.segmented:
+            return self._read_segment(index)
+        if self.fmt == SaveFormatEnum.NUMPY:
+            return np.load(self._files[index], mmap_mode="r")
+        if self.fmt == SaveFormatEnum.ENVI:
+            image = envi().open(str(self._files[index]))
+            return image.read_band(0)
+        if self.fmt == SaveFormatEnum.COMPRESSED:
+            file_index, key = self._keys[index]
+            if self._npz_index != file_index:
+                self.close()
+                self._npz = np.load(self._files[file_index])
+                self._npz_index = file_index
+            return self._npz[key]
+        return self._cube[index]
+
+    def _read_segment(self, index: int) -> np.ndarray:
+        segment_index = bisect.bisect_right(self._offsets, index)
+        if self._segment_index != segment_index:
+            self.close()
+            self._segment = SessionReader(self._segments[segment_index], prefix=self.prefix)
+            self._segment_index = segment_index
+        first = self._offsets[segment_index - 1] if segment_index > 0 else 0
+        return self._segment.read(index - first)
+
+    def frame_shape(self) -> tuple[int, ...]:
+        return tuple(self.read(0).shape)
+
+    def dtype(self) -> np.dtype:
+        return self.read(0).dtype
+
+    def frame_bytes(self) -> int:
+        return int(np.prod(self.frame_shape())) * self.dtype().itemsize
+
+    def envi_options(self) -> dict:
+        """
+        Returns the camera metadata of the session, as produced by
+        get_envi_options when recording.
+        """
+        if self.manifest is not None and self.manifest.get("envi options"):
+            return dict(self.manifest["envi options"])
+        if self.segmented:
+            self.read(0)
+            return self._segment.envi_options()
+        if self.fmt == SaveFormatEnum.ENVI:
+            return envi_options_from_header(self._files[0])
+        if self.fmt == SaveFormatEnum.ENVI_CUBE:
+            header = envi_options_from_header(self.folder / f"{self.prefix}.hdr")
+            header["bands"] = 1
+            if "filter array wavelength" in header:
+                header["wavelength"] = header.pop("filter array wavelength")
+            return header
+        shape, dtype = self.frame_shape(), self.dtype()
+        return {
+            "samples": shape[1],
+            "lines": shape[0],
+            "bands": 1,
+            "interleave": "bsq",
+            "byte order": 0,
+            "data type": ENVI_DATA_TYPES[np.dtype(dtype)],
+        }
+
+    def close(self) -> None:
+        if self._segment is not None:
+            self._segment.close()
+            self._segment = None
+            self._segment_index = None
+        if self._npz is not None:
+            self._npz.close()
+            self._npz = None
+            self._npz_index = None
+
+
+def is_session(folder: Path) -> bool:
+    try:
+        detect_format(folder)
+    except ValueError:
+        return False
+    return True
@@ -0,0 +1,140 @@
+from dataclasses import dataclass
+from enum import Enum
+
+import numpy as np
+
+STACK_DEFAULT_FRAMES = 16
+STACK_DEFAULT_ALPHA = 0.1
+STACK_SATURATION_FRACTION = 0.01
+
+
+class StackModeEnum(str, Enum):
+    OFF = "off"
+    MEAN = "mean"
+    EMA = "ema"
+
+
+@dataclass
+class StackConfig:
+    """
+    Temporal averaging of consecutive raw frames: the mean of each block of
+    `frames` frames, or an exponential moving average with weight `alpha`
+    for the live view. Frames with more than saturation_fraction of
+    saturated pixels are rejected if reject_saturated is True. The stacked
+    frames replace the raw frames on the display and/or in the recording.
+    """
+    mode: StackModeEnum = StackModeEnum.OFF
+    frames: int = STACK_DEFAULT_FRAMES
+    alpha: float = STACK_DEFAULT_ALPHA
+    reject_saturated: bool = False
+    saturation_fraction: float = STACK_SATURATION_FRACTION
+    display: bool = True
+    record: bool = False
+
+    @property
+    def enabled(self) -> bool:
+        return self.mode != StackModeEnum.OFF
+
+
+class FrameStacker:
+    """
+    Accumulates raw frames into preallocated buffers, without allocation per
+    frame.
+
+    In mean mode, integer frames are summed into an int32 accumulator when
+    the sum of a block cannot overflow (float32 otherwise), and the mean is
+    written to a float32 frame once the block is complete. In EMA mode, the
+    float32 average is updated with every frame. The stacked frame is reused
+    between results, so it must be copied to be kept.
+    """
+    config: StackConfig
+    stacked: np.ndarray | None
+    count: int
+    rejected: int
+    n_stacked: int
+
+    def __init__(self, config: StackConfig):
+        self.config = config
+        self.stacked = None
+        self.count = 0
+        self.rejected = 0
+        self.n_stacked = 0
+        self._sum = None
+        self._delta = None
+        self._mask = None
+        self._shape = None
+        self._dtype = None
+
+    def reset(self) -> None:
+        self.count = 0
+        self.rejected = 0
+        self.n_stacked = 0
+
+    def matches(self, frame: np.ndarray) -> bool:
+        return frame.shape == self._shape and frame.dtype == self._dtype
+
+    def _allocate(self, frame: np.ndarray, max_value: int) -> None:
+        self._shape, self._dtype = frame.shape, frame.dtype
+        self.stacked = np.zeros(frame.shape, dtype=np.float32)
+        self._mask = np.empty(frame.shape, dtype=bool)
+        self._sum = None
+        self._delta = None
+        if self.config.mode == StackModeEnum.MEAN:
+            fits_int32 = (
+                np.issubdtype(frame.dtype, np.integer)
+                and max_value * self.config.frames <= np.iinfo(np.int32).max
+            )
+            self._sum = np.zeros(
+                frame.shape, dtype=np.int32 if fits_int32 else np.float32
+            )
+        else:
+            self._delta = np.empty(frame.shape, dtype=np.float32)
+        self.count = 0
+
+    def saturated(self, frame: np.ndarray, max_value: int) -> bool:
+        np.greater_equal(frame, max_value, out=self._mask)
+        n_saturated = np.count_nonzero(self._mask)
+        return n_saturated > self.config.saturation_fraction * frame.size
+
+    def push(self, frame: np.ndarray, max_value: int) -> np.ndarray | None:
+        """
+        Adds a raw frame, returning the stacked frame when a new one is ready
+        (after each block of frames in mean mode, every frame in EMA mode).
+        """
+        if self.stacked is None or not self.matches(frame):
+            self._allocate(frame=frame, max_value=max_value)
+        if self.config.reject_saturated and self.saturated(frame, max_value):
+            self.rejected += 1
+            return None
+        if self.config.mode == StackModeEnum.MEAN:
+            return self._push_mean(frame=frame)
+        return self._push_ema(frame=frame)
+
+    def _push_mean(self, frame: np.ndarray) -> np.ndarray | None:
+        if self.count == 0:
+            np.copyto(self._sum, frame, casting="unsafe")
+        else:
+            np.add(self._sum, frame, out=self._sum, casting="unsafe")
+        self.count += 1
+        if self.count < self.config.frames:
+            return None
+        np.multiply(self._sum, 1.0 / self.count, out=self.stacked, casting="unsafe")
+        self.count = 0
+        self.n_stacked += 1
+        return self.stacked
+
+    def _push_ema(self, frame: np.ndarray) -> np.ndarray:
+        if self.count == 0:
+            np.copyto(self.stacked, frame, casting="unsafe")
+        else:
+            np.subtract(frame, self.stacked, out=self._delta, casting="unsafe")
+            self._delta *= self.config.alpha
+            self.stacked += self._delta
+        self.count += 1
+        self.n_stacked += 1
+        return self.stacked
+
+    def progress(self) -> float:
+        if self.config.mode == StackModeEnum.MEAN:
+            return self.count / self.config.frames
+        return 1.0
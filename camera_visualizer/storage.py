@@ -0,0 +1,169 @@
+import math
+import shutil
+import time
+from dataclasses import dataclass
+from enum import Enum
+from pathlib import Path
+
+from camera_visualizer.recorder import AsyncFrameWriter
+
+STORAGE_QUEUE_WARNING_FILL = 0.5
+STORAGE_OVERFLOW_HORIZON_S = 10.0
+STORAGE_MIN_REMAINING_S = 10.0
+STORAGE_SAMPLE_PERIOD_S = 1.0
+
+
+class StoragePolicyEnum(str, Enum):
+    WARN = "warn"
+    REDUCE_FPS = "reduce fps"
+    STOP = "stop"
+
+
+@dataclass
+class StorageStatus:
+    required_bps: float = 0.0
+    achieved_bps: float = 0.0
+    capacity_bps: float = math.inf
+    latency_s: float = 0.0
+    queue_fill: float = 0.0
+    free_bytes: int = 0
+    remaining_s: float = math.inf
+    record_every: int = 1
+    warning: str | None = None
+    stop: bool = False
+
+    def summary(self) -> str:
+        text = (
+            f"Disk: {self.achieved_bps / 2 ** 20:.0f}/"
+            f"{self.required_bps / 2 ** 20:.0f} MB/s, "
+            f"{self.free_bytes / 2 ** 30:.1f} GB free"
+        )
+        if math.isfinite(self.remaining_s):
+            text += f" ({format_duration(self.remaining_s)} left)"
+        if self.record_every > 1:
+            text += f", recording 1 frame out of {self.record_every}"
+        return text
+
+
+def format_duration(seconds: float) -> str:
+    minutes, seconds = divmod(int(seconds), 60)
+    hours, minutes = divmod(minutes, 60)
+    return f"{hours:d}:{minutes:02d}:{seconds:02d}"
+
+
+def required_bandwidth(frame_bytes: int, fps: float, record_every: int = 1) -> float:
+    return frame_bytes * fps / record_every
+
+
+class StorageMonitor:
+    """
+    Compares the bandwidth required by the recording with the one achieved by
+    the frame writer, and estimates the remaining recording time from the
+    free space of the disk.
+
+    When the writer cannot keep up (its queue is filling up or its write
+    bandwidth is below the required one), the policy decides whether to only
+    warn, to record one frame out of N, or to stop the recording. The
+    recording is always stopped before the disk is full.
+    """
+    path: Path
+    policy: StoragePolicyEnum
+    status: StorageStatus
+
+    def __init__(
+        self,
+        path: Path,
+        policy: StoragePolicyEnum | str = StoragePolicyEnum.WARN,
+        min_remaining_s: float = STORAGE_MIN_REMAINING_S,
+    ):
+        self.path = path
+        self.policy = StoragePolicyEnum(policy)
+        self.min_remaining_s = min_remaining_s
+        self.status = StorageStatus()
+        self._last_sample = None
+
+    def reset(self) -> None:
+        self.status = StorageStatus()
+        self._last_sample = None
+
+    def update(
+        self,
+        frame_bytes: int,
+        fps: float,
+        writer: AsyncFrameWriter | None = None,
+    ) -> StorageStatus:
+        status = self.status
+        status.warning = None
+        status.stop = False
+        status.free_bytes = shutil.disk_usage(self.path).free
+        status.required_bps = required_bandwidth(
+            frame_bytes=frame_bytes,
+            fps=fps,
+            record_every=status.record_every,
+        )
+        if status.required_bps > 0:
+            status.remaining_s = status.free_bytes / status.required_bps
+        if writer is None:
+            self._last_sample = None
+            status.record_every = 1
+            return status
+
+        now = time.perf_counter()
+        sample = (
+            now,
+            writer.bytes_written,
+            writer.write_time,
+            writer.queue_depth(),
+            writer.dropped,
+        )
+        if self._last_sample is not None and now > self._last_sample[0]:
+            elapsed = now - self._last_sample[0]
+            written = sample[1] - self._last_sample[1]
+            busy = sample[2] - self._last_sample[2]
+            growth = (sample[3] - self._last_sample[3]) / elapsed
+            status.achieved_bps = written / elapsed
+            status.capacity_bps = written / busy if busy > 0 else math.inf
+            status.latency_s = writer.last_latency
+            status.queue_fill = sample[3] / writer.queue_size()
+            if growth > 0:
+                overflow_s = (writer.queue_size() - sample[3]) / growth
+            else:
+                overflow_s = math.inf
+            self._check_overflow(
+                overflow_s=overflow_s,
+                required_bps=required_bandwidth(frame_bytes, fps),
+                dropped=sample[4] - self._last_sample[4],
+            )
+        self._last_sample = sample
+
+        if status.remaining_s < self.min_remaining_s:
+            status.warning = "Disk almost full"
+            status.stop = True
+        return status
+
+    def _check_overflow(
+        self,
+        overflow_s: float,
+        required_bps: float,
+        dropped: int,
+    ) -> None:
+        status = self.status
+        if status.queue_fill >= STORAGE_QUEUE_WARNING_FILL:
+            status.warning = "Disk too slow"
+        if dropped > 0:
+            status.warning = f"Disk too slow, {dropped} frames dropped"
+        overloaded = dropped > 0 or overflow_s < STORAGE_OVERFLOW_HORIZON_S
+        if not overloaded:
+            return
+        if status.warning is None:
+            status.warning = (
+                f"Disk too slow, queue full in {overflow_s:.0f} s"
+            )
+        if self.policy == StoragePolicyEnum.STOP:
+            status.stop = True
+        elif self.policy == StoragePolicyEnum.REDUCE_FPS:
+            if math.isfinite(status.capacity_bps) and status.capacity_bps > 0:
+                record_every = math.ceil(required_bps / status.capacity_bps)
+            else:
+                record_every = status.record_every + 1
+            status.record_every = max(record_every, status.record_every + 1)
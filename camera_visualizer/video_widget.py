@@ -0,0 +1,243 @@
+import time
+from enum import Enum
+
+import numpy as np
+
+from PyQt5.QtWidgets import QWidget, QSizePolicy
+from PyQt5.QtCore import Qt, QPoint, QPointF, QRect, QRectF, pyqtSignal
+from PyQt5.QtGui import QImage, QPainter, QColor, QPen, QPolygonF
+
+
+class TransformEnum(str, Enum):
+    FAST = "fast"
+    SMOOTH = "smooth"
+
+
+def image_format(arr: np.ndarray, indexed: bool = False) -> QImage.Format:
+    if arr.ndim == 2 and arr.dtype == np.uint8:
+        return QImage.Format_Indexed8 if indexed else QImage.Format_Grayscale8
+    if arr.ndim == 2 and arr.dtype == np.uint16:
+        return QImage.Format_Grayscale16
+    if arr.ndim == 3 and arr.shape[2] == 3 and arr.dtype == np.uint8:
+        return QImage.Format_RGB888
+    raise ValueError(
+        f"Image of shape {arr.shape} and type {arr.dtype} not displayable"
+    )
+
+
+class VideoWidget(QWidget):
+    """
+    Widget painting a NumPy display buffer scaled to its size.
+
+    The buffer is wrapped in a QImage without copying, so a reference to it
+    is kept for as long as it is displayed. Writing in place to the same
+    buffer and calling set_frame again only triggers a repaint. The duration
+    of the latest paint is kept in paint_seconds.
+
+    A region of interest, as (top, left, bottom, right) fractions of the
+    frame, can be outlined over the frame. While selecting, a rectangle
+    dragged over the frame is emitted with roi_selected in the same form.
+    """
+    roi_selected = pyqtSignal(tuple)
+    paint_seconds: float
+    _buffer: np.ndarray | None
+    _image: QImage | None
+
+    def __init__(self, parent: QWidget | None = None):
+        super().__init__(parent)
+        self._buffer = None
+        self._image = None
+        self._indexed = False
+        self._color_table = None
+        self._text = ""
+        self._transform = TransformEnum.SMOOTH
+        self._roi = None
+        self._selecting = False
+        self._drag_start = None
+        self._drag_end = None
+        self.paint_seconds = 0.0
+        self.setAttribute(Qt.WA_OpaquePaintEvent)
+        self.setSizePolicy(QSizePolicy.Expanding, QSizePolicy.Expanding)
+
+    def set_frame(self, arr: np.ndarray, indexed: bool = False) -> None:
+        """
+        Displays a uint8 grayscale (or indexed), uint16 grayscale or uint8 RGB
+        buffer.
+        """
+        if (
+            self._image is None
+            or arr is not self._buffer
+            or indexed != self._indexed
+        ):
+            self._wrap(arr=arr, indexed=indexed)
+        self._text = ""
+        self.update()
+
+    def set_color_table(self, color_table: list[int] | None) -> None:
+        """
+        Sets the color table (as a list of 0xAARRGGBB values) for indexed
+        buffers.
+        """
+        self._color_table = color_table
+        if self._image is not None and self._indexed and color_table is not None:
+            self._image.setColorTable(color_table)
+            self.update()
+
+    def set_text(self, text: str) -> None:
+        """
+        Clears the current frame and displays a text message instead.
+        """
+        self._buffer = None
+        self._image = None
+        self._text = text
+        self.update()
+
+    def set_transform(self, transform: TransformEnum | str) -> None:
+        if not isinstance(transform, TransformEnum):
+            transform = TransformEnum(transform)
+        self._transform = transform
+        self.update()
+
+    def transform(self) -> TransformEnum:
+        return self._transform
+
+    def image_rect(self) -> QRect:
+        """
+        Returns the rectangle of the widget where the frame is painted.
+        """
+        if self._image is None:
+            return self.rect()
+        size = self._image.size().scaled(self.size(), Qt.KeepAspectRatio)
+        rect = QRect(0, 0, size.width(), size.height())
+        rect.moveCenter(self.rect().center())
+        return rect
+
+    def set_roi(self, roi: tuple[float, float, float, float] | None) -> None:
+        """
+        Outlines a region of interest given as (top, left, bottom, right)
+        fractions of the frame, or none.
+        """
+        self._roi = roi
+        self.update()
+
+    def set_selecting(self, selecting: bool) -> None:
+        self._selecting = selecting
+        self._drag_start = None
+        self._drag_end = None
+        self.setCursor(Qt.CrossCursor if selecting else Qt.ArrowCursor)
+        self.update()
+
+    def _fraction(self, point: QPoint) -> tuple[float, float]:
+        rect = self.image_rect()
+        y = (point.y() - rect.top()) / max(rect.height(), 1)
+        x = (point.x() - rect.left()) / max(rect.width(), 1)
+        return min(max(y, 0.0), 1.0), min(max(x, 0.0), 1.0)
+
+    def _drag_roi(self) -> tuple[float, float, float, float]:
+        (y0, x0), (y1, x1) = self._fraction(self._drag_start), self._fraction(self._drag_end)
+        return min(y0, y1), min(x0, x1), max(y0, y1), max(x0, x1)
+
+    def mousePressEvent(self, event) -> None:
+        if self._selecting and event.button() == Qt.LeftButton:
+            self._drag_start = event.pos()
+            self._drag_end = event.pos()
+        super().mousePressEvent(event)
+
+    def mouseMoveEvent(self, event) -> None:
+        if self._drag_start is not None:
+            self._drag_end = event.pos()
+            self.update()
+        super().mouseMoveEvent(event)
+
+    def mouseReleaseEvent(self, event) -> None:
+        if self._drag_start is not None and event.button() == Qt.LeftButton:
+            self._drag_end = event.pos()
+            roi = self._drag_roi()
+            self._drag_start = None
+            self._drag_end = None
+            if roi[2] > roi[0] and roi[3] > roi[1]:
+                self.roi_selected.emit(roi)
+            self.update()
+        super().mouseReleaseEvent(event)
+
+    def _roi_rect(self, roi: tuple[float, float, float, float]) -> QRectF:
+        rect = self.image_rect()
+        top, left, bottom, right = roi
+        return QRectF(
+            rect.left() + left * rect.width(),
+            rect.top() + top * rect.height(),
+            (right - left) * rect.width(),
+            (bottom - top) * rect.height(),
+        )
+
+    def _wrap(self, arr: np.ndarray, indexed: bool) -> None:
+        fmt = image_format(arr=arr, indexed=indexed)
+        if not arr.flags.c_contiguous:
+            arr = np.ascontiguousarray(arr)
+        self._buffer = arr
+        self._indexed = indexed
+        self._image = QImage(
+            arr.data,
+            arr.shape[1],
+            arr.shape[0],
+            arr.strides[0],
+            fmt,
+        )
+        if indexed and self._color_table is not None:
+            self._image.setColorTable(self._color_table)
+
+    def paintEvent(self, event) -> None:
+        start = time.perf_counter()
+        painter = QPainter(self)
+        painter.fillRect(self.rect(), QColor(Qt.black))
+        if self._image is None:
+            painter.setPen(QColor(Qt.white))
+            painter.drawText(self.rect(), Qt.AlignCenter, self._text)
+        else:
+            painter.setRenderHint(
+                QPainter.SmoothPixmapTransform,
+                self._transform == TransformEnum.SMOOTH,
+            )
+            painter.drawImage(self.image_rect(), self._image)
+            roi = self._drag_roi() if self._drag_start is not None else self._roi
+            if roi is not None:
+                painter.setPen(QPen(QColor(Qt.yellow), 2))
+                painter.drawRect(self._roi_rect(roi))
+        painter.end()
+        self.paint_seconds = time.perf_counter() - start
+
+
+class TrendWidget(QWidget):
+    """
+    Widget plotting the latest values of a metric as a line, scaled between
+    zero and the largest value, with the largest value marked.
+    """
+    _values: np.ndarray
+
+    def __init__(self, parent: QWidget | None = None):
+        super().__init__(parent)
+        self._values = np.zeros(0, dtype=np.float32)
+        self.setAttribute(Qt.WA_OpaquePaintEvent)
+        self.setSizePolicy(QSizePolicy.Expanding, QSizePolicy.Fixed)
+        self.setFixedHeight(80)
+
+    def set_values(self, values: np.ndarray) -> None:
+        self._values = np.asarray(values, dtype=np.float32)
+        self.update()
+
+    def paintEvent(self, event) -> None:
+        painter = QPainter(self)
+        painter.fillRect(self.rect(), QColor(Qt.black))
+        values = self._values
+        top = float(values.max()) if len(values) else 0.0
+        if len(values) > 1 and top > 0:
+            width, height = self.width() - 1, self.height() - 1
+            xs = np.linspace(0, width, len(values))
+            ys = height * (1 - values / top)
+            painter.setRenderHint(QPainter.Antialiasing)
+            painter.setPen(QPen(QColor(Qt.green), 2))
+            painter.drawPolyline(QPolygonF([QPointF(x, y) for x, y in zip(xs, ys)]))
+            best = int(np.argmax(values))
+            painter.setPen(QPen(QColor(Qt.yellow), 1, Qt.DashLine))
+            painter.drawLine(QPointF(xs[best], 0), QPointF(xs[best], height))
+        painter.end()
@@ -0,0 +1,168 @@
+from enum import Enum
+
+import numpy as np
+
+from camera_visualizer.camera_interface.bayer import (
+    BAYER_DEFAULT_ORDER,
+    demosaic_bilinear,
+)
+from camera_visualizer.camera_interface.ximea_mosaic import (
+    XIMEA_MOSAIC_C,
+    XIMEA_MOSAIC_R,
+    XIMEA_WAVELENGTHS,
+    get_images,
+)
+
+# Wavelengths (in nm) of the XIMEA bands shown as red, green and blue
+FALSE_COLOR_WAVELENGTHS = (800, 680, 595)
+# Colormap of the false color view of sensors without spectral bands, as
+# (level, red, green, blue) anchors
+FALSE_COLOR_ANCHORS = np.array([
+    [0.00, 0.00, 0.00, 0.02],
+    [0.25, 0.33, 0.06, 0.43],
+    [0.50, 0.73, 0.21, 0.33],
+    [0.75, 0.98, 0.55, 0.04],
+    [1.00, 0.99, 1.00, 0.64],
+], dtype=np.float32)
+FALSE_COLOR_LEVELS = 1024
+
+
+class ViewModeEnum(str, Enum):
+    RAW = "raw"
+    DEMOSAIC = "demosaic"
+    FALSE_COLOR = "false color"
+
+
+def false_color_lut() -> np.ndarray:
+    levels = np.linspace(0.0, 1.0, FALSE_COLOR_LEVELS, dtype=np.float32)
+    return np.stack(
+        [np.interp(levels, FALSE_COLOR_ANCHORS[:, 0], FALSE_COLOR_ANCHORS[:, c]) for c in (1, 2, 3)],
+        axis=-1,
+    ).astype(np.float32)
+
+
+_FALSE_COLOR_LUT = false_color_lut()
+
+
+def _mosaic_band(frame: np.ndarray, wavelength: int) -> np.ndarray:
+    for ii, row in enumerate(XIMEA_WAVELENGTHS):
+        if wavelength in row:
+            return frame[ii::XIMEA_MOSAIC_R, row.index(wavelength)::XIMEA_MOSAIC_C]
+    raise ValueError(f"No band at {wavelength} nm.")
+
+
+def false_color_view(
+    frame: np.ndarray,
+    cfa_shape: tuple[int, int],
+    dynamic_range: int,
+) -> np.ndarray:
+    """
+    Returns an RGB view of a raw frame: the NIR, red and orange bands of a
+    4x4 XIMEA mosaic as red, green and blue, or a colormap of the intensity
+    of other sensors, binned over their filter array period.
+    """
+    if frame.ndim == 3:
+        frame = frame.mean(axis=-1)
+    if tuple(cfa_shape) == (XIMEA_MOSAIC_R, XIMEA_MOSAIC_C):
+        bands = [_mosaic_band(frame, w) for w in FALSE_COLOR_WAVELENGTHS]
+        return np.stack(bands, axis=-1).astype(np.float32) / dynamic_range
+    rows, cols = cfa_shape
+    view = frame.astype(np.float32) / dynamic_range
+    if (rows, cols) != (1, 1):
+        height = view.shape[0] // rows * rows
+        width = view.shape[1] // cols * cols
+        view = view[:height, :width].reshape(
+            height // rows, rows, width // cols, cols
+        ).mean(axis=(1, 3))
+    levels = np.clip(view * (FALSE_COLOR_LEVELS - 1), 0, FALSE_COLOR_LEVELS - 1)
+    return _FALSE_COLOR_LUT[levels.astype(np.intp)]
+
+
+def frame_view(
+    frame: np.ndarray,
+    mode: ViewModeEnum | str,
+    cfa_shape: tuple[int, int],
+    dynamic_range: int,
+    bayer_order: str = BAYER_DEFAULT_ORDER,
+) -> np.ndarray:
+    """
+    Returns the view of a raw frame in one of the view modes of the live
+    cameras, without their SDK: the tiled bands of a demosaiced 4x4 XIMEA
+    mosaic, or the bilinear RGB demosaicing of a Bayer frame.
+    """
+    mode = ViewModeEnum(mode)
+    if mode == ViewModeEnum.FALSE_COLOR:
+        return false_color_view(frame, cfa_shape=cfa_shape, dynamic_range=dynamic_range)
+    demosaic = mode == ViewModeEnum.DEMOSAIC
+    if tuple(cfa_shape) == (XIMEA_MOSAIC_R, XIMEA_MOSAIC_C):
+        return get_images(frame=frame, demosaic_flag=demosaic, dynamic_range=dynamic_range)
+    view = frame.astype(np.float32) / dynamic_range
+    if view.ndim == 3:
+        view = view.mean(axis=-1)
+    if demosaic and tuple(cfa_shape) == (2, 2):
+        view = demosaic_bilinear(view, order=bayer_order)
+    return view
+
+
+def decimate_mosaic(
+    frame: np.ndarray,
+    cfa_shape: tuple[int, int],
+    decimation: int,
+) -> np.ndarray:
+    """
+    Keeps one filter array period out of `decimation` in both directions of
+    a raw frame, so that the decimated frame is still a mosaic of the same
+    pattern, whose view is the view of the frame at a reduced resolution.
+    Trailing channels are kept.
+    """
+    if decimation <= 1:
+        return frame
+    rows, cols = cfa_shape
+    if (rows, cols) == (1, 1):
+        return frame[::decimation, ::decimation]
+    height = frame.shape[0] // rows
+    width = frame.shape[1] // cols
+    periods = frame[:height * rows, :width * cols].reshape(
+        (height, rows, width, cols) + frame.shape[2:]
+    )
+    periods = periods[::decimation, :, ::decimation]
+    return periods.reshape((periods.shape[0] * rows, periods.shape[2] * cols) + frame.shape[2:])
+
+
+def display_channels(view: np.ndarray) -> np.ndarray:
+    """
+    Returns the displayed channels of a view: grayscale views as (H, W), and
+    the first three channels of multichannel views.
+    """
+    if view.ndim == 3 and view.shape[2] == 1:
+        return view[..., 0]
+    if view.ndim == 3:
+        return view[..., :3]
+    if view.ndim != 2:
+        raise ValueError("Image not displayable")
+    return view
+
+
+def view_to_display(
+    view: np.ndarray,
+    out: np.ndarray | None = None,
+    limits: tuple[float, float] | None = None,
+) -> np.ndarray:
+    """
+    Converts a float view in [0, 1] to an 8 bits display buffer, reusing the
+    output buffer when its shape matches. Only the first three channels of
+    multichannel views are kept. With (low, high) limits, the view is
+    stretched so that low is black and high is white.
+    """
+    view = display_channels(view)
+    if out is None or out.shape != view.shape or out.dtype != np.uint8:
+        out = np.empty(view.shape, dtype=np.uint8)
+    if limits is None:
+        np.multiply(np.clip(view, 0.0, 1.0), 255.0, out=out, casting="unsafe")
+        return out
+    low, high = limits
+    scaled = np.subtract(view, np.float32(low), dtype=np.float32)
+    np.multiply(scaled, np.float32(255.0 / (high - low)), out=scaled)
+    np.clip(scaled, 0.0, 255.0, out=scaled)
+    np.copyto(out, scaled, casting="unsafe")
+    return out
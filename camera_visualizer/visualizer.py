@@ -1,129 +1,556 @@
+from collections.abc import Callable
 from functools import partial
-from typing import Any
 from datetime import datetime
 import argparse
+import queue
+import threading
+import time
 
-import matplotlib.pyplot as plt
-from matplotlib.animation import FuncAnimation
+import numpy as np
+from matplotlib.colors import Normalize
 
-from camera_visualizer.camera_interface.mock_interface import MockCamera, Camera
-from camera_visualizer.serializer import SaveFormatEnum
+from camera_visualizer.acquisition import Acquisition
+from camera_visualizer.camera_interface.mock_interface import Camera, CameraEnum, camera
+from camera_visualizer.camera_interface.registry import backend_names, get_backend
+from camera_visualizer.profiling import (
+    PROFILE_POLL_MS,
+    ProfileConfig,
+    Profiler,
+    add_profile_arguments,
+    profile_config,
+)
+from camera_visualizer.serializer import SaveFormatEnum, sink_names
+from camera_visualizer.views import view_to_display
+
+VISUALIZER_DEFAULT_FPS = 30.0
+VISUALIZER_DISPLAY_FPS = 30.0
+VISUALIZER_MAX_FAILURES = 3
+VISUALIZER_EXPOSURE_TRIES = 50
+VISUALIZER_FIRST_FRAME_TIMEOUT_S = 5.0
+VISUALIZER_STATUS_PERIOD_S = 1.0
+# Wait between two polls of the benchmark when no new frame is available
+VISUALIZER_BENCHMARK_POLL_S = 0.0005
+# The display buffers are uint8, so the normalization is fixed
+VISUALIZER_NORM = Normalize(vmin=0, vmax=255, clip=True)
 
 
 class VisualizerState:
     paused: bool = False
-    record: bool = False
-    bit_depth_selector: bool = False
-    estimating_exposure: bool = False
     demosaic: bool = False
+    frames: int = 0
+    frame_index: int = -1
+    shape: tuple[int, ...] | None = None
+    status_time: float = 0.0
+    status_frames: int = 0
+
+
+class AcquisitionThread:
+    """
+    Grabs frames from its own thread at the acquisition rate, independently
+    of the display, and hands the display the latest frame only.
+
+    The view of a grabbed frame is only computed and converted to a uint8
+    display buffer when the display asked for a new frame, so that frames
+    the display cannot keep up with are skipped instead of queued. Two
+    display buffers are used: the next frame is converted into the back
+    buffer while the display reads the front one, and the lock is only held
+    to swap them, never across a grab or a conversion.
+
+    The view is decimated by `decimation` (set by the display from the size
+    of the axes) before the conversion, since matplotlib resamples the whole
+    image on every draw however few screen pixels it covers.
+
+    The camera settings are changed by commands posted to the thread, which
+    runs them between two grabs, so that they never change in the middle of
+    a grab and the display never waits for one.
+    """
+    acquisition: Acquisition
+    fps: float
+    lock: threading.Lock
+    decimation: int
+    view_shape: tuple[int, int] | None
+    error: Exception | None
+
+    def __init__(self, acquisition: Acquisition, fps: float):
+        self.acquisition = acquisition
+        self.fps = fps
+        self.lock = threading.Lock()
+        self.decimation = 1
+        self.view_shape = None
+        self.error = None
+        self.grabbed = 0
+        self.converted = 0
+        self.convert_time = 0.0
+        self._front = None
+        self._back = None
+        self._front_index = -1
+        self._wanted = True
+        self._estimating = False
+        self._exposure_tries = 0
+        self._commands = queue.SimpleQueue()
+        self._stop = threading.Event()
+        self._thread = None
+        self._start = None
+
+    def start(self) -> None:
+        self._start = time.perf_counter()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+
+    def join(self, timeout: float | None = None) -> None:
+        if self._thread is not None:
+            self._thread.join(timeout=timeout)
+
+    def is_alive(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def elapsed(self) -> float:
+        if self._start is None:
+            return 0.0
+        return time.perf_counter() - self._start
+
+    def latest(self) -> tuple[int, np.ndarray | None]:
+        """
+        Returns the index and display buffer of the latest converted frame,
+        and asks for the next one. Must be called with the lock held, and the
+        buffer is only valid until the lock is released.
+        """
+        self._wanted = True
+        return self._front_index, self._front
+
+    def wait_first_frame(self, timeout: float = VISUALIZER_FIRST_FRAME_TIMEOUT_S) -> np.ndarray:
+        """
+        Waits for the first display buffer, and returns a copy of it.
+        """
+        end = time.perf_counter() + timeout
+        while time.perf_counter() < end:
+            with self.lock:
+                index, buffer = self.latest()
+                if buffer is not None:
+                    return buffer.copy()
+            if not self.is_alive():
+                break
+            time.sleep(0.01)
+        if self.error is not None:
+            raise self.error
+        raise TimeoutError("No frame received from the camera.")
+
+    def post(self, command: Callable[[Acquisition], None]) -> None:
+        """
+        Runs a command on the acquisition from the acquisition thread, before
+        the next grab. Errors of the command are printed.
+        """
+        self._commands.put(command)
+
+    def estimate_exposure(self) -> None:
+        self.post(self._start_exposure_estimation)
+
+    def _start_exposure_estimation(self, acquisition: Acquisition) -> None:
+        acquisition.camera.init_exposure(max_exposure=int(1_000_000 // self.fps))
+        self._estimating = True
+        self._exposure_tries = 0
+
+    def _run_commands(self) -> None:
+        while True:
+            try:
+                command = self._commands.get_nowait()
+            except queue.Empty:
+                return
+            try:
+                command(self.acquisition)
+            except Exception as e:
+                print(f"Command failed: {e}")
+
+    def _grab(self) -> None:
+        camera = self.acquisition.camera
+        if self._estimating:
+            camera.set_exposure(camera.adjust_exposure())
+        frame = self.acquisition.grab(fps=self.fps)
+        self.grabbed += 1
+        if self._estimating:
+            self._exposure_tries += 1
+            converged = camera.check_exposure(frame=frame)
+            if converged or self._exposure_tries >= VISUALIZER_EXPOSURE_TRIES:
+                self._estimating = False
+                print(f"Exposure set to {camera.exposure()} us")
+
+    def _convert(self) -> None:
+        start = time.perf_counter()
+        view = self.acquisition.view()
+        if view is None:
+            return
+        shape = view.shape[:2]
+        decimation = self.decimation
+        if decimation > 1:
+            view = view[::decimation, ::decimation]
+        self._back = view_to_display(view=view, out=self._back)
+        with self.lock:
+            self._front, self._back = self._back, self._front
+            self._front_index = self.acquisition.frame_index
+            self.view_shape = shape
+            self._wanted = False
+        self.converted += 1
+        self.convert_time += time.perf_counter() - start
 
+    def _run(self) -> None:
+        period = 1.0 / self.fps
+        failures = 0
+        next_grab = time.perf_counter()
+        try:
+            while not self._stop.is_set():
+                self._run_commands()
+                try:
+                    self._grab()
+                    if self._wanted:
+                        self._convert()
+                    failures = 0
+                except self.acquisition.camera.exception_type() as e:
+                    failures += 1
+                    if failures >= VISUALIZER_MAX_FAILURES:
+                        self.error = e
+                        break
+                next_grab += period
+                delay = next_grab - time.perf_counter()
+                if delay > 0:
+                    time.sleep(delay)
+                elif delay < -period:
+                    # Do not try to catch up after a slow grab
+                    next_grab = time.perf_counter()
+        except Exception as e:
+            self.error = e
+        finally:
+            try:
+                self.acquisition.stop_recording()
+            except Exception as e:
+                print(f"Recording failed: {e}")
 
-def on_key(event, state: VisualizerState, camera: Camera):
+
+def open_camera(
+    camera_id: CameraEnum | str,
+    fps: float,
+    exposure: int | None = None,
+    bit_depth: int | None = None,
+) -> Camera:
+    """
+    Opens a camera with the given exposure (in microseconds) and bit depth.
+    """
+    source = camera(camera_id=camera_id)
+    source.open(fps=fps)
+    if bit_depth is not None and source.bit_depth() != bit_depth:
+        source.toggle_bit_depth()
+        if source.bit_depth() != bit_depth:
+            print(f"Bit depth {bit_depth} not available, using {source.bit_depth()}.")
+    if exposure is not None:
+        if source.is_auto_exposure():
+            source.toggle_auto_exposure()
+        source.set_exposure(exposure)
+    return source
+
+
+def display_decimation(ax, shape: tuple[int, int]) -> int:
+    """
+    Returns the largest decimation of a view of the given shape that keeps at
+    least one view pixel per screen pixel over the visible part of the axes,
+    so that zooming in shows the full resolution.
+    """
+    x0, x1 = ax.get_xlim()
+    y0, y1 = ax.get_ylim()
+    rows = min(abs(y1 - y0), shape[0])
+    cols = min(abs(x1 - x0), shape[1])
+    return max(int(min(rows / max(ax.bbox.height, 1), cols / max(ax.bbox.width, 1))), 1)
+
+
+def show_view(im, shape: tuple[int, int]) -> None:
+    """
+    Sets the image extent to the full view shape, whatever the decimation of
+    the displayed data.
+    """
+    im.set_extent((-0.5, shape[1] - 0.5, shape[0] - 0.5, -0.5))
+
+
+def toggle_view(acquisition: Acquisition) -> None:
+    acquisition.camera.toggle_view()
+    acquisition.invalidate_view()
+
+
+def toggle_bit_depth(acquisition: Acquisition) -> None:
+    if acquisition.recording:
+        print("The bit depth cannot change while recording.")
+        return
+    acquisition.camera.toggle_bit_depth()
+    acquisition.reset()
+    print(f"Switched to {acquisition.camera.bit_depth()} bits")
+
+
+def toggle_recording(acquisition: Acquisition, filename_stem: str, fmt: SaveFormatEnum | str) -> None:
+    if not acquisition.recording:
+        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+        acquisition.camera.set_save_subfolder(subfolder=timestamp)
+        acquisition.start_recording(fmt=fmt, filename_prefix=filename_stem)
+        print(f"Recording to {acquisition.camera.save_folder()}")
+        return
+    try:
+        acquisition.stop_recording()
+        print("Stopped recording")
+    except Exception as e:
+        print(f"Recording failed: {e}")
+
+
+def on_key(
+    event,
+    state: VisualizerState,
+    thread: AcquisitionThread,
+    filename_stem: str,
+    fmt: SaveFormatEnum | str,
+):
+    """
+    Handles the keys of the figure. Camera changes are posted to the
+    acquisition thread.
+    """
     if event.key == "p":
         state.paused = not state.paused
         print("Paused" if state.paused else "Resumed")
     if event.key == "m":
-        camera.toggle_view()
-        state.demosaic = False if state.demosaic else True
+        thread.post(toggle_view)
+        state.demosaic = not state.demosaic
         if state.demosaic:
             print("Switched to demosaic view.")
         else:
             print("Switched to raw view.")
     if event.key == "b":
-        state.bit_depth_selector = True
+        thread.post(toggle_bit_depth)
+        state.frame_index = -1
     if event.key == "r":
-        state.record = not state.record
-        if state.record:
-            timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-            camera.set_save_subfolder(subfolder=timestamp)
-            print("Recording")
-        else:
-            print("Stopped recording")
+        thread.post(partial(toggle_recording, filename_stem=filename_stem, fmt=fmt))
     if event.key == "e":
-        camera.init_exposure(max_exposure=int(1_000_000 // 30))
-        state.estimating_exposure = True
+        thread.estimate_exposure()
 
 
 def update(
     frame_index: int,
     state: VisualizerState,
-    camera: Camera,
-    filename_stem: str,
-    fps: float,
-    im: Any, 
+    thread: AcquisitionThread,
+    im,
+    status,
 ):
-    if state.bit_depth_selector:
-        camera.toggle_bit_depth()
-        print("Switched bit depth")
-        state.bit_depth_selector = False
-    if state.estimating_exposure:
-        camera.adjust_exposure()
-        print(f"Exposure set to {camera.exposure()} us")
-
-    frame_save, frame_view = camera.get_frame(fps=fps)
-
-    if not state.paused:
-        im.set_data(frame_view)
-    if state.record and camera.save_folder().exists():
-        camera.save_frame(
-            frame=frame_save,
-            filename_stem=f"{filename_stem}_{frame_index}",
-            fmt=SaveFormatEnum.ENVI,
-        )
-    if state.estimating_exposure:
-        converged = camera.check_exposure(frame=frame_save)
-        state.estimating_exposure = not converged
-    return [im]
+    """
+    Displays the latest frame if there is a new one. Frames grabbed since the
+    previous update are skipped, and nothing is redrawn without a new frame.
+    """
+    if state.paused:
+        return []
+    with thread.lock:
+        index, buffer = thread.latest()
+        if buffer is None or index == state.frame_index:
+            return []
+        state.frame_index = index
+        im.set_data(buffer)
+        shape = thread.view_shape
+    state.frames += 1
+    if shape != state.shape:
+        # The extent and the blitting background follow the new shape
+        state.shape = shape
+        show_view(im=im, shape=shape)
+        im.figure.canvas.draw()
+    thread.decimation = display_decimation(ax=im.axes, shape=shape)
+
+    now = time.perf_counter()
+    if now - state.status_time >= VISUALIZER_STATUS_PERIOD_S:
+        display_fps = (state.frames - state.status_frames) / (now - state.status_time)
+        acquisition = thread.acquisition
+        text = f"display {display_fps:.1f} fps, acquisition {acquisition.measured_fps or 0:.1f} fps"
+        if acquisition.recording:
+            text += f", {acquisition.frames_recorded()} recorded"
+        status.set_text(text)
+        state.status_time = now
+        state.status_frames = state.frames
+    return [im, status]
 
 
 def main_run(
-    exposure: int = 10_000,
-    fps: float = 30,
-    filename_stem: str = "frame",    
+    camera_id: CameraEnum | str = CameraEnum.MOCK,
+    exposure: int | None = 10_000,
+    fps: float = VISUALIZER_DEFAULT_FPS,
+    display_fps: float = VISUALIZER_DISPLAY_FPS,
+    bit_depth: int | None = None,
+    filename_stem: str = "frame",
+    fmt: SaveFormatEnum | str = SaveFormatEnum.ENVI,
+    profile: ProfileConfig | None = None,
 ):
+    import matplotlib.pyplot as plt
+    from matplotlib.animation import FuncAnimation
+
+    source = open_camera(camera_id=camera_id, fps=fps, exposure=exposure, bit_depth=bit_depth)
+    thread = AcquisitionThread(acquisition=Acquisition(camera=source), fps=fps)
+    thread.start()
     try:
-        from ximea_visualizer.ximea_interface import XimeaCamera
-        camera = XimeaCamera()
-    except ImportError:
-        camera = MockCamera()
-    except Exception as e:
-        raise e
+        first = thread.wait_first_frame()
+    except BaseException:
+        thread.stop()
+        thread.join()
+        source.close()
+        raise
 
-    camera.open(fps=fps)
-    camera.set_exposure(exposure=exposure)
-    camera.toggle_bit_depth()
-    frame, frame_normalized = camera.get_frame(fps=fps)
     fig, ax = plt.subplots()
     ax.set_title(
         "P to pause/unpause, R to start/stop recording, M to switch view,\n"+
         "E for calibrating exposure time, B to change bit depth."
     )
-    im = ax.imshow(frame_normalized, cmap="gray")
+    im = ax.imshow(
+        first,
+        cmap="gray",
+        norm=VISUALIZER_NORM,
+        interpolation="nearest",
+        interpolation_stage="data",
+        animated=True,
+    )
+    status = ax.text(
+        0.01,
+        0.99,
+        "",
+        transform=ax.transAxes,
+        va="top",
+        color="yellow",
+        fontsize="small",
+        animated=True,
+    )
+
+    show_view(im=im, shape=thread.view_shape)
 
     state = VisualizerState()
+    state.shape = thread.view_shape
+    state.status_time = time.perf_counter()
 
-    update_fn = partial(update, state=state, camera=camera, filename_stem=filename_stem, fps=fps, im=im)
+    update_fn = partial(update, state=state, thread=thread, im=im, status=status)
     ani = FuncAnimation(
         fig,
         update_fn,
-        interval=fps,
+        interval=1000 / display_fps,
         blit=True,
         cache_frame_data=False,
     )
-    
-    on_key_update = partial(on_key, state=state, camera=camera)
+
+    on_key_update = partial(on_key, state=state, thread=thread, filename_stem=filename_stem, fmt=fmt)
     fig.canvas.mpl_connect('key_press_event', on_key_update)
 
+    profiler = None
+    if profile is not None:
+        profiler = Profiler(config=profile, name="visualizer")
+
+        def check_profile():
+            if profiler.tick(frames=thread.acquisition.frame_index + 1):
+                plt.close(fig)
+
+        profile_timer = fig.canvas.new_timer(interval=PROFILE_POLL_MS)
+        profile_timer.add_callback(check_profile)
+        profile_timer.start()
+        profiler.start()
+
     try:
         plt.show()
     except KeyboardInterrupt:
         print("Exiting...")
     finally:
-        camera.close()
+        thread.stop()
+        thread.join()
+        source.close()
+        if profiler is not None:
+            profiler.stop()
+        if thread.error is not None:
+            print(f"Acquisition stopped: {thread.error}")
+
+
+def benchmark(
+    camera_id: CameraEnum | str = CameraEnum.MOCK,
+    seconds: float = 10.0,
+    exposure: int | None = None,
+    fps: float = VISUALIZER_DEFAULT_FPS,
+    bit_depth: int | None = None,
+) -> str:
+    """
+    Runs the visualizer without a window for the given duration, displaying
+    every new frame as soon as it is available with the blitting path of the
+    animation on an Agg canvas, and returns the achieved display rate against
+    the acquisition rate.
+    """
+    from matplotlib.backends.backend_agg import FigureCanvasAgg
+    from matplotlib.figure import Figure
+
+    source = open_camera(camera_id=camera_id, fps=fps, exposure=exposure, bit_depth=bit_depth)
+    thread = AcquisitionThread(acquisition=Acquisition(camera=source), fps=fps)
+    thread.start()
+    try:
+        first = thread.wait_first_frame()
+        fig = Figure()
+        canvas = FigureCanvasAgg(fig)
+        ax = fig.add_subplot()
+        im = ax.imshow(
+            first,
+            cmap="gray",
+            norm=VISUALIZER_NORM,
+            interpolation="nearest",
+            interpolation_stage="data",
+            animated=True,
+        )
+        show_view(im=im, shape=thread.view_shape)
+        canvas.draw()
+        background = canvas.copy_from_bbox(ax.bbox)
+        thread.decimation = display_decimation(ax=ax, shape=thread.view_shape)
+
+        displayed = 0
+        draw_time = 0.0
+        last_index = -1
+        start_grabbed = thread.grabbed
+        start = time.perf_counter()
+        while time.perf_counter() - start < seconds and thread.is_alive():
+            with thread.lock:
+                index, buffer = thread.latest()
+                new = buffer is not None and index != last_index
+                if new:
+                    last_index = index
+                    im.set_data(buffer)
+            if not new:
+                time.sleep(VISUALIZER_BENCHMARK_POLL_S)
+                continue
+            draw_start = time.perf_counter()
+            canvas.restore_region(background)
+            ax.draw_artist(im)
+            canvas.blit(ax.bbox)
+            draw_time += time.perf_counter() - draw_start
+            displayed += 1
+        elapsed = time.perf_counter() - start
+        grabbed = thread.grabbed - start_grabbed
+    finally:
+        thread.stop()
+        thread.join()
+        source.close()
+    if thread.error is not None:
+        raise thread.error
+
+    convert_ms = 1000 * thread.convert_time / max(thread.converted, 1)
+    draw_ms = 1000 * draw_time / max(displayed, 1)
+    return (
+        f"Acquisition: {grabbed / elapsed:.1f} fps (target {fps:.1f}), "
+        f"{grabbed} frames in {elapsed:.1f} s\n"
+        f"Display:     {displayed / elapsed:.1f} fps, {displayed} frames, "
+        f"{max(grabbed - displayed, 0)} skipped\n"
+        f"Per displayed frame: {convert_ms:.2f} ms view and conversion "
+        f"(acquisition thread), {draw_ms:.2f} ms drawing"
+    )
 
 
 def main():
-    parser = argparse.ArgumentParser(description="Setting up exposure time")
+    parser = argparse.ArgumentParser(description="Matplotlib camera visualizer")
+    parser.add_argument(
+        "--camera",
+        type=str,
+        choices=backend_names(),
+        default=None,
+        help="Camera to display (default: ximea if available, else mock).",
+    )
     parser.add_argument(
         "-e",
         "--exposure",
@@ -131,6 +558,19 @@ def main():
         default=10000,
         help="Choose the exposure time in microseconds.",
     )
+    parser.add_argument(
+        "--fps",
+        type=float,
+        default=VISUALIZER_DEFAULT_FPS,
+        help="Acquisition frame rate.",
+    )
+    parser.add_argument(
+        "--display-fps",
+        type=float,
+        default=VISUALIZER_DISPLAY_FPS,
+        help="Maximum display refresh rate.",
+    )
+    parser.add_argument("--bit-depth", type=int, default=None)
     parser.add_argument(
         "-n",
         "--name",
@@ -138,10 +578,51 @@ def main():
         default="frame",
         help="Choose the savefile name.",
     )
+    parser.add_argument(
+        "-f",
+        "--format",
+        type=str,
+        choices=sink_names(),
+        default=SaveFormatEnum.ENVI.value,
+        help="Recording format.",
+    )
+    parser.add_argument(
+        "--benchmark",
+        type=float,
+        default=None,
+        metavar="SECONDS",
+        help="Run without a window for SECONDS and report the display and acquisition rates.",
+    )
+    add_profile_arguments(parser)
     args = parser.parse_args()
+
+    if args.camera is not None:
+        camera_id = args.camera
+    elif get_backend(CameraEnum.XIMEA).available():
+        camera_id = CameraEnum.XIMEA
+    else:
+        camera_id = CameraEnum.MOCK
+
+    if args.benchmark is not None:
+        print(
+            benchmark(
+                camera_id=camera_id,
+                seconds=args.benchmark,
+                exposure=args.exposure,
+                fps=args.fps,
+                bit_depth=args.bit_depth,
+            )
+        )
+        return
     main_run(
+        camera_id=camera_id,
         exposure=args.exposure,
-        filename_stem=args.name,    
+        fps=args.fps,
+        display_fps=args.display_fps,
+        bit_depth=args.bit_depth,
+        filename_stem=args.name,
+        fmt=args.format,
+        profile=profile_config(args) if args.profile else None,
     )
 
 if __name__ == "__main__":
@@ -0,0 +1,63 @@
+import argparse
+import time
+
+import numpy as np
+
+from camera_visualizer.camera_interface.ximea_mosaic import XIMEA_HEIGHT, XIMEA_WIDTH
+from camera_visualizer.contrast import AutoContrast
+from camera_visualizer.views import view_to_display
+
+
+def run(views: list[np.ndarray], contrast: AutoContrast | None) -> float:
+    """
+    Converts the views to display buffers, with or without auto-contrast.
+    Returns the time per frame in ms.
+    """
+    buffer = None
+    start = time.perf_counter()
+    for view in views:
+        limits = contrast.update(view) if contrast is not None else None
+        buffer = view_to_display(view=view, out=buffer, limits=limits)
+    return 1000 * (time.perf_counter() - start) / len(views)
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Cost of the auto-contrast of the live view on XIMEA sized frames."
+    )
+    parser.add_argument("-n", "--frames", type=int, default=200)
+    parser.add_argument("--fps", type=float, default=30.0)
+    parser.add_argument(
+        "--level",
+        type=float,
+        default=0.05,
+        help="Mean level of the simulated dim view, in [0, 1].",
+    )
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    views = [
+        (args.level * rng.gamma(4.0, 0.25, (XIMEA_HEIGHT, XIMEA_WIDTH))).astype(np.float32)
+        for _ in range(8)
+    ]
+    views = views * (args.frames // len(views))
+    contrast = AutoContrast()
+    start = time.perf_counter()
+    for view in views:
+        contrast.percentiles(view)
+    histogram_ms = 1000 * (time.perf_counter() - start) / len(views)
+    fixed_ms = run(views, contrast=None)
+    auto_ms = run(views, contrast=contrast)
+    budget_ms = 1000 / args.fps
+    print(f"Histogram and limits: {histogram_ms:.2f} ms/frame")
+    print(f"Fixed conversion:     {fixed_ms:.2f} ms/frame")
+    print(
+        f"Auto-contrast:        {auto_ms:.2f} ms/frame "
+        f"(+{auto_ms - fixed_ms:.2f} ms, {100 * (auto_ms - fixed_ms) / budget_ms:.1f}% "
+        f"of the {budget_ms:.1f} ms frame budget)"
+    )
+    print(f"Limits: {contrast.limits[0]:.4f} - {contrast.limits[1]:.4f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,52 @@
+import argparse
+import time
+
+from camera_visualizer.acquisition import Acquisition
+from camera_visualizer.camera_interface.mock_interface import MockCamera
+
+
+def run(
+    acquisition: Acquisition,
+    n_frames: int,
+    fps: float,
+    display_fps: float | None,
+) -> float:
+    """
+    Simulates n_frames acquisitions at the given fps, computing the view of
+    the latest frame only at the display rate (every frame if None). Returns
+    the CPU time spent.
+    """
+    display_period = 0. if display_fps is None else 1. / display_fps
+    next_display = 0.
+    start = time.process_time()
+    for ii in range(n_frames):
+        acquisition.grab(fps=fps)
+        t = ii / fps
+        if t >= next_display and acquisition.has_new_view():
+            acquisition.view()
+            next_display = t + display_period
+    return time.process_time() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="CPU cost of eager versus rate-capped frame views."
+    )
+    parser.add_argument("-n", "--frames", type=int, default=2000)
+    parser.add_argument("--fps", type=float, default=170)
+    parser.add_argument("--display-fps", type=float, default=60)
+    args = parser.parse_args()
+
+    camera = MockCamera()
+    camera.toggle_bit_depth()  # 16 bits frames
+    camera.open(fps=args.fps)
+    eager = run(Acquisition(camera), args.frames, args.fps, display_fps=None)
+    capped = run(Acquisition(camera), args.frames, args.fps, args.display_fps)
+    camera.close()
+    print(f"Every frame viewed: {eager:.3f} s CPU")
+    print(f"Display capped at {args.display_fps:g} fps: {capped:.3f} s CPU")
+    print(f"Ratio: {capped / eager:.2f} (expected ~{args.display_fps / args.fps:.2f})")
+
+
+if __name__ == "__main__":
+    main()
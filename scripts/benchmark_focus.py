@@ -0,0 +1,106 @@
+import argparse
+import time
+
+import numpy as np
+
+from camera_visualizer.camera_interface.ximea_mosaic import (
+    XIMEA_HEIGHT,
+    XIMEA_MOSAIC_C,
+    XIMEA_MOSAIC_R,
+    XIMEA_WIDTH,
+)
+from camera_visualizer.focus import (
+    FOCUS_DEFAULT_ROI,
+    FocusAssist,
+    FocusConfig,
+    FocusMetricEnum,
+    overlay_peaking,
+    peaking_mask,
+)
+
+CFA_SHAPE = (XIMEA_MOSAIC_R, XIMEA_MOSAIC_C)
+MAX_VALUE = 2 ** 10 - 1
+# Maximum frame rate of the XIMEA camera (XIMEA_FPS_MAX)
+SENSOR_FPS = 170.0
+
+
+def mosaic_frames(n: int, blur: int, rng: np.random.Generator) -> list[np.ndarray]:
+    """
+    Returns n 10-bit XIMEA sized frames of a blocky scene, blurred by `blur`
+    box filter passes, with a different gain per band and some noise.
+    """
+    scene = np.kron(rng.random((XIMEA_HEIGHT // 16, XIMEA_WIDTH // 16)), np.ones((16, 16)))
+    for _ in range(blur):
+        scene = (
+            scene
+            + np.roll(scene, 1, 0) + np.roll(scene, -1, 0)
+            + np.roll(scene, 1, 1) + np.roll(scene, -1, 1)
+        ) / 5
+    gain = np.tile(rng.uniform(0.3, 1.0, CFA_SHAPE), (XIMEA_HEIGHT // 4, XIMEA_WIDTH // 4))
+    return [
+        np.clip(scene * gain * 900 + 50 + rng.normal(0, 3, scene.shape), 0, MAX_VALUE).astype(np.uint16)
+        for _ in range(n)
+    ]
+
+
+def run(
+    frames: list[np.ndarray],
+    focus: FocusAssist,
+    repeat: int,
+    fps: float | None = None,
+) -> float:
+    """
+    Scores the frames, only those due at `fps` if given, as the acquisition
+    does. Returns the time per frame in ms.
+    """
+    start = time.perf_counter()
+    for _ in range(repeat):
+        for frame in frames:
+            if fps is None or focus.due(fps=fps):
+                focus.update(frame=frame, cfa_shape=CFA_SHAPE, max_value=MAX_VALUE)
+    return 1000 * (time.perf_counter() - start) / (repeat * len(frames))
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Cost of the focus assist on XIMEA sized mosaic frames."
+    )
+    parser.add_argument("-n", "--frames", type=int, default=200)
+    parser.add_argument("--fps", type=float, default=SENSOR_FPS)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    frames = mosaic_frames(n=8, blur=0, rng=rng)
+    repeat = max(args.frames // len(frames), 1)
+    budget_ms = 1000 / args.fps
+    for metric in FocusMetricEnum:
+        for name, roi in (("ROI", FOCUS_DEFAULT_ROI), ("frame", (0.0, 0.0, 1.0, 1.0))):
+            focus = FocusAssist(config=FocusConfig(metric=metric, roi=roi))
+            ms = run(frames=frames, focus=focus, repeat=repeat)
+            print(
+                f"{metric.value:>9} on the {name:<5}: {ms:.2f} ms/frame "
+                f"({100 * ms / budget_ms:.1f}% of the {budget_ms:.1f} ms frame budget)"
+            )
+            ms = run(frames=frames, focus=focus, repeat=repeat, fps=args.fps)
+            print(
+                f"{'':>9}   scoring 1 frame in {focus.every}: {ms:.2f} ms/frame "
+                f"({100 * ms / budget_ms:.1f}% of the frame budget)"
+            )
+
+    print("Scores with increasing blur:")
+    focus = FocusAssist()
+    for blur in (0, 2, 8, 32):
+        frame = mosaic_frames(n=1, blur=blur, rng=rng)[0]
+        focus.update(frame=frame, cfa_shape=CFA_SHAPE, max_value=MAX_VALUE)
+        print(f"  {blur:>2} passes: {focus.summary()}")
+
+    buffer = np.zeros((XIMEA_HEIGHT, XIMEA_WIDTH), dtype=np.uint8)
+    start = time.perf_counter()
+    for frame in frames:
+        overlay_peaking(buffer=buffer, mask=peaking_mask(frame=frame, cfa_shape=CFA_SHAPE))
+    peaking_ms = 1000 * (time.perf_counter() - start) / len(frames)
+    print(f"Peaking overlay:  {peaking_ms:.2f} ms per displayed frame")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,118 @@
+import argparse
+import json
+import re
+import subprocess
+import sys
+from pathlib import Path
+
+# Modules that must not be imported by the core package
+HEAVY_MODULES = (
+    "PyQt5",
+    "matplotlib",
+    "spectral",
+    "scipy",
+    "ximea",
+    "imagingcontrol4",
+)
+IMPORT_TIME_BUDGET_MS = 300.0
+IMPORT_TIME_TOLERANCE = 0.25
+IMPORT_TIME_PATTERN = re.compile(r"import time:\s+(\d+)\s+\|\s+(\d+)\s+\|\s*(\S+)")
+
+
+def import_time_ms(module: str) -> tuple[float, dict[str, float]]:
+    """
+    Imports a module in a fresh interpreter with -X importtime. Returns the
+    cumulative import time of the module and the time spent in each top-level
+    package, in milliseconds.
+    """
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    total = 0.0
+    packages = {}
+    for line in result.stderr.splitlines():
+        match = IMPORT_TIME_PATTERN.match(line)
+        if match is None:
+            continue
+        self_ms = int(match.group(1)) / 1000
+        name = match.group(3)
+        if name == module:
+            total = int(match.group(2)) / 1000
+        root = name.split(".")[0]
+        packages[root] = packages.get(root, 0.0) + self_ms
+    return total, packages
+
+
+def imported_heavy_modules(module: str) -> list[str]:
+    code = (
+        f"import sys, {module}; "
+        f"print(','.join(m for m in {HEAVY_MODULES!r} if m in sys.modules))"
+    )
+    result = subprocess.run(
+        [sys.executable, "-c", code], capture_output=True, text=True, check=True
+    )
+    return [m for m in result.stdout.strip().split(",") if m]
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Fails if the cold import of the core package regresses."
+    )
+    parser.add_argument("--module", type=str, default="camera_visualizer")
+    parser.add_argument("-n", "--repeat", type=int, default=5)
+    parser.add_argument(
+        "--budget-ms",
+        type=float,
+        default=IMPORT_TIME_BUDGET_MS,
+        help="Maximum import time when no baseline is given.",
+    )
+    parser.add_argument(
+        "--baseline",
+        type=Path,
+        default=None,
+        help="JSON file with the reference import time.",
+    )
+    parser.add_argument(
+        "--tolerance",
+        type=float,
+        default=IMPORT_TIME_TOLERANCE,
+        help="Allowed relative regression with respect to the baseline.",
+    )
+    parser.add_argument(
+        "--update-baseline",
+        action="store_true",
+        help="Write the measured import time to the baseline file.",
+    )
+    args = parser.parse_args()
+
+    runs = [import_time_ms(args.module) for _ in range(args.repeat)]
+    best, packages = min(runs, key=lambda run: run[0])
+    print(f"import {args.module}: {best:.1f} ms (best of {args.repeat})")
+    for name, ms in sorted(packages.items(), key=lambda kv: -kv[1])[:10]:
+        print(f"  {name:<24} {ms:8.1f} ms")
+
+    failed = False
+    heavy = imported_heavy_modules(args.module)
+    if heavy:
+        print(f"FAIL: importing {args.module} imports {', '.join(heavy)}")
+        failed = True
+
+    budget = args.budget_ms
+    if args.baseline is not None and args.baseline.is_file():
+        with open(args.baseline, "r") as f:
+            budget = json.load(f)["import_ms"] * (1 + args.tolerance)
+    if args.baseline is not None and args.update_baseline:
+        with open(args.baseline, "w") as f:
+            json.dump({"module": args.module, "import_ms": best}, f, indent=2)
+        print(f"Baseline written to {args.baseline}")
+    elif best > budget:
+        print(f"FAIL: {best:.1f} ms above the budget of {budget:.1f} ms")
+        failed = True
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
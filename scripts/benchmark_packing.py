@@ -0,0 +1,63 @@
+import argparse
+import sys
+import time
+
+import numpy as np
+
+from camera_visualizer.camera_interface.ximea_mosaic import XIMEA_HEIGHT, XIMEA_WIDTH
+from camera_visualizer.packing import FramePacker, PACKED_BIT_DEPTHS
+
+# Maximum frame rate of the XIMEA camera (XIMEA_FPS_MAX)
+SENSOR_FPS = 170.0
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description=(
+            "Checks that the bit packing is lossless, and that packing and "
+            "unpacking XIMEA sized frames keeps up with the sensor rate."
+        )
+    )
+    parser.add_argument("-n", "--frames", type=int, default=200)
+    parser.add_argument("--fps", type=float, default=SENSOR_FPS)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    failed = False
+    for bit_depth in PACKED_BIT_DEPTHS:
+        packer = FramePacker(n_pixels=XIMEA_HEIGHT * XIMEA_WIDTH, bit_depth=bit_depth)
+        frame = rng.integers(
+            0, 2 ** bit_depth, (XIMEA_HEIGHT, XIMEA_WIDTH), dtype=packer.dtype
+        )
+        packed = np.empty(packer.frame_bytes, dtype=np.uint8)
+        unpacked = np.empty(packer.n_pixels, dtype=packer.dtype)
+
+        lossless = np.array_equal(
+            packer.unpack(packer.pack(frame, out=packed), out=unpacked),
+            frame.reshape(-1),
+        )
+        start = time.perf_counter()
+        for _ in range(args.frames):
+            packer.pack(frame, out=packed)
+        pack_fps = args.frames / (time.perf_counter() - start)
+        start = time.perf_counter()
+        for _ in range(args.frames):
+            packer.unpack(packed, out=unpacked)
+        unpack_fps = args.frames / (time.perf_counter() - start)
+
+        ratio = packer.frame_bytes / frame.nbytes
+        print(
+            f"{bit_depth:2d} bits: {ratio:.1%} of the unpacked size, "
+            f"pack {pack_fps:.0f} fps, unpack {unpack_fps:.0f} fps"
+            + ("" if lossless else ", ROUND TRIP FAILED")
+        )
+        if not lossless:
+            failed = True
+        if pack_fps < args.fps:
+            print(f"FAIL: packing {bit_depth}-bit frames below {args.fps:g} fps")
+            failed = True
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
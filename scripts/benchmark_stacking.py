@@ -0,0 +1,51 @@
+import argparse
+import time
+
+import numpy as np
+
+from camera_visualizer.camera_interface.ximea_mosaic import XIMEA_HEIGHT, XIMEA_WIDTH
+from camera_visualizer.stacking import FrameStacker, StackConfig, StackModeEnum
+
+
+def run(stacker: FrameStacker, frames: list[np.ndarray], max_value: int) -> float:
+    """
+    Pushes the frames to the stacker. Returns the achieved frame rate.
+    """
+    start = time.perf_counter()
+    for frame in frames:
+        stacker.push(frame=frame, max_value=max_value)
+    return len(frames) / (time.perf_counter() - start)
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Throughput of the frame stacking on XIMEA sized frames."
+    )
+    parser.add_argument("-n", "--frames", type=int, default=500)
+    parser.add_argument("--stack", type=int, default=16)
+    parser.add_argument("--bit-depth", type=int, default=10)
+    args = parser.parse_args()
+
+    max_value = 2 ** args.bit_depth - 1
+    dtype = np.uint8 if args.bit_depth <= 8 else np.uint16
+    rng = np.random.default_rng(0)
+    frames = [
+        rng.integers(0, max_value, (XIMEA_HEIGHT, XIMEA_WIDTH), dtype=dtype)
+        for _ in range(8)
+    ]
+    frames = frames * (args.frames // len(frames))
+    for mode in (StackModeEnum.MEAN, StackModeEnum.EMA):
+        for reject in (False, True):
+            stacker = FrameStacker(
+                config=StackConfig(
+                    mode=mode,
+                    frames=args.stack,
+                    reject_saturated=reject,
+                )
+            )
+            fps = run(stacker, frames, max_value)
+            print(f"{mode.value:>4}, reject saturated {reject!s:>5}: {fps:.0f} fps")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,81 @@
+import argparse
+import subprocess
+import time
+
+from camera_visualizer.camera_interface.v4l2_mmap import (
+    V4L2MmapCamera,
+    resolve_device,
+)
+
+
+def run_mmap(device: str | None, n_frames: int, fps: float) -> tuple[float, tuple]:
+    """
+    Streams frames through the mapped buffers. Returns the achieved frame
+    rate and the frame shape.
+    """
+    camera = V4L2MmapCamera()
+    camera.set_device(device_id=device)
+    camera.open(fps=fps)
+    try:
+        frame = camera.get_raw_frame(fps=fps)
+        start = time.perf_counter()
+        for _ in range(n_frames):
+            frame = camera.get_raw_frame(fps=fps)
+        rate = n_frames / (time.perf_counter() - start)
+        return rate, (frame.shape, frame.dtype, camera.state.pixel_format.fourcc)
+    finally:
+        camera.close()
+
+
+def run_subprocess(device: str, n_frames: int, width: int, height: int, pixfmt: str) -> float:
+    """
+    Grabs frames with one v4l2-ctl call per frame, as the legacy interface.
+    """
+    cmd = [
+        "v4l2-ctl",
+        f"--device={device}",
+        f"--set-fmt-video=width={width},height={height},pixelformat={pixfmt}",
+        "--stream-mmap",
+        "--stream-count=1",
+        "--stream-to=-",
+    ]
+    start = time.perf_counter()
+    for _ in range(n_frames):
+        subprocess.run(cmd, stdout=subprocess.PIPE, check=True)
+    return n_frames / (time.perf_counter() - start)
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description=(
+            "Frame rate of the V4L2 mmap streaming against one v4l2-ctl call "
+            "per frame. Without a camera, load the vivid driver with "
+            "`sudo modprobe vivid`."
+        )
+    )
+    parser.add_argument("--device", type=str, default=None)
+    parser.add_argument("-n", "--frames", type=int, default=200)
+    parser.add_argument("--fps", type=float, default=60.0)
+    parser.add_argument(
+        "--subprocess-frames",
+        type=int,
+        default=20,
+        help="Frames grabbed with v4l2-ctl (0 to skip).",
+    )
+    args = parser.parse_args()
+
+    rate, (shape, dtype, pixfmt) = run_mmap(args.device, args.frames, args.fps)
+    print(f"mmap streaming: {rate:.1f} fps ({shape[1]}x{shape[0]} {pixfmt.strip()} {dtype})")
+    if args.subprocess_frames > 0:
+        rate = run_subprocess(
+            device=resolve_device(args.device),
+            n_frames=args.subprocess_frames,
+            width=shape[1],
+            height=shape[0],
+            pixfmt=pixfmt,
+        )
+        print(f"v4l2-ctl per frame: {rate:.1f} fps")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,93 @@
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+from PyQt5.QtWidgets import QApplication, QLabel
+from PyQt5.QtCore import Qt
+from PyQt5.QtGui import QImage, QPixmap
+
+from camera_visualizer.video_widget import TransformEnum, VideoWidget
+from camera_visualizer.views import view_to_display
+
+
+def label_path(label: QLabel, view: np.ndarray) -> None:
+    """
+    Frame-to-screen path of the former QLabel based display.
+    """
+    arr = np.clip(view * 255.0, 0, 255).astype(np.uint8)
+    qimg = QImage(
+        arr.data,
+        arr.shape[1],
+        arr.shape[0],
+        arr.shape[1],
+        QImage.Format_Grayscale8,
+    ).copy()
+    pixmap = QPixmap.fromImage(qimg)
+    label.setPixmap(pixmap.scaled(
+        label.size(), Qt.KeepAspectRatio, Qt.SmoothTransformation
+    ))
+    label.repaint()
+
+
+def widget_path(
+    widget: VideoWidget,
+    view: np.ndarray,
+    buffer: np.ndarray | None,
+) -> np.ndarray:
+    buffer = view_to_display(view=view, out=buffer)
+    widget.set_frame(buffer)
+    widget.repaint()
+    return buffer
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Frame-to-screen time of the QLabel and VideoWidget paths."
+    )
+    parser.add_argument("-n", "--frames", type=int, default=200)
+    parser.add_argument("--height", type=int, default=1088)
+    parser.add_argument("--width", type=int, default=2048)
+    parser.add_argument("--size", type=int, nargs=2, default=(960, 510))
+    args = parser.parse_args()
+
+    os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+    app = QApplication(sys.argv[:1])
+    rng = np.random.default_rng(seed=0)
+    views = [
+        rng.random((args.height, args.width), dtype=np.float32)
+        for _ in range(4)
+    ]
+
+    label = QLabel()
+    label.resize(*args.size)
+    label.show()
+    start = time.perf_counter()
+    for ii in range(args.frames):
+        label_path(label=label, view=views[ii % len(views)])
+    label_time = (time.perf_counter() - start) / args.frames
+
+    results = {"QLabel/QPixmap": label_time}
+    for transform in TransformEnum:
+        widget = VideoWidget()
+        widget.set_transform(transform)
+        widget.resize(*args.size)
+        widget.show()
+        buffer = None
+        start = time.perf_counter()
+        for ii in range(args.frames):
+            buffer = widget_path(widget, views[ii % len(views)], buffer)
+        results[f"VideoWidget ({transform.value})"] = (
+            (time.perf_counter() - start) / args.frames
+        )
+        widget.close()
+
+    for name, elapsed in results.items():
+        print(f"{name}: {1000 * elapsed:.2f} ms/frame")
+    app.quit()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,163 @@
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+import urllib.error
+import urllib.request
+
+from camera_visualizer.acquisition import Acquisition
+from camera_visualizer.camera_interface.mock_interface import CameraEnum, camera
+from camera_visualizer.focus import FocusConfig
+from camera_visualizer.metrics import (
+    BYTES_WRITTEN,
+    FOCUS_SCORE,
+    FRAMES_GRABBED,
+    FRAMES_RECORDED,
+    PROMETHEUS_CONTENT_TYPE,
+    QUEUE_SIZE,
+    RECORDING,
+    REGISTRY,
+    MetricsServer,
+    register_acquisition,
+)
+from camera_visualizer.serializer import SaveFormatEnum
+
+CHECK_FPS = 30.0
+# Label with characters escaped by the text format
+CHECK_LABELS = {"camera": "mock", "session": 'check "metrics"'}
+CHECK_LABEL_TEXT = 'camera="mock",session="check \\"metrics\\""'
+
+
+def fetch(url: str) -> tuple[int, str, str]:
+    """
+    Returns the status, content type and body of a GET request.
+    """
+    try:
+        with urllib.request.urlopen(url, timeout=5) as response:
+            return response.status, response.headers["Content-Type"], response.read().decode()
+    except urllib.error.HTTPError as e:
+        return e.code, e.headers["Content-Type"], ""
+
+
+def parse_text(body: str) -> tuple[dict[str, str], dict[str, float]]:
+    """
+    Parses the Prometheus text format into the types of the families and the
+    values of the samples, keyed by name and labels.
+    """
+    types, values = {}, {}
+    for line in body.splitlines():
+        if line.startswith("# TYPE "):
+            _, _, name, type_ = line.split(" ")
+            types[name] = type_
+        elif line and not line.startswith("#"):
+            key, value = line.rsplit(" ", 1)
+            values[key] = float(value)
+    return types, values
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description=(
+            "Checks the metrics endpoint on a mock acquisition: serves the "
+            "metrics on a free port, grabs and records a few frames, and "
+            "checks the /metrics and /metrics.json bodies."
+        )
+    )
+    parser.add_argument("-n", "--frames", type=int, default=10)
+    args = parser.parse_args()
+
+    # The recorded session goes to a temporary data path
+    data_dir = tempfile.TemporaryDirectory()
+    os.environ["DATA_PATH"] = data_dir.name
+    failures = []
+
+    def check(condition: bool, message: str) -> None:
+        if not condition:
+            failures.append(message)
+
+    source = camera(camera_id=CameraEnum.MOCK)
+    source.open(fps=CHECK_FPS)
+    acquisition = Acquisition(camera=source)
+    acquisition.configure_focus(FocusConfig())
+    collector = register_acquisition(acquisition=acquisition, labels=CHECK_LABELS)
+    server = MetricsServer(port=0)
+    try:
+        source.set_save_subfolder(subfolder="check_metrics")
+        acquisition.start_recording(fmt=SaveFormatEnum.NUMPY)
+        for _ in range(args.frames):
+            acquisition.grab(fps=CHECK_FPS)
+        writer = acquisition.writer
+        deadline = time.perf_counter() + 5.0
+        while writer.frames_written < args.frames and time.perf_counter() < deadline:
+            time.sleep(0.01)
+
+        status, content_type, body = fetch(server.url)
+        check(status == 200, f"/metrics status {status}")
+        check(content_type == PROMETHEUS_CONTENT_TYPE, f"/metrics content type {content_type}")
+        check(body.endswith("\n"), "/metrics body does not end with a newline")
+        types, values = parse_text(body)
+        for name, type_ in (
+            (FRAMES_GRABBED, "counter"),
+            (FRAMES_RECORDED, "counter"),
+            (RECORDING, "gauge"),
+            (FOCUS_SCORE, "gauge"),
+        ):
+            check(types.get(name) == type_, f"{name} type {types.get(name)} instead of {type_}")
+            check(f"# HELP {name} " in body, f"{name} has no help")
+        expected = {
+            FRAMES_GRABBED: args.frames,
+            FRAMES_RECORDED: args.frames,
+            RECORDING: 1,
+            QUEUE_SIZE: writer.queue_size(),
+            BYTES_WRITTEN: writer.bytes_written,
+        }
+        for name, value in expected.items():
+            key = f"{name}{{{CHECK_LABEL_TEXT}}}"
+            check(values.get(key) == value, f"{key} = {values.get(key)} instead of {value}")
+        check(
+            values.get(f"{FOCUS_SCORE}{{{CHECK_LABEL_TEXT}}}") == acquisition.focus.score,
+            "focus score differs from the acquisition",
+        )
+
+        status, content_type, body = fetch(server.url + ".json")
+        check(status == 200, f"/metrics.json status {status}")
+        check(content_type == "application/json", f"/metrics.json content type {content_type}")
+        snapshot = json.loads(body)
+        check(abs(snapshot["time"] - time.time()) < 60, "snapshot time is not the current time")
+        samples = {
+            sample["name"]: sample for sample in snapshot["samples"]
+            if sample["labels"] == CHECK_LABELS
+        }
+        for name, value in expected.items():
+            got = samples.get(name, {}).get("value")
+            check(got == value, f"JSON {name} = {got} instead of {value}")
+
+        status, _, _ = fetch(server.url.replace("/metrics", "/missing"))
+        check(status == 404, f"unknown path status {status}")
+
+        acquisition.stop_recording()
+        _, _, body = fetch(server.url)
+        _, values = parse_text(body)
+        check(values.get(f"{RECORDING}{{{CHECK_LABEL_TEXT}}}") == 0, "recording still reported")
+        check(
+            f"{FRAMES_RECORDED}{{" not in body,
+            "writer metrics exported without a recording",
+        )
+    finally:
+        server.close()
+        REGISTRY.unregister(collector)
+        acquisition.stop_recording()
+        source.close()
+        data_dir.cleanup()
+
+    for failure in failures:
+        print(f"FAIL: {failure}")
+    if not failures:
+        print(f"OK: {args.frames} frames grabbed and recorded, metrics served on port {server.port}")
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,132 @@
+import argparse
+import json
+import sys
+import tempfile
+import time
+from datetime import date
+from pathlib import Path
+
+import numpy as np
+
+from camera_visualizer.catalog import SessionCatalog
+from camera_visualizer.recorder import AsyncFrameWriter, SegmentConfig
+from camera_visualizer.serializer import SaveFormatEnum
+from camera_visualizer.session import SESSION_MANIFEST, SessionReader
+
+CHECK_SHAPE = (64, 80)
+CHECK_ENVI_OPTIONS = {"bit depth": 10, "exposure time (ms)": 5.0}
+# Segments roll over after each frame, in all the formats
+CHECK_SEGMENT_MB = 1 / 2 ** 20
+CHECK_TIMEOUT_S = 5.0
+# Manifest of a session that can not be read
+CHECK_BROKEN_MANIFEST = {"format": "numpy", "frames": 1, "segments": 1}
+
+
+def crashed_session(folder: Path, fmt: SaveFormatEnum, n_frames: int) -> None:
+    """
+    Records n_frames segmented frames in folder, then leaves the writer
+    without closing it, as a crash would.
+    """
+    folder.mkdir()
+    writer = AsyncFrameWriter(
+        save_folder=folder,
+        fmt=fmt,
+        segment_config=SegmentConfig(max_mb=CHECK_SEGMENT_MB),
+        previews=False,
+    )
+    writer.start()
+    for index in range(n_frames):
+        frame = np.full(CHECK_SHAPE, index, dtype=np.uint16)
+        writer.submit(frame=frame, envi_options=CHECK_ENVI_OPTIONS)
+    deadline = time.perf_counter() + CHECK_TIMEOUT_S
+    while writer.frames_written < n_frames and time.perf_counter() < deadline:
+        time.sleep(0.01)
+    if writer.error is not None:
+        raise writer.error
+
+
+def check_session(folder: Path, expected: int) -> list[str]:
+    """
+    Reads a crashed session, which must hold the frames of its closed
+    segments only.
+    """
+    failures = []
+    reader = SessionReader(folder)
+    try:
+        if not reader.segmented:
+            failures.append("not read as a segmented session")
+        if len(reader) != expected:
+            failures.append(f"{len(reader)} frames instead of {expected}")
+        frames = list(reader)
+        if [int(frame[0, 0]) for frame in frames] != list(range(expected)):
+            failures.append("frames read out of order")
+        try:
+            reader.read(expected)
+            failures.append(f"frame {expected} read past the end")
+        except IndexError:
+            pass
+    finally:
+        reader.close()
+    return failures
+
+
+def check_rebuild(root: Path, n_sessions: int, n_started: int) -> list[str]:
+    """
+    Rebuilds a catalog of the crashed sessions and a broken one, which must
+    be skipped, and queries the sessions started until today.
+    """
+    failures = []
+    broken = root / "check" / "broken"
+    broken.mkdir()
+    with open(broken / SESSION_MANIFEST, "w") as f:
+        json.dump(CHECK_BROKEN_MANIFEST, f)
+    catalog = SessionCatalog(path=root / "catalog.sqlite")
+    n_cataloged = catalog.rebuild(workers=1)
+    if n_cataloged != n_sessions:
+        failures.append(f"rebuild cataloged {n_cataloged} sessions instead of {n_sessions}")
+    n_found = len(catalog.query(until=date.today().isoformat()))
+    if n_found != n_started:
+        failures.append(f"{n_found} sessions found until today instead of {n_started}")
+    return failures
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description=(
+            "Checks that the sessions of segmented recordings interrupted "
+            "before closing are read up to their last closed segment, in "
+            "all the save formats, including when no segment was closed, "
+            "and that they are cataloged."
+        )
+    )
+    parser.parse_args()
+
+    failures = []
+    with tempfile.TemporaryDirectory() as tmp:
+        (Path(tmp) / "check").mkdir()
+        for fmt in SaveFormatEnum:
+            # Crash during the first segment, then during the third one
+            for n_frames, expected in ((1, 0), (3, 2)):
+                folder = Path(tmp) / "check" / f"{fmt.value}_{n_frames}"
+                try:
+                    crashed_session(folder=folder, fmt=fmt, n_frames=n_frames)
+                    errors = check_session(folder=folder, expected=expected)
+                except Exception as e:
+                    errors = [f"{type(e).__name__}: {e}"]
+                failures += [f"{fmt.value}, {n_frames} frames: {error}" for error in errors]
+        # Sessions crashed before closing a segment have no start time
+        failures += check_rebuild(
+            root=Path(tmp),
+            n_sessions=2 * len(SaveFormatEnum),
+            n_started=len(SaveFormatEnum),
+        )
+
+    for failure in failures:
+        print(f"FAIL: {failure}")
+    if not failures:
+        print(f"OK: crashed sessions read and cataloged in {len(SaveFormatEnum)} formats")
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
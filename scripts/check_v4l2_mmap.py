@@ -0,0 +1,326 @@
+import argparse
+import errno
+import mmap
+import os
+import sys
+import time
+
+import numpy as np
+
+from camera_visualizer.camera_interface.v4l2_mmap import (
+    V4L2_CAP_DEVICE_CAPS,
+    V4L2_CAP_STREAMING,
+    V4L2_CAP_VIDEO_CAPTURE,
+    V4L2_CID_EXPOSURE_ABSOLUTE,
+    V4L2_CID_EXPOSURE_AUTO,
+    V4L2_EXPOSURE_MANUAL,
+    V4L2_EXPOSURE_UNIT_US,
+    V4L2_PIXEL_FORMATS,
+    V4L2IO,
+    V4L2MmapCamera,
+    VIDIOC_DQBUF,
+    VIDIOC_ENUM_FMT,
+    VIDIOC_G_CTRL,
+    VIDIOC_G_FMT,
+    VIDIOC_G_PARM,
+    VIDIOC_QBUF,
+    VIDIOC_QUERYBUF,
+    VIDIOC_QUERYCAP,
+    VIDIOC_QUERYCTRL,
+    VIDIOC_REQBUFS,
+    VIDIOC_S_CTRL,
+    VIDIOC_S_FMT,
+    VIDIOC_S_PARM,
+    VIDIOC_STREAMOFF,
+    VIDIOC_STREAMON,
+    fourcc,
+    fourcc_name,
+    query_exposure,
+)
+
+FAKE_DEVICE = "/dev/video-fake"
+FAKE_WIDTH = 640
+FAKE_HEIGHT = 480
+# Bytes added at the end of each row, as drivers aligning their rows do
+FAKE_ROW_PADDING = 64
+# Exposure control range, in V4L2 units of 100 us
+FAKE_EXPOSURE_RANGE = (1, 5000, 1)
+
+
+class FakeV4L2IO(V4L2IO):
+    """
+    Emulates a V4L2 capture device streaming a known pattern: the buffers
+    live in an anonymous memory file mapped read-only by the camera, as the
+    kernel buffers are, and are filled when dequeued. Rows are padded, and
+    the padding is set to the largest sample value, so that frames keeping
+    the row stride are detected.
+    """
+
+    def __init__(self, formats: list[str], width: int = FAKE_WIDTH, height: int = FAKE_HEIGHT):
+        self.formats = formats
+        self.width = width
+        self.height = height
+        self.pixel_format = formats[0]
+        self.fd = None
+        self.memory = None
+        self.buffer_length = 0
+        self.n_buffers = 0
+        self.queued = []
+        self.dequeued = set()
+        self.streaming = False
+        self.sequence = 0
+        self.timeperframe = (1, 30)
+        self.exposure = 100
+        self.mapped = []
+
+    def bytes_per_line(self) -> int:
+        itemsize = np.dtype(V4L2_PIXEL_FORMATS[self.pixel_format].dtype).itemsize
+        return self.width * itemsize + FAKE_ROW_PADDING
+
+    def open(self, path: str) -> int:
+        if path != FAKE_DEVICE:
+            raise OSError(errno.ENOENT, f"No such device: {path}")
+        self.fd = os.memfd_create("fake-v4l2")
+        return self.fd
+
+    def close(self, fd: int) -> None:
+        self._free()
+        os.close(fd)
+        self.fd = None
+
+    def mmap(self, fd: int, length: int, offset: int) -> mmap.mmap:
+        buffer = mmap.mmap(fd, length, flags=mmap.MAP_SHARED, prot=mmap.PROT_READ, offset=offset)
+        self.mapped.append(buffer)
+        return buffer
+
+    def wait(self, fd: int, timeout: float) -> bool:
+        return self.streaming and bool(self.queued)
+
+    def _free(self) -> None:
+        if self.memory is not None:
+            self.memory.close()
+            self.memory = None
+        os.ftruncate(self.fd, 0)
+        self.n_buffers = 0
+        self.queued = []
+        self.dequeued = set()
+
+    def _fill(self, index: int) -> None:
+        """
+        Writes the frame of the current sequence number to a buffer: sample
+        (row, col) is (sequence + row + col) modulo the dynamic range.
+        """
+        pixel_format = V4L2_PIXEL_FORMATS[self.pixel_format]
+        dtype = np.dtype(pixel_format.dtype)
+        row = self.bytes_per_line() // dtype.itemsize
+        rows = np.frombuffer(
+            self.memory,
+            dtype=dtype,
+            count=row * self.height,
+            offset=index * self.buffer_length,
+        ).reshape(self.height, row)
+        rows[:, self.width:] = np.iinfo(dtype).max
+        rows[:, :self.width] = expected_frame(
+            sequence=self.sequence,
+            shape=(self.height, self.width),
+            dtype=dtype,
+            bit_depth=pixel_format.bit_depth,
+        )
+
+    def ioctl(self, fd: int, request: int, arg) -> None:
+        if fd != self.fd:
+            raise OSError(errno.EBADF, "Bad file descriptor")
+        if request == VIDIOC_QUERYCAP:
+            arg.card = b"Fake V4L2 device"
+            arg.capabilities = V4L2_CAP_VIDEO_CAPTURE | V4L2_CAP_STREAMING | V4L2_CAP_DEVICE_CAPS
+            arg.device_caps = V4L2_CAP_VIDEO_CAPTURE | V4L2_CAP_STREAMING
+        elif request == VIDIOC_ENUM_FMT:
+            if arg.index >= len(self.formats):
+                raise OSError(errno.EINVAL, "No more formats")
+            arg.pixelformat = fourcc(self.formats[arg.index])
+        elif request in (VIDIOC_G_FMT, VIDIOC_S_FMT):
+            if request == VIDIOC_S_FMT:
+                if self.n_buffers:
+                    raise OSError(errno.EBUSY, "Buffers are allocated")
+                name = fourcc_name(arg.fmt.pix.pixelformat)
+                if name in self.formats:
+                    self.pixel_format = name
+                self.width = min(arg.fmt.pix.width or self.width, FAKE_WIDTH)
+                self.height = min(arg.fmt.pix.height or self.height, FAKE_HEIGHT)
+            pix = arg.fmt.pix
+            pix.width = self.width
+            pix.height = self.height
+            pix.pixelformat = fourcc(self.pixel_format)
+            pix.bytesperline = self.bytes_per_line()
+            pix.sizeimage = pix.bytesperline * self.height
+        elif request == VIDIOC_S_PARM:
+            period = arg.parm.capture.timeperframe
+            self.timeperframe = (period.numerator, period.denominator)
+        elif request == VIDIOC_G_PARM:
+            period = arg.parm.capture.timeperframe
+            period.numerator, period.denominator = self.timeperframe
+        elif request == VIDIOC_REQBUFS:
+            if self.streaming:
+                raise OSError(errno.EBUSY, "Streaming")
+            self._free()
+            if arg.count > 0:
+                page = mmap.PAGESIZE
+                self.buffer_length = -(-self.bytes_per_line() * self.height // page) * page
+                self.n_buffers = arg.count
+                os.ftruncate(self.fd, self.n_buffers * self.buffer_length)
+                self.memory = mmap.mmap(self.fd, self.n_buffers * self.buffer_length)
+        elif request == VIDIOC_QUERYBUF:
+            if arg.index >= self.n_buffers:
+                raise OSError(errno.EINVAL, "Bad buffer index")
+            arg.length = self.buffer_length
+            arg.m.offset = arg.index * self.buffer_length
+        elif request == VIDIOC_QBUF:
+            if arg.index >= self.n_buffers or arg.index in self.queued:
+                raise OSError(errno.EINVAL, f"Buffer {arg.index} cannot be queued")
+            self.dequeued.discard(arg.index)
+            self.queued.append(arg.index)
+        elif request == VIDIOC_DQBUF:
+            if not self.streaming or not self.queued:
+                raise OSError(errno.EAGAIN, "No buffer ready")
+            index = self.queued.pop(0)
+            self._fill(index)
+            now = time.time()
+            arg.index = index
+            arg.bytesused = self.bytes_per_line() * self.height
+            arg.sequence = self.sequence
+            arg.timestamp.tv_sec = int(now)
+            arg.timestamp.tv_usec = int((now % 1) * 1_000_000)
+            self.dequeued.add(index)
+            self.sequence += 1
+        elif request == VIDIOC_STREAMON:
+            self.streaming = True
+        elif request == VIDIOC_STREAMOFF:
+            self.streaming = False
+            self.queued = []
+            self.dequeued = set()
+        elif request == VIDIOC_QUERYCTRL:
+            if arg.id != V4L2_CID_EXPOSURE_ABSOLUTE:
+                raise OSError(errno.EINVAL, "No such control")
+            arg.minimum, arg.maximum, arg.step = FAKE_EXPOSURE_RANGE
+        elif request == VIDIOC_G_CTRL:
+            if arg.id == V4L2_CID_EXPOSURE_ABSOLUTE:
+                arg.value = self.exposure
+            elif arg.id == V4L2_CID_EXPOSURE_AUTO:
+                arg.value = V4L2_EXPOSURE_MANUAL
+            else:
+                raise OSError(errno.EINVAL, "No such control")
+        elif request == VIDIOC_S_CTRL:
+            if arg.id == V4L2_CID_EXPOSURE_ABSOLUTE:
+                self.exposure = arg.value
+            else:
+                raise OSError(errno.EINVAL, "Control cannot be set")
+        else:
+            raise OSError(errno.ENOTTY, f"Unexpected ioctl {request:#x}")
+
+
+def expected_frame(sequence: int, shape: tuple[int, int], dtype: np.dtype, bit_depth: int) -> np.ndarray:
+    rows = np.arange(shape[0])[:, None]
+    cols = np.arange(shape[1])[None, :]
+    return ((sequence + rows + cols) % 2 ** bit_depth).astype(dtype)
+
+
+def check_stream(formats: list[str], n_frames: int) -> list[str]:
+    """
+    Streams frames of each format through the camera, toggling the bit depth
+    between them, and returns the failed checks. The formats must have
+    different bit depths.
+    """
+    failures = []
+
+    def check(condition: bool, message: str) -> None:
+        if not condition:
+            failures.append(f"{formats[0].strip()}: {message}")
+
+    io = FakeV4L2IO(formats=formats)
+    camera = V4L2MmapCamera(io=io)
+    camera.set_device(device_id=FAKE_DEVICE)
+    camera.open(fps=60.0)
+    check(io.timeperframe == (1000, 60_000), f"frame period set to {io.timeperframe}")
+    check(io.streaming and len(io.queued) == io.n_buffers, "buffers not all queued")
+    check(
+        camera.exposure_range() == tuple(v * V4L2_EXPOSURE_UNIT_US for v in FAKE_EXPOSURE_RANGE),
+        f"exposure range {camera.exposure_range()}",
+    )
+    check(camera.set_exposure(20_000) and io.exposure == 200, "exposure not set")
+
+    for position in range(len(formats)):
+        pixel_format = camera.state.pixel_format
+        dtype = np.dtype(pixel_format.dtype)
+        for _ in range(n_frames):
+            sequence = io.sequence
+            frame = camera.get_raw_frame(fps=60.0)
+            check(frame.dtype == dtype, f"dtype {frame.dtype} instead of {dtype}")
+            check(frame.shape == (FAKE_HEIGHT, FAKE_WIDTH), f"shape {frame.shape}")
+            check(not frame.flags.writeable, "frame is writeable")
+            check(
+                np.array_equal(
+                    frame,
+                    expected_frame(sequence, frame.shape, dtype, pixel_format.bit_depth),
+                ),
+                f"frame {sequence} differs from the pattern (row padding kept?)",
+            )
+            check(
+                len(io.dequeued) == 1 and len(io.queued) == io.n_buffers - 1,
+                f"{len(io.dequeued)} buffers held by the camera",
+            )
+            check(camera.cfa_shape() == pixel_format.cfa_shape, f"filter array {camera.cfa_shape()}")
+            check(camera.get_view(frame).max() <= 1.0, "view not normalized")
+        # Frames are views of the buffers, which cannot be unmapped while
+        # they are referenced
+        frame = None
+        if len(failures) > 0 or position == len(formats) - 1:
+            break
+        mapped = list(io.mapped)
+        depth = camera.bit_depth()
+        camera.toggle_bit_depth()
+        check(camera.bit_depth() != depth, "bit depth not toggled")
+        check(all(buffer.closed for buffer in mapped), "buffers left mapped on restart")
+        check(io.streaming and len(io.queued) == io.n_buffers, "stream not restarted")
+    camera.close()
+    check(not io.streaming and io.n_buffers == 0 and io.fd is None, "device not released")
+    check(all(buffer.closed for buffer in io.mapped), "buffers left mapped")
+    # As read by the GStreamer camera from the device of its v4l2src
+    exposure_control = query_exposure(device=FAKE_DEVICE, io=io)
+    check(
+        exposure_control == (camera.exposure_range(), 20_000),
+        f"exposure queried as {exposure_control}",
+    )
+    check(io.fd is None, "device left open by the exposure query")
+    return failures
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description=(
+            "Checks the V4L2 mmap camera against a fake device: formats, "
+            "row stride removal, buffer queueing and release."
+        )
+    )
+    parser.add_argument("-n", "--frames", type=int, default=20)
+    args = parser.parse_args()
+
+    cases = (
+        ["GREY"],
+        ["Y16 ", "GREY"],
+        ["RGGB"],
+        ["BG10", "BA81"],
+        ["RG12"],
+    )
+    failed = False
+    for formats in cases:
+        failures = check_stream(formats=formats, n_frames=args.frames)
+        names = ", ".join(f.strip() for f in formats)
+        print(f"{names}: " + ("OK" if not failures else f"{len(failures)} failures"))
+        for failure in failures[:10]:
+            print(f"  FAIL: {failure}")
+        failed = failed or bool(failures)
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
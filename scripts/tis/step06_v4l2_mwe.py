@@ -1,17 +1,18 @@
 import numpy as np
 
-from tis_visualizer.v4l2_interface import V4L2Camera
+from camera_visualizer.camera_interface.v4l2_interface import GST_TEST_SOURCE, V4L2Camera
 
-cam = V4L2Camera()
-cam.open()
+# Use source=None to stream from the first V4L2 device
+cam = V4L2Camera(source=GST_TEST_SOURCE, width=640, height=480)
+cam.open(fps=30)
 
 try:
     for i in range(10):
-        frame, _ = cam.get_frame()
+        frame, _ = cam.get_frame(fps=30)
         np.save(file="frame", arr=frame)
 
-        print(f"{cam.bit_depth()}: {frame.shape} {frame.dtype} max={frame.max():.4f}")
-        # cam.toggle_bit_depth()  # switch to 16-bit
+        print(f"{cam.bit_depth()}: {frame.shape} {frame.dtype} max={frame.max()}")
+        # cam.toggle_bit_depth()  # switch to 8-bit
 
 finally:
     cam.close()